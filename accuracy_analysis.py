@@ -1,4 +1,30 @@
-import matplotlib.pyplot as plt
+import base64
+import html
+import os
+
+
+# Metriche di accuratezza mostrate nei grafici, nell'ordine in cui compaiono sull'asse x.
+ACCURACY_METRICS = (
+    ("bug_accuracy", "bug"),
+    ("syntax_accuracy", "sintassi"),
+    ("style_accuracy", "stile"),
+    ("docstrings_accuracy", "docstring"),
+)
+
+
+def _pyplot(headless: bool = True):
+    """Importa matplotlib solo quando serve davvero disegnare un grafico
+
+        L'import è differito così che importare questo modulo per le sole classi di dati non paghi il costo di matplotlib.
+        In modalità headless viene selezionato il backend non interattivo "Agg", che non richiede un display.
+    """
+    import matplotlib
+
+    if headless:
+        matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    return plt
 
 
 class LlmModel:
@@ -91,21 +117,146 @@ class LlmModel:
         categories = ["bug_accuracy", "syntax_accuracy", "style_accuracy", "docstring_accuracy", "execution_time"]
         values = [self.bug_accuracy, self.syntax_accuracy, self.style_accuracy, self.docstrings_accuracy, self.time]
 
+        plt = _pyplot(headless=False)
         plt.bar(categories, values)
         plt.title(self.name)
         plt.xlabel("categories")
         plt.ylabel("score")
         plt.show()
 
+    @property
+    def label(self) -> str:
+        """Etichetta del modello usata nei grafici e nel report (nome e prompt)."""
+        return f"{self.name} ({self.prompt})" if self.prompt else self.name
+
+
+def generate_report(models: list, output_dir: str = "report", formats: tuple = ("png", "svg")) -> dict:
+    """Genera in Modalità Headless il Grafico Comparativo e il Report HTML dei Modelli LLM
+
+        Questa funzione disegna un'unica figura che confronta tutti i modelli e le varianti di prompt, senza aprire finestre.
+
+        La figura contiene due pannelli: le barre raggruppate delle accuratezze per categoria (un gruppo per categoria,
+        una barra per modello) e il tempo di esecuzione di ciascun modello. Viene usato il backend non interattivo "Agg",
+        la figura viene salvata nei formati richiesti e poi chiusa, quindi la funzione è adatta a server e CI anche con decine di modelli.
+        Accanto ai grafici viene scritto un report HTML autosufficiente che incorpora l'immagine PNG e la tabella delle metriche.
+
+        Argomenti (Args)
+
+            models (list): Le istanze LlmModel da confrontare.
+
+            output_dir (str): La cartella in cui salvare i file. Il valore predefinito è "report".
+
+            formats (tuple): I formati di immagine da generare (ad esempio "png", "svg"). Il valore predefinito è ("png", "svg").
+
+        Valori di Ritorno (Returns)
+
+            dict: I percorsi dei file generati, indicizzati per formato, più la chiave "html" per il report.
+
+        Esempi (Examples)
+
+            paths = generate_report([model_a, model_b], output_dir="report")
+            print(paths["html"])  # report/report.html
+    """
+    plt = _pyplot(headless=True)
+    os.makedirs(output_dir, exist_ok=True)
+
+    n_models = max(len(models), 1)
+    width = 0.8 / n_models
+    positions = range(len(ACCURACY_METRICS))
+
+    fig, (accuracy_ax, time_ax) = plt.subplots(
+        1, 2, figsize=(max(10, 4 + 0.6 * n_models * len(ACCURACY_METRICS)), 6),
+        gridspec_kw={"width_ratios": [3, 1]},
+    )
+
+    colors = []
+    for index, model in enumerate(models):
+        offsets = [position - 0.4 + width * (index + 0.5) for position in positions]
+        values = [getattr(model, attribute) for attribute, _ in ACCURACY_METRICS]
+        bars = accuracy_ax.bar(offsets, values, width=width, label=model.label)
+        colors.append(bars.patches[0].get_facecolor())
+
+    accuracy_ax.set_xticks(list(positions))
+    accuracy_ax.set_xticklabels([label for _, label in ACCURACY_METRICS])
+    accuracy_ax.set_ylim(0, 100)
+    accuracy_ax.set_ylabel("accuratezza (F1 %)")
+    accuracy_ax.set_title("Accuratezza per categoria")
+
+    time_ax.barh([model.label for model in models], [model.time for model in models], color=colors)
+    time_ax.set_xlabel("tempo (secondi)")
+    time_ax.set_title("Tempo di esecuzione")
+
+    fig.legend(loc="lower center", ncol=min(n_models, 4), fontsize="small")
+    fig.tight_layout(rect=(0, 0.05 + 0.03 * (n_models // 4), 1, 1))
+
+    paths = {}
+    for image_format in formats:
+        paths[image_format] = os.path.join(output_dir, f"accuracy.{image_format}")
+        fig.savefig(paths[image_format], format=image_format)
+    if "png" not in paths:
+        paths["png"] = os.path.join(output_dir, "accuracy.png")
+        fig.savefig(paths["png"], format="png")
+    plt.close(fig)
+
+    with open(paths["png"], "rb") as f:
+        image = base64.b64encode(f.read()).decode("ascii")
+
+    rows = "\n".join(
+        "<tr><td>{}</td><td>{}</td>{}<td>{}</td></tr>".format(
+            html.escape(model.name), html.escape(model.prompt),
+            "".join(f"<td>{getattr(model, attribute)}</td>" for attribute, _ in ACCURACY_METRICS),
+            model.time,
+        )
+        for model in models
+    )
+    headers = "".join(f"<th>{html.escape(label)}</th>" for _, label in ACCURACY_METRICS)
+
+    paths["html"] = os.path.join(output_dir, "report.html")
+    with open(paths["html"], "w", encoding="utf-8") as f:
+        f.write(f"""<!DOCTYPE html>
+<html lang="it">
+  <head>
+    <meta charset="utf-8" />
+    <title>Jarvis Code Assistant - Report di accuratezza</title>
+  </head>
+  <body>
+    <h1>Report di accuratezza</h1>
+    <img src="data:image/png;base64,{image}" alt="Accuratezza e tempo di esecuzione dei modelli" />
+    <table border="1">
+      <tr><th>modello</th><th>prompt</th>{headers}<th>tempo (s)</th></tr>
+{rows}
+    </table>
+  </body>
+</html>
+""")
+    return paths
+
         
 if __name__ == "__main__":
-    ollama_gen = LlmModel("codegemma", "prompt generico", 60, 50, 35, 35, 70)
-    ollama_emp = LlmModel("codegemma", "prompt migliorato", 70, 65, 45, 60, 70)
-    gemini_gen = LlmModel("gemini-2.5-flash", "prompt generico", 85, 80, 75, 90, 7)
-    gemini_emp = LlmModel("gemini-2.5-flash", "prompt migliorato", 95, 95, 90, 90, 7)
-    ollama_gen.generate_graphic()
-    ollama_emp.generate_graphic()
-    gemini_gen.generate_graphic()
-    gemini_emp.generate_graphic()
+    import argparse
+
+    from accuracy_scoring import build_models, default_results_files, load_gold_labels, score_results
+
+    parser = argparse.ArgumentParser(description="Calcola l'accuratezza dei modelli a partire dai file di risultati.")
+    parser.add_argument("results", nargs="*", help="File di risultati (.txt o .jsonl). Predefinito: *_results.txt nella cartella corrente.")
+    parser.add_argument("--labels", default="tests/labels", help="Cartella con le etichette di riferimento InputN.json.")
+    parser.add_argument("--prompt", default="prompt migliorato", help="Descrizione del prompt usato per generare i risultati.")
+    parser.add_argument("--output", default="report", help="Cartella in cui salvare grafici e report HTML.")
+    parser.add_argument("--show", action="store_true", help="Mostra un grafico interattivo per ogni modello invece di generare il report.")
+    args = parser.parse_args()
 
+    scores = score_results(args.results or default_results_files(), load_gold_labels(args.labels))
+    for name, score in scores.items():
+        print(f"=== {name} (tempo totale: {score['total_time']} secondi) ===")
+        for category, values in score["categories"].items():
+            print(f"{category:<20} precision={values['precision']:.2f} recall={values['recall']:.2f} f1={values['f1']:.2f}")
+        print(f"{'complessivo':<20} precision={score['overall']['precision']:.2f} "
+              f"recall={score['overall']['recall']:.2f} f1={score['overall']['f1']:.2f}\n")
 
+    models = build_models(scores, prompt=args.prompt)
+    if args.show:
+        for model in models:
+            model.generate_graphic()
+    else:
+        paths = generate_report(models, output_dir=args.output)
+        print(f"Report generato in '{paths['html']}'.")
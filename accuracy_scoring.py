@@ -0,0 +1,280 @@
+import ast
+import glob
+import json
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from findings_parser import REVIEW_TYPE_TAGS, parse_findings, strip_markdown_fences
+from results_io import iter_results, model_name_from_path, read_total_time
+
+
+CATEGORIES = ("bug_detection", "syntax_revision", "style_suggestions", "doc_strings_add")
+
+# Tag che contano come segnalazione per ciascuna categoria di revisione (le docstring sono valutate per simbolo).
+CATEGORY_TAGS = {**REVIEW_TYPE_TAGS, "doc_strings_add": set()}
+
+# Attributo di `LlmModel` valorizzato con l'F1 di ciascuna categoria.
+ACCURACY_FIELDS = {
+    "bug_detection": "bug_accuracy",
+    "syntax_revision": "syntax_accuracy",
+    "style_suggestions": "style_accuracy",
+    "doc_strings_add": "docstrings_accuracy",
+}
+
+# Le chiavi dei simboli (docstring) vengono codificate sopra questo valore per non collidere con i numeri di riga.
+_SYMBOL_OFFSET = 1_000_000
+_INPUT_SPACE = 1 << 20
+_LABEL_RE = re.compile(r"^Input(\d+)\.json$")
+_DEF_RE = re.compile(r"^(\s*)(?:async\s+)?(def|class)\s+(\w+)")
+
+
+def load_gold_labels(labels_dir: str = "tests/labels") -> Dict[int, Dict]:
+    """Carica le etichette di riferimento (gold label) per i file `tests/InputN.py`.
+
+        Ogni file `InputN.json` contiene il `review_type` dell'input e l'elenco delle
+        segnalazioni attese, ciascuna con "line" e "tag" (e "symbol" per le docstring).
+
+        Args:
+            labels_dir (str, optional): La cartella con i file `InputN.json`.
+                Il valore predefinito è "tests/labels".
+
+        Returns:
+            dict: Le etichette indicizzate per numero di input.
+
+        Raises:
+            FileNotFoundError: Se la cartella delle etichette non esiste.
+    """
+    labels = {}
+    for name in os.listdir(labels_dir):
+        match = _LABEL_RE.match(name)
+        if not match:
+            continue
+        with open(os.path.join(labels_dir, name), "r", encoding="utf-8") as f:
+            labels[int(match.group(1))] = json.load(f)
+    return labels
+
+
+def _is_dunder(name: str) -> bool:
+    return name.startswith("__") and name.endswith("__")
+
+
+def documented_symbols(code: str) -> List[str]:
+    """Restituisce i nomi qualificati di funzioni, classi e metodi che hanno una docstring.
+
+        I metodi speciali (`__init__`, ...) vengono ignorati, come nelle etichette di riferimento.
+        Se il codice non è analizzabile con `ast`, si ricade su una scansione testuale
+        che cerca una stringa tra triple virgolette subito dopo la definizione.
+
+        Args:
+            code (str): Il codice (già privo di delimitatori Markdown) da analizzare.
+
+        Returns:
+            List[str]: I nomi qualificati dei simboli documentati (es. "Rectangle.get_perimeter").
+    """
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return _documented_symbols_fallback(code)
+
+    symbols = []
+
+    def visit(node, prefix):
+        for child in ast.iter_child_nodes(node):
+            if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                name = prefix + child.name
+                if not _is_dunder(child.name) and ast.get_docstring(child):
+                    symbols.append(name)
+                visit(child, name + ".")
+
+    visit(tree, "")
+    return symbols
+
+
+def _documented_symbols_fallback(code: str) -> List[str]:
+    """Scansione testuale delle docstring per codice non analizzabile con `ast`."""
+    symbols = []
+    stack: List[Tuple[int, str]] = []
+    lines = code.splitlines()
+    for index, line in enumerate(lines):
+        match = _DEF_RE.match(line)
+        if not match:
+            continue
+        indent = len(match.group(1))
+        while stack and stack[-1][0] >= indent:
+            stack.pop()
+        name = ".".join([item[1] for item in stack] + [match.group(3)])
+        stack.append((indent, match.group(3)))
+        following = next((item.strip() for item in lines[index + 1:] if item.strip()), "")
+        if not _is_dunder(match.group(3)) and following.startswith(('"""', "'''")):
+            symbols.append(name)
+    return symbols
+
+
+def _extract_predictions(path: str) -> Tuple[str, Optional[float], List[Tuple[int, int, object]], List[int]]:
+    """Estrae da un file di risultati le segnalazioni previste come tuple (input, categoria, chiave)."""
+    predictions = []
+    inputs = []
+    for item in iter_results(path):
+        category = item["category"]
+        if category not in CATEGORIES:
+            continue
+        category_index = CATEGORIES.index(category)
+        inputs.append(item["input"])
+
+        if category == "doc_strings_add":
+            for symbol in documented_symbols(strip_markdown_fences(item["review"])):
+                predictions.append((item["input"], category_index, symbol))
+        else:
+            tags = CATEGORY_TAGS[category]
+            for finding in parse_findings(item["review"])["findings"]:
+                if finding["tag"] in tags:
+                    predictions.append((item["input"], category_index, finding["line"]))
+
+    return model_name_from_path(path), read_total_time(path), predictions, inputs
+
+
+def _ratio(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    return np.divide(numerator, denominator, out=np.zeros_like(numerator, dtype=float), where=denominator > 0)
+
+
+def score_results(paths: List[str], labels: Dict[int, Dict], workers: Optional[int] = None) -> Dict[str, Dict]:
+    """Calcola precision, recall e F1 per categoria e per modello su uno o più file di risultati.
+
+        I file vengono letti in parallelo; il confronto con le etichette di riferimento è
+        vettorizzato con NumPy su tutti gli input e tutti i modelli: ogni segnalazione viene
+        codificata come intero (modello, input, chiave) e veri positivi, falsi positivi e
+        falsi negativi si ottengono con `np.unique`, `np.isin` e `np.bincount`.
+
+        Una segnalazione prevista è corretta se cade sulla stessa riga del codice originale
+        di una segnalazione attesa (per le docstring, se documenta lo stesso simbolo).
+        Vengono valutati solo gli input presenti sia nei risultati sia nelle etichette.
+
+        Args:
+            paths (List[str]): I file di risultati (.txt nel formato di `run_code_review_batch` o .jsonl).
+                Se due file hanno lo stesso nome di modello, vengono valutati come modelli distinti
+                identificati dal percorso.
+            labels (dict): Le etichette di riferimento restituite da `load_gold_labels`.
+            workers (int, optional): Il numero di processi per la lettura dei file.
+
+        Returns:
+            dict: Per ogni modello, un dizionario con "total_time", "categories"
+                (per ogni categoria: "precision", "recall", "f1", "tp", "fp", "fn") e "overall".
+
+        Examples:
+            scores = score_results(["gemini_2.5_flash_results.txt"], load_gold_labels())
+            print(scores["gemini_2.5_flash"]["categories"]["bug_detection"]["f1"])
+    """
+    if len(paths) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            extracted = list(executor.map(_extract_predictions, paths, chunksize=8))
+    else:
+        extracted = [_extract_predictions(path) for path in paths]
+
+    names = [item[0] for item in extracted]
+    names = [name if names.count(name) == 1 else path for name, path in zip(names, paths)]
+
+    symbols: Dict[str, int] = {}
+
+    def encode(key) -> int:
+        if isinstance(key, str):
+            return _SYMBOL_OFFSET + symbols.setdefault(key, len(symbols))
+        return int(key)
+
+    gold_rows = []
+    pred_rows = []
+    for model_index, (_, _, predictions, inputs) in enumerate(extracted):
+        for number in set(inputs) & labels.keys():
+            label = labels[number]
+            category_index = CATEGORIES.index(label["review_type"])
+            for finding in label["findings"]:
+                key = finding.get("symbol") if label["review_type"] == "doc_strings_add" else finding["line"]
+                gold_rows.append((model_index, number, category_index, encode(key)))
+        for number, category_index, key in predictions:
+            if number in labels:
+                pred_rows.append((model_index, number, category_index, encode(key)))
+
+    n_groups = len(paths) * len(CATEGORIES)
+    gold = np.array(gold_rows, dtype=np.int64).reshape(-1, 4)
+    pred = np.array(pred_rows, dtype=np.int64).reshape(-1, 4)
+
+    key_space = _SYMBOL_OFFSET + len(symbols) + 1
+
+    def unique_ids(rows: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        ids = (rows[:, 0] * _INPUT_SPACE + rows[:, 1]) * key_space + rows[:, 3]
+        ids, first = np.unique(ids, return_index=True)
+        return ids, rows[first, 0] * len(CATEGORIES) + rows[first, 2]
+
+    gold_ids, gold_groups = unique_ids(gold)
+    pred_ids, pred_groups = unique_ids(pred)
+    hits = np.isin(pred_ids, gold_ids, assume_unique=True)
+
+    tp = np.bincount(pred_groups[hits], minlength=n_groups).reshape(len(paths), len(CATEGORIES))
+    fp = np.bincount(pred_groups[~hits], minlength=n_groups).reshape(len(paths), len(CATEGORIES))
+    fn = np.bincount(gold_groups, minlength=n_groups).reshape(len(paths), len(CATEGORIES)) - tp
+
+    def metrics(tp, fp, fn):
+        precision = _ratio(tp, tp + fp)
+        recall = _ratio(tp, tp + fn)
+        f1 = _ratio(2 * precision * recall, precision + recall)
+        return precision, recall, f1
+
+    precision, recall, f1 = metrics(tp, fp, fn)
+    overall = metrics(tp.sum(axis=1), fp.sum(axis=1), fn.sum(axis=1))
+
+    scores = {}
+    for model_index, name in enumerate(names):
+        scores[name] = {
+            "total_time": extracted[model_index][1],
+            "categories": {
+                category: {
+                    "precision": float(precision[model_index, index]),
+                    "recall": float(recall[model_index, index]),
+                    "f1": float(f1[model_index, index]),
+                    "tp": int(tp[model_index, index]),
+                    "fp": int(fp[model_index, index]),
+                    "fn": int(fn[model_index, index]),
+                }
+                for index, category in enumerate(CATEGORIES)
+            },
+            "overall": {
+                "precision": float(overall[0][model_index]),
+                "recall": float(overall[1][model_index]),
+                "f1": float(overall[2][model_index]),
+            },
+        }
+    return scores
+
+
+def build_models(scores: Dict[str, Dict], prompt: str = ""):
+    """Crea un'istanza `LlmModel` per ogni modello valutato da `score_results`.
+
+        I punteggi di accuratezza di `LlmModel` sono valorizzati con l'F1 di ciascuna
+        categoria su scala 0-100, e il tempo con il tempo totale letto dal file di risultati.
+
+        Args:
+            scores (dict): Il risultato di `score_results`.
+            prompt (str, optional): La descrizione del prompt usato per generare i risultati.
+
+        Returns:
+            List[LlmModel]: Un modello per ogni file di risultati valutato.
+    """
+    from accuracy_analysis import LlmModel
+
+    models = []
+    for name, score in scores.items():
+        accuracies = {
+            ACCURACY_FIELDS[category]: round(values["f1"] * 100)
+            for category, values in score["categories"].items()
+        }
+        models.append(LlmModel(name=name, prompt=prompt, time=round(score["total_time"] or 0), **accuracies))
+    return models
+
+
+def default_results_files(directory: str = ".") -> List[str]:
+    """Restituisce i file di risultati presenti nella cartella (`*_results.txt` e `*_results.jsonl`)."""
+    return sorted(glob.glob(os.path.join(directory, "*_results.txt"))
+                  + glob.glob(os.path.join(directory, "*_results.jsonl")))
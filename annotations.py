@@ -0,0 +1,209 @@
+import io
+import json
+import tokenize
+from typing import Dict, List, Set, Union
+
+from findings_parser import DEFAULT_SEVERITY, KNOWN_TAGS, SEVERITY_LEVELS, strip_markdown_fences
+
+
+# Tag per cui il formato dei prompt prevede la severità nel commento (`# BUG: ALTA - ...`).
+_TAGS_WITH_SEVERITY = {"BUG", "POTENTIAL_BUG"}
+_TAG_ORDER = {tag: index for index, tag in enumerate(KNOWN_TAGS)}
+# Righe esaminate da `review_diff` per ritrovare l'allineamento dopo una modifica.
+_DIFF_LOOKAHEAD = 64
+
+
+def format_annotation(finding: Dict) -> str:
+    """Formatta una segnalazione come commento annotato, nello stesso formato dei prompt.
+
+        Args:
+            finding (dict): Una segnalazione con "tag", "message" e, opzionalmente, "severity" e "rule".
+
+        Returns:
+            str: Il commento, ad esempio "# BUG: ALTA - descrizione" o "# PEP8: E501 - suggerimento".
+    """
+    tag = finding["tag"]
+    message = " ".join(str(finding.get("message", "")).split())
+    if tag == "PEP8" and finding.get("rule"):
+        return f"# {tag}: {finding['rule']} - {message}"
+    if tag in _TAGS_WITH_SEVERITY:
+        return f"# {tag}: {finding.get('severity') or DEFAULT_SEVERITY[tag]} - {message}"
+    return f"# {tag}: {message}"
+
+
+def parse_annotation_lines(text: str, line_count: int) -> List[Dict]:
+    """Interpreta la risposta del protocollo ad annotazioni (un oggetto JSON per riga).
+
+        Le righe che non sono JSON valido, che usano tag sconosciuti o che puntano a righe
+        inesistenti vengono scartate. Sono accettati anche un array JSON unico e i
+        delimitatori Markdown che alcuni modelli aggiungono comunque.
+
+        Args:
+            text (str): La risposta testuale dell'LLM.
+            line_count (int): Il numero di righe del codice originale.
+
+        Returns:
+            List[dict]: Le segnalazioni valide, con "line", "tag", "severity", "rule" e "message".
+
+        Examples:
+            parse_annotation_lines('{"line": 1, "tag": "BUG", "severity": "ALTA", "message": "x"}', 1)
+    """
+    body = strip_markdown_fences(text).strip()
+    try:
+        items = json.loads(body) if body.startswith("[") else None
+    except ValueError:
+        items = None
+    if not isinstance(items, list):
+        items = []
+        for line in body.splitlines():
+            line = line.strip().rstrip(",")
+            if not line.startswith("{"):
+                continue
+            try:
+                items.append(json.loads(line))
+            except ValueError:
+                continue
+
+    findings = []
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        tag = str(item.get("tag", "")).upper()
+        try:
+            line = int(item.get("line", 0))
+        except (TypeError, ValueError):
+            continue
+        if tag not in KNOWN_TAGS or not 1 <= line <= max(line_count, 1):
+            continue
+        severity = str(item.get("severity") or DEFAULT_SEVERITY[tag]).upper()
+        findings.append({
+            "line": line,
+            "tag": tag,
+            "severity": severity if severity in SEVERITY_LEVELS else DEFAULT_SEVERITY[tag],
+            "rule": item.get("rule") or None,
+            "message": str(item.get("message", "")).strip(),
+        })
+    return findings
+
+
+def _lines_inside_strings(code: str) -> Set[int]:
+    """Restituisce le righe che terminano dentro una stringa multilinea o con una continuazione '\\'."""
+    lines = code.splitlines()
+    unsafe = {number for number, line in enumerate(lines, start=1) if line.rstrip().endswith("\\")}
+    try:
+        for token in tokenize.generate_tokens(io.StringIO(code).readline):
+            if token.type == tokenize.STRING and token.end[0] > token.start[0]:
+                unsafe.update(range(token.start[0], token.end[0]))
+    except (tokenize.TokenError, IndentationError, SyntaxError):
+        # Codice non tokenizzabile (es. errori di sintassi): si usa la sola euristica delle continuazioni
+        pass
+    return unsafe
+
+
+def apply_annotations(code: str, findings: List[Dict]) -> str:
+    """Inserisce in modo deterministico le segnalazioni come commenti nel codice originale.
+
+        Il codice originale non viene mai modificato: la prima segnalazione di ogni riga
+        viene aggiunta come commento in linea, le successive come commenti su righe proprie
+        subito sopra, con la stessa indentazione. Se la riga termina dentro una stringa
+        multilinea o con una continuazione, tutti i commenti vengono messi sopra.
+
+        Args:
+            code (str): Lo snippet di codice originale.
+            findings (List[dict]): Le segnalazioni da inserire (vedi `parse_annotation_lines`).
+
+        Returns:
+            str: Il codice annotato, nello stesso formato prodotto dai prompt che restituiscono il codice intero.
+    """
+    lines = code.splitlines()
+    by_line: Dict[int, List[Dict]] = {}
+    for finding in sorted(findings, key=lambda item: (item["line"], _TAG_ORDER.get(item["tag"], 0))):
+        by_line.setdefault(finding["line"], []).append(finding)
+
+    unsafe = _lines_inside_strings(code) if by_line else set()
+    annotated = []
+    for number, line in enumerate(lines, start=1):
+        comments = [format_annotation(finding) for finding in by_line.get(number, [])]
+        if not comments:
+            annotated.append(line)
+            continue
+        indent = line[:len(line) - len(line.lstrip())]
+        inline = None if number in unsafe or not line.strip() else comments.pop(0)
+        annotated.extend(indent + comment for comment in comments)
+        annotated.append(f"{line} {inline}" if inline else line)
+    return "\n".join(annotated)
+
+
+def review_diff(code: str, reviewed: str) -> List[List[Union[int, str, List[str]]]]:
+    """Descrive la revisione come modifiche al codice inviato, per le risposte compatte dell'interfaccia web.
+
+        Le righe uguali non vengono ripetute. Un commento aggiunto in fondo a una riga diventa
+        `[riga, suffisso]`; ogni altra modifica diventa `[riga, righe_eliminate, [righe_nuove]]`.
+        Le righe partono da 0 e si riferiscono sempre al codice inviato (vedi `apply_review_diff`).
+
+        L'allineamento è lineare nel numero di righe (con una ricerca limitata a `_DIFF_LOOKAHEAD` righe
+        dopo ogni modifica), perché le revisioni ripetono il codice aggiungendo commenti; un confronto
+        generico come `difflib` diventa quadratico sui file lunghi con molte righe ripetute.
+
+        Args:
+            code (str): Il codice inviato, con i ritorni a capo normalizzati a "\\n".
+            reviewed (str): La revisione restituita da `LLMService.generate_code_review`.
+
+        Returns:
+            list: Le modifiche, in ordine di riga.
+
+        Examples:
+            print(review_diff("x = 1/0", "x = 1/0  # BUG: ALTA - divisione per zero"))
+            [[0, '  # BUG: ALTA - divisione per zero']]
+    """
+    original, annotated = code.split("\n"), reviewed.split("\n")
+    ops: List[List[Union[int, str, List[str]]]] = []
+    # Modifica in sospeso: riga di inizio, righe eliminate e righe inserite
+    start, deleted, inserted = 0, 0, []
+
+    def same(old: str, new: str) -> bool:
+        return new == old or bool(old.strip()) and new.startswith(old)
+
+    def flush():
+        if deleted or inserted:
+            ops.append([start, deleted, list(inserted)])
+
+    i = j = 0
+    while i < len(original) and j < len(annotated):
+        old, new = original[i], annotated[j]
+        if same(old, new):
+            flush()
+            if new != old:
+                ops.append([i, new[len(old):]])
+            i, j = i + 1, j + 1
+            start, deleted, inserted = i, 0, []
+            continue
+        # Le revisioni aggiungono soprattutto righe: si cerca la prossima riga originale tra quelle generate
+        # (o, per le eliminazioni, la riga generata tra le originali) entro una finestra limitata
+        added = next((k for k in range(1, _DIFF_LOOKAHEAD) if j + k < len(annotated) and same(old, annotated[j + k])), None)
+        removed = next((k for k in range(1, _DIFF_LOOKAHEAD) if i + k < len(original) and same(original[i + k], new)), None)
+        if added is not None and (removed is None or added <= removed):
+            inserted.extend(annotated[j:j + added])
+            j += added
+        elif removed is not None:
+            deleted += removed
+            i += removed
+        else:
+            deleted += 1
+            inserted.append(new)
+            i, j = i + 1, j + 1
+    deleted += len(original) - i
+    inserted.extend(annotated[j:])
+    flush()
+    return ops
+
+
+def apply_review_diff(code: str, ops: List[List[Union[int, str, List[str]]]]) -> str:
+    """Ricostruisce la revisione dal codice inviato e dalle modifiche di `review_diff` (come fa `static/script.js`)."""
+    lines = code.split("\n")
+    for op in reversed(ops):
+        if isinstance(op[1], str):
+            lines[op[0]] += op[1]
+        else:
+            lines[op[0]:op[0] + op[1]] = op[2]
+    return "\n".join(lines)
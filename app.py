@@ -1,8 +1,56 @@
-from flask import Flask, request, render_template
+import json
+import zipfile
 
+from flask import Flask, Response, abort, request, render_template, jsonify, stream_with_context
+
+from annotations import review_diff
+from cascade import cascade_stats
+from compression import compress_response
+from deadlines import DEADLINE_HEADER, cancellation_stats, request_timeout
+from findings_parser import parse_findings, filter_findings
+from generation import generation_stats
+from history import get_review_history, search_params
 from llm_service import LLMService
+from project_review import discover_zip, review_project
+from review_cache import get_review_cache
+from semantic_cache import get_semantic_cache
+from scheduler import api_priority, scheduler_stats, tenant_from_headers
+from static_assets import HIGHLIGHT_CDN, HIGHLIGHT_FILES, StaticAssets
+from symbol_index import SymbolIndex
 
 app = Flask(__name__)
+# I file con impronta (/assets/) sono immutabili; quelli richiamati direttamente da /static/ (es. le immagini del CSS) scadono dopo un'ora
+app.config["SEND_FILE_MAX_AGE_DEFAULT"] = 3600
+assets = StaticAssets(app.static_folder)
+
+
+@app.context_processor
+def asset_helpers():
+    """Rende disponibili ai template `asset_url` e gli script di highlight.js (copiati in static/vendor o, in mancanza, dalla CDN)."""
+    highlight_scripts = [assets.url(f"vendor/highlight/{name}") if assets.exists(f"vendor/highlight/{name}") else HIGHLIGHT_CDN + name
+                         for name in HIGHLIGHT_FILES]
+    return {"asset_url": assets.url, "highlight_scripts": highlight_scripts}
+
+
+@app.route('/assets/<path:url_name>', methods=["GET"])
+def static_asset(url_name: str):
+    """Serve un file statico con impronta, già compresso e memorizzabile dal browser per sempre."""
+    asset = assets.get(url_name)
+    if asset is None:
+        abort(404)
+    headers = {"Cache-Control": "public, max-age=31536000, immutable", "ETag": f'"{asset.etag}"', "Vary": "Accept-Encoding"}
+    if request.if_none_match.contains(asset.etag):
+        return Response(status=304, headers=headers)
+    body, encoding = asset.body(request.headers.get("Accept-Encoding"))
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(body, mimetype=asset.mimetype, headers=headers)
+
+
+@app.after_request
+def compress(response: Response) -> Response:
+    """Comprime con gzip (o brotli, se installato) le risposte testuali e JSON (vedi `compression.compress_response`)."""
+    return compress_response(response, request.headers.get("Accept-Encoding"))
 
 
 @app.route('/', methods=["GET"])
@@ -37,9 +85,13 @@ def review_code():
             review_type (str, optional): Il tipo di revisione del codice richiesto (ad esempio, "bug_detection").
             Se non specificato, il valore predefinito è "bug_detection". Anche questo viene recuperato da request.form.get("review_type").
 
+            response (str, optional): Con "diff" (usato da static/script.js) la risposta è un JSON compatto con le sole modifiche
+            rispetto al codice inviato (vedi `annotations.review_diff`), invece dell'intera pagina.
+
         Valori di Ritorno (Returns)
 
             str: Il template index.html renderizzato, che include il codice revisionato, il codice originale inviato, il tipo di revisione scelto o un messaggio di errore.
+            In modalità "diff", un JSON con "review_type", "base_lines" (le righe del codice inviato) e "ops", oppure con "error" e lo stato HTTP 400 o 500.
 
         Eccezioni Sollevate (Raises)
 
@@ -52,25 +104,277 @@ def review_code():
     """
     python_code = request.form.get("input_code")
     review_type = request.form.get("review_type", "bug_detection")
+    diff_mode = request.form.get("response") == "diff"
+
+    def page(error=None, reviewed_code=None, status=400):
+        if not diff_mode:
+            return render_template('index.html', error=error, reviewed_code=reviewed_code, original_code=python_code, selected_review_type=review_type)
+        if error:
+            return jsonify(error=error), status
+        # I browser inviano i ritorni a capo delle textarea come \r\n, mentre il client applica le modifiche al testo con \n
+        code = python_code.replace("\r\n", "\n")
+        return jsonify(review_type=review_type, base_lines=len(code.split("\n")), ops=review_diff(code, reviewed_code.replace("\r\n", "\n")))
 
     if not python_code:
-        return render_template('index.html', error="Inserisci il codice da revisionare", original_code=python_code, selected_review_type=review_type)
+        return page(error="Inserisci il codice da revisionare")
     
     try:
-        llm_service = LLMService() 
+        llm_service = LLMService(timeout=request_timeout(request.headers.get(DEADLINE_HEADER)), priority="interactive",
+                                 tenant=tenant_from_headers(request.headers.get, request.remote_addr))
     except ValueError as e:
-        return render_template('index.html', error=f"Errore di configurazione del servizio LLM: {e}", original_code=python_code, selected_review_type=review_type)
+        return page(error=f"Errore di configurazione del servizio LLM: {e}", status=500)
     except Exception as e:
-        return render_template('index.html', error=f"Errore inaspettato durante l'inizializzazione del servizio: {e}", original_code=python_code, selected_review_type=review_type)
+        return page(error=f"Errore inaspettato durante l'inizializzazione del servizio: {e}", status=500)
 
     try:
         reviewed_code = llm_service.generate_code_review(code_snippet=python_code, review_type=review_type)
-        return render_template('index.html', reviewed_code=reviewed_code, original_code=python_code, selected_review_type=review_type)
+        return page(reviewed_code=reviewed_code)
     except ValueError as e:
-        return render_template('index.html', original_code=python_code, error=str(e), selected_review_type=review_type)
+        return page(error=str(e))
     except Exception as e:
-        return render_template('index.html', original_code=python_code, error=f"Si è verificato un errore durante la revisione: {e}", selected_review_type=review_type)
+        return page(error=f"Si è verificato un errore durante la revisione: {e}", status=500)
     
 
+@app.route('/api/code_reviewer', methods=["POST"])
+def review_code_api():
+    """Variante JSON dell'Endpoint di Code Review
+
+        Questa funzione offre la stessa revisione di `review_code`, ma restituisce un risultato strutturato in JSON
+        invece del template HTML, così che client e pipeline di CI possano filtrare le segnalazioni senza dover
+        interpretare il testo generato dal modello.
+
+        Accetta sia un corpo JSON sia un form. L'output del modello viene analizzato da `parse_findings`
+        e le segnalazioni possono essere filtrate per severità minima e per tag.
+
+        Argomenti (Args)
+
+            code (str): Lo snippet di codice Python da revisionare (in alternativa, "input_code").
+
+            review_type (str, optional): Il tipo di revisione richiesto. Il valore predefinito è "bug_detection".
+
+            min_severity (str, optional): La severità minima delle segnalazioni restituite (CRITICA/ALTA/MEDIA/BASSA/INFO).
+            Può essere passata anche come parametro della query string.
+
+            tags (list o str, optional): I tag da restituire (es. ["BUG", "POTENTIAL_BUG"] o "BUG,POTENTIAL_BUG").
+
+        Valori di Ritorno (Returns)
+
+            Response: Un JSON con "review_type", "code" (il codice annotato senza delimitatori Markdown),
+            "findings" e "counts". In caso di errore, un JSON con la chiave "error" e lo stato HTTP 400 o 500.
+    """
+    python_code, review_type, min_severity, tags = _api_request_data()
+
+    if not python_code:
+        return jsonify(error="Inserisci il codice da revisionare"), 400
+
+    try:
+        llm_service = _api_llm_service()
+    except ValueError as e:
+        return jsonify(error=f"Errore di configurazione del servizio LLM: {e}"), 500
+    except Exception as e:
+        return jsonify(error=f"Errore inaspettato durante l'inizializzazione del servizio: {e}"), 500
+
+    try:
+        reviewed_code = llm_service.generate_code_review(code_snippet=python_code, review_type=review_type)
+        result = filter_findings(parse_findings(reviewed_code), min_severity=min_severity, tags=tags)
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+    except Exception as e:
+        return jsonify(error=f"Si è verificato un errore durante la revisione: {e}"), 500
+
+    return jsonify(review_type=review_type, **result)
+
+
+def _api_request_data():
+    """Legge codice, tipo di revisione, severità minima e tag dal corpo JSON, dal form o dalla query string."""
+    data = request.get_json(silent=True) or request.form
+    python_code = data.get("code") or data.get("input_code") or request.args.get("code")
+    review_type = data.get("review_type") or request.args.get("review_type", "bug_detection")
+    min_severity = data.get("min_severity") or request.args.get("min_severity")
+    tags = data.get("tags") or request.args.get("tags")
+    if isinstance(tags, str):
+        tags = [tag.strip() for tag in tags.split(",") if tag.strip()]
+    return python_code, review_type, min_severity, tags
+
+
+def _api_llm_service() -> LLMService:
+    """Crea il servizio LLM per una richiesta API, con scadenza, classe di priorità e client ricavati dalle intestazioni.
+
+        Le richieste API sono "batch", salvo quelle con un token autorizzato in `API_TOKENS`
+        alle richieste interattive (vedi `scheduler.api_priority`).
+    """
+    return LLMService(timeout=request_timeout(request.headers.get(DEADLINE_HEADER)),
+                      priority=api_priority(request.headers.get),
+                      tenant=tenant_from_headers(request.headers.get, request.remote_addr))
+
+
+def sse_event(data: dict, event: str = None) -> str:
+    """Formatta un evento Server-Sent Events con dati JSON."""
+    return (f"event: {event}\n" if event else "") + f"data: {json.dumps(data)}\n\n"
+
+
+@app.route('/api/code_reviewer/stream', methods=["GET", "POST"])
+def review_code_stream():
+    """Variante in Streaming (Server-Sent Events) dell'Endpoint di Code Review
+
+        Accetta gli stessi campi di `review_code_api` e restituisce la revisione man mano che il modello la genera,
+        come eventi `data: {"text": ...}`, seguiti da un evento `done` (o `error` con il messaggio di errore).
+
+        Se il client chiude la connessione, il server non riesce più a scrivere e chiude il generatore della risposta:
+        la chiusura arriva fino a `LLMService.stream_code_review`, che chiude lo stream HTTP verso Ollama o Gemini
+        così che il modello smetta di generare, e registra il lavoro interrotto (vedi `/api/stats`).
+
+        Valori di Ritorno (Returns)
+
+            Response: Uno stream `text/event-stream`, o un JSON con la chiave "error" e lo stato HTTP 400 o 500.
+    """
+    python_code, review_type, _, _ = _api_request_data()
+
+    if not python_code:
+        return jsonify(error="Inserisci il codice da revisionare"), 400
+
+    try:
+        llm_service = _api_llm_service()
+        stream = llm_service.stream_code_review(code_snippet=python_code, review_type=review_type)
+    except ValueError as e:
+        return jsonify(error=f"Errore di configurazione del servizio LLM: {e}"), 500
+    except Exception as e:
+        return jsonify(error=f"Errore inaspettato durante l'inizializzazione del servizio: {e}"), 500
+
+    def events():
+        try:
+            for event, text in stream:
+                if event == "error":
+                    yield sse_event({"error": text}, "error")
+                    return
+                yield sse_event({"text": text})
+            yield sse_event({}, "done")
+        finally:
+            # Eseguito anche quando il server chiude il generatore perché il client si è disconnesso
+            stream.close()
+
+    return Response(stream_with_context(events()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.route('/api/project_review', methods=["POST"])
+def review_project_api():
+    """Revisione di un Intero Progetto Caricato come Archivio Zip
+
+        Riceve un archivio zip (campo multipart "archive"), individua i file `.py` rispettando i pattern
+        predefiniti e quelli dei file `.reviewignore`/`.gitignore` del progetto, e li revisiona in parallelo
+        (vedi `project_review.review_project`), usando la cache persistente delle revisioni.
+
+        L'archivio non viene estratto né caricato in memoria: Flask salva i caricamenti grandi in un file
+        temporaneo e i file vengono letti uno alla volta, quando la loro revisione parte. Prima delle revisioni
+        viene costruito l'indice dei simboli del progetto (vedi `symbol_index.SymbolIndex`), così che ogni prompt
+        includa le firme delle funzioni e classi degli altri file usate dal file revisionato.
+
+        Argomenti (Args)
+
+            archive (file): L'archivio zip del progetto.
+
+            review_type (str, optional): Il tipo di revisione eseguito su ogni file. Il valore predefinito è "bug_detection".
+
+            ignore (str, optional): Pattern aggiuntivi da ignorare, separati da virgole (es. "tests,migrations/*").
+
+        Valori di Ritorno (Returns)
+
+            Response: L'avanzamento in NDJSON (una riga JSON per evento: "start", un "file" per ogni file completato e
+            infine "report" con il report aggregato), oppure come Server-Sent Events se la richiesta accetta
+            `text/event-stream`. In caso di errore, un JSON con la chiave "error" e lo stato HTTP 400 o 500.
+            Le richieste sono "batch", salvo i token autorizzati in `API_TOKENS` (vedi `scheduler.api_priority`).
+    """
+    upload = request.files.get("archive")
+    review_type = request.form.get("review_type") or request.args.get("review_type", "bug_detection")
+    ignore = request.form.get("ignore") or request.args.get("ignore", "")
+    if upload is None:
+        return jsonify(error="Carica l'archivio zip del progetto nel campo 'archive'"), 400
+
+    try:
+        archive = zipfile.ZipFile(upload.stream)
+    except zipfile.BadZipFile:
+        return jsonify(error="Il file caricato non è un archivio zip valido"), 400
+
+    timeout = request_timeout(request.headers.get(DEADLINE_HEADER))
+    priority = api_priority(request.headers.get)
+    tenant = tenant_from_headers(request.headers.get, request.remote_addr)
+    try:
+        LLMService(timeout=timeout, priority=priority, tenant=tenant)
+    except ValueError as e:
+        return jsonify(error=f"Errore di configurazione del servizio LLM: {e}"), 500
+    except Exception as e:
+        return jsonify(error=f"Errore inaspettato durante l'inizializzazione del servizio: {e}"), 500
+
+    files = discover_zip(archive, [pattern.strip() for pattern in ignore.split(",") if pattern.strip()])
+    # Le firme dei simboli definiti negli altri file del progetto vengono aggiunte ai prompt
+    symbol_index = SymbolIndex()
+    symbol_index.update(files)
+    use_sse = "text/event-stream" in request.headers.get("Accept", "")
+
+    def events():
+        progress = review_project(files, review_type,
+                                  lambda: LLMService(timeout=timeout, priority=priority, tenant=tenant,
+                                                     symbol_index=symbol_index))
+        try:
+            for event in progress:
+                yield sse_event(event, event["event"]) if use_sse else json.dumps(event) + "\n"
+        finally:
+            # Eseguito anche alla disconnessione del client: annulla le revisioni non ancora avviate
+            progress.close()
+            archive.close()
+
+    return Response(stream_with_context(events()), mimetype="text/event-stream" if use_sse else "application/x-ndjson",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.route('/api/history', methods=["GET"])
+def review_history():
+    """Cerca nella cronologia delle revisioni, dalla più recente.
+
+        Argomenti (Args)
+
+            limit, cursor (query string): Le revisioni per pagina (predefinito 50) e il "next_cursor" della pagina precedente.
+
+            review_type, model, file, min_severity, since, until, q (query string): I filtri (vedi `history.search_params`).
+
+        Valori di Ritorno (Returns)
+
+            Response: Un JSON con "items" (le revisioni con le segnalazioni) e "next_cursor";
+            stato 400 per parametri non validi, 404 se la cronologia è disattivata.
+    """
+    history = get_review_history()
+    if history is None:
+        return jsonify(error="La cronologia delle revisioni è disattivata (HISTORY_PATH)"), 404
+    try:
+        params = search_params(request.args)
+    except ValueError as e:
+        return jsonify(error=f"Parametro non valido: {e}"), 400
+    return jsonify(history.search(**params))
+
+
+@app.route('/api/history/<int:review_id>', methods=["GET"])
+def review_history_item(review_id: int):
+    """Restituisce una revisione della cronologia, con il testo generato e le segnalazioni (404 se non esiste)."""
+    history = get_review_history()
+    item = history.get(review_id) if history else None
+    if item is None:
+        return jsonify(error="Revisione non trovata"), 404
+    return jsonify(item)
+
+
+@app.route('/api/stats', methods=["GET"])
+def review_stats():
+    """Restituisce in JSON i contatori condivisi del processo: modalità cascata, lavoro interrotto, scheduler
+    (per backend e classe di priorità: richieste in coda e in corso, limite di concorrenza e tempi di attesa)
+    cache, cache semantica e cronologia delle revisioni (None se disattivate) e token generati per tipo di revisione."""
+    cache = get_review_cache()
+    semantic_cache = get_semantic_cache()
+    history = get_review_history()
+    return jsonify(cascade=cascade_stats.snapshot(), cancellations=cancellation_stats.snapshot(), scheduler=scheduler_stats(),
+                   cache=cache.snapshot() if cache else None, history=history.snapshot() if history else None,
+                   generation=generation_stats.snapshot(), semantic_cache=semantic_cache.snapshot() if semantic_cache else None)
+
+
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0')
@@ -0,0 +1,228 @@
+import asyncio
+import json
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs
+
+from async_llm_service import AsyncLLMService
+from cascade import cascade_stats
+from deadlines import DEADLINE_HEADER, cancellation_stats, request_timeout
+from findings_parser import filter_findings, parse_findings
+from generation import generation_stats
+from history import get_review_history, search_params
+from review_cache import get_review_cache
+from semantic_cache import get_semantic_cache
+from scheduler import api_priority, scheduler_stats, tenant_from_headers
+
+
+async def _read_body(receive) -> bytes:
+    body = b""
+    more_body = True
+    while more_body:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            break
+        body += message.get("body", b"")
+        more_body = message.get("more_body", False)
+    return body
+
+
+def _header(scope: Dict, name: str) -> Optional[str]:
+    value = dict(scope.get("headers", [])).get(name.lower().encode("latin-1"))
+    return value.decode("latin-1") if value is not None else None
+
+
+def _request_data(scope: Dict, body: bytes) -> Tuple[Dict, Dict]:
+    """Restituisce i campi del corpo (JSON o form) e della query string della richiesta."""
+    headers = dict(scope.get("headers", []))
+    content_type = headers.get(b"content-type", b"").decode("latin-1")
+    query = {key: values[0] for key, values in parse_qs(scope.get("query_string", b"").decode("latin-1")).items()}
+
+    data = {}
+    if "application/json" in content_type:
+        try:
+            data = json.loads(body or b"{}")
+        except ValueError:
+            data = {}
+    elif "application/x-www-form-urlencoded" in content_type:
+        data = {key: values[0] for key, values in parse_qs(body.decode("utf-8")).items()}
+    return (data if isinstance(data, dict) else {}), query
+
+
+def _review_params(data: Dict, query: Dict):
+    """Legge codice, tipo di revisione, severità minima e tag come `app._api_request_data`."""
+    python_code = data.get("code") or data.get("input_code") or query.get("code")
+    review_type = data.get("review_type") or query.get("review_type", "bug_detection")
+    min_severity = data.get("min_severity") or query.get("min_severity")
+    tags: Optional[List[str]] = data.get("tags") or query.get("tags")
+    if isinstance(tags, str):
+        tags = [tag.strip() for tag in tags.split(",") if tag.strip()]
+    return python_code, review_type, min_severity, tags
+
+
+def _llm_service(scope: Dict) -> AsyncLLMService:
+    """Crea il servizio LLM con scadenza, classe di priorità e client ricavati dalle intestazioni, come `app._api_llm_service`."""
+    client = scope.get("client")
+    return AsyncLLMService(timeout=request_timeout(_header(scope, DEADLINE_HEADER)),
+                           priority=api_priority(lambda name: _header(scope, name)),
+                           tenant=tenant_from_headers(lambda name: _header(scope, name), client[0] if client else None))
+
+
+async def _send_json(send, status: int, payload: Dict) -> None:
+    body = json.dumps(payload).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+async def review_code_api(scope: Dict, receive, send) -> None:
+    """Variante asincrona dell'endpoint JSON `/api/code_reviewer` di `app.py`.
+
+        Accetta gli stessi campi ("code" o "input_code", "review_type", "min_severity", "tags") e
+        restituisce lo stesso JSON, ma la revisione viene generata con `AsyncLLMService`: mentre
+        attende il modello, la richiesta non occupa un thread e un solo processo può servirne
+        centinaia contemporaneamente.
+    """
+    data, query = _request_data(scope, await _read_body(receive))
+    python_code, review_type, min_severity, tags = _review_params(data, query)
+
+    if not python_code:
+        return await _send_json(send, 400, {"error": "Inserisci il codice da revisionare"})
+
+    try:
+        llm_service = _llm_service(scope)
+    except ValueError as e:
+        return await _send_json(send, 500, {"error": f"Errore di configurazione del servizio LLM: {e}"})
+    except Exception as e:
+        return await _send_json(send, 500, {"error": f"Errore inaspettato durante l'inizializzazione del servizio: {e}"})
+
+    try:
+        reviewed_code = await llm_service.generate_code_review(code_snippet=python_code, review_type=review_type)
+        result = filter_findings(parse_findings(reviewed_code), min_severity=min_severity, tags=tags)
+    except ValueError as e:
+        return await _send_json(send, 400, {"error": str(e)})
+    except Exception as e:
+        return await _send_json(send, 500, {"error": f"Si è verificato un errore durante la revisione: {e}"})
+
+    await _send_json(send, 200, {"review_type": review_type, **result})
+
+
+def _sse_event(data: Dict, event: Optional[str] = None) -> bytes:
+    return ((f"event: {event}\n" if event else "") + f"data: {json.dumps(data)}\n\n").encode("utf-8")
+
+
+async def _wait_for_disconnect(receive) -> None:
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+
+async def review_code_stream(scope: Dict, receive, send) -> None:
+    """Variante asincrona dell'endpoint in streaming (Server-Sent Events) `/api/code_reviewer/stream`.
+
+        Mentre la revisione viene inviata al client, un secondo task attende il messaggio ASGI
+        `http.disconnect`: se il client si disconnette, il task che genera la revisione viene
+        cancellato, lo stream HTTP verso il backend viene chiuso e l'interruzione viene registrata
+        in `deadlines.cancellation_stats`, anche se il modello non ha ancora prodotto frammenti.
+    """
+    data, query = _request_data(scope, await _read_body(receive))
+    python_code, review_type, _, _ = _review_params(data, query)
+
+    if not python_code:
+        return await _send_json(send, 400, {"error": "Inserisci il codice da revisionare"})
+
+    try:
+        llm_service = _llm_service(scope)
+    except ValueError as e:
+        return await _send_json(send, 500, {"error": f"Errore di configurazione del servizio LLM: {e}"})
+    except Exception as e:
+        return await _send_json(send, 500, {"error": f"Errore inaspettato durante l'inizializzazione del servizio: {e}"})
+
+    await send({
+        "type": "http.response.start",
+        "status": 200,
+        "headers": [(b"content-type", b"text/event-stream"), (b"cache-control", b"no-cache"), (b"x-accel-buffering", b"no")],
+    })
+
+    async def stream_review():
+        stream = llm_service.stream_code_review(code_snippet=python_code, review_type=review_type)
+        try:
+            async for event, text in stream:
+                if event == "error":
+                    await send({"type": "http.response.body", "body": _sse_event({"error": text}, "error"), "more_body": True})
+                    return
+                await send({"type": "http.response.body", "body": _sse_event({"text": text}), "more_body": True})
+            await send({"type": "http.response.body", "body": _sse_event({}, "done"), "more_body": True})
+        finally:
+            await stream.aclose()
+
+    review_task = asyncio.create_task(stream_review())
+    disconnect_task = asyncio.create_task(_wait_for_disconnect(receive))
+    done, pending = await asyncio.wait({review_task, disconnect_task}, return_when=asyncio.FIRST_COMPLETED)
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
+
+    if review_task in done:
+        review_task.result()
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+async def review_stats(scope: Dict, receive, send) -> None:
+    """Restituisce in JSON i contatori condivisi del processo, come `/api/stats` di `app.py`."""
+    cache = get_review_cache()
+    semantic_cache = get_semantic_cache()
+    history = get_review_history()
+    await _send_json(send, 200, {"cascade": cascade_stats.snapshot(), "cancellations": cancellation_stats.snapshot(),
+                                 "scheduler": scheduler_stats(), "cache": cache.snapshot() if cache else None,
+                                 "history": history.snapshot() if history else None,
+                                 "generation": generation_stats.snapshot(),
+                                 "semantic_cache": semantic_cache.snapshot() if semantic_cache else None})
+
+
+async def review_history(scope: Dict, receive, send) -> None:
+    """Cerca nella cronologia delle revisioni, come `/api/history` di `app.py` (la query SQLite gira in un thread)."""
+    history = get_review_history()
+    if history is None:
+        return await _send_json(send, 404, {"error": "La cronologia delle revisioni è disattivata (HISTORY_PATH)"})
+    _, query = _request_data(scope, b"")
+    try:
+        params = search_params(query)
+    except ValueError as e:
+        return await _send_json(send, 400, {"error": f"Parametro non valido: {e}"})
+    await _send_json(send, 200, await asyncio.to_thread(history.search, **params))
+
+
+ROUTES = {
+    ("POST", "/api/code_reviewer"): review_code_api,
+    ("GET", "/api/code_reviewer/stream"): review_code_stream,
+    ("POST", "/api/code_reviewer/stream"): review_code_stream,
+    ("GET", "/api/stats"): review_stats,
+    ("GET", "/api/history"): review_history,
+}
+
+
+async def app(scope: Dict, receive, send) -> None:
+    """Applicazione ASGI con gli endpoint asincroni (avvio: `uvicorn asgi:app`).
+
+        Allo spegnimento del server vengono chiusi i client HTTP condivisi di `AsyncLLMService`.
+        L'interfaccia web resta servita da `app.py` (Flask).
+    """
+    if scope["type"] == "lifespan":
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await AsyncLLMService.aclose()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    if scope["type"] != "http":
+        return
+
+    handler = ROUTES.get((scope["method"], scope["path"]))
+    if handler is None:
+        return await _send_json(send, 404, {"error": "Endpoint non trovato"})
+    await handler(scope, receive, send)
@@ -0,0 +1,343 @@
+import asyncio
+import itertools
+import json
+from typing import AsyncIterator, List, Optional, Tuple
+
+import httpx
+import ollama
+
+from cascade import is_error_response
+from deadlines import cancellation_stats
+from findings_parser import estimate_tokens
+from generation import GEMINI_TRUNCATED_ERROR, FenceStop, ollama_options
+from llm_service import Flow, LLMService, _StreamCut
+from scheduler import get_scheduler
+
+# Il pool di connessioni di httpcore esamina tutte le connessioni per ogni richiesta in coda, quindi con
+# centinaia di richieste in corso su un solo client il costo cresce in modo quadratico. Le richieste
+# vengono distribuite a turno su più client con pool piccoli (fino a 16 x 16 connessioni).
+_HTTP_CLIENTS = 16
+_CONNECTIONS_PER_CLIENT = 16
+
+
+class AsyncLLMService(LLMService):
+    """Variante asincrona di `LLMService`, per servire molte revisioni concorrenti da un solo processo.
+
+        Le chiamate ai backend usano `httpx.AsyncClient` (Gemini) e `ollama.AsyncClient` (Ollama),
+        quindi una revisione in attesa della rete non occupa un thread del sistema operativo.
+        La logica delle revisioni (cache, prompt, protocolli, cascata, limiti di generazione) è scritta
+        una sola volta nei flussi di `LLMService` (vedi `LLMService._run_flow`): questa classe li esegue
+        con `_run_flow_async`, attendendo le chiamate ai backend e spostando in un thread (`asyncio.to_thread`)
+        il lavoro locale bloccante, come le cache su SQLite e la ricerca NumPy della cache semantica.
+        Come per i client sincroni e asincroni di `httpx`, il metodo pubblico ha lo stesso nome,
+        `generate_code_review`, ma va atteso.
+
+        I client HTTP sono condivisi a livello di classe (le istanze vengono create a ogni richiesta)
+        e vanno chiusi con `aclose` allo spegnimento del server. Il micro-batching
+        (vedi `micro_batch.MicroBatcher`) è basato sui thread e non viene usato da questa classe.
+    """
+    _http_clients: List[httpx.AsyncClient] = []
+    _http_turn = itertools.count()
+    _ollama_client: Optional[ollama.AsyncClient] = None
+
+
+    @classmethod
+    def _http(cls) -> httpx.AsyncClient:
+        if not cls._http_clients:
+            cls._http_clients = [httpx.AsyncClient(timeout=300, limits=httpx.Limits(max_connections=_CONNECTIONS_PER_CLIENT))
+                                 for _ in range(_HTTP_CLIENTS)]
+        return cls._http_clients[next(cls._http_turn) % _HTTP_CLIENTS]
+
+
+    def _ollama(self) -> ollama.AsyncClient:
+        if AsyncLLMService._ollama_client is None:
+            AsyncLLMService._ollama_client = ollama.AsyncClient(host=self.local_base_url)
+        return AsyncLLMService._ollama_client
+
+
+    @classmethod
+    async def aclose(cls) -> None:
+        """Chiude i client HTTP condivisi."""
+        clients, cls._http_clients = cls._http_clients, []
+        for client in clients:
+            await client.aclose()
+        cls._ollama_client = None
+
+
+    async def call_gemini_async(self, prompt: str) -> str:
+        """Interagisce con l'API di Gemini senza bloccare l'event loop.
+
+            Args:
+                prompt (str): Il prompt testuale da inviare all'LLM.
+
+            Returns:
+                str: La risposta testuale generata dall'LLM, o lo stesso messaggio di errore
+                    che restituirebbe la chiamata sincrona.
+        """
+        return await self._run_flow_async(self._generation_flow("gemini", prompt))
+
+
+    async def _request_gemini_async(self, prompt: str) -> str:
+        """Esegue la chiamata a Gemini, una volta ottenuto lo slot dallo scheduler."""
+        if not self.gemini_api_key or not self.gemini_api_base_url:
+            return "Errore: API Key o Base URL per il modello selezionati non configurati."
+
+        timeout = self._remaining()
+        if timeout <= 0:
+            return self._deadline_error()
+
+        try:
+            response = await self._http().post(self.gemini_api_base_url, **self._gemini_request(prompt), timeout=timeout)
+            response.raise_for_status()
+            return self._gemini_response_text(response.json())
+
+        except httpx.HTTPStatusError as e:
+            return self._gemini_error("http", e)
+        except httpx.ConnectError as e:
+            return self._gemini_error("connection", e)
+        except httpx.TimeoutException as e:
+            cancellation_stats.record_deadline(timeout)
+            return self._gemini_error("timeout", e)
+        except httpx.HTTPError as e:
+            return self._gemini_error("request", e)
+        except ValueError as e: # Per errori di parsing JSON
+            return self._gemini_error("parsing", e)
+        except Exception as e:
+            return self._gemini_error("unexpected", e)
+
+
+    async def call_local_llm_async(self, prompt: str) -> str:
+        """Interagisce con l'istanza locale di Ollama senza bloccare l'event loop.
+
+            Args:
+                prompt (str): Il prompt testuale da inviare all'LLM locale.
+
+            Returns:
+                str: La risposta testuale generata da Ollama, o un messaggio di errore.
+        """
+        return await self._run_flow_async(self._generation_flow("ollama", prompt))
+
+
+    async def _request_ollama_async(self, prompt: str) -> str:
+        """Esegue la chiamata a Ollama, una volta ottenuto lo slot dallo scheduler."""
+        if not self.model_name:
+            return "Errore: Nome del modello Ollama non configurato."
+
+        timeout = self._remaining()
+        if timeout <= 0:
+            return self._deadline_error()
+
+        try:
+            # Alla scadenza la coroutine viene cancellata e la connessione verso Ollama chiusa
+            response = await asyncio.wait_for(
+                self._ollama().chat(model=self.model_name, messages=[{'role': 'user', 'content': prompt}],
+                                   options=ollama_options(self.generation)), timeout)
+            return self._ollama_response_text(response)
+
+        except ollama.ResponseError as e:
+            return self._ollama_error(e, "response")
+        except asyncio.TimeoutError as e:
+            cancellation_stats.record_deadline(timeout)
+            return self._ollama_error(e, "timeout")
+        except Exception as e:
+            return self._ollama_error(e)
+
+
+    async def _scheduled_async(self, backend: str, prompt: str, call) -> str:
+        """Versione asincrona di `LLMService._scheduled`: attende lo slot senza bloccare l'event loop."""
+        try:
+            async with get_scheduler(backend).aslot(self.priority, self.tenant, estimate_tokens(prompt), self._remaining()):
+                return await call(prompt)
+        except TimeoutError:
+            return self._deadline_error()
+
+
+    async def _scheduled_stream_async(self, backend: str, prompt: str, stream_factory) -> AsyncIterator[Tuple[str, str]]:
+        """Versione asincrona di `LLMService._scheduled_stream`."""
+        try:
+            async with get_scheduler(backend).aslot(self.priority, self.tenant, estimate_tokens(prompt), self._remaining()):
+                stream = stream_factory(prompt)
+                try:
+                    async for item in stream:
+                        yield item
+                finally:
+                    await stream.aclose()
+        except TimeoutError:
+            yield "error", self._deadline_error()
+
+
+    async def _run_flow_async(self, flow: Flow) -> str:
+        """Esegue un flusso di revisione di `LLMService` senza bloccare l'event loop (vedi `LLMService._run_flow`)."""
+        result = None
+        while True:
+            try:
+                operation = flow.send(result)
+            except StopIteration as stop:
+                return stop.value
+            result = await self._perform_async(*operation)
+
+
+    async def _perform_async(self, kind: str, *args):
+        """Versione asincrona di `LLMService._perform`: il lavoro locale ("io") viene eseguito in un thread."""
+        if kind == "io":
+            return await asyncio.to_thread(*args)
+        if kind == "backend":
+            return await self._call_backend_async(*args)
+        backend, prompt = args
+        if kind == "request":
+            return await self._scheduled_async(backend, prompt,
+                                               self._request_gemini_async if backend == "gemini" else self._request_ollama_async)
+        stream_factory = self._stream_gemini_async if backend == "gemini" else self._stream_ollama_async
+        return await self._generate_until_fence_async(self._scheduled_stream_async(backend, prompt, stream_factory))
+
+
+    def _micro_batched(self, code_snippet: str) -> bool:
+        # Il micro-batcher è basato sui thread: le revisioni asincrone vengono inviate singolarmente
+        return False
+
+
+    async def _generate_until_fence_async(self, stream) -> Tuple[str, bool]:
+        """Versione asincrona di `LLMService._generate_until_fence`."""
+        self.last_usage = None
+        fence = FenceStop()
+        try:
+            async for event, text in stream:
+                outcome = self._fence_step(fence, event, text)
+                if outcome is not None:
+                    return outcome
+        finally:
+            await stream.aclose()
+        return fence.text, False
+
+
+    async def _call_backend_async(self, prompt: str) -> str:
+        """Invia il prompt al backend scelto durante l'inizializzazione ("gemini" o "ollama")."""
+        if self.llm_choice == "gemini":
+            return await self.call_gemini_async(prompt)
+        return await self.call_local_llm_async(prompt)
+
+
+    async def generate_code_review(self, code_snippet: str, review_type: str = "bug_detection") -> str: # type: ignore[override]
+        """Genera una revisione del codice come `LLMService.generate_code_review`, senza bloccare l'event loop.
+
+            Args:
+                code_snippet (str): Lo snippet di codice Python da revisionare.
+                review_type (str, optional): Il tipo di revisione da eseguire. Il valore predefinito è "bug_detection".
+
+            Returns:
+                str: Il codice revisionato con commenti/suggerimenti generati dall'LLM,
+                o un messaggio di errore se la chiamata all'LLM fallisce.
+
+            Raises:
+                ValueError: Se la `llm_choice` determinata durante l'inizializzazione non è supportata.
+
+            Examples:
+                # service = AsyncLLMService()
+                # reviewed_code = await service.generate_code_review("x=1", "style_suggestions")
+        """
+        return await self._run_flow_async(self._review_flow(code_snippet, review_type))
+
+
+    async def _stream_gemini_async(self, prompt: str) -> AsyncIterator[Tuple[str, str]]:
+        """Versione asincrona di `LLMService._stream_gemini`."""
+        stream_request = self._gemini_stream_request(prompt)
+        if stream_request is None or not self.gemini_api_key:
+            review = await self._request_gemini_async(prompt)  # lo slot è già stato ottenuto
+            yield ("error" if is_error_response(review) else "chunk"), review
+            return
+
+        timeout = self._remaining()
+        if timeout <= 0:
+            yield "error", self._deadline_error()
+            return
+
+        url, request = stream_request
+        try:
+            # L'uscita dal blocco `async with` (anche per cancellazione) chiude lo stream HTTP
+            async with self._http().stream("POST", url, **request, timeout=timeout) as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    if line.startswith("data:"):
+                        chunk = json.loads(line[len("data:"):])
+                        text = self._gemini_chunk_text(chunk)
+                        if text:
+                            yield "chunk", text
+                        if self._gemini_truncated((chunk.get('candidates') or [{}])[0]):
+                            yield "error", GEMINI_TRUNCATED_ERROR
+        except httpx.HTTPStatusError as e:
+            yield "error", self._gemini_error("http", e)
+        except httpx.ConnectError as e:
+            yield "error", self._gemini_error("connection", e)
+        except httpx.TimeoutException as e:
+            cancellation_stats.record_deadline(timeout)
+            yield "error", self._gemini_error("timeout", e)
+        except httpx.HTTPError as e:
+            yield "error", self._gemini_error("request", e)
+        except ValueError as e:
+            yield "error", self._gemini_error("parsing", e)
+
+
+    async def _stream_ollama_async(self, prompt: str) -> AsyncIterator[Tuple[str, str]]:
+        """Versione asincrona di `LLMService._stream_ollama`."""
+        if not self.model_name:
+            yield "error", "Errore: Nome del modello Ollama non configurato."
+            return
+
+        stream = None
+        try:
+            stream = await asyncio.wait_for(self._ollama().chat(
+                model=self.model_name, messages=[{'role': 'user', 'content': prompt}], stream=True,
+                options=ollama_options(self.generation)), self._remaining())
+            while True:
+                # Ogni frammento deve arrivare entro la scadenza della richiesta
+                try:
+                    part = await asyncio.wait_for(stream.__anext__(), self._remaining())
+                except StopAsyncIteration:
+                    break
+                if part.get('done'):
+                    self._ollama_response_text(part)
+                text = part['message']['content'] if 'message' in part else ""
+                if text:
+                    yield "chunk", text
+        except ollama.ResponseError as e:
+            yield "error", self._ollama_error(e, "response")
+        except asyncio.TimeoutError as e:
+            cancellation_stats.record_deadline()
+            yield "error", self._ollama_error(e, "timeout")
+        except Exception as e:
+            yield "error", self._ollama_error(e)
+        finally:
+            if stream is not None:
+                # Chiude lo stream HTTP verso Ollama, che così smette di generare
+                await stream.aclose()
+
+
+    async def stream_code_review(self, code_snippet: str, review_type: str = "bug_detection") -> AsyncIterator[Tuple[str, str]]: # type: ignore[override]
+        """Versione asincrona di `LLMService.stream_code_review`.
+
+            Se il task che consuma lo stream viene cancellato (ad esempio alla disconnessione del
+            client ASGI) o il generatore viene chiuso, lo stream verso il backend viene chiuso e
+            l'interruzione viene registrata in `deadlines.cancellation_stats`.
+        """
+        flow, prompt = self._stream_plan(code_snippet, review_type)
+        if flow is not None:
+            review = await self._run_flow_async(flow)
+            yield ("error" if is_error_response(review) else "chunk"), review
+            return
+
+        cut = _StreamCut(self, code_snippet, review_type)
+        stream_factory = self._stream_gemini_async if self.llm_choice == "gemini" else self._stream_ollama_async
+        stream = self._scheduled_stream_async(self.llm_choice, prompt, stream_factory)
+        try:
+            async for event, text in stream:
+                events, finished = cut.feed(event, text)
+                for item in events:
+                    yield item
+                if finished:
+                    break
+            cut.completed()
+        except (GeneratorExit, asyncio.CancelledError):
+            cut.cancelled()
+            raise
+        finally:
+            await stream.aclose()
@@ -0,0 +1,267 @@
+import argparse
+import json
+import random
+import sys
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import requests
+
+from cascade import is_error_response
+from config import Config
+from corpus import TESTS_DIR, iter_corpus
+from llm_service import LLMService
+from results_io import write_results
+
+# Stati finali di un job batch (l'API li restituisce come "BATCH_STATE_*"; l'SDK come "JOB_STATE_*").
+TERMINAL_STATES = ("SUCCEEDED", "FAILED", "CANCELLED", "EXPIRED")
+
+# Le richieste inline di un job non possono superare 20 MB: i job vengono divisi prima di questo limite.
+MAX_JOB_BYTES = 16 * 1024 * 1024
+
+_CATEGORIES = ("bug_detection", "syntax_revision", "doc_strings_add", "style_suggestions")
+
+
+class GeminiBatchClient:
+    """Client minimo dell'API batch di Gemini (`batchGenerateContent` con richieste inline).
+
+        Gli URL vengono ricavati da `Config.GEMINI_API_BASE_URL`: ".../models/<modello>:generateContent"
+        diventa ".../models/<modello>:batchGenerateContent" per creare i job, e lo stato di un job
+        "batches/N" si legge da ".../v1beta/batches/N".
+
+        Attributes:
+            api_key (str): La chiave API di Gemini.
+            batch_url (str): L'URL di creazione dei job.
+            api_root (str): La radice dell'API (es. "https://generativelanguage.googleapis.com/v1beta").
+    """
+
+    def __init__(self, api_key: str, generate_url: str, timeout: float = 60) -> None:
+        if ":generateContent" not in generate_url or "/models/" not in generate_url:
+            raise ValueError(f"URL di Gemini non adatto all'API batch (serve .../models/<modello>:generateContent): {generate_url}")
+        self.api_key = api_key
+        self.batch_url = generate_url.replace(":generateContent", ":batchGenerateContent")
+        self.api_root = generate_url[:generate_url.index("/models/")]
+        self._timeout = timeout
+        self._session = requests.Session()
+
+    def submit(self, items: List[Tuple[str, Dict]], display_name: str) -> str:
+        """Crea un job con le richieste `generateContent` indicate, come coppie (chiave, richiesta).
+
+            Returns:
+                str: Il nome del job (es. "batches/123").
+
+            Raises:
+                requests.exceptions.RequestException: Se la creazione del job fallisce.
+        """
+        payload = {"batch": {"display_name": display_name, "input_config": {"requests": {"requests": [
+            {"request": request, "metadata": {"key": key}} for key, request in items
+        ]}}}}
+        response = self._session.post(self.batch_url, params={"key": self.api_key}, json=payload, timeout=self._timeout)
+        response.raise_for_status()
+        operation = response.json()
+        return operation.get("name") or operation["metadata"]["name"]
+
+    def get(self, name: str) -> Dict:
+        """Restituisce l'operazione del job `name` (stato in `metadata.state`, risposte in `response` quando è concluso)."""
+        response = self._session.get(f"{self.api_root}/{name}", params={"key": self.api_key}, timeout=self._timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def wait(self, names: List[str], poll_interval: float = 2.0, max_interval: float = 60.0, timeout: float = 86400,
+             on_poll: Optional[Callable[[str, str], None]] = None) -> Dict[str, Dict]:
+        """Attende la conclusione dei job, controllandone lo stato con attese crescenti.
+
+            L'intervallo tra un controllo e il successivo parte da `poll_interval` e cresce del 50%
+            a ogni giro (con una piccola variazione casuale) fino a `max_interval`. Gli errori di rete
+            durante un controllo vengono ignorati fino a 5 errori consecutivi per job.
+
+            Args:
+                names (List[str]): I job da attendere.
+                poll_interval (float, optional): Il primo intervallo, in secondi.
+                max_interval (float, optional): L'intervallo massimo, in secondi.
+                timeout (float, optional): I secondi oltre i quali si smette di attendere (i job restano in esecuzione).
+                on_poll (Optional[Callable]): Chiamata con nome e stato del job a ogni controllo.
+
+            Returns:
+                Dict[str, Dict]: Per ogni job concluso, l'operazione finale.
+
+            Raises:
+                TimeoutError: Se i job non si concludono entro `timeout`.
+                requests.exceptions.RequestException: Dopo 5 errori consecutivi nel controllo di un job.
+        """
+        deadline = time.monotonic() + timeout
+        pending = list(names)
+        finished: Dict[str, Dict] = {}
+        failures = {name: 0 for name in names}
+        interval = poll_interval
+        while pending:
+            for name in list(pending):
+                try:
+                    operation = self.get(name)
+                    failures[name] = 0
+                except requests.exceptions.RequestException:
+                    failures[name] += 1
+                    if failures[name] >= 5:
+                        raise
+                    continue
+                state = (operation.get("metadata") or {}).get("state", "")
+                if on_poll:
+                    on_poll(name, state)
+                if operation.get("done") or state.endswith(TERMINAL_STATES):
+                    finished[name] = operation
+                    pending.remove(name)
+            if not pending:
+                break
+            if time.monotonic() + interval > deadline:
+                raise TimeoutError(f"Job batch non conclusi entro {timeout:.0f} secondi: {', '.join(pending)}")
+            time.sleep(interval * random.uniform(0.9, 1.1))
+            interval = min(max_interval, interval * 1.5)
+        return finished
+
+    @staticmethod
+    def responses(operation: Dict) -> Dict[str, Dict]:
+        """Restituisce le risposte di un job concluso per chiave: {"response": ...} o {"error": ...}."""
+        output = operation.get("response") or {}
+        inlined = (output.get("inlinedResponses") or {}).get("inlinedResponses", [])
+        return {(item.get("metadata") or {}).get("key"): item for item in inlined}
+
+
+def pack_jobs(items: List[Tuple[str, Dict]], max_requests: int, max_bytes: int = MAX_JOB_BYTES) -> List[List[Tuple[str, Dict]]]:
+    """Divide le richieste in job di al più `max_requests` richieste e `max_bytes` byte (JSON)."""
+    jobs: List[List[Tuple[str, Dict]]] = []
+    size = 0
+    for key, request in items:
+        request_bytes = len(json.dumps(request, ensure_ascii=False).encode("utf-8")) + len(key) + 64
+        if not jobs or len(jobs[-1]) >= max_requests or size + request_bytes > max_bytes:
+            jobs.append([])
+            size = 0
+        jobs[-1].append((key, request))
+        size += request_bytes
+    return jobs
+
+
+def _job_error(operation: Dict) -> str:
+    state = (operation.get("metadata") or {}).get("state", "")
+    message = (operation.get("error") or {}).get("message", "")
+    return f"Errore dal job batch di Gemini ({state}): {message}".rstrip(": ")
+
+
+def run_batch_reviews(corpus: List[Tuple[int, str, str]], max_requests: int = 1000, poll_interval: float = 2.0,
+                      max_interval: float = 60.0, timeout: float = 86400, verbose: bool = True) -> Tuple[Dict[str, List[Dict]], Dict]:
+    """Revisiona un corpus con l'API batch di Gemini.
+
+        Per ogni input vengono usati lo stesso prompt, le stesse impostazioni di generazione e la stessa
+        post-elaborazione di `LLMService.generate_code_review` (vedi `LLMService.prepare_gemini_request`). Le revisioni
+        già nella cache persistente non vengono inviate, né quelle che non richiedono il modello (es. docstring
+        già presenti); le altre vengono raccolte in job, inviate insieme e, a job conclusi, ricondotte agli
+        input tramite la chiave di ogni richiesta. Le revisioni riuscite vengono salvate in cache e in cronologia.
+
+        Args:
+            corpus (List[Tuple[int, str, str]]): Gli input come tuple (numero, review_type, codice).
+            max_requests (int, optional): Il numero massimo di richieste per job.
+            poll_interval (float, optional): Il primo intervallo tra i controlli dello stato, in secondi.
+            max_interval (float, optional): L'intervallo massimo tra i controlli, in secondi.
+            timeout (float, optional): I secondi oltre i quali si smette di attendere i job.
+            verbose (bool, optional): Se True, stampa l'avanzamento.
+
+        Returns:
+            tuple: I risultati per categoria, nel formato di `results_io.write_results`, e le statistiche
+            ("inputs", "cached", "local", "submitted", "jobs", "errors", "polls").
+
+        Raises:
+            ValueError: Se Gemini non è configurato o il suo URL non consente l'API batch.
+    """
+    log = print if verbose else (lambda *args, **kwargs: None)
+    client = GeminiBatchClient(Config.GEMINI_API_KEY or "", Config.GEMINI_API_BASE_URL or "")
+    stats = {"inputs": len(corpus), "cached": 0, "local": 0, "submitted": 0, "jobs": 0, "errors": 0, "polls": 0}
+    reviews: Dict[int, str] = {}
+    pending: Dict[str, Dict] = {}
+    for number, review_type, code in corpus:
+        service = LLMService(priority="batch", tenant="batch_mode")
+        if service.llm_choice not in ("gemini", "cascade"):
+            raise ValueError("La modalità batch richiede Gemini (API_KEY e API_BASE_URL).")
+        prepared = service.prepare_gemini_request(code, review_type)
+        if prepared["request"] is None:
+            reviews[number] = prepared["review"]
+            stats["cached" if prepared["source"] == "cache" else "local"] += 1
+            continue
+        pending[f"input-{number}"] = {"number": number, "service": service, "prepared": prepared}
+
+    jobs = pack_jobs([(key, item["prepared"]["request"]) for key, item in pending.items()], max_requests)
+    start = time.perf_counter()
+    names = []
+    for index, job in enumerate(jobs, start=1):
+        names.append(client.submit(job, f"code-review-{int(time.time())}-{index}"))
+        log(f"Job {names[-1]}: {len(job)} richieste")
+    stats["submitted"], stats["jobs"] = len(pending), len(jobs)
+
+    def on_poll(name, state):
+        stats["polls"] += 1
+        log(f"  {name}: {state}")
+
+    operations = client.wait(names, poll_interval, max_interval, timeout, on_poll) if names else {}
+    for name, job in zip(names, jobs):
+        operation = operations[name]
+        responses = client.responses(operation)
+        for key, _ in job:
+            item = pending[key]
+            result = responses.get(key)
+            if result is None:
+                error = _job_error(operation)
+            elif "error" in result:
+                error = f"Errore dal job batch di Gemini: {result['error'].get('message', result['error'])}"
+            else:
+                error = None
+            # Il tempo registrato in cronologia è quello dall'invio dei job alla loro conclusione
+            review = item["service"].finish_gemini_response(item["prepared"], None if error else result["response"],
+                                                            error, start)
+            reviews[item["number"]] = review
+            stats["errors"] += is_error_response(review)
+
+    results: Dict[str, List[Dict]] = {category: [] for category in _CATEGORIES}
+    for number, review_type, code in corpus:
+        results.setdefault(review_type, []).append({
+            "test_number": number,
+            "code_snippet": code,
+            "prompt_used": "",
+            "generated_review": reviews.get(number, "Errore: revisione non ricevuta dal job batch."),
+        })
+    return results, stats
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Revisiona il corpus tests/InputN.py con l'API batch di Gemini (revisioni notturne senza attesa interattiva).")
+    parser.add_argument("--tests-dir", default=TESTS_DIR, help="Cartella con i file InputN.py.")
+    parser.add_argument("--first", type=int, default=1, help="Primo input da revisionare.")
+    parser.add_argument("--last", type=int, default=100, help="Ultimo input da revisionare.")
+    parser.add_argument("--output", default="llm_code_review_results.txt", help="File dei risultati (formato di test.py).")
+    parser.add_argument("--max-requests", type=int, default=1000, help="Richieste massime per job.")
+    parser.add_argument("--poll-interval", type=float, default=5.0, help="Primo intervallo tra i controlli dello stato (secondi).")
+    parser.add_argument("--max-interval", type=float, default=60.0, help="Intervallo massimo tra i controlli (secondi).")
+    parser.add_argument("--timeout", type=float, default=86400, help="Secondi massimi di attesa dei job.")
+    args = parser.parse_args(argv)
+
+    corpus = list(iter_corpus(args.tests_dir, args.first, args.last))
+    if not corpus:
+        print(f"Errore: nessun file InputN.py in '{args.tests_dir}'.")
+        return 1
+
+    start = time.time()
+    try:
+        results, stats = run_batch_reviews(corpus, args.max_requests, args.poll_interval, args.max_interval, args.timeout)
+    except (ValueError, TimeoutError, requests.exceptions.RequestException) as e:
+        print(f"Errore nella modalità batch: {e}")
+        return 1
+    total_time = time.time() - start
+
+    write_results(args.output, results, total_time)
+    print(f"\nRevisione completata. I risultati sono stati salvati in '{args.output}'.")
+    print(f"Input: {stats['inputs']}  dalla cache: {stats['cached']}  senza modello: {stats['local']}  "
+          f"inviati: {stats['submitted']} in {stats['jobs']} job  errori: {stats['errors']}  controlli: {stats['polls']}")
+    print(f"Tempo totale impiegato: {total_time:.2f} secondi ({len(corpus) / max(total_time, 1e-9):.1f} revisioni/s).")
+    return 1 if stats["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,970 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+from cascade import is_error_response, review_confidence
+from config import Config
+from corpus import TESTS_DIR, iter_corpus
+from findings_parser import REVIEW_TYPE_TAGS, estimate_tokens, parse_findings
+from results_io import iter_results, read_total_time
+from static_checks import run_static_checks
+
+
+def summarize(values: List[float]) -> Dict[str, float]:
+    """Restituisce media e percentili (p50, p90, p99) di una lista di valori."""
+    if not values:
+        return {"mean": 0.0, "p50": 0.0, "p90": 0.0, "p99": 0.0}
+    ordered = sorted(values)
+
+    def percentile(q):
+        return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+    return {"mean": sum(ordered) / len(ordered), "p50": percentile(0.5), "p90": percentile(0.9), "p99": percentile(0.99)}
+
+
+def _print_summary(title: str, values: List[float], unit: str) -> None:
+    stats = summarize(values)
+    print(f"{title:<28} media={stats['mean']:.3f}{unit} p50={stats['p50']:.3f}{unit} "
+          f"p90={stats['p90']:.3f}{unit} p99={stats['p99']:.3f}{unit}")
+
+
+def bench_cascade(args: argparse.Namespace) -> None:
+    """Misura tasso di escalation, latenza e costo della modalità cascata sul corpus `tests/`.
+
+        Con `--replay LOCALE REMOTO` la cascata viene simulata sui file di risultati già registrati
+        (la latenza di ogni input è il tempo medio per input dell'esecuzione originale); senza,
+        ogni input viene revisionato dal vivo con `LLMService` in modalità "cascade".
+    """
+    threshold = args.threshold if args.threshold is not None else Config.CASCADE_CONFIDENCE_THRESHOLD
+    corpus = {number: (review_type, code) for number, review_type, code in iter_corpus(args.tests_dir)}
+    latencies, remote_tokens, escalated = [], [], 0
+
+    if args.replay:
+        local_path, remote_path = args.replay
+        local = {item["input"]: item["review"] for item in iter_results(local_path)}
+        remote = {item["input"]: item["review"] for item in iter_results(remote_path)}
+        local_latency = (read_total_time(local_path) or 0.0) / max(len(local), 1)
+        remote_latency = (read_total_time(remote_path) or 0.0) / max(len(remote), 1)
+
+        for number, (review_type, code) in corpus.items():
+            if number not in local:
+                continue
+            scores = review_confidence(code, local[number], review_type, run_static_checks(code))
+            latency = local_latency
+            tokens = 0
+            if scores["confidence"] < threshold:
+                escalated += 1
+                latency += remote_latency
+                tokens = estimate_tokens(code) + args.prompt_tokens + estimate_tokens(remote.get(number, ""))
+            latencies.append(latency)
+            remote_tokens.append(tokens)
+    else:
+        from llm_service import LLMService
+
+        service = LLMService()
+        if service.llm_choice != "cascade":
+            raise SystemExit("Configura sia Ollama che Gemini e imposta CASCADE_MODE=1 per misurare la cascata.")
+        Config.CASCADE_CONFIDENCE_THRESHOLD = threshold
+
+        for number, (review_type, code) in corpus.items():
+            start = time.perf_counter()
+            review = service.generate_code_review(code_snippet=code, review_type=review_type)
+            latencies.append(time.perf_counter() - start)
+            if service.last_cascade["escalated"]:
+                escalated += 1
+                remote_tokens.append(estimate_tokens(code) + args.prompt_tokens + estimate_tokens(review))
+            else:
+                remote_tokens.append(0)
+
+    reviews = len(latencies)
+    costs = [tokens / 1000 * args.cost_per_1k for tokens in remote_tokens]
+    print(f"Revisioni: {reviews}  escalation: {escalated} ({escalated / max(reviews, 1):.1%})  soglia: {threshold}")
+    _print_summary("Latenza end-to-end", latencies, "s")
+    _print_summary("Token inviati a Gemini", remote_tokens, "")
+    _print_summary("Costo per revisione", costs, "$")
+    print(f"Latenza totale: {sum(latencies):.1f}s  costo totale: {sum(costs):.4f}$")
+
+
+def bench_protocol(args: argparse.Namespace) -> None:
+    """Confronta token di output e tempo del protocollo "echo" e di quello ad annotazioni.
+
+        Dal vivo, ogni input del corpus viene revisionato con entrambi i protocolli e vengono
+        usati i token di output dichiarati dal backend (`LLMService.last_usage`). Con `--replay`
+        le risposte registrate nel formato "echo" vengono confrontate con le righe JSON che
+        il protocollo ad annotazioni avrebbe prodotto per le stesse segnalazioni.
+    """
+    from llm_service import ANNOTATION_REVIEW_TYPES
+
+    results = {"echo": {"tokens": [], "times": []}, "annotations": {"tokens": [], "times": []}}
+
+    if args.replay:
+        for item in iter_results(args.replay):
+            if item["category"] not in ANNOTATION_REVIEW_TYPES:
+                continue
+            tags = REVIEW_TYPE_TAGS[item["category"]]
+            annotations = "\n".join(
+                json.dumps({key: finding[key] for key in ("line", "tag", "severity", "rule", "message") if finding[key]},
+                           ensure_ascii=False, separators=(",", ":"))
+                for finding in parse_findings(item["review"])["findings"] if finding["tag"] in tags
+            )
+            results["echo"]["tokens"].append(estimate_tokens(item["review"]))
+            results["annotations"]["tokens"].append(estimate_tokens(annotations) if annotations else 0)
+    else:
+        from llm_service import LLMService
+
+        service = LLMService()
+        for protocol in ("echo", "annotations"):
+            Config.REVIEW_PROTOCOL = protocol
+            for number, review_type, code in iter_corpus(args.tests_dir):
+                if review_type not in ANNOTATION_REVIEW_TYPES:
+                    continue
+                start = time.perf_counter()
+                review = service.generate_code_review(code_snippet=code, review_type=review_type)
+                results[protocol]["times"].append(time.perf_counter() - start)
+                usage = service.last_usage or {}
+                results[protocol]["tokens"].append(usage.get("output_tokens") or estimate_tokens(review))
+
+    for protocol, values in results.items():
+        print(f"--- Protocollo {protocol} ---")
+        _print_summary("Token di output", values["tokens"], "")
+        if values["times"]:
+            _print_summary("Tempo per revisione", values["times"], "s")
+    echo_tokens = sum(results["echo"]["tokens"])
+    annotation_tokens = sum(results["annotations"]["tokens"])
+    if echo_tokens:
+        print(f"Token di output totali: echo={echo_tokens} annotazioni={annotation_tokens} "
+              f"({(annotation_tokens - echo_tokens) / echo_tokens:+.1%})")
+
+
+def bench_docstrings(args: argparse.Namespace) -> None:
+    """Riporta unità documentate, saltate e token risparmiati dall'inserimento locale delle docstring.
+
+        Senza `--live` viene solo analizzato il corpus (unità da documentare e unità saltate);
+        con `--live` ogni input "doc_strings_add" viene revisionato con il protocollo ad annotazioni.
+    """
+    from docstrings import plan_docstrings
+
+    totals = {"units": 0, "skipped": 0, "unparsable": 0, "documented": 0, "tokens_saved": 0}
+    service = None
+    if args.live:
+        from llm_service import LLMService
+
+        Config.REVIEW_PROTOCOL = "annotations"
+        service = LLMService()
+
+    for number, review_type, code in iter_corpus(args.tests_dir):
+        if review_type != "doc_strings_add":
+            continue
+        plan = plan_docstrings(code)
+        if plan is None:
+            totals["unparsable"] += 1
+            continue
+        totals["units"] += len(plan["units"])
+        totals["skipped"] += len(plan["skipped"])
+        if service:
+            service.generate_code_review(code_snippet=code, review_type=review_type)
+            report = service.last_docstring_report or {}
+            totals["documented"] += len(report.get("documented", []))
+            totals["tokens_saved"] += report.get("tokens_saved", 0)
+
+    print(f"Unità da documentare: {totals['units']}  saltate: {totals['skipped']}  "
+          f"file non analizzabili: {totals['unparsable']}")
+    if service:
+        print(f"Unità documentate: {totals['documented']}  token di output risparmiati (stima): {totals['tokens_saved']}")
+
+
+def _simulated_backend(latency_ms: float, ms_per_token: float, drop_rate: float, slots: int):
+    """Restituisce un backend simulato che risponde ripetendo il codice, con un costo fisso per chiamata.
+
+        Il tempo di ogni chiamata è `latency_ms` più `ms_per_token` per token stimato del prompt e
+        della risposta; al massimo `slots` chiamate vengono servite contemporaneamente (un server
+        Ollama locale, ad esempio, elabora le richieste una alla volta). Per i prompt di micro-batch ogni snippet viene restituito con il suo delimitatore;
+        una frazione `drop_rate` degli snippet viene omessa per esercitare i tentativi singoli.
+    """
+    from micro_batch import _DELIMITER, _DELIMITER_RE
+
+    rng = random.Random(0)
+    lock = threading.Lock()
+    server = threading.Semaphore(slots)
+    calls = {"count": 0}
+
+    def send(prompt: str) -> str:
+        parts = _DELIMITER_RE.split(prompt)
+        if len(parts) > 1:
+            snippets = [(int(number), code.strip("\n")) for number, code in zip(parts[1::2], parts[2::2])]
+            with lock:
+                kept = [(number, code) for number, code in snippets if rng.random() >= drop_rate]
+            response = "\n".join(f"{_DELIMITER.format(number)}\n{code}" for number, code in kept)
+        else:
+            response = prompt.rsplit("\n", 1)[-1]
+        with server:
+            time.sleep((latency_ms + ms_per_token * (estimate_tokens(prompt) + estimate_tokens(response))) / 1000)
+        with lock:
+            calls["count"] += 1
+        return response
+
+    return send, calls
+
+
+def bench_microbatch(args: argparse.Namespace) -> None:
+    """Confronta il throughput sul corpus `tests/` senza e con micro-batching.
+
+        Gli input vengono inviati da `--concurrency` thread contemporaneamente, come farebbero
+        più richieste al server. Con `--simulate` il backend è simulato (latenza fissa per chiamata
+        più un costo per token), altrimenti viene usato il backend configurato.
+    """
+    from llm_service import LLMService
+    import micro_batch
+
+    corpus = list(iter_corpus(args.tests_dir))
+    Config.REVIEW_PROTOCOL = "echo"
+    Config.REVIEW_CACHE_PATH = ""
+    Config.HISTORY_PATH = ""
+
+    for window in (0.0, args.window_ms):
+        Config.MICRO_BATCH_WINDOW_MS = window
+        Config.MICRO_BATCH_MAX_SNIPPETS = args.max_snippets
+        Config.MICRO_BATCH_MAX_TOKENS = args.max_tokens
+        micro_batch._batcher = None
+
+        calls = None
+        if args.simulate is not None:
+            # Il backend configurato non viene mai chiamato: viene sostituito solo l'invio del prompt
+            Config.GEMINI_API_KEY, Config.GEMINI_API_BASE_URL = "benchmark", "http://127.0.0.1:9/generateContent"
+            Config.MODEL_NAME = Config.LOCAL_BASE_URL = None
+            service = LLMService()
+            service._call_backend, calls = _simulated_backend(args.simulate, args.ms_per_token, args.drop_rate,
+                                                              args.backend_slots)
+        else:
+            service = LLMService()
+
+        def review(item):
+            number, review_type, code = item
+            return service.generate_code_review(code_snippet=code, review_type=review_type)
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            list(executor.map(review, corpus))
+        elapsed = time.perf_counter() - start
+
+        label = f"micro-batch {window:g}ms" if window else "senza micro-batch"
+        print(f"--- {label} ---")
+        print(f"Revisioni: {len(corpus)}  tempo: {elapsed:.2f}s  throughput: {len(corpus) / elapsed:.1f} revisioni/s")
+        if calls is not None:
+            print(f"Chiamate al backend: {calls['count']}")
+        batcher = micro_batch.get_micro_batcher()
+        if batcher:
+            stats = batcher.stats
+            print(f"Micro-batch: {stats['batches']}  snippet per batch: {stats['snippets'] / max(stats['batches'], 1):.1f}  "
+                  f"tentativi singoli: {stats['retries']}")
+
+
+class _FakeGeminiHandler(BaseHTTPRequestHandler):
+    """Risponde come l'API di Gemini dopo una latenza fissa, senza generare nulla."""
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    latency = 0.2
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        time.sleep(self.latency)
+        body = json.dumps({
+            "candidates": [{"content": {"parts": [{"text": "# nessun problema"}]}}],
+            "usageMetadata": {"promptTokenCount": 0, "candidatesTokenCount": 0},
+        }).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _FakeGeminiServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+def bench_concurrency(args: argparse.Namespace) -> None:
+    """Confronta `LLMService` (un thread per revisione) e `AsyncLLMService` (un solo event loop).
+
+        Vengono eseguite `--requests` revisioni del corpus con al più `--concurrency` revisioni in
+        corso. Senza `--live` le chiamate vanno a un server locale che imita l'API di Gemini con
+        una latenza fissa (`--simulate`), così da misurare solo il costo della concorrenza lato client.
+    """
+    from async_llm_service import AsyncLLMService
+    from llm_service import LLMService
+
+    corpus = list(iter_corpus(args.tests_dir))
+    work = [corpus[index % len(corpus)] for index in range(args.requests)]
+    Config.REVIEW_PROTOCOL = "echo"
+    Config.MICRO_BATCH_WINDOW_MS = 0
+    # Senza cache: le revisioni asincrone non devono leggere quelle appena salvate da quelle sincrone
+    Config.REVIEW_CACHE_PATH = ""
+    Config.HISTORY_PATH = ""
+    # Lo scheduler non deve limitare la concorrenza che si vuole misurare
+    Config.SCHEDULER_GEMINI_SLOTS = args.concurrency
+
+    server = None
+    if not args.live:
+        _FakeGeminiHandler.latency = args.simulate / 1000
+        server = _FakeGeminiServer(("127.0.0.1", 0), _FakeGeminiHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        Config.GEMINI_API_KEY = "benchmark"
+        Config.GEMINI_API_BASE_URL = f"http://127.0.0.1:{server.server_address[1]}/generateContent"
+        Config.MODEL_NAME = Config.LOCAL_BASE_URL = None
+
+    def review_sync(item):
+        number, review_type, code = item
+        return LLMService().generate_code_review(code_snippet=code, review_type=review_type)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        sync_reviews = list(executor.map(review_sync, work))
+    sync_time = time.perf_counter() - start
+
+    async def review_all():
+        limit = asyncio.Semaphore(args.concurrency)
+
+        async def review_async(item):
+            number, review_type, code = item
+            async with limit:
+                return await AsyncLLMService().generate_code_review(code_snippet=code, review_type=review_type)
+
+        try:
+            return await asyncio.gather(*(review_async(item) for item in work))
+        finally:
+            await AsyncLLMService.aclose()
+
+    start = time.perf_counter()
+    async_reviews = asyncio.run(review_all())
+    async_time = time.perf_counter() - start
+
+    if server:
+        server.shutdown()
+
+    for label, elapsed, reviews, threads in (("sincrono (thread)", sync_time, sync_reviews, args.concurrency),
+                                             ("asincrono (event loop)", async_time, async_reviews, 1)):
+        errors = sum(1 for review in reviews if is_error_response(review))
+        print(f"--- {label} ---")
+        print(f"Revisioni: {len(reviews)}  errori: {errors}  tempo: {elapsed:.2f}s  "
+              f"throughput: {len(reviews) / elapsed:.1f} revisioni/s  thread client: {threads}")
+
+
+def bench_scheduler(args: argparse.Namespace) -> None:
+    """Simula un'ondata di richieste batch e misura l'attesa delle richieste interattive.
+
+        Il client "A" accoda `--batch` richieste batch tutte insieme, il client "B" ne accoda 20 poco dopo
+        e il client "C" invia `--interactive` richieste interattive a intervalli regolari. Ogni chiamata
+        occupa uno slot per `--service-ms` millisecondi. Lo scenario viene eseguito con una coda FIFO
+        (una sola classe e un solo client) e con `scheduler.FairScheduler`.
+    """
+    from scheduler import FairScheduler
+
+    service_time = args.service_ms / 1000
+
+    def run(fair: bool):
+        batch_cap = max(1, int(args.slots * Config.SCHEDULER_BATCH_SHARE)) if fair else args.slots
+        scheduler = FairScheduler("simulato", args.slots, {"batch": batch_cap})
+        waits = {"A": [], "B": [], "C": []}
+        finished = {"A": 0.0, "B": 0.0, "C": 0.0}
+        start = time.perf_counter()
+
+        def request(tenant, priority, delay):
+            time.sleep(delay)
+            enqueued = time.perf_counter()
+            if not fair:
+                priority, tenant_key = "interactive", "tutti"
+            else:
+                tenant_key = tenant
+            with scheduler.slot(priority, tenant_key):
+                waits[tenant].append(time.perf_counter() - enqueued)
+                time.sleep(service_time)
+            finished[tenant] = max(finished[tenant], time.perf_counter() - start)
+
+        jobs = [("A", "batch", 0.0)] * args.batch + [("B", "batch", 0.2)] * 20
+        jobs += [("C", "interactive", 0.1 + index * 0.1) for index in range(args.interactive)]
+        threads = [threading.Thread(target=request, args=job) for job in jobs]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return waits, finished, scheduler.snapshot()
+
+    for label, fair in (("coda FIFO", False), ("scheduler (priorità e ripartizione equa)", True)):
+        waits, finished, snapshot = run(fair)
+        print(f"--- {label} ---")
+        _print_summary("Attesa interattive (C)", waits["C"], "s")
+        _print_summary("Attesa batch client B", waits["B"], "s")
+        print(f"Completamento: A={finished['A']:.1f}s  B={finished['B']:.1f}s  C={finished['C']:.1f}s")
+        if fair:
+            for priority, stats in snapshot["classes"].items():
+                print(f"Classe {priority}: servite={stats['dispatched']} limite={stats['cap']} "
+                      f"attesa media={stats['wait_mean']:.2f}s massima={stats['wait_max']:.2f}s")
+
+
+def bench_symbols(args: argparse.Namespace) -> None:
+    """Misura la costruzione dell'indice dei simboli e il contesto aggiunto ai prompt dei file di un progetto.
+
+        Per ogni file di `--root` confronta i token del contesto ottenuto dall'indice (le sole firme dei
+        simboli usati, entro `--budget` token) con quelli dei moduli interi in cui quei simboli sono definiti,
+        cioè il contesto che servirebbe incollando nel prompt i file del progetto.
+    """
+    import tempfile
+
+    from project_review import ProjectFile, discover_directory
+    from symbol_index import SymbolIndex
+
+    files = discover_directory(args.root)
+    start = time.perf_counter()
+    index = SymbolIndex()
+    index.update(files)
+    build_time = time.perf_counter() - start
+    symbols = sum(len(entry["symbols"]) for entry in index.files.values())
+    print(f"File: {len(files)}  simboli: {symbols}  costruzione: {build_time * 1000:.1f}ms")
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "index.json")
+        SymbolIndex(path).update(files)
+        start = time.perf_counter()
+        reloaded = SymbolIndex(path)
+        unchanged = reloaded.update(files)
+        print(f"Caricamento da JSON e aggiornamento senza modifiche: {(time.perf_counter() - start) * 1000:.1f}ms "
+              f"({unchanged['parsed']} file analizzati)")
+        touched = [ProjectFile(f.path, f.size, f.version + ":modificato", f._open) if position == 0 else f
+                   for position, f in enumerate(files)]
+        changed = reloaded.update(touched)
+        print(f"Aggiornamento con un file modificato: {changed['elapsed'] * 1000:.1f}ms ({changed['parsed']} file analizzati)")
+
+    sources = {}
+    for project_file in files:
+        code = project_file.read(Config.PROJECT_REVIEW_MAX_FILE_BYTES)
+        if code is not None:
+            sources[index.files[project_file.path]["module"]] = (project_file.path, code)
+
+    code_tokens = context_tokens = full_tokens = enriched = 0
+    lookup_times = []
+    for module, (_, code) in sources.items():
+        start = time.perf_counter()
+        context = index.context_for(code, args.budget, module=module)
+        lookup_times.append(time.perf_counter() - start)
+        referenced = {symbol["module"] for symbol in index.resolve(code, module)}
+        code_tokens += estimate_tokens(code)
+        if context:
+            enriched += 1
+            context_tokens += estimate_tokens(context)
+        full_tokens += sum(estimate_tokens(sources[name][1]) for name in referenced if name in sources)
+
+    print(f"File con contesto: {enriched} su {len(sources)}")
+    _print_summary("Calcolo del contesto", lookup_times, "s")
+    print(f"Token del codice revisionato: {code_tokens}")
+    print(f"Token di contesto, firme dall'indice: {context_tokens}")
+    print(f"Token di contesto, moduli interi: {full_tokens}")
+    if full_tokens:
+        print(f"Risparmio sul contesto: {100 * (1 - context_tokens / full_tokens):.1f}%")
+
+
+def bench_payload(args: argparse.Namespace) -> None:
+    """Byte trasferiti e tempo del server per `/code_reviewer`: pagina intera contro risposta compatta.
+
+        Il codice inviato è formato dai moduli del progetto concatenati fino a `--lines` righe; la revisione
+        simulata aggiunge un commento ogni `--every` righe (metà in fondo alla riga, metà su una riga propria),
+        così da non dipendere dal backend. Per ogni modalità e codifica vengono riportati i byte della risposta,
+        il tempo mediano del server e il tempo di trasferimento stimato con la banda `--mbps`.
+        Vengono misurati anche i file statici della pagina alla prima visita (con impronta e `immutable`,
+        le visite successive non li richiedono più).
+    """
+    import app as web
+    from annotations import apply_review_diff
+    from compression import brotli
+
+    Config.HISTORY_PATH = ""
+    Config.REVIEW_CACHE_PATH = ""
+    Config.GEMINI_API_KEY, Config.GEMINI_API_BASE_URL = "benchmark", "http://127.0.0.1:9/generateContent"
+    Config.MODEL_NAME = Config.LOCAL_BASE_URL = None
+    # Moduli del progetto invece del corpus: i file del corpus sono brevi e ripeterli gonfierebbe la compressione
+    lines = []
+    for name in sorted(os.listdir(os.path.dirname(os.path.abspath(__file__)))):
+        if name.endswith(".py") and len(lines) < args.lines:
+            with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), name), encoding="utf-8") as f:
+                lines.extend(f.read().splitlines())
+    code = "\n".join(lines[:args.lines])
+    reviewed = ["```python"]
+    for number, line in enumerate(code.split("\n"), start=1):
+        if number % args.every == 0 and number % (2 * args.every):
+            reviewed.append(f"{line}  # BUG: ALTA - possibile problema alla riga {number}")
+        elif number % args.every == 0:
+            reviewed.append(f"{line[:len(line) - len(line.lstrip())]}# EXPLAIN: commento sulla riga {number}")
+            reviewed.append(line)
+        else:
+            reviewed.append(line)
+    reviewed = "\n".join(reviewed + ["```"])
+
+    class SimulatedService(web.LLMService):
+        def generate_code_review(self, code_snippet, review_type="bug_detection"):
+            return reviewed
+
+    web.LLMService = SimulatedService
+    client = web.app.test_client()
+    encodings = ["identity", "gzip"] + (["br"] if brotli is not None else [])
+    print(f"Codice: {len(code.splitlines())} righe, {len(code.encode('utf-8'))} byte; banda stimata {args.mbps} Mbit/s")
+    for mode in ("full", "diff"):
+        for encoding in encodings:
+            data = {"input_code": code, "review_type": "bug_detection", **({"response": "diff"} if mode == "diff" else {})}
+            times = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                response = client.post("/code_reviewer", data=data, headers={"Accept-Encoding": encoding})
+                times.append(time.perf_counter() - start)
+            size = len(response.get_data())
+            if mode == "diff" and encoding == "identity":
+                assert apply_review_diff(code, response.get_json()["ops"]) == reviewed
+            transfer = size * 8 / (args.mbps * 1e6)
+            print(f"{'pagina intera' if mode == 'full' else 'risposta compatta':18} {encoding:9} {size:9} byte  "
+                  f"server {summarize(times)['p50'] * 1000:7.1f} ms  trasferimento {transfer * 1000:7.1f} ms")
+
+    page = client.get("/").get_data(as_text=True)
+    urls = re.findall(r'(?:href|src)="(/assets/[^"]+)"', page)
+    for encoding in encodings:
+        total = sum(len(client.get(url, headers={"Accept-Encoding": encoding}).get_data()) for url in urls)
+        print(f"File statici alla prima visita ({len(urls)} file, {encoding}): {total} byte; alle visite successive: 0 richieste")
+
+
+class _RamblingGeminiHandler(BaseHTTPRequestHandler):
+    """Imita un modello che, dopo il codice annotato, continua con una lunga spiegazione.
+
+        Il codice del prompt viene ripetuto in un blocco ```python, seguito da una spiegazione lunga
+        `ramble` volte il codice, introdotta a turno da "**Spiegazione:**" (una delle sequenze di arresto)
+        o da "Modifiche apportate:" (che solo l'interruzione alla chiusura del blocco evita).
+        Ogni token costa `ms_per_token`; `maxOutputTokens` e `stopSequences` vengono rispettati come
+        farebbe Gemini, e con `:streamGenerateContent` la generazione si ferma quando il client chiude lo stream.
+    """
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    ms_per_token = 1.0
+    ramble = 2.0
+    calls = 0
+    lock = threading.Lock()
+
+    def _response_text(self, request: Dict) -> str:
+        prompt = request["contents"][0]["parts"][0]["text"]
+        code = prompt.rsplit("è:", 1)[-1].strip("\n")
+        with self.lock:
+            _RamblingGeminiHandler.calls += 1
+            header = "**Spiegazione:**" if self.calls % 2 else "Modifiche apportate:"
+        sentence = "La funzione è stata controllata riga per riga e le modifiche sono descritte qui. "
+        explanation = (sentence * (int(len(code) * self.ramble) // len(sentence) + 1))[:int(len(code) * self.ramble)]
+        text = f"```python\n{code}\n```\n\n{header}\n{explanation}"
+        config = request.get("generationConfig", {})
+        for stop in config.get("stopSequences", []):
+            if stop in text:
+                text = text[:text.index(stop)]
+        if "maxOutputTokens" in config:
+            text = text[:config["maxOutputTokens"] * 4]
+        return text
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        text = self._response_text(request)
+        prompt_tokens = estimate_tokens(request["contents"][0]["parts"][0]["text"])
+        if ":streamGenerateContent" not in self.path:
+            time.sleep(estimate_tokens(text) * self.ms_per_token / 1000)
+            body = json.dumps({
+                "candidates": [{"content": {"parts": [{"text": text}]}}],
+                "usageMetadata": {"promptTokenCount": prompt_tokens, "candidatesTokenCount": estimate_tokens(text)},
+            }).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        chunk_chars = 64  # 16 token per frammento
+        try:
+            for start in range(0, len(text), chunk_chars):
+                part = text[start:start + chunk_chars]
+                time.sleep(estimate_tokens(part) * self.ms_per_token / 1000)
+                event = {"candidates": [{"content": {"parts": [{"text": part}]}}],
+                         "usageMetadata": {"promptTokenCount": prompt_tokens,
+                                           "candidatesTokenCount": estimate_tokens(text[:start + chunk_chars])}}
+                self.wfile.write(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # il client ha chiuso lo stream: il "modello" smette di generare
+        self.close_connection = True
+
+    def log_message(self, format, *args):
+        pass
+
+
+def bench_generation(args: argparse.Namespace) -> None:
+    """Token generati e latenza per tipo di revisione, con e senza limiti di generazione e interruzione anticipata.
+
+        Il corpus viene revisionato tre volte (protocollo "echo"): senza impostazioni di generazione,
+        con i limiti per tipo di revisione (token massimi, sequenze di arresto, temperatura) e con i limiti
+        più l'interruzione alla chiusura del blocco di codice. Senza `--live` le chiamate vanno a un server
+        locale che imita un modello prolisso (vedi `_RamblingGeminiHandler`).
+    """
+    from generation import generation_stats
+    from llm_service import LLMService
+
+    corpus = list(iter_corpus(args.tests_dir))
+    Config.REVIEW_PROTOCOL = "echo"
+    Config.MICRO_BATCH_WINDOW_MS = 0
+    Config.REVIEW_CACHE_PATH = ""
+    Config.HISTORY_PATH = ""
+    Config.SCHEDULER_GEMINI_SLOTS = Config.SCHEDULER_OLLAMA_SLOTS = args.concurrency
+
+    server = None
+    if not args.live:
+        _RamblingGeminiHandler.ms_per_token = args.ms_per_token
+        _RamblingGeminiHandler.ramble = args.ramble
+        server = _FakeGeminiServer(("127.0.0.1", 0), _RamblingGeminiHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        Config.GEMINI_API_KEY = "benchmark"
+        Config.GEMINI_API_BASE_URL = f"http://127.0.0.1:{server.server_address[1]}/v1beta/models/simulato:generateContent"
+        Config.MODEL_NAME = Config.LOCAL_BASE_URL = None
+
+    def review(item):
+        number, review_type, code = item
+        service = LLMService()
+        start = time.perf_counter()
+        text = service.generate_code_review(code_snippet=code, review_type=review_type)
+        elapsed = time.perf_counter() - start
+        tokens = (service.last_usage or {}).get("output_tokens") or estimate_tokens(text)
+        return review_type, tokens, elapsed, is_error_response(text)
+
+    modes = (("senza limiti", False, False), ("limiti", True, False), ("limiti + interruzione", True, True))
+    results: Dict[str, Dict[str, List[Tuple[int, float]]]] = {}
+    for label, limits, early_stop in modes:
+        Config.GENERATION_LIMITS, Config.EARLY_STOP = limits, early_stop
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            outcomes = list(executor.map(review, corpus))
+        errors = sum(1 for outcome in outcomes if outcome[3])
+        results[label] = {}
+        for review_type, tokens, elapsed, _ in outcomes:
+            results[label].setdefault(review_type, []).append((tokens, elapsed))
+        print(f"--- {label}: {len(outcomes)} revisioni, {errors} errori ---")
+
+    if server:
+        server.shutdown()
+
+    baseline = results[modes[0][0]]
+    print(f"{'tipo di revisione':20} {'modalità':24} {'token medi':>10} {'riduzione':>10} {'latenza media':>14} {'risparmio':>10}")
+    for review_type in sorted(baseline):
+        base_tokens = sum(tokens for tokens, _ in baseline[review_type]) / len(baseline[review_type])
+        base_latency = sum(elapsed for _, elapsed in baseline[review_type]) / len(baseline[review_type])
+        for label, _, _ in modes:
+            values = results[label][review_type]
+            tokens = sum(value[0] for value in values) / len(values)
+            latency = sum(value[1] for value in values) / len(values)
+            print(f"{review_type:20} {label:24} {tokens:10.0f} {(base_tokens - tokens) / base_tokens:10.1%} "
+                  f"{latency * 1000:12.0f}ms {(base_latency - latency) * 1000:8.0f}ms")
+    print("Chiamate interrotte alla chiusura del blocco:",
+          {review_type: stats["early_stops"] for review_type, stats in generation_stats.snapshot().items()})
+
+
+def _project_functions() -> List[str]:
+    """Restituisce il codice delle funzioni (anche metodi) definite nei moduli del progetto."""
+    import ast
+
+    functions = []
+    folder = os.path.dirname(os.path.abspath(__file__))
+    for name in sorted(os.listdir(folder)):
+        if not name.endswith(".py"):
+            continue
+        with open(os.path.join(folder, name), encoding="utf-8") as f:
+            source = f.read()
+        for node in ast.walk(ast.parse(source)):
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                segment = ast.get_source_segment(source, node)
+                if segment and segment.count("\n") >= 3:
+                    functions.append(segment)
+    return functions
+
+
+def _near_copy(code: str, rng: random.Random, edit: bool) -> str:
+    """Una copia della funzione con i nomi rinominati e, con `edit`, una riga aggiunta."""
+    from semantic_cache import _TOKEN_RE, _normalize
+
+    # Solo i nomi vengono rinominati: stringhe e commenti sono token a sé e restano invariati
+    names = {token for token in _TOKEN_RE.findall(code) if _normalize(token) == "_" and re.fullmatch(r"[A-Za-z_]\w*", token)}
+    renames = {name: f"{name}_{rng.randrange(1000)}" for name in sorted(names) if rng.random() < 0.5}
+    code = _TOKEN_RE.sub(lambda match: renames.get(match.group(0), match.group(0)), code)
+    if edit:
+        lines = code.split("\n")
+        index = rng.randrange(1, len(lines))
+        indent = lines[index][:len(lines[index]) - len(lines[index].lstrip())]
+        lines.insert(index, f"{indent}print({rng.randrange(1000)})")
+        code = "\n".join(lines)
+    return code
+
+
+# Modifiche di una sola riga che la cache semantica non deve coprire con la revisione della funzione originale.
+_OPERATOR_CHANGES = [(" / ", " // "), (" == ", " != "), (" < ", " <= "), (" + ", " - "), (" and ", " or "), (" is ", " is not ")]
+_LITERAL_RE = re.compile(r"(?<![\w.])\d+(?![\w.])|\"[^\"\n]*\"|'[^'\n]*'")
+
+
+def _changed_copy(code: str, rng: random.Random, kind: str) -> Optional[str]:
+    """Una copia rinominata della funzione con un operatore ("operatori") o un letterale ("letterali") cambiato in una riga,
+    o None se la funzione non ne contiene."""
+    code = _near_copy(code, rng, edit=False)
+    lines = code.split("\n")
+    # Ogni modifica è (riga, inizio, fine, testo nuovo): la sostituzione avviene nel punto trovato, non altrove nella riga
+    if kind == "operatori":
+        choices = [(index, match.start(), match.end(), new) for index, line in enumerate(lines[1:], 1)
+                   if not line.lstrip().startswith("#") for old, new in _OPERATOR_CHANGES
+                   for match in re.finditer(re.escape(old), line)]
+    else:
+        choices = [(index, match.start(), match.end(),
+                    ("0" if match.group(0) == "1" else "1") if match.group(0)[0].isdigit() else repr(match.group(0)[1:-1] + "?"))
+                   for index, line in enumerate(lines[1:], 1) if not line.lstrip().startswith("#")
+                   for match in _LITERAL_RE.finditer(line)]
+    if not choices:
+        return None
+    index, start, end, new = rng.choice(choices)
+    lines[index] = lines[index][:start] + new + lines[index][end:]
+    return "\n".join(lines)
+
+
+def bench_semantic(args: argparse.Namespace) -> None:
+    """Latenza di ricerca e qualità della cache semantica con `--entries` funzioni indicizzate.
+
+        L'indice viene riempito con copie rinominate delle funzioni del progetto (il 10% delle funzioni
+        resta fuori, per misurare i falsi riusi). Vengono misurati: tempo di embedding e di inserimento,
+        latenza della ricerca (solo prodotto e top-k) e della ricerca completa (embedding, ricerca e
+        adattamento delle segnalazioni), riusi corretti delle copie rinominate e riusi di funzioni diverse
+        o di copie con una riga aggiunta, un operatore o un letterale cambiato, che devono essere rinviate
+        al modello. Infine l'indice viene riempito con un limite di memoria (`--max-mb`).
+    """
+    from semantic_cache import EMBEDDING_DIM, SemanticCache, embed
+
+    args.dim = args.dim or EMBEDDING_DIM
+    rng = random.Random(0)
+    functions = _project_functions()
+    rng.shuffle(functions)
+    held_out = functions[:len(functions) // 10]
+    indexed = functions[len(functions) // 10:]
+    group = "benchmark|bug_detection"
+
+    cache = SemanticCache(threshold=args.threshold, max_bytes=1 << 40, dim=args.dim)
+    source_of = {}
+    fill_time = 0.0
+    for number in range(args.entries):
+        source = number % len(indexed)
+        code = indexed[source] if number < len(indexed) else _near_copy(indexed[source], rng, edit=False)
+        source_of[code] = source
+        lines = code.split("\n")
+        review = "\n".join(lines[:-1] + [lines[-1] + "  # BUG: [MEDIA] segnalazione simulata"])
+        start = time.perf_counter()
+        cache.add(code, group, review)
+        fill_time += time.perf_counter() - start
+    print(f"Funzioni del progetto: {len(functions)} ({len(held_out)} escluse dall'indice); dimensione {args.dim}")
+    print(f"Inserimento di {len(cache)} voci: {fill_time:.1f}s ({fill_time / len(cache) * 1e6:.0f} µs/voce), "
+          f"memoria stimata {cache.snapshot()['bytes'] / 2 ** 20:.0f} MB")
+
+    queries = []
+    for index in range(args.queries):
+        source = rng.randrange(len(indexed))
+        queries.append(("copie modificate" if index % 2 else "copie rinominate", source,
+                        _near_copy(indexed[source], rng, edit=index % 2 == 1)))
+    for kind in ("operatori", "letterali"):
+        for _ in range(args.queries // 2):
+            source = rng.randrange(len(indexed))
+            query = _changed_copy(indexed[source], rng, kind)
+            if query is not None:
+                queries.append((f"{kind} cambiati", source, query))
+    queries += [("funzioni diverse", None, code) for code in held_out[:args.queries]]
+    embed_times, search_times, lookup_times = [], [], []
+    outcomes = {kind: [0, 0, 0] for kind in ("copie rinominate", "copie modificate", "operatori cambiati",
+                                            "letterali cambiati", "funzioni diverse")}
+    for kind, source, query in queries:
+        start = time.perf_counter()
+        vector = embed(query, args.dim)
+        embed_times.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        best = cache.search(vector, group, k=args.k)
+        search_times.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        hit = cache.lookup(query, group, k=args.k) is not None
+        lookup_times.append(time.perf_counter() - start)
+
+        outcomes[kind][0] += 1
+        outcomes[kind][1] += hit
+        # Riuso corretto: la voce trovata è una copia della stessa funzione (o di una identica)
+        outcomes[kind][2] += hit and source is not None and indexed[source_of[best[0][1]["code"]]] == indexed[source]
+
+    _print_summary("Embedding", [value * 1000 for value in embed_times], "ms")
+    _print_summary(f"Ricerca top-{args.k}", [value * 1000 for value in search_times], "ms")
+    _print_summary("Ricerca con adattamento", [value * 1000 for value in lookup_times], "ms")
+    for kind, (total, hits, correct) in outcomes.items():
+        print(f"{kind:18} {total:5} ricerche  riusi {hits / max(total, 1):6.1%}  dalla stessa funzione {correct / max(hits, 1):6.1%}")
+    print("Solo le copie rinominate devono essere riusate: le altre vanno rinviate al modello.")
+
+    bounded = SemanticCache(threshold=args.threshold, max_bytes=int(args.max_mb * 2 ** 20), dim=args.dim)
+    for number in range(args.entries):
+        bounded.add(_near_copy(indexed[number % len(indexed)], rng, edit=False), group, "")
+    stats = bounded.snapshot()
+    print(f"Limite di {args.max_mb:.0f} MB: {stats['entries']} voci, {stats['bytes'] / 2 ** 20:.1f} MB, {stats['evicted']} eliminate")
+
+
+def bench_bulk(args: argparse.Namespace) -> None:
+    """Throughput di una revisione dell'intero corpus: chiamate `generateContent` una alla volta contro l'API batch.
+
+        Il percorso per richiesta revisiona gli input uno dopo l'altro, come `test.py`; quello batch invia
+        tutto il corpus in job e ne attende la conclusione (vedi `batch_mode.run_batch_reviews`). Senza `--live`
+        entrambi usano il server locale `fake_batch_server.FakeBatchServer`, con latenza per chiamata, attesa in
+        coda dei job e costo per richiesta nei job configurabili.
+    """
+    from batch_mode import run_batch_reviews
+    from fake_batch_server import FakeBatchServer
+    from llm_service import LLMService
+
+    corpus = list(iter_corpus(args.tests_dir))
+    Config.REVIEW_PROTOCOL = "echo"
+    Config.MICRO_BATCH_WINDOW_MS = 0
+    Config.REVIEW_CACHE_PATH = ""
+    Config.HISTORY_PATH = ""
+
+    server = None
+    if not args.live:
+        server = FakeBatchServer(request_latency=args.request_latency, queue_delay=args.queue_delay,
+                                 per_request=args.per_request, workers=args.batch_workers).start()
+        Config.GEMINI_API_KEY = "benchmark"
+        Config.GEMINI_API_BASE_URL = server.url
+        Config.MODEL_NAME = Config.LOCAL_BASE_URL = None
+
+    start = time.perf_counter()
+    reviews = [LLMService(priority="batch").generate_code_review(code_snippet=code, review_type=review_type)
+               for _, review_type, code in corpus]
+    sequential_time = time.perf_counter() - start
+    sequential_errors = sum(1 for review in reviews if is_error_response(review))
+
+    start = time.perf_counter()
+    results, stats = run_batch_reviews(corpus, args.max_requests, args.poll_interval, verbose=False)
+    batch_time = time.perf_counter() - start
+
+    print(f"Corpus: {len(corpus)} input")
+    print(f"{'per richiesta':14} tempo {sequential_time:7.2f}s  throughput {len(corpus) / sequential_time:7.1f} revisioni/s  "
+          f"chiamate HTTP {len(corpus)}  errori {sequential_errors}")
+    print(f"{'batch':14} tempo {batch_time:7.2f}s  throughput {len(corpus) / batch_time:7.1f} revisioni/s  "
+          f"chiamate HTTP {stats['jobs'] + stats['polls']} ({stats['jobs']} job, {stats['polls']} controlli)  errori {stats['errors']}")
+    if server:
+        server.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark delle modalità di revisione sul corpus tests/.")
+    parser.add_argument("--tests-dir", default=TESTS_DIR, help="Cartella con i file InputN.py.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    cascade = subparsers.add_parser("cascade", help="Tasso di escalation, latenza e costo della modalità cascata.")
+    cascade.add_argument("--replay", nargs=2, metavar=("LOCALE", "REMOTO"),
+                         help="Simula la cascata sui file di risultati del modello locale e di quello remoto.")
+    cascade.add_argument("--threshold", type=float, default=None, help="Soglia di confidenza per l'escalation.")
+    cascade.add_argument("--prompt-tokens", type=int, default=500, help="Token stimati delle istruzioni del prompt.")
+    cascade.add_argument("--cost-per-1k", type=float, default=0.0025, help="Costo in dollari per 1000 token di Gemini.")
+    cascade.set_defaults(handler=bench_cascade)
+
+    protocol = subparsers.add_parser("protocol", help="Token di output e tempo: protocollo echo contro annotazioni.")
+    protocol.add_argument("--replay", metavar="RISULTATI",
+                          help="Stima il risparmio a partire da un file di risultati registrato con il protocollo echo.")
+    protocol.set_defaults(handler=bench_protocol)
+
+    docstrings = subparsers.add_parser("docstrings", help="Unità saltate e token risparmiati dall'inserimento locale delle docstring.")
+    docstrings.add_argument("--live", action="store_true", help="Revisiona il corpus con il backend configurato.")
+    docstrings.set_defaults(handler=bench_docstrings)
+
+    microbatch = subparsers.add_parser("microbatch", help="Throughput con e senza micro-batching delle richieste concorrenti.")
+    microbatch.add_argument("--window-ms", type=float, default=30.0, help="Finestra di raccolta del micro-batcher.")
+    microbatch.add_argument("--max-snippets", type=int, default=8, help="Numero massimo di snippet per micro-batch.")
+    microbatch.add_argument("--max-tokens", type=int, default=2000, help="Budget di token del codice per micro-batch.")
+    microbatch.add_argument("--concurrency", type=int, default=16, help="Richieste inviate in parallelo.")
+    microbatch.add_argument("--simulate", type=float, metavar="LATENZA_MS", default=None,
+                            help="Usa un backend simulato con questa latenza fissa per chiamata.")
+    microbatch.add_argument("--ms-per-token", type=float, default=0.5, help="Costo simulato per token (con --simulate).")
+    microbatch.add_argument("--backend-slots", type=int, default=2,
+                            help="Chiamate servite contemporaneamente dal backend simulato (con --simulate).")
+    microbatch.add_argument("--drop-rate", type=float, default=0.0,
+                            help="Frazione di snippet omessi dalle risposte simulate, per esercitare i tentativi singoli.")
+    microbatch.set_defaults(handler=bench_microbatch)
+
+    concurrency = subparsers.add_parser("concurrency", help="Revisioni concorrenti: LLMService sincrono contro AsyncLLMService.")
+    concurrency.add_argument("--requests", type=int, default=500, help="Numero di revisioni da eseguire.")
+    concurrency.add_argument("--concurrency", type=int, default=200, help="Revisioni in corso contemporaneamente.")
+    concurrency.add_argument("--simulate", type=float, metavar="LATENZA_MS", default=200.0,
+                             help="Latenza del server Gemini simulato.")
+    concurrency.add_argument("--live", action="store_true", help="Usa il backend configurato invece del server simulato.")
+    concurrency.set_defaults(handler=bench_concurrency)
+
+    scheduler = subparsers.add_parser("scheduler", help="Attesa delle richieste interattive durante un'ondata di richieste batch.")
+    scheduler.add_argument("--slots", type=int, default=2, help="Chiamate contemporanee concesse al backend simulato.")
+    scheduler.add_argument("--service-ms", type=float, default=50.0, help="Durata simulata di ogni chiamata.")
+    scheduler.add_argument("--batch", type=int, default=200, help="Richieste batch del client A.")
+    scheduler.add_argument("--interactive", type=int, default=20, help="Richieste interattive del client C.")
+    scheduler.set_defaults(handler=bench_scheduler)
+
+    symbols = subparsers.add_parser("symbols", help="Costruzione dell'indice dei simboli e token di contesto aggiunti ai prompt.")
+    symbols.add_argument("--root", default=".", help="La cartella del progetto da indicizzare.")
+    symbols.add_argument("--budget", type=int, default=400, help="Budget di token del contesto per file.")
+    symbols.set_defaults(handler=bench_symbols)
+
+    payload = subparsers.add_parser("payload", help="Byte trasferiti da /code_reviewer: pagina intera contro risposta compatta, con compressione.")
+    payload.add_argument("--lines", type=int, default=2000, help="Righe del codice inviato.")
+    payload.add_argument("--every", type=int, default=10, help="Un commento simulato ogni quante righe.")
+    payload.add_argument("--repeat", type=int, default=5, help="Richieste per ogni combinazione.")
+    payload.add_argument("--mbps", type=float, default=10.0, help="Banda usata per stimare il tempo di trasferimento.")
+    payload.set_defaults(handler=bench_payload)
+
+    generation = subparsers.add_parser("generation", help="Token generati e latenza per tipo di revisione, con limiti e interruzione anticipata.")
+    generation.add_argument("--concurrency", type=int, default=8, help="Revisioni in corso contemporaneamente.")
+    generation.add_argument("--ms-per-token", type=float, default=20.0,
+                            help="Costo simulato per token generato (20 ms: circa 50 token/s, come un modello locale).")
+    generation.add_argument("--ramble", type=float, default=2.0,
+                            help="Lunghezza della spiegazione simulata dopo il codice, in multipli del codice.")
+    generation.add_argument("--live", action="store_true", help="Usa il backend configurato invece del server simulato.")
+    generation.set_defaults(handler=bench_generation)
+
+    semantic = subparsers.add_parser("semantic", help="Latenza di ricerca e riusi della cache semantica delle funzioni.")
+    semantic.add_argument("--entries", type=int, default=100000, help="Funzioni indicizzate.")
+    semantic.add_argument("--queries", type=int, default=500,
+                          help="Ricerche di copie (metà rinominate, metà con una riga aggiunta), più altrettante con un operatore o un letterale cambiato.")
+    semantic.add_argument("--dim", type=int, default=None, help="Dimensione degli embedding (predefinita: EMBEDDING_DIM).")
+    semantic.add_argument("--k", type=int, default=5, help="Vicini restituiti dalla ricerca.")
+    semantic.add_argument("--threshold", type=float, default=0.95, help="Similarità minima per il riuso.")
+    semantic.add_argument("--max-mb", type=float, default=16.0, help="Limite di memoria per la prova di eliminazione.")
+    semantic.set_defaults(handler=bench_semantic)
+
+    bulk = subparsers.add_parser("bulk", help="Throughput del corpus: una chiamata per input contro l'API batch di Gemini.")
+    bulk.add_argument("--request-latency", type=float, default=0.3, help="Secondi per chiamata del server simulato.")
+    bulk.add_argument("--queue-delay", type=float, default=2.0, help="Secondi in coda di ogni job simulato.")
+    bulk.add_argument("--per-request", type=float, default=0.02, help="Secondi per richiesta nei job simulati.")
+    bulk.add_argument("--batch-workers", type=int, default=8, help="Richieste di un job simulato eseguite in parallelo.")
+    bulk.add_argument("--max-requests", type=int, default=1000, help="Richieste massime per job.")
+    bulk.add_argument("--poll-interval", type=float, default=0.5, help="Primo intervallo tra i controlli dello stato.")
+    bulk.add_argument("--live", action="store_true", help="Usa il Gemini configurato invece del server simulato.")
+    bulk.set_defaults(handler=bench_bulk)
+
+    args = parser.parse_args()
+    args.handler(args)
+
+
+if __name__ == "__main__":
+    main()
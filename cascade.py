@@ -0,0 +1,122 @@
+import re
+import threading
+from typing import Dict, List
+
+from findings_parser import REVIEW_TYPE_TAGS, parse_findings, strip_annotations
+
+
+# Prefissi dei messaggi di errore che `LLMService` restituisce al posto della revisione.
+ERROR_PREFIXES = (
+    "Errore",
+    "Timeout",
+    "Nessuna revisione",
+    "Nessuna risposta",
+    "Si è verificato",
+)
+
+_TAG_LIKE_RE = re.compile(r"#\s*[A-Z][A-Z0-9_]{2,}\s*:")
+
+
+def is_error_response(text: str) -> bool:
+    """Indica se il testo restituito da `LLMService` è un messaggio di errore invece di una revisione."""
+    return text.lstrip().startswith(ERROR_PREFIXES)
+
+
+def review_confidence(code: str, review: str, review_type: str, static_findings: List[Dict]) -> Dict:
+    """Stima la confidenza di una revisione generata da un modello economico.
+
+        La confidenza combina tre segnali, ciascuno tra 0 e 1:
+
+        - "preservation": quanto l'output conserva il codice originale, cioè il minimo tra la
+          frazione di righe originali presenti nell'output e la frazione di righe di codice
+          dell'output presenti nell'originale (dopo aver rimosso i commenti annotati);
+        - "parsing": la frazione di commenti in stile tag (`# XYZ:`) riconosciuti come tag
+          pertinenti al `review_type`;
+        - "agreement": la frazione di segnalazioni dei controlli statici pertinenti al
+          `review_type` che il modello ha segnalato sulla stessa riga (±1).
+
+        Args:
+            code (str): Lo snippet di codice originale.
+            review (str): La revisione generata dal modello.
+            review_type (str): Il tipo di revisione richiesto.
+            static_findings (List[dict]): Le segnalazioni di `static_checks.run_static_checks`.
+
+        Returns:
+            dict: I tre segnali e la "confidence" complessiva (media pesata 0.4/0.3/0.3).
+    """
+    if not review.strip() or is_error_response(review):
+        return {"preservation": 0.0, "parsing": 0.0, "agreement": 0.0, "confidence": 0.0}
+
+    parsed = parse_findings(review)
+    output_lines = [strip_annotations(line).strip() for line in parsed["code"].splitlines()]
+    output_code = [line for line in output_lines if line and not line.startswith("#")]
+    original_lines = [line.strip() for line in code.splitlines() if line.strip()]
+    original_set, output_set = set(original_lines), set(output_lines)
+    kept = sum(line in output_set for line in original_lines) / len(original_lines) if original_lines else 1.0
+    # Le docstring aggiunte non sono codice estraneo: per "doc_strings_add" conta solo la conservazione
+    added = 1.0 if review_type == "doc_strings_add" or not output_code else \
+        sum(line in original_set for line in output_code) / len(output_code)
+    preservation = min(kept, added)
+
+    relevant_tags = REVIEW_TYPE_TAGS.get(review_type, set())
+    relevant = [finding for finding in parsed["findings"] if finding["tag"] in relevant_tags]
+    tag_like = sum(len(_TAG_LIKE_RE.findall(line)) for line in parsed["code"].splitlines())
+    parsing = min(len(relevant) / tag_like, 1.0) if tag_like else 1.0
+
+    expected = [finding for finding in static_findings if finding["tag"] in relevant_tags]
+    reported_lines = {finding["line"] for finding in relevant}
+    if expected:
+        agreement = sum(
+            any(abs(finding["line"] - line) <= 1 for line in reported_lines) for finding in expected
+        ) / len(expected)
+    elif review_type == "syntax_revision" and relevant:
+        # Il parser di Python non trova errori: gli errori di sintassi segnalati dal modello sono sospetti
+        agreement = 0.5
+    else:
+        agreement = 1.0
+
+    confidence = 0.4 * preservation + 0.3 * parsing + 0.3 * agreement
+    return {"preservation": preservation, "parsing": parsing, "agreement": agreement, "confidence": confidence}
+
+
+class CascadeStats:
+    """Contatori condivisi delle revisioni eseguite in modalità cascata.
+
+        Le istanze di `LLMService` vengono create a ogni richiesta, quindi le statistiche
+        sono raccolte in un oggetto a livello di modulo protetto da un lock.
+
+        Attributes:
+            reviews (int): Il numero di revisioni eseguite in cascata.
+            escalated (int): Il numero di revisioni inoltrate al modello più potente.
+            local_time (float): Il tempo totale (secondi) speso sul modello locale.
+            remote_time (float): Il tempo totale (secondi) speso sul modello remoto.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.reviews = 0
+        self.escalated = 0
+        self.local_time = 0.0
+        self.remote_time = 0.0
+
+    def record(self, escalated: bool, local_time: float, remote_time: float) -> None:
+        """Registra l'esito di una revisione in cascata."""
+        with self._lock:
+            self.reviews += 1
+            self.escalated += int(escalated)
+            self.local_time += local_time
+            self.remote_time += remote_time
+
+    def snapshot(self) -> Dict:
+        """Restituisce una copia dei contatori, con il tasso di escalation."""
+        with self._lock:
+            return {
+                "reviews": self.reviews,
+                "escalated": self.escalated,
+                "escalation_rate": self.escalated / self.reviews if self.reviews else 0.0,
+                "local_time": self.local_time,
+                "remote_time": self.remote_time,
+            }
+
+
+cascade_stats = CascadeStats()
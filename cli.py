@@ -0,0 +1,262 @@
+import argparse
+import ast
+import io
+import json
+import os
+import re
+import subprocess
+import sys
+import textwrap
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from config import Config
+from findings_parser import SEVERITY_LEVELS
+from project_review import ProjectFile, discover_directory, review_file
+
+# Codici di uscita: nessuna segnalazione bloccante, segnalazioni bloccanti, errori (configurazione o revisioni fallite).
+EXIT_OK = 0
+EXIT_FINDINGS = 1
+EXIT_ERROR = 2
+
+_HUNK_RE = re.compile(r"^@@ -\d+(?:,\d+)? \+(\d+)(?:,(\d+))? @@")
+
+
+def _git(root: str, *args: str) -> Optional[str]:
+    try:
+        completed = subprocess.run(["git", "-C", root, *args], capture_output=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return completed.stdout.decode("utf-8", errors="replace")
+
+
+def repository_root() -> str:
+    """Restituisce la radice del repository git, o la cartella corrente se non è un repository."""
+    root = _git(os.getcwd(), "rev-parse", "--show-toplevel")
+    return root.strip() if root else os.getcwd()
+
+
+def staged_files(root: str) -> List[str]:
+    """Restituisce i file Python aggiunti, copiati, modificati o rinominati nell'area di staging (relativi alla radice)."""
+    output = _git(root, "diff", "--cached", "--name-only", "--diff-filter=ACMR", "--", "*.py") or ""
+    return [line for line in output.splitlines() if line]
+
+
+def changed_lines(root: str, paths: List[str], staged: bool) -> Dict[str, List[int]]:
+    """Restituisce, per file, le righe aggiunte o modificate secondo `git diff -U0`.
+
+        Args:
+            root (str): La radice del repository.
+            paths (List[str]): I file da confrontare, relativi alla radice del repository.
+            staged (bool): True per confrontare l'area di staging con HEAD, False per la copia di lavoro.
+
+        Returns:
+            Dict[str, List[int]]: Le righe modificate per file; i file senza modifiche non sono presenti.
+            Per le sole cancellazioni viene indicata la riga successiva al punto di cancellazione.
+    """
+    output = _git(root, "diff", "-U0", "--no-color", "--no-ext-diff", *(["--cached"] if staged else ["HEAD"]), "--", *paths) or ""
+    changes: Dict[str, List[int]] = {}
+    current = None
+    for line in output.splitlines():
+        if line.startswith("+++ "):
+            current = line[6:] if line.startswith("+++ b/") else None
+        elif current and line.startswith("@@"):
+            match = _HUNK_RE.match(line)
+            if match:
+                start, count = int(match.group(1)), int(match.group(2) or 1)
+                changes.setdefault(current, []).extend(range(start, start + count) if count else [max(start, 1)])
+    return changes
+
+
+def changed_units(code: str, lines: List[int]) -> List[Tuple[int, int]]:
+    """Individua le porzioni di codice da rivedere per le righe modificate.
+
+        Per ogni riga modificata viene scelta la funzione (o il metodo) più interna che la contiene
+        (decoratori compresi) o, fuori dalle funzioni, l'istruzione di primo livello o del corpo di
+        una classe; le righe di una classe fuori da queste porzioni (intestazione, decoratori, commenti
+        tra i metodi) fanno rivedere l'intera classe. Le porzioni sovrapposte o adiacenti vengono unite. Se il codice non è analizzabile
+        con `ast`, viene restituito l'intero file, perché gli errori di sintassi vanno comunque segnalati.
+
+        Args:
+            code (str): Il codice del file.
+            lines (List[int]): Le righe modificate (a partire da 1).
+
+        Returns:
+            List[Tuple[int, int]]: Gli intervalli di righe (inizio e fine inclusi), ordinati.
+    """
+    total = len(code.splitlines())
+    try:
+        tree = ast.parse(code)
+    except (SyntaxError, ValueError):
+        return [(1, max(total, 1))]
+
+    candidates = []
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            candidates.append(node)
+    for node in tree.body:
+        if isinstance(node, ast.ClassDef):
+            candidates.append(node)
+            candidates.extend(child for child in node.body if not isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef)))
+        elif not isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            candidates.append(node)
+
+    spans = []
+    for node in candidates:
+        start = min([node.lineno] + [decorator.lineno for decorator in getattr(node, "decorator_list", [])])
+        spans.append((start, node.end_lineno or node.lineno))
+
+    ranges = []
+    for line in sorted(set(lines)):
+        containing = [span for span in spans if span[0] <= line <= span[1]]
+        if containing:
+            ranges.append(min(containing, key=lambda span: span[1] - span[0]))
+
+    merged: List[Tuple[int, int]] = []
+    for start, end in sorted(set(ranges)):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _snippet_file(path: str, code: str, start: int, end: int) -> ProjectFile:
+    """Crea un `ProjectFile` con le righe `start`-`end` del file, senza indentazione comune (es. un metodo)."""
+    data = textwrap.dedent("\n".join(code.splitlines()[start - 1:end])).encode("utf-8")
+    return ProjectFile(path, len(data), f"{path}:{start}-{end}", lambda: io.BytesIO(data))
+
+
+def collect_work(args: argparse.Namespace, root: str) -> Tuple[List[Tuple[ProjectFile, int]], List[str]]:
+    """Prepara le porzioni di codice da revisionare con il loro scostamento di riga nel file.
+
+        Returns:
+            tuple: Le coppie (file o porzione, righe da aggiungere ai numeri di riga delle segnalazioni)
+            e i messaggi dei file che non è stato possibile leggere.
+    """
+    problems = []
+    sources: Dict[str, str] = {}
+    if args.staged:
+        for path in staged_files(root):
+            content = _git(root, "show", f":{path}")
+            if content is None:
+                problems.append(f"{path}: impossibile leggere la versione in staging")
+            else:
+                sources[path] = content
+    for target in args.paths:
+        if os.path.isdir(target):
+            targets = [os.path.join(target, *project_file.path.split("/")) for project_file in discover_directory(target)]
+        else:
+            targets = [target]
+        for file_path in targets:
+            # Percorsi relativi alla radice, come quelli di git e dell'indice dei simboli
+            path = os.path.relpath(os.path.abspath(file_path), root).replace(os.sep, "/")
+            try:
+                with open(file_path, "r", encoding="utf-8", errors="replace") as f:
+                    sources[path] = f.read()
+            except OSError as e:
+                problems.append(f"{file_path}: {e}")
+
+    changes = changed_lines(root, sorted(sources), args.staged) if args.changed_only else {}
+    tracked = set((_git(root, "ls-files") or "").splitlines()) if args.changed_only else set()
+
+    work = []
+    for path, code in sources.items():
+        if not args.changed_only or path not in tracked:
+            # File interi, anche per i file nuovi non ancora tracciati
+            work.append((ProjectFile(path, len(code.encode("utf-8")), path, lambda data=code.encode("utf-8"): io.BytesIO(data)), 0))
+            continue
+        for start, end in changed_units(code, changes.get(path, [])):
+            work.append((_snippet_file(path, code, start, end), start - 1))
+    return work, problems
+
+
+def blocking(finding: Dict, fail_on: str) -> bool:
+    """Indica se una segnalazione ha severità pari o superiore a `fail_on` ("none" non blocca mai)."""
+    if fail_on == "none":
+        return False
+    severity = finding.get("severity")
+    rank = SEVERITY_LEVELS.index(severity) if severity in SEVERITY_LEVELS else len(SEVERITY_LEVELS)
+    return rank <= SEVERITY_LEVELS.index(fail_on)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Revisiona file Python con l'LLM configurato (per hook di pre-commit e pipeline di CI).")
+    parser.add_argument("paths", nargs="*", help="File o cartelle da revisionare.")
+    parser.add_argument("--staged", action="store_true", help="Revisiona i file Python nell'area di staging di git.")
+    parser.add_argument("--changed-only", action="store_true",
+                        help="Revisiona solo le funzioni e le istruzioni modificate (git diff -U0).")
+    parser.add_argument("--review-type", default="bug_detection",
+                        choices=["bug_detection", "syntax_revision", "style_suggestions", "doc_strings_add"])
+    parser.add_argument("--workers", type=int, default=Config.PROJECT_REVIEW_WORKERS, help="Revisioni in parallelo.")
+    parser.add_argument("--fail-on", default="ALTA", choices=[*SEVERITY_LEVELS, "none"],
+                        help="Severità minima che fa terminare il comando con codice 1.")
+    parser.add_argument("--format", default="text", choices=["text", "json"], help="Formato dell'output.")
+    parser.add_argument("--no-context", action="store_true", help="Non aggiunge ai prompt le firme dell'indice dei simboli.")
+    args = parser.parse_args(argv)
+
+    if not args.paths and not args.staged:
+        parser.error("indica dei file o delle cartelle, oppure --staged")
+
+    # Importato dopo la lettura degli argomenti, così che --help sia immediato
+    from llm_service import LLMService
+    from symbol_index import INDEX_FILENAME, SymbolIndex
+
+    try:
+        LLMService()
+    except ValueError as e:
+        print(f"Errore di configurazione del servizio LLM: {e}", file=sys.stderr)
+        return EXIT_ERROR
+
+    root = repository_root()
+    work, problems = collect_work(args, root)
+    symbol_index = None
+    if not args.no_context and work:
+        # Nei repository l'indice sta nella cartella .git, così non compare tra i file non tracciati
+        git_dir = (_git(root, "rev-parse", "--absolute-git-dir") or "").strip()
+        symbol_index = SymbolIndex(os.path.join(git_dir or root, INDEX_FILENAME))
+        symbol_index.update(discover_directory(root))
+
+    def service_factory():
+        return LLMService(priority="batch", tenant="cli", symbol_index=symbol_index)
+
+    with ThreadPoolExecutor(max_workers=max(1, args.workers)) as executor:
+        results = list(executor.map(
+            lambda item: review_file(item[0], args.review_type, service_factory, Config.PROJECT_REVIEW_MAX_FILE_BYTES), work))
+
+    findings = []
+    errors = list(problems)
+    for (project_file, offset), result in zip(work, results):
+        if result["status"] == "error":
+            errors.append(f"{project_file.path}: {result['error']}")
+        for finding in result.get("findings", []):
+            findings.append({"path": project_file.path, **finding, "line": finding["line"] + offset})
+    findings.sort(key=lambda finding: (finding["path"], finding["line"]))
+    blocking_count = sum(blocking(finding, args.fail_on) for finding in findings)
+    exit_code = EXIT_FINDINGS if blocking_count else (EXIT_ERROR if errors else EXIT_OK)
+
+    if args.format == "json":
+        json.dump({
+            "review_type": args.review_type,
+            "reviewed": len(work),
+            "cached": sum(result["status"] == "cached" for result in results),
+            "findings": findings,
+            "blocking": blocking_count,
+            "errors": errors,
+            "exit_code": exit_code,
+        }, sys.stdout, ensure_ascii=False, indent=2)
+        print()
+    else:
+        for finding in findings:
+            rule = f" {finding['rule']}" if finding.get("rule") else ""
+            print(f"{finding['path']}:{finding['line']}: {finding['severity']} {finding['tag']}{rule} {finding['message']}")
+        for error in errors:
+            print(f"Errore: {error}", file=sys.stderr)
+        print(f"{len(work)} porzioni revisionate, {len(findings)} segnalazioni ({blocking_count} bloccanti), {len(errors)} errori.",
+              file=sys.stderr)
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
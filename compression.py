@@ -0,0 +1,91 @@
+import gzip
+from typing import Iterable, Optional
+
+try:
+    import brotli
+except ImportError:  # dipendenza facoltativa: senza `brotli` le risposte vengono compresse solo con gzip
+    brotli = None
+
+# Tipi di contenuto compressi e dimensione minima (in byte) sotto la quale la compressione non conviene.
+COMPRESSIBLE_TYPES = ("text/", "application/json", "application/javascript", "image/svg+xml")
+MIN_COMPRESS_BYTES = 512
+
+
+def is_compressible(mimetype: Optional[str], size: int) -> bool:
+    """Indica se conviene comprimere un contenuto del tipo e della dimensione indicati."""
+    return size >= MIN_COMPRESS_BYTES and bool(mimetype) and mimetype.startswith(COMPRESSIBLE_TYPES)
+
+
+def choose_encoding(accept_encoding: Optional[str], available: Iterable[str] = ("br", "gzip")) -> Optional[str]:
+    """Sceglie la codifica della risposta dall'intestazione Accept-Encoding del client.
+
+        Brotli ("br") è preferito a gzip se il client lo accetta e il pacchetto `brotli` è installato;
+        le codifiche con `q=0` sono escluse, anche se il client accetta "*".
+
+        Args:
+            accept_encoding (Optional[str]): L'intestazione Accept-Encoding della richiesta.
+            available (Iterable[str], optional): Le codifiche disponibili, in ordine di preferenza
+                (es. quelle già calcolate per un file statico).
+
+        Returns:
+            Optional[str]: "br", "gzip" o None se il client non accetta nessuna delle codifiche disponibili.
+    """
+    accepted, rejected = set(), set()
+    for part in (accept_encoding or "").split(","):
+        name, _, params = part.strip().partition(";")
+        quality = params.strip()
+        if quality.startswith("q="):
+            try:
+                if float(quality[2:]) <= 0:
+                    # Una codifica esclusa esplicitamente non viene scelta neanche tramite "*"
+                    rejected.add(name.strip().lower())
+                    continue
+            except ValueError:
+                continue
+        accepted.add(name.strip().lower())
+    for encoding in available:
+        if encoding in rejected:
+            continue
+        if (encoding in accepted or "*" in accepted) and (encoding != "br" or brotli is not None):
+            return encoding
+    return None
+
+
+def compress(data: bytes, encoding: str, static: bool = False) -> bytes:
+    """Comprime `data` con la codifica indicata.
+
+        Args:
+            data (bytes): Il contenuto da comprimere.
+            encoding (str): "br" o "gzip".
+            static (bool, optional): True per i file statici, compressi una sola volta al livello massimo;
+                le risposte dinamiche usano un livello più veloce.
+    """
+    if encoding == "br":
+        return brotli.compress(data, quality=11 if static else 5)
+    return gzip.compress(data, compresslevel=9 if static else 6, mtime=0)
+
+
+def compress_response(response, accept_encoding: Optional[str]):
+    """Comprime il corpo di una risposta Flask, se il client lo accetta e il contenuto lo consente.
+
+        Le risposte in streaming (NDJSON, SSE) e i file inviati direttamente non vengono toccati,
+        così come quelle già codificate o troppo piccole.
+
+        Args:
+            response (flask.Response): La risposta da comprimere.
+            accept_encoding (Optional[str]): L'intestazione Accept-Encoding della richiesta.
+
+        Returns:
+            flask.Response: La stessa risposta, eventualmente compressa.
+    """
+    if response.direct_passthrough or response.is_streamed or response.status_code < 200 or response.status_code in (204, 304):
+        return response
+    if "Content-Encoding" in response.headers or not is_compressible(response.mimetype, response.content_length or 0):
+        return response
+    response.vary.add("Accept-Encoding")
+    encoding = choose_encoding(accept_encoding)
+    if encoding is None:
+        return response
+    response.set_data(compress(response.get_data(), encoding))
+    response.headers["Content-Encoding"] = encoding
+    return response
@@ -30,6 +30,97 @@ class Config:
             LOCAL_BASE_URL (str o None): L'URL di base per un servizio locale o un endpoint di sviluppo. 
             Viene recuperato dalla variabile d'ambiente 'LOCAL_BASE_URL'. Sarà None se la variabile non è impostata.
 
+            CASCADE_MODE (bool): Se True e sono configurati sia Ollama che Gemini, le revisioni vengono eseguite
+            prima con il modello locale e inoltrate a Gemini solo se la confidenza è bassa.
+            Viene recuperato dalla variabile d'ambiente 'CASCADE_MODE' ("1", "true", "on"). Il valore predefinito è False.
+
+            CASCADE_CONFIDENCE_THRESHOLD (float): La confidenza minima (tra 0 e 1) sotto la quale una revisione
+            del modello locale viene inoltrata a Gemini. Viene recuperata da 'CASCADE_CONFIDENCE_THRESHOLD'. Il valore predefinito è 0.7.
+
+            REVIEW_PROTOCOL (str): Il protocollo di output richiesto al modello. Con "echo" il modello restituisce
+            il codice originale con i commenti aggiunti; con "annotations" restituisce solo le segnalazioni
+            (JSON, una per riga) e i commenti vengono inseriti localmente. Viene recuperato da 'REVIEW_PROTOCOL'.
+            Il valore predefinito è "echo".
+
+            MICRO_BATCH_WINDOW_MS (float): La finestra in millisecondi in cui le richieste dello stesso tipo di revisione
+            vengono raccolte e inviate all'LLM in un unico prompt (vedi `micro_batch.MicroBatcher`).
+            Viene recuperata da 'MICRO_BATCH_WINDOW_MS'. Il valore predefinito è 0 (micro-batching disattivato).
+
+            MICRO_BATCH_MAX_SNIPPETS (int): Il numero massimo di snippet per micro-batch.
+            Viene recuperato da 'MICRO_BATCH_MAX_SNIPPETS'. Il valore predefinito è 8.
+
+            MICRO_BATCH_MAX_TOKENS (int): Il budget di token stimati del codice per micro-batch.
+            Viene recuperato da 'MICRO_BATCH_MAX_TOKENS'. Il valore predefinito è 2000.
+
+            REVIEW_TIMEOUT_SECONDS (float): Il tempo massimo, in secondi, concesso a una richiesta di revisione e
+            a tutte le chiamate ai backend che comporta. Un client può ridurlo con l'intestazione `X-Review-Deadline`.
+            Viene recuperato da 'REVIEW_TIMEOUT_SECONDS'. Il valore predefinito è 300.
+
+            SCHEDULER_OLLAMA_SLOTS (int): Le chiamate contemporanee concesse a Ollama dallo scheduler (vedi `scheduler.FairScheduler`).
+            Viene recuperato da 'SCHEDULER_OLLAMA_SLOTS'. Il valore predefinito è 2.
+
+            SCHEDULER_GEMINI_SLOTS (int): Le chiamate contemporanee concesse a Gemini dallo scheduler.
+            Viene recuperato da 'SCHEDULER_GEMINI_SLOTS'. Il valore predefinito è 32.
+
+            SCHEDULER_BATCH_SHARE (float): La quota massima degli slot di ciascun backend utilizzabile dalle richieste batch
+            (almeno uno slot). Viene recuperata da 'SCHEDULER_BATCH_SHARE'. Il valore predefinito è 0.5.
+
+            SCHEDULER_TENANT_WEIGHTS (str): I pesi dei client nella ripartizione equa, nel formato "token:abc=3,ip:10.0.0.1=0.5"
+            (i client non indicati hanno peso 1). Viene recuperato da 'SCHEDULER_TENANT_WEIGHTS'. Il valore predefinito è vuoto.
+
+            API_TOKENS (str): I token API riconosciuti, nel formato "abc=interactive,def": solo questi identificano un client
+            nella ripartizione equa (gli altri vengono identificati per indirizzo IP) e solo quelli marcati "interactive" possono
+            chiedere la priorità interattiva sulle API, che altrimenti è "batch". Viene recuperato da 'API_TOKENS'.
+            Il valore predefinito è vuoto.
+
+            REVIEW_CACHE_PATH (str): Il file SQLite della cache persistente delle revisioni (vedi `review_cache.ReviewCache`).
+            Viene recuperato da 'REVIEW_CACHE_PATH' (es. "review_cache.sqlite3"). Il valore predefinito è vuoto (cache disattivata).
+
+            REVIEW_CACHE_MAX_ENTRIES (int): Il numero massimo di revisioni conservate nella cache.
+            Viene recuperato da 'REVIEW_CACHE_MAX_ENTRIES'. Il valore predefinito è 100000.
+
+            PROJECT_REVIEW_WORKERS (int): Le revisioni eseguite in parallelo durante la revisione di un progetto
+            (vedi `project_review.review_project`). Viene recuperato da 'PROJECT_REVIEW_WORKERS'. Il valore predefinito è 4.
+
+            PROJECT_REVIEW_MAX_FILE_BYTES (int): La dimensione massima, in byte, dei file revisionati in un progetto;
+            i file più grandi vengono saltati. Viene recuperata da 'PROJECT_REVIEW_MAX_FILE_BYTES'. Il valore predefinito è 200000.
+
+            SYMBOL_INDEX_ROOT (str): La cartella del progetto di cui indicizzare i simboli (vedi `symbol_index.SymbolIndex`):
+            i prompt delle revisioni includono le firme delle funzioni e classi del progetto usate dallo snippet.
+            Viene recuperata da 'SYMBOL_INDEX_ROOT'. Il valore predefinito è vuoto (nessun indice per l'interfaccia web).
+
+            SYMBOL_CONTEXT_TOKENS (int): Il budget di token stimati delle firme aggiunte al prompt.
+            Viene recuperato da 'SYMBOL_CONTEXT_TOKENS'. Il valore predefinito è 400.
+
+            HISTORY_PATH (str): Il file SQLite della cronologia delle revisioni (vedi `history.ReviewHistory`).
+            Viene recuperato da 'HISTORY_PATH' (es. "review_history.sqlite3"). Il valore predefinito è vuoto (cronologia disattivata).
+
+            HISTORY_RETENTION_DAYS (float): Dopo quanti giorni le revisioni vengono eliminate dalla cronologia.
+            Viene recuperato da 'HISTORY_RETENTION_DAYS'. Il valore predefinito è 30; 0 le conserva senza limiti.
+
+            GENERATION_LIMITS (bool): Se attivo, ogni chiamata al modello usa le impostazioni del tipo di revisione
+            (token massimi proporzionali al codice, sequenze di arresto e temperatura, vedi `generation.generation_settings`).
+            Viene recuperato da 'GENERATION_LIMITS' ("1", "true" o "on"). Il valore predefinito è disattivato.
+
+            EARLY_STOP (bool): Se attivo insieme a GENERATION_LIMITS, le revisioni vengono generate in streaming e interrotte
+            quando il modello chiude il blocco di codice annotato, senza attendere le spiegazioni successive.
+            Viene recuperato da 'EARLY_STOP' ("1", "true" o "on"). Il valore predefinito è disattivato.
+
+            GEMINI_THINKING_BUDGET (int): Con GENERATION_LIMITS attivo, i token di ragionamento concessi a Gemini e aggiunti
+            al limite di token in uscita (vedi `generation.gemini_generation_config`). Viene recuperato da 'GEMINI_THINKING_BUDGET'.
+            Il valore predefinito è 1024; un valore negativo non invia `thinkingConfig` (modelli che non ragionano).
+
+            SEMANTIC_CACHE (bool): Se attivo, le revisioni di singole funzioni vengono riusate anche per funzioni
+            che ne sono copie rinominate, adattando le segnalazioni; le funzioni simili ma con righe cambiate vengono
+            rinviate al modello (vedi `semantic_cache.SemanticCache`).
+            Viene recuperato da 'SEMANTIC_CACHE' ("1", "true" o "on"). Il valore predefinito è disattivato.
+
+            SEMANTIC_CACHE_THRESHOLD (float): La similarità coseno minima per riusare una revisione.
+            Viene recuperato da 'SEMANTIC_CACHE_THRESHOLD'. Il valore predefinito è 0.95.
+
+            SEMANTIC_CACHE_MAX_MB (float): La memoria massima della cache semantica; oltre, vengono eliminate le funzioni usate meno di recente.
+            Viene recuperato da 'SEMANTIC_CACHE_MAX_MB'. Il valore predefinito è 64.
+
         Esempi (Examples)
 
         Per accedere a un'impostazione di configurazione da qualsiasi punto dell'applicazione:
@@ -53,5 +144,39 @@ class Config:
     MODEL_NAME = os.getenv("MODEL_NAME")
     LOCAL_BASE_URL = os.getenv("LOCAL_BASE_URL")
 
+    CASCADE_MODE = os.getenv("CASCADE_MODE", "").lower() in ("1", "true", "on")
+    CASCADE_CONFIDENCE_THRESHOLD = float(os.getenv("CASCADE_CONFIDENCE_THRESHOLD", "0.7"))
+
+    REVIEW_PROTOCOL = os.getenv("REVIEW_PROTOCOL", "echo").lower()
+
+    MICRO_BATCH_WINDOW_MS = float(os.getenv("MICRO_BATCH_WINDOW_MS", "0"))
+    MICRO_BATCH_MAX_SNIPPETS = int(os.getenv("MICRO_BATCH_MAX_SNIPPETS", "8"))
+    MICRO_BATCH_MAX_TOKENS = int(os.getenv("MICRO_BATCH_MAX_TOKENS", "2000"))
+
+    REVIEW_TIMEOUT_SECONDS = float(os.getenv("REVIEW_TIMEOUT_SECONDS", "300"))
+
+    SCHEDULER_OLLAMA_SLOTS = int(os.getenv("SCHEDULER_OLLAMA_SLOTS", "2"))
+    SCHEDULER_GEMINI_SLOTS = int(os.getenv("SCHEDULER_GEMINI_SLOTS", "32"))
+    SCHEDULER_BATCH_SHARE = float(os.getenv("SCHEDULER_BATCH_SHARE", "0.5"))
+    SCHEDULER_TENANT_WEIGHTS = os.getenv("SCHEDULER_TENANT_WEIGHTS", "")
+    API_TOKENS = os.getenv("API_TOKENS", "")
+
+    REVIEW_CACHE_PATH = os.getenv("REVIEW_CACHE_PATH", "")
+    REVIEW_CACHE_MAX_ENTRIES = int(os.getenv("REVIEW_CACHE_MAX_ENTRIES", "100000"))
+
+    PROJECT_REVIEW_WORKERS = int(os.getenv("PROJECT_REVIEW_WORKERS", "4"))
+    PROJECT_REVIEW_MAX_FILE_BYTES = int(os.getenv("PROJECT_REVIEW_MAX_FILE_BYTES", "200000"))
+
+    SYMBOL_INDEX_ROOT = os.getenv("SYMBOL_INDEX_ROOT", "")
+    SYMBOL_CONTEXT_TOKENS = int(os.getenv("SYMBOL_CONTEXT_TOKENS", "400"))
+
+    HISTORY_PATH = os.getenv("HISTORY_PATH", "")
+    HISTORY_RETENTION_DAYS = float(os.getenv("HISTORY_RETENTION_DAYS", "30"))
 
+    GENERATION_LIMITS = os.getenv("GENERATION_LIMITS", "off").lower() in ("1", "true", "on")
+    EARLY_STOP = os.getenv("EARLY_STOP", "off").lower() in ("1", "true", "on")
+    GEMINI_THINKING_BUDGET = int(os.getenv("GEMINI_THINKING_BUDGET", "1024"))
 
+    SEMANTIC_CACHE = os.getenv("SEMANTIC_CACHE", "off").lower() in ("1", "true", "on")
+    SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+    SEMANTIC_CACHE_MAX_MB = float(os.getenv("SEMANTIC_CACHE_MAX_MB", "64"))
@@ -0,0 +1,26 @@
+import os
+from typing import Iterator, Tuple
+
+
+TESTS_DIR = "tests"
+
+
+def review_type_for_input(number: int) -> str:
+    """Restituisce il `review_type` associato a `tests/InputN.py`, come in `run_code_review_batch`."""
+    if number <= 25:
+        return "bug_detection"
+    if number <= 50:
+        return "syntax_revision"
+    if number <= 75:
+        return "doc_strings_add"
+    return "style_suggestions"
+
+
+def iter_corpus(tests_dir: str = TESTS_DIR, first: int = 1, last: int = 100) -> Iterator[Tuple[int, str, str]]:
+    """Itera i file `InputN.py` del corpus di test come tuple (numero, review_type, codice)."""
+    for number in range(first, last + 1):
+        path = os.path.join(tests_dir, f"Input{number}.py")
+        if not os.path.exists(path):
+            continue
+        with open(path, "r", encoding="utf-8") as f:
+            yield number, review_type_for_input(number), f.read()
@@ -0,0 +1,94 @@
+import threading
+from typing import Dict, Optional
+
+from config import Config
+
+
+# Intestazione con cui il client indica quanti secondi è disposto ad attendere la revisione.
+DEADLINE_HEADER = "X-Review-Deadline"
+
+DEADLINE_ERROR = "Timeout: la scadenza della richiesta è stata superata."
+
+
+def request_timeout(header_value: Optional[str] = None) -> float:
+    """Restituisce i secondi a disposizione di una richiesta di revisione.
+
+        Il valore dell'intestazione `X-Review-Deadline` può solo ridurre il limite configurato
+        in `Config.REVIEW_TIMEOUT_SECONDS`; valori non numerici o non positivi vengono ignorati.
+
+        Args:
+            header_value (Optional[str]): Il valore dell'intestazione, in secondi (es. "30" o "2.5").
+
+        Returns:
+            float: I secondi a disposizione della richiesta.
+    """
+    try:
+        requested = float(header_value) if header_value else None
+    except ValueError:
+        requested = None
+    if requested is None or requested <= 0:
+        return Config.REVIEW_TIMEOUT_SECONDS
+    return min(requested, Config.REVIEW_TIMEOUT_SECONDS)
+
+
+def estimate_reclaimed(expected_tokens: int, generated_tokens: int, elapsed: float) -> float:
+    """Stima il tempo di generazione risparmiato interrompendo una revisione in streaming.
+
+        Con il protocollo "echo" il modello ripete il codice, quindi l'output atteso è lungo almeno
+        quanto il codice originale; il tempo restante è stimato con la velocità osservata finora.
+
+        Args:
+            expected_tokens (int): I token di output attesi (stimati dal codice originale).
+            generated_tokens (int): I token già generati al momento dell'interruzione.
+            elapsed (float): I secondi trascorsi dall'inizio della generazione.
+
+        Returns:
+            float: I secondi di generazione risparmiati (0 se non stimabili).
+    """
+    if generated_tokens <= 0 or elapsed <= 0 or expected_tokens <= generated_tokens:
+        return 0.0
+    return (expected_tokens - generated_tokens) * elapsed / generated_tokens
+
+
+class CancellationStats:
+    """Contatori condivisi del lavoro interrotto (client disconnessi e scadenze superate).
+
+        Attributes:
+            cancelled (int): Le generazioni interrotte perché il client si è disconnesso.
+            deadline_exceeded (int): Le chiamate ai backend non eseguite o interrotte per scadenza superata.
+            cancelled_time (float): I secondi di generazione spesi sulle revisioni poi interrotte.
+            reclaimed_time (float): I secondi di generazione risparmiati (stima, vedi `estimate_reclaimed`).
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.cancelled = 0
+        self.deadline_exceeded = 0
+        self.cancelled_time = 0.0
+        self.reclaimed_time = 0.0
+
+    def record_cancelled(self, elapsed: float, reclaimed: float) -> None:
+        """Registra una generazione interrotta dalla disconnessione del client."""
+        with self._lock:
+            self.cancelled += 1
+            self.cancelled_time += elapsed
+            self.reclaimed_time += reclaimed
+
+    def record_deadline(self, elapsed: float = 0.0) -> None:
+        """Registra una chiamata saltata o interrotta per scadenza superata."""
+        with self._lock:
+            self.deadline_exceeded += 1
+            self.cancelled_time += elapsed
+
+    def snapshot(self) -> Dict:
+        """Restituisce una copia dei contatori."""
+        with self._lock:
+            return {
+                "cancelled": self.cancelled,
+                "deadline_exceeded": self.deadline_exceeded,
+                "cancelled_time": self.cancelled_time,
+                "reclaimed_time": self.reclaimed_time,
+            }
+
+
+cancellation_stats = CancellationStats()
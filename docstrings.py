@@ -0,0 +1,235 @@
+import ast
+import json
+from typing import Dict, List, Optional
+
+from findings_parser import estimate_tokens, strip_markdown_fences
+
+
+def _has_params(node: ast.AST) -> bool:
+    args = node.args
+    names = [arg.arg for arg in args.posonlyargs + args.args + args.kwonlyargs]
+    if names and names[0] in ("self", "cls"):
+        names = names[1:]
+    return bool(names or args.vararg or args.kwarg)
+
+
+def _own_nodes(node: ast.AST):
+    """Visita il corpo di una funzione senza entrare nelle funzioni e classi annidate."""
+    stack = list(node.body)
+    while stack:
+        child = stack.pop()
+        yield child
+        if not isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef, ast.Lambda)):
+            stack.extend(ast.iter_child_nodes(child))
+
+
+def required_sections(node: ast.AST) -> List[str]:
+    """Restituisce le sezioni Google Style richieste per la docstring di una funzione o classe.
+
+        Args:
+            node (ast.AST): Il nodo `FunctionDef`, `AsyncFunctionDef` o `ClassDef`.
+
+        Returns:
+            List[str]: Le sezioni richieste tra "Args:", "Returns:" e "Raises:"
+                (nessuna per le classi).
+    """
+    if isinstance(node, ast.ClassDef):
+        return []
+    sections = []
+    if _has_params(node):
+        sections.append("Args:")
+    nodes = list(_own_nodes(node))
+    if any(isinstance(child, ast.Return) and child.value is not None for child in nodes) \
+            or any(isinstance(child, (ast.Yield, ast.YieldFrom)) for child in nodes):
+        sections.append("Returns:")
+    if any(isinstance(child, ast.Raise) for child in nodes):
+        sections.append("Raises:")
+    return sections
+
+
+def find_units(code: str) -> Dict:
+    """Elenca funzioni, classi e metodi che richiedono una docstring (nuova o completata).
+
+        Una unità viene saltata se la sua docstring contiene già tutte le sezioni richieste
+        (Args/Returns/Raises, vedi `required_sections`), oppure se il corpo è sulla stessa riga
+        della definizione (`def f(): return 1`), perché inserirvi la docstring richiederebbe
+        di riformattare il codice.
+
+        Args:
+            code (str): Lo snippet di codice Python da analizzare.
+
+        Returns:
+            dict: Un dizionario con "units" (le unità da documentare, ciascuna con "id", "kind",
+                "signature", "line", "indent", "docstring" e, se già presente, "docstring_lines")
+                e "skipped" (gli id delle unità saltate).
+
+        Raises:
+            SyntaxError: Se il codice non è analizzabile con `ast`.
+    """
+    tree = ast.parse(code)
+    lines = code.splitlines()
+    units = []
+    skipped = []
+
+    def visit(node, prefix, in_class):
+        for child in ast.iter_child_nodes(node):
+            if not isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                continue
+            name = prefix + child.name
+            docstring = ast.get_docstring(child)
+            first = child.body[0]
+            sections = required_sections(child)
+
+            if docstring and all(section in docstring for section in sections):
+                skipped.append(name)
+            elif first.lineno == child.lineno:
+                skipped.append(name)
+            else:
+                unit = {
+                    "id": name,
+                    "kind": "class" if isinstance(child, ast.ClassDef) else ("method" if in_class else "function"),
+                    "signature": "\n".join(lines[child.lineno - 1:first.lineno - 1]).strip(),
+                    "line": first.lineno,
+                    "indent": lines[first.lineno - 1][:first.col_offset],
+                    "docstring": docstring,
+                    "sections": sections,
+                }
+                if docstring:
+                    unit["docstring_lines"] = (first.lineno, first.end_lineno)
+                units.append(unit)
+
+            visit(child, name + ".", isinstance(child, ast.ClassDef))
+
+    visit(tree, "", False)
+    return {"units": units, "skipped": skipped}
+
+
+def build_docstring_prompt(code: str, units: List[Dict]) -> str:
+    """Genera il prompt che chiede all'LLM solo i testi delle docstring, in un'unica chiamata.
+
+        Args:
+            code (str): Lo snippet di codice Python, mostrato come contesto.
+            units (List[dict]): Le unità restituite da `find_units`.
+
+        Returns:
+            str: Il prompt da inviare all'LLM.
+    """
+    requested = "\n".join(
+        f"- {unit['id']} ({unit['kind']}), sezioni richieste: {', '.join(unit['sections']) or 'nessuna'}"
+        + (" - completa la docstring esistente" if unit["docstring"] else "")
+        for unit in units
+    )
+    prompt = ( f'''
+                Sei un esperto di documentazione Python. Scrivi docstring in stile Google per le unità elencate.
+
+                ISTRUZIONI:
+                - NON restituire il codice. Restituisci SOLO un oggetto JSON che associa l'identificativo di ogni unità al testo della sua docstring.
+                - Il testo NON deve contenere le triple virgolette né l'indentazione del codice.
+                - Inizia con un breve riassunto su una riga, poi una riga vuota e, se necessario, una descrizione più dettagliata.
+                - Includi le sezioni richieste (Args, Returns, Raises) nel formato Google Style, ad esempio:
+                  "Breve riassunto.\\n\\nArgs:\\n    param1 (type): Descrizione.\\n\\nReturns:\\n    type: Descrizione."
+
+                UNITÀ DA DOCUMENTARE:
+{requested}
+
+                Il codice è:
+                '''
+                f"{code}" )
+    return prompt
+
+
+def parse_docstring_response(text: str, units: List[Dict]) -> Dict[str, str]:
+    """Estrae dalla risposta dell'LLM i testi delle docstring per le unità richieste.
+
+        Args:
+            text (str): La risposta dell'LLM (un oggetto JSON, eventualmente tra delimitatori Markdown).
+            units (List[dict]): Le unità richieste.
+
+        Returns:
+            Dict[str, str]: I testi delle docstring indicizzati per id; le unità mancanti o non valide sono omesse.
+    """
+    body = strip_markdown_fences(text).strip()
+    start, end = body.find("{"), body.rfind("}")
+    if start < 0 or end < start:
+        return {}
+    try:
+        data = json.loads(body[start:end + 1])
+    except ValueError:
+        return {}
+    if not isinstance(data, dict):
+        return {}
+    wanted = {unit["id"] for unit in units}
+    return {key: value.strip() for key, value in data.items()
+            if key in wanted and isinstance(value, str) and value.strip()}
+
+
+def _format_docstring(text: str, indent: str) -> List[str]:
+    """Formatta il testo come docstring indentata; barre rovesciate e triple virgolette vengono protette."""
+    text = text.strip().strip('"').strip().replace("\\", "\\\\").replace('"""', '\\"\\"\\"')
+    body = text.splitlines()
+    if len(body) == 1:
+        return [f'{indent}"""{body[0]}"""']
+    formatted = [f'{indent}"""{body[0]}']
+    formatted.extend(f"{indent}{line}" if line.strip() else "" for line in body[1:])
+    formatted.append(f'{indent}"""')
+    return formatted
+
+
+def insert_docstrings(code: str, units: List[Dict], docstrings: Dict[str, str]) -> str:
+    """Inserisce (o sostituisce) le docstring nel codice, all'indentazione corretta.
+
+        Le modifiche vengono applicate dal fondo del file verso l'inizio, così che le
+        posizioni calcolate con `ast` restino valide. Il resto del codice non viene toccato.
+
+        Args:
+            code (str): Lo snippet di codice originale.
+            units (List[dict]): Le unità restituite da `find_units`.
+            docstrings (Dict[str, str]): I testi delle docstring indicizzati per id.
+
+        Returns:
+            str: Il codice con le docstring inserite.
+    """
+    lines = code.splitlines()
+    for unit in sorted(units, key=lambda item: item["line"], reverse=True):
+        text = docstrings.get(unit["id"])
+        if not text:
+            continue
+        formatted = _format_docstring(text, unit["indent"])
+        if "docstring_lines" in unit:
+            first, last = unit["docstring_lines"]
+            lines[first - 1:last] = formatted
+        else:
+            lines[unit["line"] - 1:unit["line"] - 1] = formatted
+    return "\n".join(lines) + ("\n" if code.endswith("\n") else "")
+
+
+def docstring_report(units: Dict, docstrings: Dict[str, str], response: str, code: str) -> Dict:
+    """Riassume l'esito dell'inserimento locale delle docstring.
+
+        I token risparmiati sono stimati come la differenza tra l'output che il modello
+        avrebbe generato riscrivendo il file intero (codice più docstring) e la risposta JSON.
+
+        Args:
+            units (dict): Il risultato di `find_units`.
+            docstrings (Dict[str, str]): Le docstring ottenute dall'LLM.
+            response (str): La risposta grezza dell'LLM.
+            code (str): Lo snippet di codice originale.
+
+        Returns:
+            dict: "documented", "missing", "skipped" (liste di id) e "tokens_saved" (stima).
+    """
+    echo_tokens = estimate_tokens(code) + sum(estimate_tokens(text) for text in docstrings.values())
+    return {
+        "documented": sorted(docstrings),
+        "missing": [unit["id"] for unit in units["units"] if unit["id"] not in docstrings],
+        "skipped": units["skipped"],
+        "tokens_saved": max(0, echo_tokens - (estimate_tokens(response) if response else 0)),
+    }
+
+
+def plan_docstrings(code: str) -> Optional[Dict]:
+    """Prepara l'inserimento locale delle docstring, o restituisce None se il codice non è analizzabile."""
+    try:
+        return find_units(code)
+    except SyntaxError:
+        return None
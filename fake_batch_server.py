@@ -0,0 +1,192 @@
+import argparse
+import itertools
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+from urllib.parse import parse_qs, urlparse
+
+# Tipo dichiarato nei metadati dei job, come nelle risposte dell'API di Gemini.
+_BATCH_TYPE = "type.googleapis.com/google.ai.generativelanguage.v1main.GenerateContentBatch"
+_OUTPUT_TYPE = "type.googleapis.com/google.ai.generativelanguage.v1main.GenerateContentBatchOutput"
+
+
+def fake_review(request: Dict) -> Dict:
+    """Genera la risposta simulata a una richiesta `generateContent`.
+
+        Il codice che segue l'ultimo "è:" del prompt viene restituito in un blocco ```python,
+        segnalando le divisioni per zero (`/ 0`), così che le revisioni siano verificabili.
+    """
+    prompt = request["contents"][0]["parts"][0]["text"]
+    code = prompt.rsplit("è:", 1)[-1].strip("\n")
+    lines = [line + ("  # BUG: [ALTA] divisione per zero" if "/ 0" in line else "") for line in code.split("\n")]
+    text = "```python\n" + "\n".join(lines) + "\n```"
+    return {
+        "candidates": [{"content": {"parts": [{"text": text}], "role": "model"}, "finishReason": "STOP"}],
+        "usageMetadata": {"promptTokenCount": len(prompt) // 4, "candidatesTokenCount": len(text) // 4},
+    }
+
+
+class FakeBatchServer:
+    """Server locale che imita `generateContent` e l'API batch di Gemini, per provare la modalità batch senza rete.
+
+        - `POST /v1beta/models/<modello>:generateContent` (e `:streamGenerateContent`, in un solo evento SSE)
+          risponde dopo `request_latency` secondi;
+        - `POST /v1beta/models/<modello>:batchGenerateContent` crea un job con le richieste inline e
+          restituisce l'operazione ("batches/N", stato "BATCH_STATE_PENDING");
+        - `GET /v1beta/batches/N` restituisce lo stato del job: in coda per `queue_delay` secondi, poi in
+          esecuzione per `per_request` secondi a richiesta (divisi tra `workers` esecutori), infine
+          "BATCH_STATE_SUCCEEDED" con le risposte in `response.inlinedResponses.inlinedResponses`.
+
+        Con `fail_every` una richiesta ogni `fail_every` del job restituisce un errore invece della risposta.
+
+        Attributes:
+            url (str): L'URL `generateContent` da usare come `API_BASE_URL`.
+            stats (Dict[str, int]): Chiamate `generateContent`, job creati, richieste nei job e controlli dello stato.
+    """
+
+    def __init__(self, port: int = 0, request_latency: float = 0.3, queue_delay: float = 1.0,
+                 per_request: float = 0.02, workers: int = 8, fail_every: int = 0) -> None:
+        self.request_latency = request_latency
+        self.queue_delay = queue_delay
+        self.per_request = per_request
+        self.workers = max(1, workers)
+        self.fail_every = fail_every
+        self.stats = {"generate": 0, "jobs": 0, "batched_requests": 0, "polls": 0}
+        self._jobs: Dict[str, Dict] = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+        self.url = f"http://127.0.0.1:{self._server.server_address[1]}/v1beta/models/gemini-simulato:generateContent"
+
+    def start(self) -> "FakeBatchServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _create_job(self, body: Dict) -> Dict:
+        batch = body.get("batch", {})
+        items = batch.get("input_config", batch.get("inputConfig", {})).get("requests", {}).get("requests", [])
+        now = time.time()
+        with self._lock:
+            name = f"batches/{next(self._ids)}"
+            self.stats["jobs"] += 1
+            self.stats["batched_requests"] += len(items)
+            self._jobs[name] = {
+                "items": items,
+                "display_name": batch.get("display_name", batch.get("displayName", "")),
+                "created": now,
+                "running_at": now + self.queue_delay,
+                "done_at": now + self.queue_delay + self.per_request * -(-len(items) // self.workers),
+            }
+        return self._operation(name)
+
+    def _operation(self, name: str) -> Dict:
+        job = self._jobs[name]
+        now = time.time()
+        state = "BATCH_STATE_PENDING" if now < job["running_at"] else (
+            "BATCH_STATE_RUNNING" if now < job["done_at"] else "BATCH_STATE_SUCCEEDED")
+        metadata = {"@type": _BATCH_TYPE, "name": name, "displayName": job["display_name"], "state": state,
+                    "batchStats": {"requestCount": str(len(job["items"]))}}
+        operation = {"name": name, "metadata": metadata}
+        if state == "BATCH_STATE_SUCCEEDED":
+            if "responses" not in job:
+                job["responses"] = [
+                    {"error": {"code": 500, "message": "Errore simulato"}, "metadata": item.get("metadata", {})}
+                    if self.fail_every and index % self.fail_every == self.fail_every - 1
+                    else {"response": fake_review(item["request"]), "metadata": item.get("metadata", {})}
+                    for index, item in enumerate(job["items"])
+                ]
+            operation["done"] = True
+            operation["response"] = {"@type": _OUTPUT_TYPE, "inlinedResponses": {"inlinedResponses": job["responses"]}}
+        return operation
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _send(self, status: int, payload: Dict) -> None:
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _authorized(self) -> bool:
+                if parse_qs(urlparse(self.path).query).get("key") or self.headers.get("x-goog-api-key"):
+                    return True
+                self._send(403, {"error": {"code": 403, "message": "API key mancante", "status": "PERMISSION_DENIED"}})
+                return False
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                if not self._authorized():
+                    return
+                path = urlparse(self.path).path
+                if path.endswith(":batchGenerateContent"):
+                    self._send(200, server._create_job(body))
+                elif path.endswith(":generateContent") or path.endswith(":streamGenerateContent"):
+                    with server._lock:
+                        server.stats["generate"] += 1
+                    time.sleep(server.request_latency)
+                    if path.endswith(":generateContent"):
+                        self._send(200, fake_review(body))
+                        return
+                    # Streaming (SSE): la risposta intera in un solo evento
+                    event = f"data: {json.dumps(fake_review(body))}\n\n".encode("utf-8")
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/event-stream")
+                    self.send_header("Content-Length", str(len(event)))
+                    self.end_headers()
+                    self.wfile.write(event)
+                else:
+                    self._send(404, {"error": {"code": 404, "message": f"Percorso sconosciuto: {path}"}})
+
+            def do_GET(self):
+                if not self._authorized():
+                    return
+                name = urlparse(self.path).path.split("/v1beta/", 1)[-1]
+                with server._lock:
+                    server.stats["polls"] += 1
+                    if name not in server._jobs:
+                        self._send(404, {"error": {"code": 404, "message": f"Job {name} non trovato", "status": "NOT_FOUND"}})
+                        return
+                    operation = server._operation(name)
+                self._send(200, operation)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Server locale che imita generateContent e l'API batch di Gemini.")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--request-latency", type=float, default=0.3, help="Secondi per ogni chiamata generateContent.")
+    parser.add_argument("--queue-delay", type=float, default=1.0, help="Secondi in coda prima dell'esecuzione di un job.")
+    parser.add_argument("--per-request", type=float, default=0.02, help="Secondi per richiesta all'interno di un job.")
+    parser.add_argument("--workers", type=int, default=8, help="Richieste di un job eseguite in parallelo.")
+    parser.add_argument("--fail-every", type=int, default=0, help="Una richiesta ogni N del job fallisce (0: nessuna).")
+    args = parser.parse_args()
+
+    server = FakeBatchServer(args.port, args.request_latency, args.queue_delay, args.per_request, args.workers, args.fail_every)
+    print(f"API_BASE_URL={server.url}  (API_KEY: qualsiasi valore)")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,267 @@
+import re
+from typing import Dict, List, Optional, Tuple
+
+
+# Tag riconosciuti nei commenti generati dai prompt di `LLMService._generate_review_prompt`.
+KNOWN_TAGS = (
+    "BUG", "POTENTIAL_BUG", "MISSING_HANDLING",
+    "SYNTAX_ERROR", "DEPRECATED", "INVALID",
+    "PEP8", "STYLE", "NAMING",
+    "EXPLAIN",
+)
+
+# Tag pertinenti per ciascun `review_type`.
+REVIEW_TYPE_TAGS = {
+    "bug_detection": {"BUG", "POTENTIAL_BUG", "MISSING_HANDLING"},
+    "syntax_revision": {"SYNTAX_ERROR", "INVALID", "DEPRECATED"},
+    "style_suggestions": {"PEP8", "STYLE", "NAMING"},
+    "doc_strings_add": {"EXPLAIN"},
+}
+
+# Scala fissa di severità (dalla più grave alla meno grave).
+SEVERITY_LEVELS = ("CRITICA", "ALTA", "MEDIA", "BASSA", "INFO")
+
+# Severità assegnata ai tag per cui i prompt non richiedono una severità esplicita.
+DEFAULT_SEVERITY = {
+    "BUG": "ALTA",
+    "POTENTIAL_BUG": "MEDIA",
+    "MISSING_HANDLING": "MEDIA",
+    "SYNTAX_ERROR": "ALTA",
+    "INVALID": "ALTA",
+    "DEPRECATED": "BASSA",
+    "PEP8": "BASSA",
+    "STYLE": "BASSA",
+    "NAMING": "BASSA",
+    "EXPLAIN": "INFO",
+}
+
+_TAG_RE = re.compile(r"#\s*(" + "|".join(sorted(KNOWN_TAGS, key=len, reverse=True)) + r")\s*:\s*(.*)$")
+_SEVERITY_RE = re.compile(r"^\[?\s*(" + "|".join(SEVERITY_LEVELS) + r")\b\s*\]?\s*(?:[-–:]\s*)?(.*)$", re.IGNORECASE)
+_RULE_RE = re.compile(r"^\[?\s*([A-Z]\d{3})\s*\]?\s*(?:[-–:]\s*)?(.*)$")
+_FENCE_RE = re.compile(r"^\s*```")
+_ANNOTATION_RE = re.compile(r"\s*#\s*(?:" + "|".join(KNOWN_TAGS) + r")\s*:.*$")
+
+
+def estimate_tokens(text: str) -> int:
+    """Stima approssimativa dei token di un testo (circa 4 caratteri per token), usata nei report."""
+    return max(1, len(text) // 4)
+
+
+def strip_annotations(line: str) -> str:
+    """Rimuove da una riga l'eventuale commento annotato (`# BUG: ...`), lasciando il codice originale."""
+    return _ANNOTATION_RE.sub("", line)
+
+
+def strip_markdown_fences(text: str) -> str:
+    """Rimuove i delimitatori Markdown (```python ... ```) dall'output di un LLM.
+
+        Se l'output contiene almeno un blocco recintato, viene restituito solo il
+        contenuto dei blocchi di codice, scartando le spiegazioni testuali che i
+        modelli aggiungono prima o dopo (es. "**Spiegazione:**"). In assenza di
+        blocchi recintati il testo viene restituito invariato.
+
+        Args:
+            text (str): L'output testuale generato dall'LLM.
+
+        Returns:
+            str: Il solo codice annotato, senza delimitatori Markdown.
+
+        Examples:
+            print(strip_markdown_fences("```python\\nx = 1\\n```\\nSpiegazione"))
+            x = 1
+    """
+    return "\n".join(_code_lines(text))
+
+
+def _code_lines(text: str) -> List[str]:
+    """Restituisce le righe di codice contenute nei blocchi recintati (o tutte, se non ce ne sono)."""
+    lines = text.splitlines()
+    code: List[str] = []
+    inside = False
+    found_fence = False
+    for line in lines:
+        if _FENCE_RE.match(line):
+            found_fence = True
+            inside = not inside
+            continue
+        if inside:
+            code.append(line)
+    return code if found_fence else lines
+
+
+def _comment_start(line: str, quote: Optional[str]) -> Tuple[Optional[int], Optional[str]]:
+    """Trova l'inizio del commento di una riga, ignorando i `#` dentro le stringhe.
+
+        Args:
+            line (str): La riga di codice.
+            quote (str, optional): Il delimitatore della stringa multilinea ancora aperta alla riga precedente.
+
+        Returns:
+            tuple: La posizione del `#` (None se la riga non ha commenti) e il delimitatore
+                della stringa che resta aperta alla fine della riga (None se non ce ne sono).
+    """
+    i = 0
+    opened = -1
+    while i < len(line):
+        char = line[i]
+        if quote:
+            if char == "\\":
+                i += 2
+                continue
+            if line.startswith(quote, i):
+                i += len(quote)
+                quote = None
+                continue
+        elif char == "#":
+            return i, None
+        elif char in "\"'":
+            quote = char * 3 if line.startswith(char * 3, i) else char
+            opened = i
+            i += len(quote)
+            continue
+        i += 1
+    if quote and len(quote) == 1 and not line.endswith("\\"):
+        # Stringa con un solo apice non chiusa (errore di sintassi, es. `print("ciao) # SYNTAX_ERROR: ...`):
+        # l'apice non apre una stringa e il commento si cerca dopo di esso
+        start, _ = _comment_start(line[opened + 1:], None)
+        return (None if start is None else opened + 1 + start), None
+    return None, quote
+
+
+def _split_message(tag: str, body: str):
+    """Separa severità, codice regola e messaggio dal corpo di un commento annotato."""
+    severity = None
+    rule = None
+    body = body.strip()
+
+    if tag == "PEP8":
+        match = _RULE_RE.match(body)
+        if match:
+            rule, body = match.group(1), match.group(2)
+    else:
+        match = _SEVERITY_RE.match(body)
+        if match:
+            severity, body = match.group(1).upper(), match.group(2)
+
+    return severity or DEFAULT_SEVERITY[tag], rule, body.strip()
+
+
+def parse_findings(text: str) -> Dict:
+    """Estrae in un solo passaggio le segnalazioni annotate dall'output di un LLM.
+
+        Scorre una sola volta le righe del codice annotato (dopo aver rimosso i
+        delimitatori Markdown) e, per ogni commento con un tag noto
+        (`# BUG:`, `# PEP8: E501`, `# SYNTAX_ERROR:`, `# EXPLAIN:` ...), produce una
+        segnalazione con numero di riga, tag, severità, codice regola e messaggio.
+
+        Il numero di riga `line` fa riferimento al codice originale: le righe che contengono
+        solo un commento annotato vengono ancorate alla riga di codice successiva e non vengono
+        conteggiate (i commenti ordinari del codice restano righe originali). I tag dentro le
+        stringhe e le docstring vengono ignorati. `output_line` indica invece la riga nel codice annotato.
+
+        Args:
+            text (str): L'output testuale generato dall'LLM.
+
+        Returns:
+            dict: Un dizionario con le chiavi:
+                - "code" (str): il codice annotato senza delimitatori Markdown;
+                - "findings" (list): le segnalazioni, ciascuna con "line", "output_line",
+                  "tag", "severity", "rule" e "message";
+                - "counts" (dict): conteggi per "tag" e per "severity".
+
+        Examples:
+            result = parse_findings("x=1 # PEP8: E225 - spazi attorno all'operatore")
+            print(result["findings"][0]["rule"])
+            E225
+    """
+    lines = _code_lines(text)
+    findings: List[Dict] = []
+    by_tag: Dict[str, int] = {}
+    by_severity: Dict[str, int] = {}
+    pending: List[Dict] = []
+    original_line = 0
+    quote = None
+
+    for output_line, line in enumerate(lines, start=1):
+        start, quote = _comment_start(line, quote)
+        match = _TAG_RE.search(line, start) if start is not None else None
+        # Solo le righe formate da un unico commento annotato sono state aggiunte dal modello
+        standalone = match is not None and match.start() == start and not line[:start].strip()
+
+        if not standalone:
+            original_line += 1
+            # I commenti su righe proprie si riferiscono alla prima riga di codice successiva
+            for finding in pending:
+                finding["line"] = original_line
+            pending.clear()
+
+        if not match:
+            continue
+
+        tag = match.group(1)
+        severity, rule, message = _split_message(tag, match.group(2))
+        finding = {
+            "line": original_line,
+            "output_line": output_line,
+            "tag": tag,
+            "severity": severity,
+            "rule": rule,
+            "message": message,
+        }
+        if standalone:
+            pending.append(finding)
+        findings.append(finding)
+        by_tag[tag] = by_tag.get(tag, 0) + 1
+        by_severity[severity] = by_severity.get(severity, 0) + 1
+
+    # Commenti finali senza codice successivo: restano ancorati all'ultima riga di codice
+    for finding in pending:
+        finding["line"] = max(original_line, 1)
+
+    return {
+        "code": "\n".join(lines),
+        "findings": findings,
+        "counts": {"tag": by_tag, "severity": by_severity},
+    }
+
+
+def filter_findings(result: Dict, min_severity: Optional[str] = None, tags: Optional[List[str]] = None) -> Dict:
+    """Filtra le segnalazioni di un risultato di `parse_findings` per severità e tag.
+
+        Args:
+            result (dict): Il risultato restituito da `parse_findings`.
+            min_severity (str, optional): La severità minima da mantenere
+                (CRITICA/ALTA/MEDIA/BASSA/INFO). Se None, non filtra per severità.
+            tags (list, optional): I tag da mantenere. Se None, li mantiene tutti.
+
+        Returns:
+            dict: Un nuovo risultato con le sole segnalazioni selezionate e i conteggi aggiornati.
+
+        Raises:
+            ValueError: Se `min_severity` non appartiene alla scala di severità.
+    """
+    threshold = len(SEVERITY_LEVELS)
+    if min_severity:
+        min_severity = min_severity.upper()
+        if min_severity not in SEVERITY_LEVELS:
+            raise ValueError(f"Severità '{min_severity}' non valida. Valori ammessi: {', '.join(SEVERITY_LEVELS)}.")
+        threshold = SEVERITY_LEVELS.index(min_severity) + 1
+
+    wanted = {tag.upper() for tag in tags} if tags else None
+    findings = [
+        finding for finding in result["findings"]
+        if SEVERITY_LEVELS.index(finding["severity"]) < threshold
+        and (wanted is None or finding["tag"] in wanted)
+    ]
+
+    by_tag: Dict[str, int] = {}
+    by_severity: Dict[str, int] = {}
+    for finding in findings:
+        by_tag[finding["tag"]] = by_tag.get(finding["tag"], 0) + 1
+        by_severity[finding["severity"]] = by_severity.get(finding["severity"], 0) + 1
+
+    return {
+        "code": result["code"],
+        "findings": findings,
+        "counts": {"tag": by_tag, "severity": by_severity},
+    }
@@ -0,0 +1,151 @@
+import hashlib
+import json
+import threading
+from typing import Dict, Optional
+
+from config import Config
+
+# Impostazioni di generazione per tipo di revisione (protocollo "echo": il modello riscrive il codice annotato).
+# Il limite di token generati è `min_tokens + output_ratio * token del codice`: largo abbastanza da non troncare
+# il codice annotato, ma non le lunghe spiegazioni che alcuni modelli aggiungono dopo.
+GENERATION_PROFILES = {
+    "bug_detection": {"temperature": 0.2, "output_ratio": 2.0, "min_tokens": 1024},
+    "syntax_revision": {"temperature": 0.0, "output_ratio": 2.0, "min_tokens": 1024},
+    "style_suggestions": {"temperature": 0.2, "output_ratio": 2.5, "min_tokens": 1024},
+    "doc_strings_add": {"temperature": 0.3, "output_ratio": 3.0, "min_tokens": 1536},
+}
+# Protocollo ad annotazioni: il modello restituisce solo le segnalazioni (o le docstring), non il codice.
+PROTOCOL_PROFILES = {
+    "annotations": {"temperature": 0.1, "output_ratio": 0.5, "min_tokens": 768},
+    "docstrings": {"temperature": 0.3, "output_ratio": 1.0, "min_tokens": 1024},
+}
+# Tetto del limite calcolato: un file grande deve poter essere riscritto per intero.
+MAX_OUTPUT_TOKENS = 32768
+
+# Messaggio restituito al posto di una revisione di Gemini troncata dal limite di token (vedi `cascade.ERROR_PREFIXES`).
+GEMINI_TRUNCATED_ERROR = "Nessuna revisione completa generata da Gemini: raggiunto il limite di token in uscita."
+
+# Le spiegazioni che seguono il codice iniziano di solito così (es. "**Spiegazione:**" di codegemma).
+STOP_SEQUENCES = ["\n**Spiegazione", "\nSpiegazione:", "\n**Explanation", "\nExplanation:"]
+
+
+def generation_settings(review_type: str, input_tokens: int, protocol: str = "echo", early_stop: bool = True) -> Optional[Dict]:
+    """Calcola le impostazioni di generazione di una chiamata al modello.
+
+        Args:
+            review_type (str): Il tipo di revisione.
+            input_tokens (int): I token stimati del codice da revisionare (o dell'intero prompt, per i micro-batch).
+            protocol (str, optional): "echo", "annotations" o "docstrings" (il prompt delle sole docstring).
+            early_stop (bool, optional): False per le risposte che non sono un unico blocco di codice
+                (protocollo ad annotazioni, micro-batch con più snippet).
+
+        Returns:
+            Optional[Dict]: "max_tokens", "temperature", "stop", "early_stop" (interrompere la generazione
+            alla chiusura del blocco di codice) e "review_type", o None se `Config.GENERATION_LIMITS` è disattivato.
+    """
+    if not Config.GENERATION_LIMITS:
+        return None
+    profile = PROTOCOL_PROFILES.get(protocol) or GENERATION_PROFILES.get(review_type, GENERATION_PROFILES["bug_detection"])
+    return {
+        "max_tokens": min(MAX_OUTPUT_TOKENS, int(profile["min_tokens"] + profile["output_ratio"] * input_tokens)),
+        "temperature": profile["temperature"],
+        "stop": list(STOP_SEQUENCES),
+        "early_stop": early_stop and Config.EARLY_STOP,
+        "review_type": review_type,
+    }
+
+
+def generation_profile() -> str:
+    """Identifica le impostazioni di generazione in uso, per la chiave della cache delle revisioni.
+
+        Restituisce "default" se `Config.GENERATION_LIMITS` è disattivato, altrimenti un'impronta dei profili,
+        del tetto, del budget di ragionamento e di `Config.EARLY_STOP`: cambiandoli, le revisioni salvate
+        con le impostazioni precedenti non vengono riutilizzate.
+    """
+    if not Config.GENERATION_LIMITS:
+        return "default"
+    profile = json.dumps([GENERATION_PROFILES, PROTOCOL_PROFILES, MAX_OUTPUT_TOKENS, STOP_SEQUENCES,
+                          Config.GEMINI_THINKING_BUDGET, Config.EARLY_STOP], sort_keys=True)
+    return "limits:" + hashlib.sha256(profile.encode("utf-8")).hexdigest()[:12]
+
+
+def gemini_generation_config(settings: Dict) -> Dict:
+    """Traduce le impostazioni di `generation_settings` nel `generationConfig` di Gemini.
+
+        Nei modelli che ragionano (es. Gemini 2.5 Flash) i token di ragionamento rientrano in `maxOutputTokens`:
+        il budget `Config.GEMINI_THINKING_BUDGET` viene limitato e aggiunto al limite, così che non consumi
+        i token della revisione. Con un budget negativo `thinkingConfig` non viene inviato.
+    """
+    config = {"maxOutputTokens": settings["max_tokens"], "temperature": settings["temperature"], "stopSequences": settings["stop"]}
+    if Config.GEMINI_THINKING_BUDGET >= 0:
+        config["maxOutputTokens"] += Config.GEMINI_THINKING_BUDGET
+        config["thinkingConfig"] = {"thinkingBudget": Config.GEMINI_THINKING_BUDGET}
+    return config
+
+
+def ollama_options(settings: Optional[Dict]) -> Optional[Dict]:
+    """Traduce le impostazioni di `generation_settings` nelle `options` di Ollama (None: valori del modello)."""
+    if settings is None:
+        return None
+    return {"num_predict": settings["max_tokens"], "temperature": settings["temperature"], "stop": settings["stop"]}
+
+
+class FenceStop:
+    """Riconosce, durante lo streaming, la chiusura del blocco di codice annotato.
+
+        Il primo delimitatore ``` apre il blocco e il successivo lo chiude, come in
+        `findings_parser.strip_markdown_fences`: ciò che il modello genera dopo non viene usato.
+        Le righe vengono esaminate una sola volta, man mano che si completano.
+
+        Attributes:
+            text (str): Il testo ricevuto finora.
+    """
+
+    def __init__(self) -> None:
+        self.text = ""
+        self._scanned = 0
+        self._inside = False
+
+    def feed(self, chunk: str) -> Optional[int]:
+        """Aggiunge un frammento e restituisce la lunghezza del testo da tenere se il blocco si è chiuso, altrimenti None."""
+        self.text += chunk
+        while True:
+            end = self.text.find("\n", self._scanned)
+            line = self.text[self._scanned:] if end < 0 else self.text[self._scanned:end]
+            stripped = line.strip()
+            if self._inside and stripped == "```":
+                # La riga di chiusura è completa anche senza il ritorno a capo finale
+                return len(self.text) if end < 0 else end
+            if end < 0:
+                return None
+            if stripped.startswith("```"):
+                self._inside = not self._inside
+            self._scanned = end + 1
+
+
+class GenerationStats:
+    """Contatori condivisi, per tipo di revisione, delle chiamate con impostazioni di generazione.
+
+        Per ogni tipo: chiamate, chiamate interrotte alla chiusura del blocco di codice
+        e token generati (dichiarati dal backend o, per le chiamate interrotte, stimati).
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._by_type: Dict[str, Dict[str, int]] = {}
+
+    def record(self, review_type: str, output_tokens: Optional[int], early_stopped: bool) -> None:
+        with self._lock:
+            stats = self._by_type.setdefault(review_type, {"calls": 0, "early_stops": 0, "output_tokens": 0})
+            stats["calls"] += 1
+            stats["early_stops"] += int(early_stopped)
+            stats["output_tokens"] += output_tokens or 0
+
+    def snapshot(self) -> Dict:
+        """Restituisce i contatori per tipo di revisione, con la media dei token generati per chiamata."""
+        with self._lock:
+            return {review_type: {**stats, "avg_output_tokens": round(stats["output_tokens"] / stats["calls"], 1)}
+                    for review_type, stats in self._by_type.items()}
+
+
+generation_stats = GenerationStats()
@@ -0,0 +1,275 @@
+import atexit
+import hashlib
+import queue
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+from config import Config
+from findings_parser import SEVERITY_LEVELS, parse_findings
+
+
+class ReviewHistory:
+    """Cronologia persistente delle revisioni, su un file SQLite in modalità WAL.
+
+        Per ogni revisione vengono salvati hash del codice, tipo di revisione, modello, file (se noto),
+        esito ("ok", "cached" o "error"), latenza, token, la revisione e le segnalazioni estratte da
+        `parse_findings`. Gli indici su istante, modello, severità massima e file rendono le ricerche
+        indipendenti dalla dimensione della cronologia; la paginazione usa l'id dell'ultima revisione
+        restituita (`cursor`) invece di OFFSET.
+
+        `record` si limita ad accodare la revisione: hash, analisi delle segnalazioni e scrittura avvengono
+        in un thread dedicato, che salva le revisioni accumulate in un'unica transazione. Se la coda è piena
+        le revisioni vengono scartate (e contate in `dropped`) invece di rallentare le richieste.
+        Le revisioni più vecchie di `retention_days` vengono eliminate periodicamente.
+
+        Attributes:
+            path (str): Il percorso del file SQLite.
+            retention_days (float): I giorni di conservazione (0: nessun limite).
+            recorded (int): Le revisioni salvate dall'avvio del processo.
+            dropped (int): Le revisioni scartate perché la coda era piena o la scrittura è fallita.
+    """
+
+    # Revisioni scritte al massimo in una transazione, revisioni in attesa e secondi tra due eliminazioni.
+    _BATCH_SIZE = 500
+    _QUEUE_SIZE = 10000
+    _PRUNE_INTERVAL = 3600
+
+    def __init__(self, path: str, retention_days: float = 30) -> None:
+        self.path = path
+        self.retention_days = retention_days
+        self.recorded = 0
+        self.dropped = 0
+        self._queue: "queue.Queue[Dict]" = queue.Queue(self._QUEUE_SIZE)
+        self._pruned = 0.0
+        self._lock = threading.Lock()
+        self._conn = self._connect()
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS reviews ("
+            " id INTEGER PRIMARY KEY, created REAL NOT NULL, code_hash TEXT NOT NULL, review_type TEXT NOT NULL,"
+            " model TEXT NOT NULL, file TEXT, status TEXT NOT NULL, latency_ms REAL, prompt_tokens INTEGER,"
+            " output_tokens INTEGER, max_severity INTEGER, findings_count INTEGER NOT NULL, review TEXT NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS findings ("
+            " review_id INTEGER NOT NULL, line INTEGER, tag TEXT, severity INTEGER, rule TEXT, message TEXT);"
+            "CREATE INDEX IF NOT EXISTS reviews_created ON reviews (created);"
+            "CREATE INDEX IF NOT EXISTS reviews_model ON reviews (model, id);"
+            "CREATE INDEX IF NOT EXISTS reviews_file ON reviews (file, id);"
+            "CREATE INDEX IF NOT EXISTS reviews_severity ON reviews (max_severity, id);"
+            "CREATE INDEX IF NOT EXISTS findings_review ON findings (review_id);"
+        )
+        self._conn.commit()
+        self._writer = threading.Thread(target=self._run, name="review-history", daemon=True)
+        self._writer.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def record(self, entry: Dict) -> bool:
+        """Accoda una revisione senza attendere la scrittura.
+
+            Args:
+                entry (Dict): Le chiavi "code", "review", "review_type", "model", "file", "status",
+                    "latency" (secondi) e "usage" (il `last_usage` del servizio, o None).
+
+            Returns:
+                bool: False se la revisione è stata scartata perché la coda è piena.
+        """
+        try:
+            self._queue.put_nowait({**entry, "created": time.time()})
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def flush(self) -> None:
+        """Attende che tutte le revisioni accodate siano state scritte."""
+        self._queue.join()
+
+    def _run(self) -> None:
+        conn = self._connect()
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self._BATCH_SIZE:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._write(conn, batch)
+                self.recorded += len(batch)
+                if time.time() - self._pruned >= self._PRUNE_INTERVAL:
+                    self._prune(conn)
+            except sqlite3.Error as e:
+                conn.rollback()
+                self.dropped += len(batch)
+                print(f"Errore durante il salvataggio della cronologia delle revisioni: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    @staticmethod
+    def _write(conn: sqlite3.Connection, batch: List[Dict]) -> None:
+        for entry in batch:
+            findings = [] if entry["status"] == "error" else parse_findings(entry["review"])["findings"]
+            ranks = [SEVERITY_LEVELS.index(finding["severity"]) for finding in findings if finding["severity"] in SEVERITY_LEVELS]
+            usage = entry.get("usage") or {}
+            cursor = conn.execute(
+                "INSERT INTO reviews (created, code_hash, review_type, model, file, status, latency_ms, prompt_tokens,"
+                " output_tokens, max_severity, findings_count, review) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (entry["created"], hashlib.sha256(entry["code"].encode("utf-8")).hexdigest(), entry["review_type"],
+                 entry["model"], entry.get("file"), entry["status"], round(entry["latency"] * 1000, 1),
+                 usage.get("prompt_tokens"), usage.get("output_tokens"), min(ranks) if ranks else None,
+                 len(findings), entry["review"]))
+            conn.executemany(
+                "INSERT INTO findings VALUES (?, ?, ?, ?, ?, ?)",
+                [(cursor.lastrowid, finding["line"], finding["tag"],
+                  SEVERITY_LEVELS.index(finding["severity"]) if finding["severity"] in SEVERITY_LEVELS else None,
+                  finding["rule"], finding["message"]) for finding in findings])
+        conn.commit()
+
+    def _prune(self, conn: sqlite3.Connection) -> None:
+        self._pruned = time.time()
+        if self.retention_days <= 0:
+            return
+        cutoff = time.time() - self.retention_days * 86400
+        conn.execute("DELETE FROM findings WHERE review_id IN (SELECT id FROM reviews WHERE created < ?)", (cutoff,))
+        conn.execute("DELETE FROM reviews WHERE created < ?", (cutoff,))
+        conn.commit()
+
+    def search(self, limit: int = 50, cursor: Optional[int] = None, review_type: Optional[str] = None,
+               model: Optional[str] = None, file: Optional[str] = None, min_severity: Optional[str] = None,
+               since: Optional[float] = None, until: Optional[float] = None, text: Optional[str] = None) -> Dict:
+        """Cerca nella cronologia, dalla revisione più recente.
+
+            Args:
+                limit (int, optional): Le revisioni per pagina (al massimo 500).
+                cursor (Optional[int]): Il "next_cursor" della pagina precedente.
+                review_type, model (Optional[str]): Filtri esatti.
+                file (Optional[str]): Il file; se termina con "/", tutti i file della cartella.
+                min_severity (Optional[str]): Solo le revisioni con almeno una segnalazione di questa severità o superiore.
+                since, until (Optional[float]): L'intervallo di tempo (timestamp Unix).
+                text (Optional[str]): Il testo da cercare nei messaggi delle segnalazioni.
+
+            Returns:
+                Dict: "items" (le revisioni, con le segnalazioni e senza il testo della revisione)
+                e "next_cursor" (None se non ci sono altre pagine).
+        """
+        limit = max(1, min(int(limit), 500))
+        conditions, params = [], []
+        for column, value in (("review_type", review_type), ("model", model)):
+            if value:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+        if file:
+            if file.endswith("/"):
+                conditions.append("file >= ? AND file < ?")
+                params += [file, file[:-1] + "0"]
+            else:
+                conditions.append("file = ?")
+                params.append(file)
+        if min_severity in SEVERITY_LEVELS:
+            conditions.append("max_severity <= ?")
+            params.append(SEVERITY_LEVELS.index(min_severity))
+        if since is not None:
+            conditions.append("created >= ?")
+            params.append(since)
+        if until is not None:
+            conditions.append("created < ?")
+            params.append(until)
+        if cursor is not None:
+            conditions.append("id < ?")
+            params.append(int(cursor))
+        if text:
+            conditions.append("EXISTS (SELECT 1 FROM findings WHERE review_id = reviews.id AND message LIKE ?)")
+            params.append(f"%{text}%")
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT id, created, code_hash, review_type, model, file, status, latency_ms, prompt_tokens,"
+                f" output_tokens, max_severity, findings_count FROM reviews {where} ORDER BY id DESC LIMIT ?",
+                (*params, limit + 1)).fetchall()
+            items = [self._item(row) for row in rows[:limit]]
+            self._attach_findings(items)
+        return {"items": items, "next_cursor": items[-1]["id"] if len(rows) > limit else None}
+
+    def get(self, review_id: int) -> Optional[Dict]:
+        """Restituisce una revisione con il suo testo e le segnalazioni, o None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, created, code_hash, review_type, model, file, status, latency_ms, prompt_tokens,"
+                " output_tokens, max_severity, findings_count, review FROM reviews WHERE id = ?", (review_id,)).fetchone()
+            if row is None:
+                return None
+            item = {**self._item(row[:-1]), "review": row[-1]}
+            self._attach_findings([item])
+        return item
+
+    @staticmethod
+    def _item(row) -> Dict:
+        keys = ("id", "created", "code_hash", "review_type", "model", "file", "status", "latency_ms",
+                "prompt_tokens", "output_tokens", "max_severity", "findings_count")
+        item = dict(zip(keys, row))
+        item["max_severity"] = SEVERITY_LEVELS[item["max_severity"]] if item["max_severity"] is not None else None
+        return item
+
+    def _attach_findings(self, items: List[Dict]) -> None:
+        by_id = {item["id"]: item for item in items}
+        for item in items:
+            item["findings"] = []
+        if not by_id:
+            return
+        rows = self._conn.execute(
+            f"SELECT review_id, line, tag, severity, rule, message FROM findings"
+            f" WHERE review_id IN ({','.join('?' * len(by_id))}) ORDER BY review_id, line", tuple(by_id)).fetchall()
+        for review_id, line, tag, severity, rule, message in rows:
+            by_id[review_id]["findings"].append({
+                "line": line, "tag": tag, "severity": SEVERITY_LEVELS[severity] if severity is not None else None,
+                "rule": rule, "message": message})
+
+    def snapshot(self) -> Dict:
+        """Restituisce revisioni conservate, salvate, scartate e in attesa di scrittura."""
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM reviews").fetchone()[0]
+        return {"entries": entries, "recorded": self.recorded, "dropped": self.dropped, "pending": self._queue.qsize()}
+
+
+def search_params(query) -> Dict:
+    """Converte i parametri della query string di `/api/history` negli argomenti di `ReviewHistory.search`.
+
+        I parametri sono "limit", "cursor", "review_type", "model", "file", "min_severity",
+        "since", "until" (timestamp Unix) e "q" (testo da cercare nei messaggi).
+
+        Raises:
+            ValueError: Se "limit", "cursor", "since" o "until" non sono numeri.
+    """
+    params = {name: query.get(name) or None for name in ("review_type", "model", "file")}
+    params["min_severity"] = (query.get("min_severity") or "").upper() or None
+    params["text"] = query.get("q") or None
+    for name, convert in (("limit", int), ("cursor", int), ("since", float), ("until", float)):
+        if query.get(name):
+            params[name] = convert(query[name])
+    return params
+
+
+_history: Optional[ReviewHistory] = None
+_history_lock = threading.Lock()
+
+
+def get_review_history() -> Optional[ReviewHistory]:
+    """Restituisce la cronologia condivisa dal processo, o None se `Config.HISTORY_PATH` è vuoto.
+
+        Alla chiusura del processo vengono scritte le revisioni ancora in coda.
+    """
+    global _history
+    if not Config.HISTORY_PATH:
+        return None
+    with _history_lock:
+        if _history is None:
+            _history = ReviewHistory(Config.HISTORY_PATH, Config.HISTORY_RETENTION_DAYS)
+            atexit.register(_history.flush)
+        return _history
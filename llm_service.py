@@ -1,9 +1,86 @@
+import copy
+import json
 import os
-from typing import Optional
-import ollama
+import time
+from typing import Dict, Generator, Iterator, List, Optional, Tuple
 import requests
 
+from annotations import apply_annotations, parse_annotation_lines
+from cascade import cascade_stats, is_error_response, review_confidence
 from config import Config
+from deadlines import DEADLINE_ERROR, cancellation_stats, estimate_reclaimed
+from docstrings import build_docstring_prompt, docstring_report, insert_docstrings, parse_docstring_response, plan_docstrings
+from findings_parser import REVIEW_TYPE_TAGS, estimate_tokens
+from generation import (GEMINI_TRUNCATED_ERROR, FenceStop, gemini_generation_config, generation_profile,
+                        generation_settings, generation_stats, ollama_options)
+from history import get_review_history
+from micro_batch import get_micro_batcher
+from review_cache import get_review_cache
+from scheduler import DEFAULT_PRIORITY, get_scheduler, normalize_priority
+from static_checks import run_static_checks
+from symbol_index import SymbolIndex, get_symbol_index
+
+# Tipi di revisione che supportano il protocollo ad annotazioni (le docstring richiedono di modificare il codice).
+ANNOTATION_REVIEW_TYPES = ("bug_detection", "syntax_revision", "style_suggestions")
+
+# Un flusso di revisione: produce le operazioni da eseguire come tuple e riceve i loro risultati (vedi `LLMService._run_flow`).
+Flow = Generator[Tuple, object, str]
+
+
+class _StreamCut:
+    """Elabora gli eventi dello stream di `stream_code_review`, per il servizio sincrono e per quello asincrono.
+
+        Interrompe lo stream alla chiusura del blocco di codice (se l'interruzione anticipata è attiva)
+        o alla scadenza della richiesta, aggiorna le statistiche e ricorda il testo generato, per
+        registrare nella cronologia la revisione (o l'errore) a fine stream e il lavoro perso se il
+        client si disconnette.
+    """
+
+    def __init__(self, service: "LLMService", code_snippet: str, review_type: str) -> None:
+        self.service = service
+        self.code_snippet = code_snippet
+        self.review_type = review_type
+        self.start = time.perf_counter()
+        self.generated: List[str] = []
+        self.error: Optional[str] = None
+        settings = service.generation
+        self.fence = FenceStop() if settings is not None and settings["early_stop"] else None
+
+    def feed(self, event: str, text: str) -> Tuple[List[Tuple[str, str]], bool]:
+        """Elabora un evento del backend.
+
+            Returns:
+                tuple: Gli eventi da inoltrare al client e True se lo stream va chiuso.
+        """
+        if event != "chunk":
+            if event == "error":
+                self.error = text
+            return [(event, text)], False
+        if self.fence is not None:
+            received = len(self.fence.text)
+            end = self.fence.feed(text)
+            if end is not None:
+                # Il blocco di codice è chiuso: il resto della generazione non serve
+                text = self.fence.text[received:end]
+                self.generated.append(text)
+                self.service._early_stop_usage(self.fence.text[:end])
+                generation_stats.record(self.review_type, self.service.last_usage["output_tokens"], True)
+                return ([(event, text)] if text else []), True
+        self.generated.append(text)
+        if self.service._remaining() <= 0:
+            cancellation_stats.record_deadline(time.perf_counter() - self.start)
+            self.error = DEADLINE_ERROR
+            return [(event, text), ("error", DEADLINE_ERROR)], True
+        return [(event, text)], False
+
+    def completed(self) -> None:
+        """Registra nella cronologia la revisione generata o, se lo stream è fallito, il messaggio di errore."""
+        self.service._record_history(self.code_snippet, self.review_type, self.error or "".join(self.generated), self.start)
+
+    def cancelled(self) -> None:
+        """Registra l'interruzione dello stream da parte del client."""
+        self.service._record_stream_cancelled(self.code_snippet, self.generated, self.start)
+
 
 class LLMService:
     """Classe di servizio per interagire con vari Large Language Model (LLM).
@@ -18,25 +95,75 @@ class LLMService:
             api_base_url (Optional[str]): URL di base per l'API dell'LLM basato su cloud.
             model_name (Optional[str]): Nome del modello LLM locale (es. 'llama2').
             local_base_url (Optional[str]): URL di base per l'istanza locale di Ollama.
-            llm_choice (str): Memorizza l'LLM scelto ("not local API" o "ollama")
+            llm_choice (str): Memorizza l'LLM scelto ("gemini", "ollama" o "cascade")
                             dopo l'inizializzazione.
+            last_cascade (Optional[dict]): L'esito dell'ultima revisione in modalità cascata
+                            (confidenza, escalation e tempi), o None.
+            last_usage (Optional[dict]): I token di input ("prompt_tokens") e di output
+                            ("output_tokens") dichiarati dal backend per l'ultima chiamata, o None.
+            last_docstring_report (Optional[dict]): Le unità documentate, mancanti e saltate
+                            e i token risparmiati dall'ultimo inserimento locale di docstring, o None.
+            timeout (float): I secondi a disposizione di ciascuna revisione, dal suo inizio.
+            deadline (Optional[float]): L'istante (`time.monotonic()`) oltre il quale le chiamate ai backend
+                            della revisione in corso vengono interrotte o non vengono più eseguite, o None
+                            prima della prima revisione.
+            priority (str): La classe di priorità delle chiamate ai backend ("interactive" o "batch").
+            tenant (str): Il client per cui vengono eseguite le chiamate, usato per la ripartizione equa.
+            last_cache_hit (bool): True se l'ultima revisione è stata letta dalla cache persistente o da quella semantica.
+            last_similarity (Optional[float]): La similarità della funzione da cui è stata adattata l'ultima
+                            revisione (vedi `semantic_cache.SemanticCache`), o None.
+            symbol_index (Optional[SymbolIndex]): L'indice dei simboli del progetto usato per arricchire i prompt, o None.
+            source_module (Optional[str]): Il modulo del progetto a cui appartiene lo snippet, se noto
+                            (risolve gli import relativi nell'indice dei simboli).
+            source_path (Optional[str]): Il file a cui appartiene lo snippet, se noto (salvato nella cronologia).
+            generation (Optional[dict]): Le impostazioni di generazione della revisione in corso
+                            (vedi `generation.generation_settings`), o None per i valori del modello.
     """
     gemini_api_key: Optional[str]
     gemini_api_base_url: Optional[str]
     model_name: Optional[str]
     local_base_url: Optional[str]
     llm_choice: str
-
-
-    def __init__(self) -> None:
+    last_cascade: Optional[Dict]
+    last_usage: Optional[Dict]
+    last_docstring_report: Optional[Dict]
+    timeout: float
+    deadline: Optional[float]
+    priority: str
+    tenant: str
+    last_cache_hit: bool
+    last_similarity: Optional[float]
+    symbol_index: Optional[SymbolIndex]
+    source_module: Optional[str]
+    source_path: Optional[str]
+    generation: Optional[Dict]
+
+
+    def __init__(self, timeout: Optional[float] = None, priority: str = DEFAULT_PRIORITY, tenant: str = "default",
+                 symbol_index: Optional[SymbolIndex] = None) -> None:
         """Inizializza il servizio LLMService e determina quale LLM utilizzare.
 
             Legge la configurazione dall'oggetto `Config` e verifica che
             sia configurato esattamente un solo LLM (o l'API cloud/Gemini o Ollama/locale).
             Configura l'LLM scelto per le chiamate successive.
 
+            Se sono configurati entrambi e `Config.CASCADE_MODE` è attivo, viene scelta
+            la modalità "cascade": il modello locale risponde per primo e Gemini viene
+            interpellato solo per le revisioni a bassa confidenza.
+
+            Args:
+                timeout (Optional[float]): I secondi a disposizione di ciascuna revisione, condivisi da tutte
+                    le sue chiamate ai backend (vedi `deadlines.request_timeout`); la scadenza parte all'inizio
+                    di ogni `generate_code_review` o `stream_code_review`. Il valore predefinito è
+                    `Config.REVIEW_TIMEOUT_SECONDS`.
+                priority (str, optional): La classe di priorità ("interactive" o "batch") con cui le chiamate
+                    vengono accodate dallo scheduler del backend (vedi `scheduler.FairScheduler`).
+                tenant (str, optional): Il client (token API o indirizzo IP) per la ripartizione equa tra client.
+                symbol_index (Optional[SymbolIndex]): L'indice dei simboli del progetto con cui arricchire i prompt.
+                    Il valore predefinito è l'indice condiviso di `Config.SYMBOL_INDEX_ROOT`, se impostata.
+
             Raises:
-                ValueError: Se sono configurati sia Gemini/API cloud che Ollama,
+                ValueError: Se sono configurati sia Gemini/API cloud che Ollama senza la modalità cascata,
                             o se nessun LLM è configurato nel file .env.
 
             Examples:
@@ -63,11 +190,28 @@ class LLMService:
         self.gemini_api_base_url = Config.GEMINI_API_BASE_URL
         self.model_name = Config.MODEL_NAME
         self.local_base_url = Config.LOCAL_BASE_URL
+        self.last_cascade = None
+        self.last_usage = None
+        self.last_docstring_report = None
+        self.last_cache_hit = False
+        self.last_similarity = None
+        self.symbol_index = symbol_index if symbol_index is not None else get_symbol_index()
+        self.source_module = None
+        self.source_path = None
+        self.generation = None
+        self._symbol_context_memo = (None, "")
+        self.timeout = timeout if timeout is not None else Config.REVIEW_TIMEOUT_SECONDS
+        self.deadline = None
+        self.priority = normalize_priority(priority)
+        self.tenant = tenant
         # 2 modelli usati contemporaneamente non fanno distinguere quale chiamare
         gemini_configured = self.gemini_api_key and self.gemini_api_base_url
         ollama_configured = self.model_name and self.local_base_url
 
-        if gemini_configured and ollama_configured:
+        if gemini_configured and ollama_configured and Config.CASCADE_MODE:
+            self.llm_choice = "cascade"
+            os.environ["OLLAMA_HOST"] = str(self.local_base_url)
+        elif gemini_configured and ollama_configured:
             # Se entrambi sono configurati, solleva un errore o scegli una priorità
             raise ValueError("Sono configurati sia Gemini che Ollama. "
             "Si prega di configurarne solo uno nel file .env.")
@@ -99,7 +243,7 @@ class LLMService:
             Raises:
                 requests.exceptions.HTTPError: Per errori HTTP (ad esempio, risposte 4xx, 5xx).
                 requests.exceptions.ConnectionError: Per errori relativi alla rete.
-                requests.exceptions.Timeout: Se la richiesta scade dopo 300 secondi.
+                requests.exceptions.Timeout: Se la richiesta supera la scadenza (vedi `deadline`).
                 requests.exceptions.RequestException: Per qualsiasi altro errore generale relativo a `requests`.
                 ValueError: Se il parsing JSON fallisce a causa di un formato di risposta non valido dall'API.
                 Exception: Per qualsiasi altro errore imprevisto durante il processo.
@@ -111,9 +255,175 @@ class LLMService:
                 # response = service._LLMService__call_llm_api("Raccontami una breve storia su un prode cavaliere.")
                 # print(response)
         """
+        return self._run_flow(self._generation_flow("gemini", prompt))
+
+
+    def __request_gemini(self, prompt: str) -> str:
+        """Esegue la chiamata a Gemini, una volta ottenuto lo slot dallo scheduler."""
         if not self.gemini_api_key or not self.gemini_api_base_url:
             return "Errore: API Key o Base URL per il modello selezionati non configurati."
 
+        timeout = self._remaining()
+        if timeout <= 0:
+            return self._deadline_error()
+
+        try:
+            response = requests.post(self.gemini_api_base_url, **self._gemini_request(prompt), timeout=timeout)
+            response.raise_for_status()
+            return self._gemini_response_text(response.json())
+
+        except requests.exceptions.HTTPError as e:
+            return self._gemini_error("http", e)
+        except requests.exceptions.ConnectionError as e:
+            return self._gemini_error("connection", e)
+        except requests.exceptions.Timeout as e:
+            cancellation_stats.record_deadline(timeout)
+            return self._gemini_error("timeout", e)
+        except requests.exceptions.RequestException as e:
+            return self._gemini_error("request", e)
+        except ValueError as e: # Per errori di parsing JSON
+            return self._gemini_error("parsing", e)
+        except Exception as e:
+            return self._gemini_error("unexpected", e)
+
+
+    def _start_deadline(self) -> None:
+        """Fa partire la scadenza di una nuova revisione: `timeout` secondi da adesso."""
+        self.deadline = time.monotonic() + self.timeout
+
+
+    def _remaining(self) -> float:
+        """Restituisce i secondi che mancano alla scadenza della revisione (negativi se superata)."""
+        if self.deadline is None:
+            return self.timeout
+        return self.deadline - time.monotonic()
+
+
+    def _scheduled(self, backend: str, prompt: str, call) -> str:
+        """Esegue `call(prompt)` quando lo scheduler del backend concede uno slot alla richiesta.
+
+            L'attesa in coda rientra nella scadenza della richiesta: se lo slot non arriva in tempo,
+            la chiamata non viene eseguita e viene restituito l'errore di scadenza.
+        """
+        try:
+            with get_scheduler(backend).slot(self.priority, self.tenant, estimate_tokens(prompt), self._remaining()):
+                return call(prompt)
+        except TimeoutError:
+            return self._deadline_error()
+
+
+    def _scheduled_stream(self, backend: str, prompt: str, stream_factory) -> Iterator[Tuple[str, str]]:
+        """Come `_scheduled`, ma mantiene lo slot del backend per tutta la durata dello stream."""
+        try:
+            with get_scheduler(backend).slot(self.priority, self.tenant, estimate_tokens(prompt), self._remaining()):
+                stream = stream_factory(prompt)
+                try:
+                    yield from stream
+                finally:
+                    stream.close()
+        except TimeoutError:
+            yield "error", self._deadline_error()
+
+
+    def _run_flow(self, flow: Flow) -> str:
+        """Esegue un flusso di revisione con le chiamate sincrone e ne restituisce il risultato.
+
+            I flussi (`_review_flow`, `_cascade_flow`, `_generation_flow` ...) contengono l'intera logica
+            delle revisioni e sono condivisi con `AsyncLLMService`: invece di chiamare i backend, producono
+            le operazioni da eseguire come tuple e ricevono il loro risultato (vedi `_perform`). Questo
+            metodo le esegue direttamente, `AsyncLLMService._run_flow_async` le attende senza bloccare l'event loop.
+        """
+        result = None
+        while True:
+            try:
+                operation = flow.send(result)
+            except StopIteration as stop:
+                return stop.value
+            result = self._perform(*operation)
+
+
+    def _perform(self, kind: str, *args):
+        """Esegue un'operazione di un flusso di revisione.
+
+            - ("io", funzione, *argomenti): lavoro locale bloccante (cache su disco, cache semantica);
+            - ("backend", prompt): chiamata al backend scelto (vedi `_call_backend`);
+            - ("batch", snippet, tipo): revisione tramite il micro-batcher (vedi `_micro_batch`);
+            - ("request", backend, prompt): una chiamata al backend, dopo aver ottenuto lo slot dallo scheduler;
+            - ("until_fence", backend, prompt): una chiamata in streaming letta fino alla chiusura del blocco di codice.
+        """
+        if kind == "io":
+            function, *rest = args
+            return function(*rest)
+        if kind == "backend":
+            return self._call_backend(*args)
+        if kind == "batch":
+            return self._micro_batch(*args)
+        backend, prompt = args
+        if kind == "request":
+            return self._scheduled(backend, prompt, self.__request_gemini if backend == "gemini" else self._request_ollama)
+        stream_factory = self._stream_gemini if backend == "gemini" else self._stream_ollama
+        return self._generate_until_fence(self._scheduled_stream(backend, prompt, stream_factory))
+
+
+    def _generation_flow(self, backend: str, prompt: str) -> Flow:
+        """Flusso di una chiamata al backend con le impostazioni di `self.generation`.
+
+            Con l'interruzione anticipata attiva, la risposta viene letta in streaming e lo stream
+            viene chiuso (il modello smette di generare) appena arriva la chiusura del blocco di codice.
+        """
+        settings = self.generation
+        if settings is not None and settings["early_stop"]:
+            review, early_stopped = yield ("until_fence", backend, prompt)
+        else:
+            review, early_stopped = (yield ("request", backend, prompt)), False
+        if settings is not None and not is_error_response(review):
+            generation_stats.record(settings["review_type"], (self.last_usage or {}).get("output_tokens"), early_stopped)
+        return review
+
+
+    def _generate_until_fence(self, stream) -> Tuple[str, bool]:
+        """Legge uno stream fino alla chiusura del blocco di codice (vedi `generation.FenceStop`).
+
+            Returns:
+                tuple: Il testo generato (o il messaggio di errore) e True se lo stream è stato interrotto.
+        """
+        self.last_usage = None
+        fence = FenceStop()
+        try:
+            for event, text in stream:
+                outcome = self._fence_step(fence, event, text)
+                if outcome is not None:
+                    return outcome
+        finally:
+            stream.close()
+        return fence.text, False
+
+
+    def _fence_step(self, fence: FenceStop, event: str, text: str) -> Optional[Tuple[str, bool]]:
+        """Elabora un evento di `_generate_until_fence`: restituisce l'esito se lo stream va chiuso, altrimenti None."""
+        if event == "error":
+            return text, False
+        end = fence.feed(text)
+        if end is None:
+            return None
+        self._early_stop_usage(fence.text[:end])
+        return fence.text[:end], True
+
+
+    def _early_stop_usage(self, kept: str) -> None:
+        """Aggiorna `last_usage` di una generazione interrotta: i token di output sono stimati sul testo ricevuto."""
+        usage = self.last_usage or {"prompt_tokens": None}
+        self.last_usage = {"prompt_tokens": usage.get("prompt_tokens"), "output_tokens": estimate_tokens(kept)}
+
+
+    def _deadline_error(self) -> str:
+        """Registra una chiamata saltata per scadenza superata e restituisce il messaggio di errore."""
+        cancellation_stats.record_deadline()
+        return DEADLINE_ERROR
+
+
+    def _gemini_request(self, prompt: str) -> Dict:
+        """Costruisce intestazioni, parametri e payload della richiesta a Gemini (condivisi dal client sincrono e asincrono)."""
         headers = {
             "Content-Type": "application/json"
         }
@@ -130,37 +440,54 @@ class LLMService:
                 }
             ],
         }
+        if self.generation is not None:
+            payload["generationConfig"] = gemini_generation_config(self.generation)
+        return {"headers": headers, "params": params, "json": payload}
 
-        try:
-            response = requests.post(self.gemini_api_base_url, headers=headers, 
-                                     params=params, json=payload, timeout=300)
-            response.raise_for_status()
-            response_json = response.json()
 
-            if 'candidates' in response_json and response_json['candidates']:
-                generated_text = response_json['candidates'][0]['content']['parts'][0]['text']
-                return generated_text
-            else:
-                return "Nessuna revisione generata da Gemini."
+    def _gemini_response_text(self, response_json: Dict) -> str:
+        """Estrae il testo generato dalla risposta JSON di Gemini e salva i token dichiarati in `last_usage`."""
+        usage = response_json.get('usageMetadata', {})
+        self.last_usage = {
+            "prompt_tokens": usage.get('promptTokenCount'),
+            "output_tokens": usage.get('candidatesTokenCount'),
+        }
 
-        except requests.exceptions.HTTPError as e:
-            print(f"Errore HTTP durante la chiamata a Gemini: {e}")
-            return f"Errore HTTP dall'API di Gemini: {e}"
-        except requests.exceptions.ConnectionError as e:
-            print(f"Errore di connessione durante la chiamata a Gemini: {e}")
-            return f"Errore di connessione a Gemini: {e}"
-        except requests.exceptions.Timeout as e:
-            print(f"Timeout durante la chiamata a Gemini: {e}")
-            return "Timeout della chiamata a Gemini."
-        except requests.exceptions.RequestException as e:
-            print(f"Errore generico durante la chiamata a Gemini: {e}")
-            return f"Si è verificato un errore durante la chiamata a Gemini: {e}"
-        except ValueError as e: # Per errori di parsing JSON
-            print(f"Errore di parsing JSON dalla risposta di Gemini: {e}")
-            return f"Errore di parsing dalla risposta di Gemini: {e}"
-        except Exception as e:
-            print(f"Errore inaspettato durante la chiamata a Gemini: {e}")
-            return f"Si è verificato un errore inaspettato: {e}"
+        if 'candidates' in response_json and response_json['candidates']:
+            candidate = response_json['candidates'][0]
+            parts = candidate.get('content', {}).get('parts', [])
+            if not parts:
+                # Es. con Gemini 2.5 i token di ragionamento possono esaurire il limite prima della risposta
+                return f"Nessuna revisione generata da Gemini (motivo: {candidate.get('finishReason', 'sconosciuto')})."
+            if self._gemini_truncated(candidate):
+                return GEMINI_TRUNCATED_ERROR
+            return "".join(part.get('text', "") for part in parts)
+        else:
+            return "Nessuna revisione generata da Gemini."
+
+
+    def _gemini_error(self, kind: str, error: Exception) -> str:
+        """Traduce un errore della chiamata a Gemini nel messaggio restituito al posto della revisione.
+
+            Args:
+                kind (str): La categoria dell'errore ("http", "connection", "timeout", "request",
+                    "parsing" o "unexpected"), indipendente dal client HTTP usato.
+                error (Exception): L'eccezione sollevata.
+
+            Returns:
+                str: Il messaggio di errore (vedi `cascade.ERROR_PREFIXES`).
+        """
+        log, message = {
+            "http": ("Errore HTTP durante la chiamata a Gemini", f"Errore HTTP dall'API di Gemini: {error}"),
+            "connection": ("Errore di connessione durante la chiamata a Gemini", f"Errore di connessione a Gemini: {error}"),
+            "timeout": ("Timeout durante la chiamata a Gemini", "Timeout della chiamata a Gemini."),
+            "request": ("Errore generico durante la chiamata a Gemini",
+                        f"Si è verificato un errore durante la chiamata a Gemini: {error}"),
+            "parsing": ("Errore di parsing JSON dalla risposta di Gemini", f"Errore di parsing dalla risposta di Gemini: {error}"),
+            "unexpected": ("Errore inaspettato durante la chiamata a Gemini", f"Si è verificato un errore inaspettato: {error}"),
+        }[kind]
+        print(f"{log}: {error}")
+        return message
 
 
     def call_local_llm(self, prompt: str) -> str:
@@ -188,27 +515,64 @@ class LLMService:
                 # response = service.call_local_llm("Riassumi il GIL di Python.")
                 # print(response)
         """
+        return self._run_flow(self._generation_flow("ollama", prompt))
+
+
+    def _request_ollama(self, prompt: str) -> str:
+        """Esegue la chiamata a Ollama, una volta ottenuto lo slot dallo scheduler."""
         if not self.model_name:
             return "Errore: Nome del modello Ollama non configurato."
 
-        try:
-            response = ollama.chat(model=self.model_name, messages=[{'role': 'user', 'content': prompt}]) # type: ignore
-    
+        timeout = self._remaining()
+        if timeout <= 0:
+            return self._deadline_error()
 
-            if 'message' in response and 'content' in response['message']:
-                generated_text = response['message']['content']
-                return generated_text
-            else:
-                return "Nessuna risposta valida da Ollama."
+        # Importati solo quando serve Ollama: la CLI con Gemini si avvia senza caricarli
+        import httpx
+        import ollama
+
+        try:
+            # Un client per chiamata, così che il timeout sia quello rimasto alla richiesta
+            with ollama.Client(host=self.local_base_url, timeout=timeout) as client:
+                response = client.chat(model=self.model_name, messages=[{'role': 'user', 'content': prompt}],
+                                       options=ollama_options(self.generation)) # type: ignore
+            return self._ollama_response_text(response)
 
         except ollama.ResponseError as e:
-            # Cattura errori specifici dalla libreria Ollama
-            print(f"Errore dalla risposta di Ollama (ad es. modello non trovato): {e}")
-            return f"Errore dall'API di Ollama: {e}"
+            return self._ollama_error(e, "response")
+        except httpx.TimeoutException as e:
+            cancellation_stats.record_deadline(timeout)
+            return self._ollama_error(e, "timeout")
         except Exception as e:
-            # Cattura altri errori generici che potrebbero verificarsi durante la chiamata
-            print(f"Errore inaspettato durante la chiamata a Ollama: {e}")
-            return f"Si è verificato un errore inaspettato: {e}"
+            return self._ollama_error(e)
+
+
+    def _ollama_response_text(self, response) -> str:
+        """Estrae il testo generato dalla risposta di Ollama e salva i token dichiarati in `last_usage`."""
+        self.last_usage = {
+            "prompt_tokens": response['prompt_eval_count'] if 'prompt_eval_count' in response else None,
+            "output_tokens": response['eval_count'] if 'eval_count' in response else None,
+        }
+
+        if 'message' in response and 'content' in response['message']:
+            generated_text = response['message']['content']
+            return generated_text
+        else:
+            return "Nessuna risposta valida da Ollama."
+
+
+    def _ollama_error(self, error: Exception, kind: str = "unexpected") -> str:
+        """Traduce un errore della chiamata a Ollama ("response", "timeout" o "unexpected") nel messaggio restituito."""
+        if kind == "timeout":
+            print(f"Timeout durante la chiamata a Ollama: {error}")
+            return "Timeout della chiamata a Ollama."
+        if kind == "response":
+            # Errori specifici dalla libreria Ollama (es. modello non trovato o problemi del server)
+            print(f"Errore dalla risposta di Ollama (ad es. modello non trovato): {error}")
+            return f"Errore dall'API di Ollama: {error}"
+        # Altri errori generici che potrebbero verificarsi durante la chiamata
+        print(f"Errore inaspettato durante la chiamata a Ollama: {error}")
+        return f"Si è verificato un errore inaspettato: {error}"
         
 
     def _generate_review_prompt(self, code_snippet: str = "", review_type: str = "bug_detection") -> str:
@@ -354,6 +718,210 @@ class LLMService:
         return prompt
     
 
+    def _generate_annotation_prompt(self, code_snippet: str = "", review_type: str = "bug_detection") -> str:
+        """Genera il prompt del protocollo ad annotazioni, in cui l'LLM non ripete il codice.
+
+            Invece di restituire il codice originale con i commenti, il modello restituisce
+            solo le segnalazioni, una per riga, come oggetti JSON ancorati al numero di riga.
+            Il codice viene mostrato con i numeri di riga per rendere l'ancoraggio affidabile.
+            I commenti vengono poi inseriti localmente da `annotations.apply_annotations`,
+            quindi i token generati non crescono con la dimensione del file.
+
+            Args:
+                code_snippet (str, optional): Lo snippet di codice da revisionare.
+                review_type (str, optional): Il tipo di revisione ("bug_detection",
+                                 "syntax_revision" o "style_suggestions").
+
+            Returns:
+                str: La stringa del prompt formattato, pronta per essere inviata all'LLM.
+        """
+        focus = {
+            "bug_detection": "bug, errori logici e problemi di runtime (eccezioni non gestite, indici fuori range, "
+                             "divisioni per zero, argomenti di default mutabili, gestione impropria delle risorse)",
+            "syntax_revision": "errori di sintassi, costrutti Python non validi e sintassi deprecata",
+            "style_suggestions": "violazioni dello standard PEP8, problemi di stile e di nomenclatura",
+        }[review_type]
+        tags = ", ".join(sorted(REVIEW_TYPE_TAGS[review_type]))
+        numbered = "\n".join(f"{number}: {line}" for number, line in enumerate(code_snippet.splitlines(), start=1))
+
+        prompt = ( f'''
+                Sei un revisore esperto di codice Python. Analizza il codice fornito cercando: {focus}.
+
+                FORMATO OUTPUT:
+                - NON restituire il codice. Restituisci SOLO le segnalazioni, una per riga, ciascuna come oggetto JSON:
+                  {{"line": <numero di riga>, "tag": "<TAG>", "severity": "<SEVERITÀ>", "rule": "<codice PEP8 o null>", "message": "<descrizione concisa>"}}
+                - TAG ammessi: {tags}.
+                - SEVERITÀ: CRITICA/ALTA/MEDIA/BASSA. "rule" è il codice della regola PEP8 (es. E501) solo per il tag PEP8.
+                - Per OGNI problema inserisci ESATTAMENTE UNA segnalazione. Se non rilevi problemi, non restituire nulla.
+                Il codice da revisionare (con i numeri di riga) è:
+                '''
+                f"{numbered}" )
+        return prompt
+
+
+    def _apply_annotation_response(self, code_snippet: str, response: str) -> str:
+        """Inserisce nel codice originale le segnalazioni restituite con il protocollo ad annotazioni.
+
+            Se il backend ha restituito un messaggio di errore, questo viene restituito invariato.
+        """
+        if is_error_response(response):
+            return response
+        findings = parse_annotation_lines(response, len(code_snippet.splitlines()))
+        return apply_annotations(code_snippet, findings)
+
+
+    def _apply_docstring_response(self, code_snippet: str, units: Dict, response: str) -> str:
+        """Inserisce nel codice originale le docstring restituite dall'LLM e ne salva il report.
+
+            Se il backend ha restituito un messaggio di errore, questo viene restituito invariato.
+        """
+        if is_error_response(response):
+            return response
+        docstrings = parse_docstring_response(response, units["units"])
+        self.last_docstring_report = docstring_report(units, docstrings, response, code_snippet)
+        return insert_docstrings(code_snippet, units["units"], docstrings)
+
+
+    def _review_plan(self, code_snippet: str, review_type: str):
+        """Sceglie il prompt da inviare e la funzione che trasforma la risposta nel codice revisionato.
+
+            Con `Config.REVIEW_PROTOCOL` impostato a "annotations":
+            - per bug, sintassi e stile viene usato `_generate_annotation_prompt` e i commenti
+              vengono inseriti localmente;
+            - per "doc_strings_add" vengono chieste solo le docstring delle unità che ne hanno
+              bisogno (vedi `docstrings.find_units`), poi inserite localmente. Se nessuna unità
+              ne ha bisogno, il prompt è None e il codice viene restituito senza chiamare l'LLM.
+              Se il codice non è analizzabile con `ast`, si usa il prompt tradizionale.
+
+            Con un indice dei simboli (`self.symbol_index`), il prompt include le firme dei simboli
+            del progetto usati dallo snippet (vedi `_with_symbol_context`). Gli snippet con firme da
+            aggiungere non passano dal micro-batching, che compone un prompt con più snippet.
+
+            Imposta anche `self.generation`, le impostazioni di generazione del tipo di revisione e del protocollo.
+
+            Returns:
+                tuple: Il prompt (o None) e la funzione di post-elaborazione della risposta.
+        """
+        input_tokens = estimate_tokens(code_snippet)
+        if Config.REVIEW_PROTOCOL == "annotations" and review_type in ANNOTATION_REVIEW_TYPES:
+            self.generation = generation_settings(review_type, input_tokens, "annotations", early_stop=False)
+            prompt = self._generate_annotation_prompt(code_snippet=code_snippet, review_type=review_type)
+            return self._with_symbol_context(prompt, code_snippet), lambda response: self._apply_annotation_response(code_snippet, response)
+
+        if Config.REVIEW_PROTOCOL == "annotations" and review_type == "doc_strings_add":
+            units = plan_docstrings(code_snippet)
+            if units is not None:
+                if not units["units"]:
+                    self.last_docstring_report = docstring_report(units, {}, "", code_snippet)
+                    return None, lambda response: code_snippet
+                self.generation = generation_settings(review_type, input_tokens, "docstrings", early_stop=False)
+                prompt = build_docstring_prompt(code_snippet, units["units"])
+                return self._with_symbol_context(prompt, code_snippet), lambda response: self._apply_docstring_response(code_snippet, units, response)
+
+        self.generation = generation_settings(review_type, input_tokens)
+        prompt = self._generate_review_prompt(code_snippet=code_snippet, review_type=review_type)
+        return self._with_symbol_context(prompt, code_snippet), lambda response: response
+
+
+    def _symbol_context(self, code_snippet: str) -> str:
+        """Restituisce le firme dei simboli del progetto usati dallo snippet (vedi `symbol_index.SymbolIndex.context_for`)."""
+        if self.symbol_index is None:
+            return ""
+        if self._symbol_context_memo[0] != code_snippet:
+            self._symbol_context_memo = (code_snippet, self.symbol_index.context_for(code_snippet, module=self.source_module))
+        return self._symbol_context_memo[1]
+
+
+    def _with_symbol_context(self, prompt: str, code_snippet: str) -> str:
+        """Aggiunge al prompt, subito prima del codice, le firme dei simboli definiti in altri moduli e usati dallo snippet.
+
+            Le istruzioni restano all'inizio del prompt, identiche per tutte le richieste dello stesso tipo.
+            Senza indice dei simboli, o se lo snippet non usa simboli del progetto, il prompt non cambia.
+        """
+        context = self._symbol_context(code_snippet)
+        if not context:
+            return prompt
+        section = ("CONTESTO DEL PROGETTO (solo come riferimento: NON revisionarlo e NON includerlo nella risposta).\n"
+                   "Firme delle funzioni e classi definite in altri moduli e usate dal codice:\n"
+                   f"```python\n{context}\n```\n\n")
+        # I prompt terminano con "Il codice ... è:" seguito dal codice
+        label = prompt.rfind("Il codice", 0, max(0, len(prompt) - len(code_snippet)))
+        if label < 0:
+            return section + prompt
+        line_start = prompt.rfind("\n", 0, label) + 1
+        return prompt[:line_start] + section + prompt[line_start:]
+
+
+    def _call_backend(self, prompt: str) -> str:
+        """Invia il prompt al backend scelto durante l'inizializzazione ("gemini" o "ollama")."""
+        if self.llm_choice == "gemini":
+            return self.__call_gemini(prompt)
+        return self.call_local_llm(prompt)
+
+
+    def _cascade_flow(self, code_snippet: str, review_type: str, prompt: str, postprocess=None) -> Flow:
+        """Flusso di una revisione in cascata: prima il modello locale, poi Gemini se necessario.
+
+            I controlli statici e la revisione del modello locale vengono usati per stimare
+            la confidenza (vedi `cascade.review_confidence`). Se la confidenza è inferiore a
+            `Config.CASCADE_CONFIDENCE_THRESHOLD`, il prompt viene inoltrato a Gemini.
+            Se anche Gemini fallisce, viene restituita la revisione locale.
+            L'esito viene salvato in `self.last_cascade` e sommato a `cascade.cascade_stats`.
+
+            Args:
+                code_snippet (str): Lo snippet di codice Python da revisionare.
+                review_type (str): Il tipo di revisione da eseguire.
+                prompt (str): Il prompt già generato da `_generate_review_prompt`.
+                postprocess (callable, optional): La funzione applicata alla risposta grezza di
+                    ciascun backend prima di stimarne la confidenza (es. l'inserimento delle annotazioni).
+
+            Returns:
+                str: La revisione del modello locale o, in caso di escalation, quella di Gemini.
+        """
+        postprocess = postprocess or (lambda response: response)
+
+        start = time.perf_counter()
+        local_review = postprocess((yield from self._generation_flow("ollama", prompt)))
+        local_time = time.perf_counter() - start
+
+        scores, escalated = self._cascade_decision(code_snippet, review_type, local_review)
+
+        review = local_review
+        remote_time = 0.0
+        if escalated:
+            start = time.perf_counter()
+            review = postprocess((yield from self._generation_flow("gemini", prompt)))
+            remote_time = time.perf_counter() - start
+
+        return self._cascade_result(scores, escalated, local_review, review, local_time, remote_time)
+
+
+    def _cascade_decision(self, code_snippet: str, review_type: str, local_review: str):
+        """Stima la confidenza della revisione locale e decide se inoltrare il prompt a Gemini.
+
+            Returns:
+                tuple: I punteggi di `cascade.review_confidence` e True se serve l'escalation.
+        """
+        scores = review_confidence(code_snippet, local_review, review_type, run_static_checks(code_snippet))
+        return scores, scores["confidence"] < Config.CASCADE_CONFIDENCE_THRESHOLD
+
+
+    def _cascade_result(self, scores: Dict, escalated: bool, local_review: str, review: str,
+                        local_time: float, remote_time: float) -> str:
+        """Registra l'esito della cascata e sceglie la revisione finale (quella locale se Gemini fallisce)."""
+        if escalated and is_error_response(review) and not is_error_response(local_review):
+            review = local_review
+
+        self.last_cascade = {
+            **scores,
+            "escalated": escalated,
+            "local_time": local_time,
+            "remote_time": remote_time,
+        }
+        cascade_stats.record(escalated, local_time, remote_time)
+        return review
+
+
     def generate_code_review(self, code_snippet: str, review_type: str = "bug_detection") -> str:
         """Genera una revisione del codice per un dato snippet utilizzando l'LLM selezionato.
 
@@ -361,6 +929,19 @@ class LLMService:
             genera un prompt specifico basato sul `review_type` e poi invia
             questo prompt all'LLM configurato (basato su cloud o locale).
 
+            Con `Config.REVIEW_PROTOCOL` impostato a "annotations", il modello restituisce solo
+            le segnalazioni (o, per "doc_strings_add", solo i testi delle docstring) e il codice
+            revisionato viene composto localmente; il formato del risultato non cambia (vedi `_review_plan`).
+
+            Con `Config.MICRO_BATCH_WINDOW_MS` maggiore di 0 e il protocollo "echo", le richieste
+            concorrenti dello stesso tipo vengono raggruppate in un unico prompt dal micro-batcher
+            condiviso (vedi `micro_batch.MicroBatcher`). La modalità cascata non usa il micro-batching,
+            perché la confidenza viene stimata snippet per snippet.
+
+            Le revisioni riuscite vengono salvate nella cache persistente (vedi `review_cache.ReviewCache`):
+            lo stesso codice, con lo stesso tipo di revisione, modello e protocollo, non viene inviato di nuovo.
+            Ogni revisione, anche letta dalla cache o fallita, viene accodata alla cronologia (vedi `history.ReviewHistory`).
+
             Args:   
             code_snippet (str): Lo snippet di codice Python da revisionare.
             review_type (str, optional): Il tipo di revisione da eseguire.
@@ -376,7 +957,7 @@ class LLMService:
 
             Raises:
                 ValueError: Se la `llm_choice` determinata durante l'inizializzazione
-                    non è un'opzione supportata ("not local API" o "ollama").
+                    non è un'opzione supportata ("gemini", "ollama" o "cascade").
 
             Examples:
             # Supponendo che sia configurata l'opzione 'not local API'
@@ -391,9 +972,419 @@ class LLMService:
             # print(reviewed_code)
             # x = 1 # PEP8: E225 - missing whitespace around operator
         """
-        if self.llm_choice == "gemini":
-            return self.__call_gemini(self._generate_review_prompt(code_snippet=code_snippet, review_type=review_type))
-        elif self.llm_choice == "ollama":
-            return self.call_local_llm(self._generate_review_prompt(code_snippet=code_snippet, review_type=review_type))
+        return self._run_flow(self._review_flow(code_snippet, review_type))
+
+
+    def prepare_gemini_request(self, code_snippet: str, review_type: str = "bug_detection") -> Dict:
+        """Prepara una revisione la cui richiesta a Gemini viene inviata da chi chiama (es. con l'API batch).
+
+            Prompt, impostazioni di generazione e post-elaborazione sono quelli di `generate_code_review`
+            (vedi `_review_plan`). Se la revisione è già nella cache persistente, o non richiede il modello
+            (es. docstring già presenti), viene restituita subito e accodata alla cronologia.
+
+            Args:
+                code_snippet (str): Lo snippet di codice Python da revisionare.
+                review_type (str, optional): Il tipo di revisione. Il valore predefinito è "bug_detection".
+
+            Returns:
+                dict: La revisione preparata, da passare a `finish_gemini_response`. Contiene "review"
+                (la revisione già disponibile, o None), "source" ("cache", "local" o None) e "request"
+                (il corpo della richiesta `generateContent`, o None se la revisione è già disponibile).
+        """
+        start = time.perf_counter()
+        key, cached = self._cached_review(code_snippet, review_type)
+        prepared = {"code": code_snippet, "review_type": review_type, "cache_key": key, "start": start,
+                    "review": cached, "source": "cache" if cached is not None else None, "request": None}
+        if cached is None:
+            prompt, prepared["postprocess"] = self._review_plan(code_snippet, review_type)
+            if prompt is None:
+                prepared["review"], prepared["source"] = prepared["postprocess"](""), "local"
+            else:
+                prepared["request"] = self._gemini_request(prompt)["json"]
+        if prepared["review"] is not None:
+            self._record_history(code_snippet, review_type, prepared["review"], start)
+        return prepared
+
+
+    def finish_gemini_response(self, prepared: Dict, response_json: Optional[Dict] = None, error: Optional[str] = None,
+                               start: Optional[float] = None) -> str:
+        """Completa una revisione di `prepare_gemini_request` con la risposta di Gemini ricevuta da chi chiama.
+
+            La risposta viene post-elaborata come in `generate_code_review`; la revisione riuscita viene
+            salvata nella cache persistente e ogni revisione viene accodata alla cronologia.
+
+            Args:
+                prepared (dict): La revisione restituita da `prepare_gemini_request`.
+                response_json (dict, optional): La risposta `generateContent` di Gemini.
+                error (str, optional): Il messaggio di errore da restituire se la richiesta è fallita.
+                start (float, optional): L'istante (`time.perf_counter`) da cui misurare la latenza
+                    registrata in cronologia. Se None, quello della preparazione.
+
+            Returns:
+                str: Il codice revisionato, o il messaggio di errore.
+        """
+        if response_json is None:
+            review = error or "Nessuna revisione generata da Gemini."
         else:
+            review = prepared["postprocess"](self._gemini_response_text(response_json))
+        self._store_review(prepared["cache_key"], prepared["review_type"], review)
+        self._record_history(prepared["code"], prepared["review_type"], review, start if start is not None else prepared["start"])
+        return review
+
+
+    def _check_llm_choice(self) -> None:
+        if self.llm_choice not in ("gemini", "ollama", "cascade"):
             raise ValueError(f"Scelta LLM '{self.llm_choice}' non supportata per la generazione della revisione.")
+
+
+    def _review_flow(self, code_snippet: str, review_type: str) -> Flow:
+        """Flusso di `generate_code_review`, condiviso con `AsyncLLMService` (vedi `_run_flow`).
+
+            Le letture e le scritture delle cache (SQLite e cache semantica) sono operazioni "io":
+            il servizio asincrono le esegue in un thread, senza bloccare l'event loop.
+        """
+        self._check_llm_choice()
+        self._start_deadline()
+
+        start = time.perf_counter()
+        key, cached = yield ("io", self._cached_review, code_snippet, review_type)
+        group = None
+        if cached is None:
+            group, cached = yield ("io", self._similar_review, code_snippet, review_type)
+        if cached is not None:
+            self._record_history(code_snippet, review_type, cached, start)
+            return cached
+        prompt, postprocess = self._review_plan(code_snippet, review_type)
+        review = yield from self._planned_review_flow(code_snippet, review_type, prompt, postprocess)
+        if key is not None:
+            yield ("io", self._store_review, key, review_type, review)
+        if group is not None:
+            yield ("io", self._store_similar, group, code_snippet, review)
+        self._record_history(code_snippet, review_type, review, start)
+        return review
+
+
+    def _planned_review_flow(self, code_snippet: str, review_type: str, prompt: Optional[str], postprocess) -> Flow:
+        """Flusso della revisione con il backend scelto, a partire dal piano di `_review_plan` (senza cache)."""
+        if prompt is None:
+            return postprocess("")
+        if self.llm_choice == "cascade":
+            return (yield from self._cascade_flow(code_snippet, review_type, prompt, postprocess))
+        if self._micro_batched(code_snippet):
+            return (yield ("batch", code_snippet, review_type))
+        return postprocess((yield ("backend", prompt)))
+
+
+    def _micro_batched(self, code_snippet: str) -> bool:
+        """Indica se la revisione passa dal micro-batcher condiviso (solo protocollo "echo" e snippet senza firme)."""
+        return (get_micro_batcher() is not None and Config.REVIEW_PROTOCOL == "echo"
+                and not self._symbol_context(code_snippet))
+
+
+    def _micro_batch(self, code_snippet: str, review_type: str) -> str:
+        """Accoda lo snippet al micro-batcher, con il backend, la priorità e la scadenza della richiesta.
+
+            `last_usage` riceve la quota dei token del micro-batch attribuita allo snippet (vedi `micro_batch.split_usage`).
+        """
+        review, self.last_usage = get_micro_batcher().submit(
+            review_type, code_snippet,
+            lambda code: self._generate_review_prompt(code_snippet=code, review_type=review_type),
+            lambda batch_prompt: self._call_batch(batch_prompt, review_type),
+            group=(self.llm_choice, self.priority), deadline=self.deadline)
+        return review
+
+
+    def _call_batch(self, prompt: str, review_type: str) -> Tuple[str, Optional[Dict]]:
+        """Invia il prompt di un micro-batch e restituisce la risposta con i token dichiarati.
+
+            I limiti sono calcolati sull'intero prompt, senza interruzione anticipata. La chiamata usa una copia
+            del servizio, così che impostazioni e token del micro-batch non sovrascrivano quelli della revisione
+            di chi lo invia, che può essere in corso in un altro thread.
+        """
+        sender = copy.copy(self)
+        sender.generation = generation_settings(review_type, estimate_tokens(prompt), early_stop=False)
+        response = sender._call_backend(prompt)
+        return response, sender.last_usage
+
+
+    def _cache_backend(self) -> str:
+        """Identifica backend, modelli, protocollo e impostazioni di generazione nella chiave della cache delle revisioni."""
+        models = []
+        if self.llm_choice in ("gemini", "cascade"):
+            models.append(f"gemini:{self.gemini_api_base_url}")
+        if self.llm_choice in ("ollama", "cascade"):
+            models.append(f"ollama:{self.model_name}")
+        return "|".join([self.llm_choice, *models, Config.REVIEW_PROTOCOL, generation_profile()])
+
+
+    def _cached_review(self, code_snippet: str, review_type: str) -> Tuple[Optional[str], Optional[str]]:
+        """Cerca la revisione nella cache persistente.
+
+            Returns:
+                tuple: La chiave della revisione (None se la cache è disattivata) e la revisione salvata, o None.
+        """
+        self.last_cache_hit = False
+        cache = get_review_cache()
+        if cache is None:
+            return None, None
+        # Le firme aggiunte al prompt cambiano la revisione, quindi fanno parte della chiave
+        key = cache.make_key(self._cache_backend(), review_type, code_snippet + "\0" + self._symbol_context(code_snippet))
+        review = cache.get(key)
+        self.last_cache_hit = review is not None
+        return key, review
+
+
+    def _store_review(self, key: Optional[str], review_type: str, review: str) -> None:
+        """Salva nella cache una revisione riuscita (i messaggi di errore non vengono salvati)."""
+        if key is not None and not is_error_response(review):
+            get_review_cache().put(key, review_type, review)
+
+
+    def _similar_review(self, code_snippet: str, review_type: str) -> Tuple[Optional[str], Optional[str]]:
+        """Cerca nella cache semantica una funzione quasi identica e ne adatta la revisione.
+
+            Vengono considerate solo le singole funzioni revisionate con i tipi che producono segnalazioni
+            (vedi `ANNOTATION_REVIEW_TYPES`); le firme dell'indice dei simboli non fanno parte del confronto.
+
+            Returns:
+                tuple: Il gruppo della cache semantica (None se non si applica) e la revisione adattata, o None.
+        """
+        self.last_similarity = None
+        if not Config.SEMANTIC_CACHE or review_type not in ANNOTATION_REVIEW_TYPES:
+            return None, None
+        # Importato solo quando serve: senza cache semantica la CLI si avvia senza caricare NumPy
+        from semantic_cache import get_semantic_cache, is_single_function
+
+        cache = get_semantic_cache()
+        if cache is None or not is_single_function(code_snippet):
+            return None, None
+        group = f"{self._cache_backend()}|{review_type}"
+        match = cache.lookup(code_snippet, group)
+        if match is None:
+            return group, None
+        self.last_similarity, review = match
+        self.last_cache_hit = True
+        return group, review
+
+
+    def _store_similar(self, group: Optional[str], code_snippet: str, review: str) -> None:
+        """Salva nella cache semantica la revisione riuscita di una funzione (vedi `_similar_review`)."""
+        if group is not None and not is_error_response(review):
+            from semantic_cache import get_semantic_cache
+
+            get_semantic_cache().add(code_snippet, group, review)
+
+
+    def _record_history(self, code_snippet: str, review_type: str, review: str, start: float) -> None:
+        """Accoda la revisione alla cronologia; la scrittura avviene in un altro thread."""
+        history = get_review_history()
+        if history is None:
+            return
+        if self.last_cache_hit:
+            model = self.llm_choice
+        elif self.llm_choice == "cascade":
+            model = "gemini" if (self.last_cascade or {}).get("escalated") else f"ollama:{self.model_name}"
+        else:
+            model = "gemini" if self.llm_choice == "gemini" else f"ollama:{self.model_name}"
+        history.record({
+            "code": code_snippet,
+            "review": review,
+            "review_type": review_type,
+            "model": model,
+            "file": self.source_path,
+            "status": "error" if is_error_response(review) else ("cached" if self.last_cache_hit else "ok"),
+            "latency": time.perf_counter() - start,
+            "usage": None if self.last_cache_hit else self.last_usage,
+        })
+
+
+    def _gemini_chunk_text(self, chunk: Dict) -> str:
+        """Estrae il testo di un frammento della risposta in streaming di Gemini (aggiornando `last_usage`)."""
+        if 'usageMetadata' in chunk:
+            self.last_usage = {
+                "prompt_tokens": chunk['usageMetadata'].get('promptTokenCount'),
+                "output_tokens": chunk['usageMetadata'].get('candidatesTokenCount'),
+            }
+        candidates = chunk.get('candidates') or [{}]
+        parts = candidates[0].get('content', {}).get('parts', [])
+        return "".join(part.get('text', "") for part in parts)
+
+
+    def _gemini_truncated(self, candidate: Dict) -> bool:
+        """Indica se la risposta di Gemini è stata troncata dal limite di token calcolato da `generation_settings`."""
+        return self.generation is not None and candidate.get('finishReason') == "MAX_TOKENS"
+
+
+    def _gemini_stream_request(self, prompt: str) -> Optional[Tuple[str, Dict]]:
+        """Restituisce URL e argomenti della richiesta in streaming (SSE) a Gemini, o None se l'URL non lo consente."""
+        if not self.gemini_api_base_url or ":generateContent" not in self.gemini_api_base_url:
+            return None
+        request = self._gemini_request(prompt)
+        request["params"]["alt"] = "sse"
+        return self.gemini_api_base_url.replace(":generateContent", ":streamGenerateContent"), request
+
+
+    def _stream_gemini(self, prompt: str) -> Iterator[Tuple[str, str]]:
+        """Genera la risposta di Gemini in streaming come coppie ("chunk" o "error", testo)."""
+        stream_request = self._gemini_stream_request(prompt)
+        if stream_request is None or not self.gemini_api_key:
+            review = self.__request_gemini(prompt)  # lo slot è già stato ottenuto da `_scheduled_stream`
+            yield ("error" if is_error_response(review) else "chunk"), review
+            return
+
+        timeout = self._remaining()
+        if timeout <= 0:
+            yield "error", self._deadline_error()
+            return
+
+        url, request = stream_request
+        try:
+            response = requests.post(url, **request, stream=True, timeout=timeout)
+        except requests.exceptions.ConnectionError as e:
+            yield "error", self._gemini_error("connection", e)
+            return
+        except requests.exceptions.Timeout as e:
+            cancellation_stats.record_deadline(timeout)
+            yield "error", self._gemini_error("timeout", e)
+            return
+        except requests.exceptions.RequestException as e:
+            yield "error", self._gemini_error("request", e)
+            return
+
+        # La chiusura della risposta (anche quando il generatore viene chiuso) interrompe lo stream HTTP
+        with response:
+            try:
+                response.raise_for_status()
+                for line in response.iter_lines(decode_unicode=True):
+                    if line and line.startswith("data:"):
+                        chunk = json.loads(line[len("data:"):])
+                        text = self._gemini_chunk_text(chunk)
+                        if text:
+                            yield "chunk", text
+                        if self._gemini_truncated((chunk.get('candidates') or [{}])[0]):
+                            yield "error", GEMINI_TRUNCATED_ERROR
+            except requests.exceptions.HTTPError as e:
+                yield "error", self._gemini_error("http", e)
+            except requests.exceptions.Timeout as e:
+                cancellation_stats.record_deadline(timeout)
+                yield "error", self._gemini_error("timeout", e)
+            except requests.exceptions.RequestException as e:
+                yield "error", self._gemini_error("request", e)
+            except ValueError as e:
+                yield "error", self._gemini_error("parsing", e)
+
+
+    def _stream_ollama(self, prompt: str) -> Iterator[Tuple[str, str]]:
+        """Genera la risposta di Ollama in streaming come coppie ("chunk" o "error", testo)."""
+        if not self.model_name:
+            yield "error", "Errore: Nome del modello Ollama non configurato."
+            return
+
+        timeout = self._remaining()
+        if timeout <= 0:
+            yield "error", self._deadline_error()
+            return
+
+        import httpx
+        import ollama
+
+        with ollama.Client(host=self.local_base_url, timeout=timeout) as client:
+            stream = client.chat(model=self.model_name, messages=[{'role': 'user', 'content': prompt}], stream=True,
+                                 options=ollama_options(self.generation)) # type: ignore
+            try:
+                for part in stream:
+                    if part.get('done'):
+                        self._ollama_response_text(part)
+                    text = part['message']['content'] if 'message' in part else ""
+                    if text:
+                        yield "chunk", text
+            except ollama.ResponseError as e:
+                yield "error", self._ollama_error(e, "response")
+            except httpx.TimeoutException as e:
+                cancellation_stats.record_deadline(timeout)
+                yield "error", self._ollama_error(e, "timeout")
+            except Exception as e:
+                yield "error", self._ollama_error(e)
+            finally:
+                # Chiude lo stream HTTP verso Ollama, che così smette di generare
+                stream.close()
+
+
+    def _record_stream_cancelled(self, code_snippet: str, generated: List[str], start: float) -> None:
+        """Registra una generazione in streaming interrotta dalla disconnessione del client."""
+        elapsed = time.perf_counter() - start
+        reclaimed = estimate_reclaimed(estimate_tokens(code_snippet), estimate_tokens("".join(generated)), elapsed)
+        cancellation_stats.record_cancelled(elapsed, reclaimed)
+
+
+    def stream_code_review(self, code_snippet: str, review_type: str = "bug_detection") -> Iterator[Tuple[str, str]]:
+        """Genera la revisione del codice in streaming, frammento per frammento.
+
+            Con il protocollo "echo" i frammenti generati dal modello vengono restituiti man mano che
+            arrivano. Con il protocollo ad annotazioni o in modalità cascata la risposta deve essere
+            elaborata per intero, quindi la revisione viene restituita in un unico frammento.
+
+            Se chi consuma il generatore lo chiude prima della fine (ad esempio perché il client si è
+            disconnesso), lo stream HTTP verso il backend viene chiuso, il modello smette di generare e
+            l'interruzione viene registrata in `deadlines.cancellation_stats`. Superata la scadenza
+            della richiesta, lo stream viene interrotto con un errore. La revisione completata (o il
+            messaggio di errore) viene accodata alla cronologia, come in `generate_code_review`.
+
+            Args:
+                code_snippet (str): Lo snippet di codice Python da revisionare.
+                review_type (str, optional): Il tipo di revisione da eseguire. Il valore predefinito è "bug_detection".
+
+            Yields:
+                Tuple[str, str]: Coppie ("chunk", testo) con i frammenti della revisione, o ("error", messaggio).
+
+            Raises:
+                ValueError: Se la `llm_choice` determinata durante l'inizializzazione non è supportata.
+        """
+        flow, prompt = self._stream_plan(code_snippet, review_type)
+        if flow is not None:
+            review = self._run_flow(flow)
+            yield ("error" if is_error_response(review) else "chunk"), review
+            return
+
+        cut = _StreamCut(self, code_snippet, review_type)
+        stream_factory = self._stream_gemini if self.llm_choice == "gemini" else self._stream_ollama
+        stream = self._scheduled_stream(self.llm_choice, prompt, stream_factory)
+        try:
+            for event, text in stream:
+                events, finished = cut.feed(event, text)
+                yield from events
+                if finished:
+                    break
+            cut.completed()
+        except GeneratorExit:
+            cut.cancelled()
+            raise
+        finally:
+            stream.close()
+
+
+    def _stream_plan(self, code_snippet: str, review_type: str) -> Tuple[Optional[Flow], Optional[str]]:
+        """Prepara `stream_code_review`, per il servizio sincrono e per quello asincrono.
+
+            Con il protocollo "echo" (senza cascata) restituisce il prompt da inviare in streaming;
+            negli altri casi la risposta va elaborata per intero, e viene restituito il flusso della revisione.
+
+            Returns:
+                tuple: Il flusso della revisione completa (o None) e il prompt da inviare in streaming (o None).
+        """
+        self._check_llm_choice()
+        self._start_deadline()
+        self.last_cache_hit = False
+        start = time.perf_counter()
+        prompt, postprocess = self._review_plan(code_snippet, review_type)
+        if prompt is not None and self.llm_choice != "cascade" and Config.REVIEW_PROTOCOL == "echo":
+            return None, prompt
+        return self._recorded_flow(code_snippet, review_type,
+                                   self._planned_review_flow(code_snippet, review_type, prompt, postprocess), start), None
+
+
+    def _recorded_flow(self, code_snippet: str, review_type: str, flow: Flow, start: float) -> Flow:
+        """Esegue un flusso di revisione e ne registra il risultato nella cronologia."""
+        review = yield from flow
+        self._record_history(code_snippet, review_type, review, start)
+        return review
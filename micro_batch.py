@@ -0,0 +1,276 @@
+import re
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from cascade import is_error_response
+from config import Config
+from deadlines import DEADLINE_ERROR, cancellation_stats
+from findings_parser import estimate_tokens
+
+
+_DELIMITER = "### SNIPPET {} ###"
+_DELIMITER_RE = re.compile(r"^\s*#{3}\s*SNIPPET\s+(\d+)\s*#{3}\s*$", re.MULTILINE)
+
+_BATCH_ERROR = "Si è verificato un errore inaspettato durante l'invio del micro-batch."
+
+_BATCH_NOTE = '''
+                ATTENZIONE: di seguito ci sono {count} snippet di codice indipendenti, ciascuno preceduto da una riga `### SNIPPET <n> ###`.
+                Revisiona ogni snippet separatamente seguendo le istruzioni precedenti e restituisci le revisioni nello stesso ordine,
+                ciascuna preceduta dalla stessa riga `### SNIPPET <n> ###` dello snippet a cui si riferisce.
+'''
+
+# La risposta di `send`: il testo generato e i token dichiarati dal backend ("prompt_tokens", "output_tokens"), o None.
+Response = Tuple[str, Optional[Dict]]
+
+
+class _Item:
+    """Una richiesta in attesa di essere inviata in un micro-batch."""
+
+    __slots__ = ("code", "tokens", "build_prompt", "send", "deadline", "result", "usage", "done", "promoted")
+
+    def __init__(self, code: str, build_prompt: Callable[[str], str], send: Callable[[str], Response],
+                 deadline: Optional[float]) -> None:
+        self.code = code
+        self.tokens = estimate_tokens(code)
+        self.build_prompt = build_prompt
+        self.send = send
+        self.deadline = deadline
+        self.result = None
+        self.usage = None
+        self.done = threading.Event()
+        self.promoted = False
+
+
+def demultiplex(response: str, count: int) -> Dict[int, str]:
+    """Divide la risposta di un micro-batch nelle revisioni dei singoli snippet.
+
+        Args:
+            response (str): La risposta dell'LLM con le revisioni separate da `### SNIPPET <n> ###`.
+            count (int): Il numero di snippet inviati.
+
+        Returns:
+            Dict[int, str]: Le revisioni non vuote indicizzate per numero di snippet (da 1 a `count`).
+    """
+    parts = _DELIMITER_RE.split(response)
+    reviews = {}
+    # parts = [testo prima del primo delimitatore, n1, revisione1, n2, revisione2, ...]
+    for number, text in zip(parts[1::2], parts[2::2]):
+        index = int(number)
+        text = text.strip()
+        if 1 <= index <= count and text and index not in reviews:
+            reviews[index] = text
+    return reviews
+
+
+def split_usage(usage: Optional[Dict], batch: List[_Item], reviews: Dict[int, str]) -> Dict[int, Optional[Dict]]:
+    """Ripartisce tra gli snippet i token dichiarati per un micro-batch.
+
+        I token di input sono divisi in proporzione ai token stimati del codice di ciascuno snippet,
+        quelli di output in proporzione alla lunghezza della sua revisione.
+
+        Returns:
+            Dict[int, Optional[dict]]: I token attribuiti a ciascuno snippet (da 1 a `len(batch)`).
+    """
+    if usage is None:
+        return {}
+    code_tokens = sum(item.tokens for item in batch) or 1
+    review_tokens = {index: estimate_tokens(review) for index, review in reviews.items()}
+    output_total = sum(review_tokens.values()) or 1
+
+    def share(total: Optional[int], fraction: float) -> Optional[int]:
+        return None if total is None else round(total * fraction)
+
+    return {index: {"prompt_tokens": share(usage.get("prompt_tokens"), item.tokens / code_tokens),
+                    "output_tokens": share(usage.get("output_tokens"), review_tokens.get(index, 0) / output_total)}
+            for index, item in enumerate(batch, start=1)}
+
+
+class MicroBatcher:
+    """Raggruppa in un'unica chiamata all'LLM più richieste brevi dello stesso `review_type`.
+
+        Vengono raggruppate le richieste con lo stesso `review_type` e la stessa chiave `group`
+        (backend e classe di priorità, vedi `LLMService`), anche di client diversi.
+
+        La prima richiesta di un gruppo diventa "leader": attende al massimo `window_ms`
+        millisecondi (o finché il gruppo raggiunge `max_snippets` snippet o `max_tokens` token
+        stimati) e avvia in un thread l'invio di un unico prompt con tutti gli snippet delimitati;
+        le revisioni vengono poi distribuite ai chiamanti. Il prompt viene inviato con la funzione
+        `send` della richiesta con la scadenza più lontana, e ogni chiamante, leader compreso,
+        attende al più fino alla propria scadenza. Se la risposta non contiene la revisione di uno
+        snippet, il chiamante la richiede singolarmente con il proprio prompt e la propria funzione `send`.
+        Le richieste in eccesso restano in coda e la prima di esse diventa il leader successivo.
+
+        Attributes:
+            window_ms (float): La finestra di raccolta in millisecondi.
+            max_snippets (int): Il numero massimo di snippet per micro-batch.
+            max_tokens (int): Il budget di token stimati del codice per micro-batch.
+            stats (dict): I contatori "batches", "snippets" e "retries".
+    """
+
+    def __init__(self, window_ms: float, max_snippets: int = 8, max_tokens: int = 2000) -> None:
+        self.window_ms = window_ms
+        self.max_snippets = max(1, max_snippets)
+        self.max_tokens = max_tokens
+        self.stats = {"batches": 0, "snippets": 0, "retries": 0}
+        self._cond = threading.Condition()
+        self._queues: Dict[Tuple, List[_Item]] = {}
+
+    def _batch_size(self, queue: List[_Item]) -> int:
+        """Restituisce quante richieste in testa alla coda entrano nel prossimo micro-batch."""
+        size, tokens = 0, 0
+        for item in queue[:self.max_snippets]:
+            if size and tokens + item.tokens > self.max_tokens:
+                break
+            size += 1
+            tokens += item.tokens
+        return size
+
+    def submit(self, review_type: str, code: str, build_prompt: Callable[[str], str], send: Callable[[str], Response],
+               group: Tuple = (), deadline: Optional[float] = None) -> Response:
+        """Accoda uno snippet e ne restituisce la revisione, bloccando finché non è pronta o non scade la richiesta.
+
+            Args:
+                review_type (str): Il tipo di revisione; solo richieste dello stesso tipo vengono raggruppate.
+                code (str): Lo snippet di codice da revisionare.
+                build_prompt (Callable[[str], str]): Costruisce il prompt tradizionale per uno snippet
+                    (con uno snippet vuoto restituisce le sole istruzioni).
+                send (Callable[[str], Response]): Invia un prompt al backend e ne restituisce la risposta
+                    con i token dichiarati.
+                group (Tuple, optional): Ulteriore chiave di raggruppamento (es. backend e classe di priorità).
+                deadline (Optional[float]): La scadenza della richiesta (`time.monotonic()`), o None.
+
+            Returns:
+                Response: La revisione dello snippet (o il messaggio di errore del backend, o `DEADLINE_ERROR`)
+                e la sua quota dei token del micro-batch (vedi `split_usage`), o None.
+        """
+        item = _Item(code, build_prompt, send, deadline)
+        key = (review_type, *group)
+        with self._cond:
+            queue = self._queues.setdefault(key, [])
+            queue.append(item)
+            leader = len(queue) == 1
+            self._cond.notify_all()
+
+        while True:
+            if leader:
+                self._dispatch(key)
+            if not self._wait(key, item):
+                cancellation_stats.record_deadline()
+                return DEADLINE_ERROR, None
+            if not item.promoted:
+                return self._result(item)
+            # Promossa a leader del micro-batch successivo
+            item.promoted = False
+            item.done.clear()
+            leader = True
+
+    def _dispatch(self, key: Tuple) -> None:
+        """Raccoglie il micro-batch in testa alla coda (entro `window_ms`) e ne avvia l'invio in un thread."""
+        window_end = time.monotonic() + self.window_ms / 1000
+        with self._cond:
+            queue = self._queues[key]
+            # Si attende finché il micro-batch non è pieno (per numero di snippet o per token) o scade la finestra
+            while len(queue) < self.max_snippets and self._batch_size(queue) == len(queue):
+                remaining = window_end - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            size = self._batch_size(queue)
+            batch, queue[:size] = queue[:size], []
+            self._promote(key, queue)
+        threading.Thread(target=self._run, args=(batch,), daemon=True).start()
+
+    def _promote(self, key: Tuple, queue: List[_Item]) -> None:
+        """Rende leader la prima richiesta rimasta in coda, o elimina la coda vuota (con il lock acquisito)."""
+        if queue:
+            queue[0].promoted = True
+            queue[0].done.set()
+        else:
+            del self._queues[key]
+
+    def _wait(self, key: Tuple, item: _Item) -> bool:
+        """Attende la revisione (o la promozione) di una richiesta fino alla sua scadenza.
+
+            Returns:
+                bool: False se la scadenza è stata superata; la richiesta esce dalla coda e, se era
+                appena stata promossa a leader, passa il ruolo alla successiva.
+        """
+        timeout = None if item.deadline is None else max(0.0, item.deadline - time.monotonic())
+        if item.done.wait(timeout) and (not item.promoted or item.deadline is None or item.deadline > time.monotonic()):
+            return True
+        with self._cond:
+            if item.done.is_set() and not item.promoted:
+                return True
+            queue = self._queues.get(key)
+            if queue and item in queue:
+                queue.remove(item)
+                if item.promoted:
+                    self._promote(key, queue)
+        return False
+
+    def _result(self, item: _Item) -> Response:
+        """Restituisce la revisione di uno snippet, richiedendola singolarmente se manca dalla risposta del micro-batch."""
+        if item.result is not None:
+            return item.result, item.usage
+        with self._cond:
+            self.stats["retries"] += 1
+        return item.send(item.build_prompt(item.code))
+
+    def _run(self, batch: List[_Item]) -> None:
+        """Invia un micro-batch e demultiplexa la risposta; ogni snippet riceve la sua revisione, None o un errore.
+
+            Gli snippet assenti dalla risposta ricevono None e vengono ritentati dal proprio chiamante
+            (vedi `_result`). Se l'invio solleva un'eccezione, tutti i chiamanti ricevono un messaggio di errore.
+        """
+        with self._cond:
+            self.stats["batches"] += 1
+            self.stats["snippets"] += len(batch)
+
+        reviews: Dict[int, str] = {}
+        usage: Dict[int, Optional[Dict]] = {}
+        failed = True
+        try:
+            # La scadenza più lontana: chi scade prima smette di attendere, ma non fa fallire gli altri
+            sender = max(batch, key=lambda item: float("inf") if item.deadline is None else item.deadline)
+            if len(batch) == 1:
+                review, tokens = sender.send(sender.build_prompt(sender.code))
+                reviews, usage = {1: review}, {1: tokens}
+            else:
+                prompt = sender.build_prompt("") + _BATCH_NOTE.format(count=len(batch)) + "\n".join(
+                    f"{_DELIMITER.format(index)}\n{item.code}" for index, item in enumerate(batch, start=1)
+                )
+                response, tokens = sender.send(prompt)
+                if is_error_response(response):
+                    reviews = {index: response for index in range(1, len(batch) + 1)}
+                else:
+                    reviews = demultiplex(response, len(batch))
+                usage = split_usage(tokens, batch, reviews)
+            failed = False
+        except Exception as e:
+            print(f"Errore durante l'invio del micro-batch: {e}")
+        finally:
+            for index, item in enumerate(batch, start=1):
+                item.result = reviews.get(index, _BATCH_ERROR if failed else None)
+                item.usage = usage.get(index)
+                item.done.set()
+
+
+_batcher: Optional[MicroBatcher] = None
+_batcher_lock = threading.Lock()
+
+
+def get_micro_batcher() -> Optional[MicroBatcher]:
+    """Restituisce il micro-batcher condiviso dal processo, o None se `Config.MICRO_BATCH_WINDOW_MS` è 0.
+
+        Le istanze di `LLMService` vengono create a ogni richiesta, quindi il batcher è
+        unico a livello di modulo e viene creato alla prima richiesta.
+    """
+    global _batcher
+    if Config.MICRO_BATCH_WINDOW_MS <= 0:
+        return None
+    with _batcher_lock:
+        if _batcher is None:
+            _batcher = MicroBatcher(Config.MICRO_BATCH_WINDOW_MS, Config.MICRO_BATCH_MAX_SNIPPETS,
+                                    Config.MICRO_BATCH_MAX_TOKENS)
+        return _batcher
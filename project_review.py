@@ -0,0 +1,317 @@
+import argparse
+import fnmatch
+import json
+import os
+import sys
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+from cascade import is_error_response
+from config import Config
+from findings_parser import SEVERITY_LEVELS, parse_findings
+
+# Cartelle e file mai revisionati, oltre ai pattern dei file `.reviewignore` e `.gitignore` del progetto.
+DEFAULT_IGNORE_PATTERNS = (
+    ".git", ".hg", ".svn", "__pycache__", ".venv", "venv", ".tox", ".nox",
+    "node_modules", "site-packages", "build", "dist", "*.egg-info",
+)
+IGNORE_FILES = (".reviewignore", ".gitignore")
+
+
+def parse_ignore_patterns(text: str) -> List[str]:
+    """Legge i pattern di un file `.gitignore`/`.reviewignore` (commenti, righe vuote e negazioni `!` vengono ignorati)."""
+    patterns = []
+    for line in text.splitlines():
+        line = line.strip()
+        if line and not line.startswith(("#", "!")):
+            patterns.append(line.rstrip("/"))
+    return patterns
+
+
+def is_ignored(path: str, patterns: Iterable[str]) -> bool:
+    """Indica se un percorso relativo (separato da "/") corrisponde a uno dei pattern.
+
+        I pattern senza "/" vengono confrontati con ogni componente del percorso (come in `.gitignore`,
+        "build" esclude qualsiasi cartella "build"); quelli con "/" con il percorso intero, dalla radice.
+    """
+    parts = path.split("/")
+    for pattern in patterns:
+        if "/" in pattern:
+            if fnmatch.fnmatch(path, pattern.lstrip("/")) or fnmatch.fnmatch(path, pattern.lstrip("/") + "/*"):
+                return True
+        elif any(fnmatch.fnmatch(part, pattern) for part in parts):
+            return True
+    return False
+
+
+def module_name(path: str) -> str:
+    """Converte un percorso relativo ("pkg/utils.py", "pkg/__init__.py") nel nome del modulo ("pkg.utils", "pkg")."""
+    parts = path[:-3].split("/") if path.endswith(".py") else path.split("/")
+    if parts[-1] == "__init__":
+        parts = parts[:-1]
+    return ".".join(parts)
+
+
+class ProjectFile:
+    """Un file Python del progetto, letto solo quando viene revisionato.
+
+        Attributes:
+            path (str): Il percorso relativo alla radice del progetto (separato da "/").
+            size (int): La dimensione in byte.
+            version (str): Identifica il contenuto senza leggerlo (data di modifica e dimensione, o CRC nello zip),
+                usato per aggiornare in modo incrementale l'indice dei simboli (vedi `symbol_index.SymbolIndex`).
+    """
+
+    __slots__ = ("path", "size", "version", "_open")
+
+    def __init__(self, path: str, size: int, version: str, opener: Callable) -> None:
+        self.path = path
+        self.size = size
+        self.version = version
+        self._open = opener
+
+    def read(self, max_bytes: int) -> Optional[str]:
+        """Restituisce il contenuto del file, o None se supera `max_bytes`."""
+        with self._open() as f:
+            data = f.read(max_bytes + 1)
+        if len(data) > max_bytes:
+            return None
+        return data.decode("utf-8", errors="replace")
+
+
+def discover_directory(root: str, extra_patterns: Iterable[str] = ()) -> List[ProjectFile]:
+    """Elenca i file `.py` di una cartella, saltando le cartelle ignorate senza visitarle.
+
+        Args:
+            root (str): La cartella del progetto.
+            extra_patterns (Iterable[str], optional): Pattern da ignorare oltre a quelli predefiniti e dei file di ignore.
+
+        Returns:
+            List[ProjectFile]: I file da revisionare, in ordine di percorso (il contenuto non viene letto).
+    """
+    patterns = [*DEFAULT_IGNORE_PATTERNS, *extra_patterns]
+    for name in IGNORE_FILES:
+        ignore_path = os.path.join(root, name)
+        if os.path.isfile(ignore_path):
+            with open(ignore_path, "r", encoding="utf-8", errors="replace") as f:
+                patterns.extend(parse_ignore_patterns(f.read()))
+
+    files = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        relative_dir = os.path.relpath(dirpath, root).replace(os.sep, "/")
+        prefix = "" if relative_dir == "." else relative_dir + "/"
+        dirnames[:] = sorted(d for d in dirnames if not is_ignored(prefix + d, patterns))
+        for filename in sorted(filenames):
+            path = prefix + filename
+            if filename.endswith(".py") and not is_ignored(path, patterns):
+                full_path = os.path.join(dirpath, filename)
+                stat = os.stat(full_path)
+                files.append(ProjectFile(path, stat.st_size, f"{stat.st_mtime_ns}:{stat.st_size}",
+                                         lambda full_path=full_path: open(full_path, "rb")))
+    return files
+
+
+def discover_zip(archive: zipfile.ZipFile, extra_patterns: Iterable[str] = ()) -> List[ProjectFile]:
+    """Elenca i file `.py` di un archivio zip leggendo solo l'indice centrale, senza estrarre nulla.
+
+        Se tutti i file sono in un'unica cartella (come negli zip scaricati da GitHub), i percorsi
+        sono relativi a quella cartella, dove vengono cercati anche `.reviewignore` e `.gitignore`.
+
+        Args:
+            archive (zipfile.ZipFile): L'archivio aperto (i file vengono letti uno alla volta durante la revisione).
+            extra_patterns (Iterable[str], optional): Pattern da ignorare oltre a quelli predefiniti e dei file di ignore.
+
+        Returns:
+            List[ProjectFile]: I file da revisionare, in ordine di percorso.
+    """
+    members = [info for info in archive.infolist() if not info.is_dir()]
+    top_levels = {info.filename.split("/", 1)[0] for info in members}
+    prefix = ""
+    if len(top_levels) == 1 and all("/" in info.filename for info in members):
+        prefix = top_levels.pop() + "/"
+
+    patterns = [*DEFAULT_IGNORE_PATTERNS, *extra_patterns]
+    for info in members:
+        if info.filename in (prefix + name for name in IGNORE_FILES):
+            patterns.extend(parse_ignore_patterns(archive.read(info).decode("utf-8", errors="replace")))
+
+    files = []
+    for info in sorted(members, key=lambda info: info.filename):
+        path = info.filename[len(prefix):]
+        if path.endswith(".py") and not is_ignored(path, patterns):
+            files.append(ProjectFile(path, info.file_size, f"crc:{info.CRC}:{info.file_size}",
+                                     lambda info=info: archive.open(info)))
+    return files
+
+
+class ProjectReport:
+    """Report aggregato della revisione di un progetto: esiti, conteggi per tag e severità e file più critici."""
+
+    def __init__(self, review_type: str, total: int) -> None:
+        self.review_type = review_type
+        self.total = total
+        self.status = {"ok": 0, "cached": 0, "error": 0, "skipped": 0}
+        self.by_tag: Dict[str, int] = {}
+        self.by_severity = {level: 0 for level in SEVERITY_LEVELS}
+        self.files: List[Dict] = []
+        self.start = time.perf_counter()
+
+    def add(self, result: Dict) -> None:
+        self.status[result["status"]] += 1
+        if result["status"] in ("ok", "cached"):
+            for tag, count in result["counts"]["tag"].items():
+                self.by_tag[tag] = self.by_tag.get(tag, 0) + count
+            for level, count in result["counts"]["severity"].items():
+                self.by_severity[level] = self.by_severity.get(level, 0) + count
+        self.files.append(result)
+
+    def as_dict(self) -> Dict:
+        """Restituisce il report; i file sono ordinati dal più critico (per severità delle segnalazioni)."""
+        def criticality(result: Dict):
+            severity = result.get("counts", {}).get("severity", {})
+            return tuple(-severity.get(level, 0) for level in SEVERITY_LEVELS) + (result["path"],)
+
+        return {
+            "review_type": self.review_type,
+            "files": self.total,
+            **self.status,
+            "elapsed": time.perf_counter() - self.start,
+            "counts": {"tag": self.by_tag, "severity": self.by_severity},
+            "results": sorted(self.files, key=criticality),
+        }
+
+
+def review_file(project_file: ProjectFile, review_type: str, service_factory: Callable, max_bytes: int) -> Dict:
+    """Revisiona un file del progetto e restituisce il suo esito (senza il codice annotato)."""
+    result = {"path": project_file.path}
+    if project_file.size > max_bytes:
+        return {**result, "status": "skipped", "reason": f"file più grande di {max_bytes} byte"}
+
+    start = time.perf_counter()
+    try:
+        code = project_file.read(max_bytes)
+        if code is None:
+            return {**result, "status": "skipped", "reason": f"file più grande di {max_bytes} byte"}
+        if not code.strip():
+            return {**result, "status": "skipped", "reason": "file vuoto"}
+        llm_service = service_factory()
+        llm_service.source_module = module_name(project_file.path)
+        llm_service.source_path = project_file.path
+        review = llm_service.generate_code_review(code_snippet=code, review_type=review_type)
+    except Exception as e:
+        return {**result, "status": "error", "error": f"Si è verificato un errore durante la revisione: {e}"}
+
+    if is_error_response(review):
+        return {**result, "status": "error", "error": review.strip()}
+    parsed = parse_findings(review)
+    return {
+        **result,
+        "status": "cached" if llm_service.last_cache_hit else "ok",
+        "elapsed": time.perf_counter() - start,
+        "findings": parsed["findings"],
+        "counts": parsed["counts"],
+    }
+
+
+def review_project(files: List[ProjectFile], review_type: str, service_factory: Callable,
+                   workers: Optional[int] = None, max_bytes: Optional[int] = None) -> Iterator[Dict]:
+    """Revisiona in parallelo i file di un progetto, restituendo l'avanzamento file per file.
+
+        Al più `workers` revisioni sono in corso e al più il doppio dei file è letto o in attesa:
+        il contenuto di un file viene letto solo quando la sua revisione parte, quindi la memoria
+        non cresce con la dimensione del progetto. Le revisioni passano dalla cache persistente, se attiva
+        (vedi `review_cache.ReviewCache`), così i file invariati non vengono inviati di nuovo al modello.
+
+        Se il generatore viene chiuso prima della fine (ad esempio perché il client si è disconnesso),
+        le revisioni non ancora avviate vengono annullate.
+
+        Args:
+            files (List[ProjectFile]): I file da revisionare (vedi `discover_directory` e `discover_zip`).
+            review_type (str): Il tipo di revisione da eseguire su ogni file.
+            service_factory (Callable): Crea un `LLMService` per ogni file (gli attributi `last_*` sono per revisione);
+                al servizio viene indicato il modulo del file, per risolvere i suoi import nell'indice dei simboli.
+            workers (Optional[int]): Le revisioni in parallelo. Il valore predefinito è `Config.PROJECT_REVIEW_WORKERS`.
+            max_bytes (Optional[int]): La dimensione massima dei file. Il valore predefinito è `Config.PROJECT_REVIEW_MAX_FILE_BYTES`.
+
+        Yields:
+            Dict: Un evento "start" con il numero di file, un evento "file" per ogni file completato
+            (con "done", "total", "status" e segnalazioni) e infine un evento "report" con il report aggregato.
+    """
+    workers = max(1, workers or Config.PROJECT_REVIEW_WORKERS)
+    max_bytes = max_bytes or Config.PROJECT_REVIEW_MAX_FILE_BYTES
+    report = ProjectReport(review_type, len(files))
+    yield {"event": "start", "review_type": review_type, "files": len(files)}
+
+    pending_files = iter(files)
+    executor = ThreadPoolExecutor(max_workers=workers)
+    try:
+        in_flight = set()
+        done_count = 0
+        while True:
+            for project_file in pending_files:
+                in_flight.add(executor.submit(review_file, project_file, review_type, service_factory, max_bytes))
+                if len(in_flight) >= workers * 2:
+                    break
+            if not in_flight:
+                break
+            completed, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in completed:
+                result = future.result()
+                report.add(result)
+                done_count += 1
+                yield {"event": "file", "done": done_count, "total": len(files), **result}
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    yield {"event": "report", **report.as_dict()}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Revisiona tutti i file Python di una cartella o di un archivio zip.")
+    parser.add_argument("source", help="La cartella del progetto o un archivio .zip.")
+    parser.add_argument("--review-type", default="bug_detection",
+                        choices=["bug_detection", "syntax_revision", "style_suggestions", "doc_strings_add"])
+    parser.add_argument("--workers", type=int, default=Config.PROJECT_REVIEW_WORKERS, help="Revisioni in parallelo.")
+    parser.add_argument("--ignore", action="append", default=[], help="Pattern da ignorare (ripetibile).")
+    parser.add_argument("--output", default="project_review.json", help="Il file JSON del report aggregato.")
+    args = parser.parse_args()
+
+    from llm_service import LLMService
+    from symbol_index import INDEX_FILENAME, SymbolIndex
+
+    try:
+        LLMService()
+    except ValueError as e:
+        print(f"Errore di configurazione del servizio LLM: {e}")
+        sys.exit(1)
+
+    archive = zipfile.ZipFile(args.source) if zipfile.is_zipfile(args.source) else None
+    try:
+        files = discover_zip(archive, args.ignore) if archive else discover_directory(args.source, args.ignore)
+        # L'indice di una cartella viene salvato e aggiornato solo per i file modificati alla revisione successiva
+        index = SymbolIndex(None if archive else os.path.join(args.source, INDEX_FILENAME))
+        update = index.update(files)
+        print(f"Indice dei simboli: {update['parsed']} file analizzati, {update['reused']} invariati in {update['elapsed']:.2f}s")
+
+        def service_factory():
+            return LLMService(priority="batch", tenant="project_review", symbol_index=index)
+
+        for event in review_project(files, args.review_type, service_factory, workers=args.workers):
+            if event["event"] == "file":
+                detail = event.get("error") or event.get("reason") or f"{len(event['findings'])} segnalazioni"
+                print(f"[{event['done']}/{event['total']}] {event['path']}: {event['status']} ({detail})")
+            elif event["event"] == "report":
+                with open(args.output, "w", encoding="utf-8") as f:
+                    json.dump(event, f, ensure_ascii=False, indent=2)
+                print(f"Revisionati {event['ok'] + event['cached']} file su {event['files']} "
+                      f"({event['cached']} dalla cache, {event['error']} errori, {event['skipped']} saltati) "
+                      f"in {event['elapsed']:.2f}s. Report: {args.output}")
+    finally:
+        if archive:
+            archive.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,360 @@
+import gzip
+import json
+import os
+import re
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Optional
+
+from findings_parser import parse_findings
+
+
+_INPUT_RE = re.compile(r"^--- Input (\d+) ---$")
+_OUTPUT_RE = re.compile(r"^--- Output (\d+) \(Revisione\) ---$")
+_CATEGORY_RE = re.compile(r"^=== Categoria: (.+) ===$")
+_PROMPT_RE = re.compile(r"^--- Prompt utilizzato per '.*' ---$")
+_TIME_RE = re.compile(r"^Tempo totale impiegato: ([\d.]+) secondi$")
+
+
+def category_key(title: str) -> str:
+    """Converte il titolo di una categoria ("Bug Detection") nel relativo `review_type` ("bug_detection")."""
+    return title.strip().lower().replace(" ", "_")
+
+
+def model_name_from_path(path: str) -> str:
+    """Ricava il nome del modello dal nome di un file di risultati (es. "codegemma_results.txt" -> "codegemma")."""
+    name = os.path.splitext(os.path.basename(path))[0]
+    return re.sub(r"_results$", "", name)
+
+
+def read_total_time(path: str) -> Optional[float]:
+    """Legge il tempo totale di esecuzione dall'intestazione di un file di risultati testuale.
+
+        Vengono lette solo le prime righe del file, senza caricarlo per intero.
+        Per i file JSONL il tempo viene letto dal campo "total_time" della prima riga.
+
+        Args:
+            path (str): Il percorso del file di risultati scritto da `run_code_review_batch` (o un file JSONL).
+
+        Returns:
+            Optional[float]: Il tempo totale in secondi, o None se l'intestazione non è presente.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        if path.endswith(".jsonl"):
+            first = f.readline().strip()
+            return json.loads(first).get("total_time") if first else None
+        for _, line in zip(range(5), f):
+            match = _TIME_RE.match(line.strip())
+            if match:
+                return float(match.group(1))
+    return None
+
+
+def write_results(path: str, results: Dict[str, List[Dict]], total_time: float) -> None:
+    """Scrive un file di risultati nel formato testuale letto da `iter_results`.
+
+        Args:
+            path (str): Il file da scrivere.
+            results (Dict[str, List[Dict]]): Per ogni categoria (`review_type`), le revisioni con le chiavi
+                "test_number", "code_snippet", "prompt_used" (può essere vuoto) e "generated_review".
+            total_time (float): Il tempo totale impiegato, in secondi, scritto nell'intestazione.
+    """
+    with open(path, 'w', encoding='utf-8') as outfile:
+        outfile.write(f"--- Risultati della Code Review LLM ---\n")
+        outfile.write(f"Tempo totale impiegato: {total_time:.2f} secondi\n\n")
+
+        for category, items in results.items():
+            if items:
+                outfile.write(f"=== Categoria: {category.replace('_', ' ').title()} ===\n\n")
+
+                if items[0]["prompt_used"]:
+                    outfile.write(f"--- Prompt utilizzato per '{category.replace('_', ' ').title()}' ---\n")
+                    outfile.write(items[0]["prompt_used"].splitlines()[1].strip() + '\n')
+                    outfile.write("...\n")
+                    outfile.write("---\n\n")
+
+                for item in items:
+                    outfile.write(f"--- Input {item['test_number']} ---\n")
+                    outfile.write(item['code_snippet'].strip() + "\n\n")
+                    outfile.write(f"--- Output {item['test_number']} (Revisione) ---\n")
+                    outfile.write(item['generated_review'].strip() + "\n\n")
+                outfile.write("\n")
+
+
+def _iter_text_results(path: str) -> Iterator[Dict]:
+    """Legge in streaming un file nel formato `--- Input N --- / --- Output N (Revisione) ---`."""
+    category = ""
+    number = None
+    section = None
+    code_lines = []
+    review_lines = []
+
+    def flush():
+        return {
+            "category": category,
+            "input": number,
+            "code": "\n".join(code_lines).strip(),
+            "review": "\n".join(review_lines).strip(),
+        }
+
+    with open(path, "r", encoding="utf-8") as f:
+        for raw_line in f:
+            line = raw_line.rstrip("\n")
+
+            match = _INPUT_RE.match(line)
+            if match:
+                if section == "output":
+                    yield flush()
+                number = int(match.group(1))
+                section = "input"
+                code_lines, review_lines = [], []
+                continue
+
+            match = _OUTPUT_RE.match(line)
+            if match and section == "input":
+                section = "output"
+                continue
+
+            match = _CATEGORY_RE.match(line)
+            if match:
+                if section == "output":
+                    yield flush()
+                category = category_key(match.group(1))
+                section = None
+                continue
+
+            if section is None and _PROMPT_RE.match(line):
+                section = "prompt"
+                continue
+            if section == "prompt":
+                # L'estratto del prompt termina con una riga "---"
+                if line == "---":
+                    section = None
+                continue
+
+            if section == "input":
+                code_lines.append(line)
+            elif section == "output":
+                review_lines.append(line)
+
+    if section == "output":
+        yield flush()
+
+
+def _iter_jsonl_results(path: str) -> Iterator[Dict]:
+    """Legge in streaming un file JSONL con una revisione per riga."""
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            item = json.loads(line)
+            yield {
+                "category": item.get("category") or item.get("review_type", ""),
+                "input": int(item.get("input", item.get("test_number", 0))),
+                "code": item.get("code") or item.get("code_snippet", ""),
+                "review": item.get("review") or item.get("generated_review", ""),
+            }
+
+
+def iter_results(path: str) -> Iterator[Dict]:
+    """Itera le revisioni contenute in un file di risultati, riga per riga.
+
+        Supporta sia il formato testuale scritto da `run_code_review_batch`
+        (`--- Input N --- / --- Output N (Revisione) ---`) sia i file JSONL con una
+        revisione per riga (chiavi "input"/"test_number", "category"/"review_type",
+        "review"/"generated_review"). Il file non viene mai caricato per intero in memoria.
+
+        Args:
+            path (str): Il percorso del file di risultati (.txt o .jsonl).
+
+        Returns:
+            Iterator[dict]: Un dizionario per ogni revisione, con le chiavi
+                "category", "input", "code" e "review".
+
+        Examples:
+            for item in iter_results("gemini_2.5_flash_results.txt"):
+                print(item["category"], item["input"])
+    """
+    if path.endswith(".jsonl"):
+        return _iter_jsonl_results(path)
+    return _iter_text_results(path)
+
+
+def iter_rows(path: str, model: Optional[str] = None) -> Iterator[Dict]:
+    """Itera le righe (modello, categoria, input) di un file di risultati.
+
+        Args:
+            path (str): Il percorso del file di risultati (.txt o .jsonl).
+            model (str, optional): Il nome del modello. Se None, viene ricavato dal nome del file.
+
+        Returns:
+            Iterator[dict]: Una riga per revisione, con le chiavi "model", "category", "input",
+                "code", "review", "n_findings" (il numero di commenti annotati riconosciuti)
+                e "total_time" (il tempo totale dell'esecuzione da cui proviene la riga).
+    """
+    model = model or model_name_from_path(path)
+    total_time = read_total_time(path)
+    for item in iter_results(path):
+        yield {
+            "model": model,
+            "total_time": total_time,
+            "category": item["category"],
+            "input": item["input"],
+            "code": item["code"],
+            "review": item["review"],
+            "n_findings": len(parse_findings(item["review"])["findings"]),
+        }
+
+
+# Colonne del file colonnare: il testo di codice e revisioni resta solo nel JSONL, raggiungibile con "offset".
+_COLUMN_TYPES = {"model": "i", "category": "i", "input": "i", "n_findings": "i", "offset": "q"}
+
+
+def convert_file(path: str, output_dir: str = "converted", name: Optional[str] = None) -> Dict[str, str]:
+    """Converte un file di risultati testuale in JSONL e in un file colonnare compatto.
+
+        Il file di origine viene letto in streaming e il JSONL viene scritto riga per riga.
+        Il file colonnare (`.cols.json.gz`, compresso con gzip) contiene solo colonne numeriche,
+        tenute in memoria come array compatti: "model" e "category" codificate a dizionario
+        (indici interi in "dictionaries"), "input", "n_findings" e "offset", la posizione in byte
+        della riga nel JSONL, da cui si leggono codice e revisione (vedi `read_jsonl_rows`).
+
+        Args:
+            path (str): Il percorso del file di risultati da convertire.
+            output_dir (str, optional): La cartella di destinazione. Il valore predefinito è "converted".
+            name (str, optional): Il nome dei file generati, senza estensione. Se None, quello del file
+                di origine (vedi `output_names` per convertire file omonimi di cartelle diverse).
+
+        Returns:
+            dict: I percorsi dei file generati, con le chiavi "jsonl" e "columns".
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    base = name or os.path.splitext(os.path.basename(path))[0]
+    jsonl_path = os.path.join(output_dir, f"{base}.jsonl")
+    columns_path = os.path.join(output_dir, f"{base}.cols.json.gz")
+
+    dictionaries: Dict[str, Dict[str, int]] = {"model": {}, "category": {}}
+    columns = {column: array(typecode) for column, typecode in _COLUMN_TYPES.items()}
+
+    with open(jsonl_path, "wb") as jsonl:
+        for row in iter_rows(path):
+            columns["offset"].append(jsonl.tell())
+            jsonl.write((json.dumps(row, ensure_ascii=False) + "\n").encode("utf-8"))
+            for column in ("model", "category"):
+                columns[column].append(dictionaries[column].setdefault(row[column], len(dictionaries[column])))
+            columns["input"].append(row["input"])
+            columns["n_findings"].append(row["n_findings"])
+
+    with gzip.open(columns_path, "wt", encoding="utf-8") as f:
+        json.dump({
+            "source": os.path.basename(path),
+            "jsonl": os.path.basename(jsonl_path),
+            "total_time": read_total_time(path),
+            "dictionaries": {column: list(values) for column, values in dictionaries.items()},
+            "columns": {column: values.tolist() for column, values in columns.items()},
+        }, f, ensure_ascii=False, separators=(",", ":"))
+
+    return {"jsonl": jsonl_path, "columns": columns_path}
+
+
+def output_names(paths: List[str]) -> List[str]:
+    """Sceglie nomi di output distinti per i file da convertire.
+
+        Il nome è quello del file; per i file omonimi vengono anteposte le cartelle che li
+        distinguono (es. "run1__gemini_results" e "run2__gemini_results"); se restano uguali
+        (stessa cartella, estensioni diverse) viene aggiunto un contatore ("gemini_results-2").
+
+        Args:
+            paths (List[str]): I file da convertire.
+
+        Returns:
+            List[str]: I nomi, senza estensione, nello stesso ordine di `paths`.
+    """
+    parts = [os.path.normpath(os.path.abspath(path)).split(os.sep) for path in paths]
+    names: List[str] = []
+    for index, path_parts in enumerate(parts):
+        stem = os.path.splitext(path_parts[-1])[0]
+        folders = path_parts[:-1]
+        others = [other[:-1] for position, other in enumerate(parts) if position != index
+                  and other[:-1] != folders and os.path.splitext(other[-1])[0] == stem]
+        depth = 0
+        # Si aggiungono cartelle finché il percorso non si distingue da quello degli altri file omonimi
+        while others and depth < len(folders) and any(other[len(other) - depth - 1:] == folders[len(folders) - depth - 1:]
+                                                      for other in others):
+            depth += 1
+        prefix = folders[len(folders) - depth - 1:] if others else []
+        name = "__".join([part for part in prefix if part] + [stem])
+        # Stesso nome nella stessa cartella (es. "x.txt" e "x.jsonl"): si aggiunge un contatore
+        unique, counter = name, 1
+        while unique in names:
+            counter += 1
+            unique = f"{name}-{counter}"
+        names.append(unique)
+    return names
+
+
+def convert_files(paths: List[str], output_dir: str = "converted", workers: Optional[int] = None) -> List[Dict[str, str]]:
+    """Converte in parallelo più file di risultati con `convert_file`, un processo per file.
+
+        I file omonimi di cartelle diverse ricevono nomi di output distinti (vedi `output_names`).
+
+        Args:
+            paths (List[str]): I file di risultati da convertire.
+            output_dir (str, optional): La cartella di destinazione. Il valore predefinito è "converted".
+            workers (int, optional): Il numero massimo di processi. Se None, usa il numero di CPU.
+
+        Returns:
+            List[dict]: I percorsi generati per ciascun file, nello stesso ordine di `paths`.
+    """
+    names = output_names(paths)
+    if len(paths) <= 1:
+        return [convert_file(path, output_dir, name) for path, name in zip(paths, names)]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(convert_file, paths, [output_dir] * len(paths), names))
+
+
+def load_columns(path: str) -> Dict[str, list]:
+    """Carica un file colonnare scritto da `convert_file`, decodificando le colonne a dizionario.
+
+        Args:
+            path (str): Il percorso del file `.cols.json.gz`.
+
+        Returns:
+            dict: Le colonne indicizzate per nome ("model", "category", "input", "n_findings" e "offset").
+    """
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        data = json.load(f)
+    columns = data["columns"]
+    for name, values in data["dictionaries"].items():
+        columns[name] = [values[index] for index in columns[name]]
+    return columns
+
+
+def read_jsonl_rows(path: str, offsets: List[int]) -> Iterator[Dict]:
+    """Legge dal JSONL di `convert_file` solo le righe alle posizioni indicate (la colonna "offset").
+
+        Args:
+            path (str): Il percorso del file `.jsonl`.
+            offsets (List[int]): Le posizioni in byte delle righe da leggere.
+
+        Returns:
+            Iterator[dict]: Le righe, nello stesso ordine di `offsets`.
+    """
+    with open(path, "rb") as f:
+        for offset in offsets:
+            f.seek(offset)
+            yield json.loads(f.readline())
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Converte i file di risultati testuali in JSONL e in formato colonnare.")
+    parser.add_argument("results", nargs="+", help="File di risultati da convertire.")
+    parser.add_argument("-o", "--output", default="converted", help="Cartella di destinazione.")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="Numero di processi in parallelo.")
+    args = parser.parse_args()
+
+    for source, outputs in zip(args.results, convert_files(args.results, args.output, args.workers)):
+        print(f"{source} -> {outputs['jsonl']}, {outputs['columns']}")
@@ -0,0 +1,102 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+
+from config import Config
+
+
+class ReviewCache:
+    """Cache persistente delle revisioni, su un file SQLite condiviso da server, CLI e revisioni di progetto.
+
+        La chiave è l'hash SHA-256 di backend, modello, protocollo, tipo di revisione e codice: rivedere
+        di nuovo un file invariato non richiede chiamate al modello. I messaggi di errore non vengono
+        salvati. Oltre `max_entries` voci vengono eliminate quelle usate meno di recente.
+
+        Attributes:
+            path (str): Il percorso del file SQLite.
+            max_entries (int): Il numero massimo di revisioni conservate.
+            hits (int): Le revisioni trovate nella cache dall'avvio del processo.
+            misses (int): Le revisioni non trovate.
+    """
+
+    # Ogni quanti inserimenti viene controllato il numero di voci.
+    _PRUNE_EVERY = 256
+
+    def __init__(self, path: str, max_entries: int = 100000) -> None:
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._inserts = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS reviews ("
+            " key TEXT PRIMARY KEY, review_type TEXT NOT NULL, review TEXT NOT NULL,"
+            " created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS reviews_accessed ON reviews (accessed)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(backend: str, review_type: str, code: str) -> str:
+        """Calcola la chiave di una revisione; `backend` identifica modello e protocollo (vedi `LLMService._cache_backend`)."""
+        digest = hashlib.sha256()
+        for part in (backend, review_type, code):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Restituisce la revisione salvata con la chiave indicata, o None."""
+        with self._lock:
+            row = self._conn.execute("SELECT review FROM reviews WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._conn.execute("UPDATE reviews SET accessed = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+            return row[0]
+
+    def put(self, key: str, review_type: str, review: str) -> None:
+        """Salva una revisione, eliminando le voci meno usate se la cache supera `max_entries`."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO reviews VALUES (?, ?, ?, ?, ?)",
+                               (key, review_type, review, now, now))
+            self._inserts += 1
+            if self._inserts % self._PRUNE_EVERY == 0:
+                self._conn.execute(
+                    "DELETE FROM reviews WHERE key IN (SELECT key FROM reviews ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,))
+            self._conn.commit()
+
+    def snapshot(self) -> Dict:
+        """Restituisce voci salvate, hit e miss."""
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM reviews").fetchone()[0]
+            return {"entries": entries, "hits": self.hits, "misses": self.misses}
+
+
+_cache: Optional[ReviewCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_review_cache() -> Optional[ReviewCache]:
+    """Restituisce la cache condivisa dal processo, o None se `Config.REVIEW_CACHE_PATH` è vuoto.
+
+        La connessione SQLite viene aperta alla prima richiesta; più processi (server web e CLI)
+        possono usare lo stesso file.
+    """
+    global _cache
+    if not Config.REVIEW_CACHE_PATH:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = ReviewCache(Config.REVIEW_CACHE_PATH, Config.REVIEW_CACHE_MAX_ENTRIES)
+        return _cache
@@ -0,0 +1,279 @@
+import asyncio
+import functools
+import itertools
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Callable, Deque, Dict, Optional
+
+from config import Config
+
+
+# Classi di priorità, dalla più alta alla più bassa.
+PRIORITY_CLASSES = ("interactive", "batch")
+DEFAULT_PRIORITY = "interactive"
+
+# Intestazioni con cui un client indica la classe di priorità e il proprio token.
+PRIORITY_HEADER = "X-Review-Priority"
+TENANT_HEADER = "X-API-Token"
+
+
+def normalize_priority(value: Optional[str], default: str = DEFAULT_PRIORITY) -> str:
+    """Restituisce la classe di priorità indicata, o `default` se assente o sconosciuta."""
+    value = (value or "").strip().lower()
+    return value if value in PRIORITY_CLASSES else default
+
+
+def _request_token(get_header: Callable[[str], Optional[str]]) -> Optional[str]:
+    """Restituisce il token API indicato dal client (X-API-Token o Bearer), se presente."""
+    token = get_header(TENANT_HEADER)
+    authorization = get_header("Authorization") or ""
+    if not token and authorization.lower().startswith("bearer "):
+        token = authorization[len("bearer "):]
+    return (token or "").strip() or None
+
+
+@functools.lru_cache(maxsize=4)
+def parse_api_tokens(value: str) -> Dict[str, str]:
+    """Interpreta `API_TOKENS` ("abc=interactive,def") in un dizionario token -> classe di priorità massima concessa."""
+    tokens = {}
+    for item in value.split(","):
+        token, _, priority = item.strip().partition("=")
+        if token.strip():
+            tokens[token.strip()] = normalize_priority(priority, default="batch")
+    return tokens
+
+
+def tenant_from_headers(get_header: Callable[[str], Optional[str]], remote_addr: Optional[str]) -> str:
+    """Identifica il client per la ripartizione equa: token API configurato in `API_TOKENS` o, in mancanza, indirizzo IP.
+
+    I token sconosciuti sono ignorati, così un client non può moltiplicare le proprie quote inventandone di nuovi.
+    """
+    token = _request_token(get_header)
+    if token and token in parse_api_tokens(Config.API_TOKENS):
+        return f"token:{token}"
+    return f"ip:{remote_addr or 'sconosciuto'}"
+
+
+def api_priority(get_header: Callable[[str], Optional[str]]) -> str:
+    """Classe di priorità di una richiesta API: "batch", salvo i token autorizzati in `API_TOKENS` alle richieste
+    interattive, che possono comunque chiedere "batch" con X-Review-Priority."""
+    token = _request_token(get_header)
+    if token and parse_api_tokens(Config.API_TOKENS).get(token) == "interactive":
+        return normalize_priority(get_header(PRIORITY_HEADER))
+    return "batch"
+
+
+def parse_weights(value: str) -> Dict[str, float]:
+    """Interpreta `SCHEDULER_TENANT_WEIGHTS` ("token:abc=3,ip:10.0.0.1=0.5") in un dizionario di pesi."""
+    weights = {}
+    for item in value.split(","):
+        tenant, _, weight = item.strip().rpartition("=")
+        try:
+            if tenant and float(weight) > 0:
+                weights[tenant] = float(weight)
+        except ValueError:
+            continue
+    return weights
+
+
+class _Waiter:
+    """Una richiesta in attesa di uno slot del backend."""
+
+    __slots__ = ("priority", "tenant", "finish", "order", "enqueued", "grant", "granted")
+
+    def __init__(self, priority: str, tenant: str, grant: Callable[[], None]) -> None:
+        self.priority = priority
+        self.tenant = tenant
+        self.finish = 0.0
+        self.order = 0
+        self.enqueued = time.monotonic()
+        self.grant = grant
+        self.granted = False
+
+
+class FairScheduler:
+    """Scheduler delle chiamate a un backend, con classi di priorità e ripartizione equa tra i client.
+
+        Al più `slots` chiamate sono in corso contemporaneamente. Quando uno slot si libera viene servita
+        la classe di priorità più alta con richieste in attesa che non abbia raggiunto il proprio limite
+        di concorrenza (`class_caps`): così le richieste interattive passano davanti a quelle batch, e
+        il batch non può occupare tutti gli slot.
+
+        All'interno di una classe, le richieste dei diversi client sono servite con un weighted fair
+        queuing: ogni richiesta riceve un tempo virtuale di fine pari a
+        `max(tempo virtuale della classe, fine dell'ultima richiesta del client) + costo / peso`
+        e viene servita quella con il valore più basso. Un client che invia centinaia di richieste
+        non ritarda quindi quelle di un altro client oltre la quota stabilita dai pesi.
+
+        Attributes:
+            name (str): Il nome del backend ("ollama" o "gemini").
+            slots (int): Il numero massimo di chiamate contemporanee.
+            class_caps (Dict[str, int]): Il numero massimo di chiamate contemporanee per classe.
+            weights (Dict[str, float]): I pesi dei client (1 per quelli non indicati).
+    """
+
+    def __init__(self, name: str, slots: int, class_caps: Optional[Dict[str, int]] = None,
+                 weights: Optional[Dict[str, float]] = None) -> None:
+        self.name = name
+        self.slots = max(1, slots)
+        self.class_caps = {priority: self.slots for priority in PRIORITY_CLASSES}
+        self.class_caps.update(class_caps or {})
+        self.weights = weights or {}
+        self._lock = threading.Lock()
+        self._order = itertools.count()
+        self._queues: Dict[str, Dict[str, Deque[_Waiter]]] = {priority: {} for priority in PRIORITY_CLASSES}
+        self._virtual_time = {priority: 0.0 for priority in PRIORITY_CLASSES}
+        self._last_finish: Dict[str, Dict[str, float]] = {priority: {} for priority in PRIORITY_CLASSES}
+        self._active = {priority: 0 for priority in PRIORITY_CLASSES}
+        self._stats = {priority: {"dispatched": 0, "abandoned": 0, "wait_total": 0.0, "wait_max": 0.0}
+                       for priority in PRIORITY_CLASSES}
+
+    def _submit(self, priority: str, tenant: str, cost: float, grant: Callable[[], None]) -> _Waiter:
+        waiter = _Waiter(normalize_priority(priority), tenant, grant)
+        with self._lock:
+            last_finish = self._last_finish[waiter.priority]
+            start = max(self._virtual_time[waiter.priority], last_finish.get(tenant, 0.0))
+            waiter.finish = start + max(cost, 1.0) / self.weights.get(tenant, 1.0)
+            waiter.order = next(self._order)
+            last_finish[tenant] = waiter.finish
+            self._queues[waiter.priority].setdefault(tenant, deque()).append(waiter)
+            self._dispatch()
+        return waiter
+
+    def _dispatch(self) -> None:
+        """Assegna gli slot liberi alle richieste in attesa (da chiamare con il lock acquisito)."""
+        while sum(self._active.values()) < self.slots:
+            for priority in PRIORITY_CLASSES:
+                if self._queues[priority] and self._active[priority] < self.class_caps[priority]:
+                    break
+            else:
+                return
+
+            queues = self._queues[priority]
+            tenant = min(queues, key=lambda name: (queues[name][0].finish, queues[name][0].order))
+            waiter = queues[tenant].popleft()
+            if not queues[tenant]:
+                del queues[tenant]
+            if not queues:
+                # Classe vuota: si azzera la contabilità dei client, che ripartono alla pari
+                self._last_finish[priority].clear()
+            self._virtual_time[priority] = waiter.finish
+
+            wait = time.monotonic() - waiter.enqueued
+            stats = self._stats[priority]
+            stats["dispatched"] += 1
+            stats["wait_total"] += wait
+            stats["wait_max"] = max(stats["wait_max"], wait)
+            self._active[priority] += 1
+            waiter.granted = True
+            waiter.grant()
+
+    def _cancel(self, waiter: _Waiter) -> bool:
+        """Toglie dalla coda una richiesta non ancora servita; restituisce False se lo slot era già stato assegnato."""
+        with self._lock:
+            if waiter.granted:
+                return False
+            queues = self._queues[waiter.priority]
+            queues[waiter.tenant].remove(waiter)
+            if not queues[waiter.tenant]:
+                del queues[waiter.tenant]
+            self._stats[waiter.priority]["abandoned"] += 1
+            return True
+
+    def _release(self, priority: str) -> None:
+        with self._lock:
+            self._active[priority] -= 1
+            self._dispatch()
+
+    @contextmanager
+    def slot(self, priority: str, tenant: str, cost: float = 1.0, timeout: Optional[float] = None):
+        """Attende uno slot del backend (bloccando il thread) e lo rilascia all'uscita dal blocco `with`.
+
+            Args:
+                priority (str): La classe di priorità ("interactive" o "batch").
+                tenant (str): Il client che invia la richiesta (vedi `tenant_from_headers`).
+                cost (float, optional): Il costo della richiesta per la ripartizione equa (es. i token stimati del prompt).
+                timeout (Optional[float]): I secondi massimi di attesa in coda.
+
+            Raises:
+                TimeoutError: Se lo slot non viene assegnato entro `timeout` secondi.
+        """
+        granted = threading.Event()
+        waiter = self._submit(priority, tenant, cost, granted.set)
+        if not granted.wait(None if timeout is None else max(timeout, 0.0)) and self._cancel(waiter):
+            raise TimeoutError(f"Nessuno slot libero su {self.name} entro la scadenza.")
+        try:
+            yield
+        finally:
+            self._release(waiter.priority)
+
+    @asynccontextmanager
+    async def aslot(self, priority: str, tenant: str, cost: float = 1.0, timeout: Optional[float] = None):
+        """Versione asincrona di `slot`: attende lo slot senza bloccare l'event loop."""
+        loop = asyncio.get_running_loop()
+        granted = loop.create_future()
+
+        def grant():
+            loop.call_soon_threadsafe(lambda: granted.done() or granted.set_result(None))
+
+        waiter = self._submit(priority, tenant, cost, grant)
+        try:
+            await asyncio.wait_for(asyncio.shield(granted), None if timeout is None else max(timeout, 0.0))
+        except asyncio.TimeoutError:
+            if self._cancel(waiter):
+                raise TimeoutError(f"Nessuno slot libero su {self.name} entro la scadenza.")
+        except asyncio.CancelledError:
+            if not self._cancel(waiter):
+                self._release(waiter.priority)
+            raise
+        try:
+            yield
+        finally:
+            self._release(waiter.priority)
+
+    def snapshot(self) -> Dict:
+        """Restituisce, per ogni classe, richieste in coda e in corso, limite e tempi di attesa."""
+        with self._lock:
+            classes = {}
+            for priority in PRIORITY_CLASSES:
+                stats = self._stats[priority]
+                classes[priority] = {
+                    "queued": sum(len(queue) for queue in self._queues[priority].values()),
+                    "active": self._active[priority],
+                    "cap": self.class_caps[priority],
+                    "tenants_waiting": len(self._queues[priority]),
+                    "dispatched": stats["dispatched"],
+                    "abandoned": stats["abandoned"],
+                    "wait_mean": stats["wait_total"] / stats["dispatched"] if stats["dispatched"] else 0.0,
+                    "wait_max": stats["wait_max"],
+                }
+            return {"slots": self.slots, "classes": classes}
+
+
+_schedulers: Dict[str, FairScheduler] = {}
+_schedulers_lock = threading.Lock()
+
+
+def get_scheduler(backend: str) -> FairScheduler:
+    """Restituisce lo scheduler condiviso del backend ("ollama" o "gemini"), creandolo dalla configurazione.
+
+        Le istanze di `LLMService` vengono create a ogni richiesta, quindi gli scheduler sono unici
+        a livello di modulo. Il limite della classe "batch" è `Config.SCHEDULER_BATCH_SHARE` degli slot
+        (almeno uno), così che una parte degli slot resti sempre disponibile per le richieste interattive.
+    """
+    with _schedulers_lock:
+        if backend not in _schedulers:
+            slots = Config.SCHEDULER_OLLAMA_SLOTS if backend == "ollama" else Config.SCHEDULER_GEMINI_SLOTS
+            batch_cap = max(1, int(slots * Config.SCHEDULER_BATCH_SHARE))
+            _schedulers[backend] = FairScheduler(backend, slots, {"batch": batch_cap},
+                                                 parse_weights(Config.SCHEDULER_TENANT_WEIGHTS))
+        return _schedulers[backend]
+
+
+def scheduler_stats() -> Dict:
+    """Restituisce lo stato degli scheduler creati finora, per backend."""
+    with _schedulers_lock:
+        schedulers = dict(_schedulers)
+    return {name: scheduler.snapshot() for name, scheduler in schedulers.items()}
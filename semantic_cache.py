@@ -0,0 +1,306 @@
+import ast
+import builtins
+import difflib
+import functools
+import keyword
+import re
+import sys
+import threading
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from annotations import apply_annotations
+from config import Config
+from findings_parser import parse_findings
+
+# Dimensione dei vettori: 128 float32 (512 byte) per funzione. La ricerca è limitata dalla banda di memoria:
+# con 100.000 funzioni costa circa 3 ms, contro 11 ms con 256 componenti e la stessa qualità dei riusi.
+EMBEDDING_DIM = 128
+
+# Commenti, stringhe su una riga, identificatori, numeri e singoli simboli.
+_TOKEN_RE = re.compile(r"#[^\n]*|\"(?:\\.|[^\"\\\n])*\"|'(?:\\.|[^'\\\n])*'|[A-Za-z_]\w*|\d\w*|\S")
+_KEPT_NAMES = frozenset(keyword.kwlist) | frozenset(getattr(keyword, "softkwlist", [])) | frozenset(dir(builtins))
+# Peso dei nomi originali rispetto agli n-grammi normalizzati: una copia rinominata resta sopra la soglia.
+NAME_WEIGHT = 0.25
+# Stima della memoria occupata da una voce oltre al vettore e ai testi (dizionario, segnalazioni, array paralleli).
+_ENTRY_OVERHEAD = 400
+
+
+def _tokens(code: str) -> List[str]:
+    """Divide il codice in token, senza commenti."""
+    return [token for token in _TOKEN_RE.findall(code) if not token.startswith("#")]
+
+
+def _normalize(token: str) -> str:
+    """Sostituisce nomi definiti dal codice, stringhe e numeri con un segnaposto; parole chiave, builtin e simboli restano."""
+    if token[0] in "\"'":
+        return "S"
+    if token[0].isdigit():
+        return "N"
+    if (token[0].isalpha() or token[0] == "_") and token not in _KEPT_NAMES:
+        return "_"
+    return token
+
+
+@functools.lru_cache(maxsize=65536)
+def _token_hash(token: str) -> int:
+    return zlib.crc32(token.encode("utf-8"))
+
+
+def _mix(hashes: np.ndarray) -> np.ndarray:
+    """Rimescola i bit degli hash (uint64), così che componente e segno dipendano da tutto l'n-gramma."""
+    hashes = hashes ^ (hashes >> np.uint64(29))
+    hashes = hashes * np.uint64(0xBF58476D1CE4E5B9)
+    return hashes ^ (hashes >> np.uint64(32))
+
+
+def _hashed_counts(hashes: np.ndarray, dim: int) -> np.ndarray:
+    """Somma le feature in `dim` componenti: l'hash sceglie la componente e, con il bit 40, il segno."""
+    hashes = _mix(hashes)
+    signs = np.where(hashes & np.uint64(1 << 40), -1.0, 1.0)
+    return np.bincount((hashes % np.uint64(dim)).astype(np.intp), weights=signs, minlength=dim)
+
+
+def embed(code: str, dim: int = EMBEDDING_DIM) -> np.ndarray:
+    """Calcola l'embedding locale di un frammento di codice (hashing di n-grammi di token).
+
+        I token vengono normalizzati (nomi, stringhe e numeri diventano segnaposto) e gli
+        unigrammi, bigrammi e trigrammi normalizzati vengono proiettati con un hash in `dim`
+        componenti con segno (gli n-grammi sono combinati sugli hash dei token, con NumPy); i nomi originali contribuiscono come unigrammi a parte, con peso
+        `NAME_WEIGHT`. Due copie della stessa funzione con nomi diversi hanno quindi una similarità
+        coseno vicina a 1 (circa 0.99), ma restano distinguibili da due copie identiche.
+
+        Returns:
+            np.ndarray: Il vettore float32 di norma 1 (tutto zero se il codice non ha token).
+    """
+    tokens = _tokens(code)
+    normalized = [_normalize(token) for token in tokens]
+    units = np.fromiter((_token_hash(token) for token in normalized), dtype=np.uint64, count=len(normalized))
+    # Bigrammi e trigrammi combinano gli hash dei token con moltiplicatori diversi per posizione
+    bigrams = units[:-1] * np.uint64(0x9E3779B97F4A7C15) + units[1:]
+    trigrams = bigrams[:-1] * np.uint64(0xC2B2AE3D27D4EB4F) + units[2:]
+    names = np.fromiter((_token_hash("name:" + token) for token, norm in zip(tokens, normalized) if norm == "_"), dtype=np.uint64)
+    counts = _hashed_counts(np.concatenate([units, bigrams, trigrams]), dim) + NAME_WEIGHT * _hashed_counts(names, dim)
+    vector = (np.sign(counts) * np.log1p(np.abs(counts))).astype(np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def is_single_function(code: str) -> bool:
+    """Indica se il codice è una sola funzione (con eventuali decoratori), la granularità della cache semantica."""
+    try:
+        tree = ast.parse(code)
+    except (SyntaxError, ValueError):
+        return False
+    return len(tree.body) == 1 and isinstance(tree.body[0], (ast.FunctionDef, ast.AsyncFunctionDef))
+
+
+def _line_key(tokens: List[str]) -> str:
+    """Chiave di allineamento di una riga: nomi normalizzati, mentre operatori, parole chiave e letterali restano invariati."""
+    return " ".join("_" if _normalize(token) == "_" else token for token in tokens)
+
+
+def adapt_findings(cached_code: str, findings: List[Dict], code: str) -> Optional[List[Dict]]:
+    """Trasferisce le segnalazioni di una funzione simile sul codice nuovo.
+
+        Le righe vengono allineate dopo aver normalizzato i nomi, così che una copia rinominata
+        corrisponda riga per riga. Le segnalazioni valgono solo se il codice nuovo è una copia
+        rinominata in modo coerente (es. `totale` -> `somma` ovunque): se una riga di codice è stata
+        aggiunta, rimossa o modificata (anche solo un operatore o un letterale, es. `/` -> `//`)
+        viene restituito None, perché le segnalazioni di quella riga mancherebbero. Commenti e righe
+        vuote non contano. I nomi rinominati vengono sostituiti anche nei messaggi.
+    """
+    old_lines, new_lines = cached_code.splitlines(), code.splitlines()
+    old_tokens = [_tokens(line) for line in old_lines]
+    new_tokens = [_tokens(line) for line in new_lines]
+    matcher = difflib.SequenceMatcher(None, [_line_key(tokens) for tokens in old_tokens],
+                                      [_line_key(tokens) for tokens in new_tokens], autojunk=False)
+    mapping: Dict[int, int] = {}
+    renames: Dict[str, str] = {}
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag != "equal":
+            if any(old_tokens[i1:i2]) or any(new_tokens[j1:j2]):
+                return None
+            continue
+        for k in range(i2 - i1):
+            mapping[i1 + k + 1] = j1 + k + 1
+            for old, new in zip(old_tokens[i1 + k], new_tokens[j1 + k]):
+                if _normalize(old) == "_" and renames.setdefault(old, new) != new:
+                    # Lo stesso nome rinominato in due modi diversi: il codice non è una copia
+                    return None
+    if len(set(renames.values())) < len(renames):
+        # Due nomi diversi diventati uguali
+        return None
+    renames = {old: new for old, new in renames.items() if old != new}
+    pattern = re.compile(r"\b(" + "|".join(map(re.escape, sorted(renames, key=len, reverse=True))) + r")\b") if renames else None
+
+    adapted = []
+    for finding in findings:
+        if finding["line"] not in mapping:
+            continue
+        message = finding.get("message") or ""
+        if pattern is not None:
+            message = pattern.sub(lambda match: renames[match.group(1)], message)
+        adapted.append({**finding, "line": mapping[finding["line"]], "message": message})
+    return adapted
+
+
+class SemanticCache:
+    """Cache in memoria delle revisioni di funzioni quasi identiche, con ricerca per similarità coseno.
+
+        Ogni funzione revisionata viene salvata con il suo embedding (vedi `embed`) in una matrice NumPy;
+        la ricerca dei `k` vicini è un prodotto matrice-vettore seguito da `np.argpartition`. Le voci
+        sono divise per gruppo (backend, modello, protocollo e tipo di revisione), come le chiavi di
+        `review_cache.ReviewCache`. Quando la memoria stimata supera `max_bytes`, vengono eliminate
+        le voci usate meno di recente fino a tornare al 90% del limite.
+
+        Attributes:
+            threshold (float): La similarità minima per riusare una revisione.
+            max_bytes (int): La memoria massima stimata di vettori, codice e segnalazioni.
+            dim (int): La dimensione degli embedding.
+            stats (Dict[str, int]): Ricerche, riusi, funzioni simili ma cambiate (rinviate al modello),
+                inserimenti e voci eliminate.
+    """
+
+    def __init__(self, threshold: float = 0.95, max_bytes: int = 64 * 1024 * 1024, dim: int = EMBEDDING_DIM) -> None:
+        self.threshold = threshold
+        self.max_bytes = max_bytes
+        self.dim = dim
+        self.stats = {"lookups": 0, "hits": 0, "changed": 0, "inserts": 0, "evicted": 0}
+        self._lock = threading.Lock()
+        self._vectors = np.zeros((1024, dim), dtype=np.float32)
+        self._groups = np.zeros(1024, dtype=np.int32)
+        self._used = np.zeros(1024, dtype=np.int64)
+        self._entries: List[Dict] = []
+        self._group_ids: Dict[str, int] = {}
+        self._by_code: Dict[Tuple[int, str], int] = {}
+        self._bytes = 0
+        self._tick = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def search(self, vector: np.ndarray, group: str, k: int = 5) -> List[Tuple[float, Dict]]:
+        """Restituisce le `k` voci del gruppo più simili al vettore, come coppie (similarità, voce) in ordine decrescente."""
+        with self._lock:
+            return [(score, self._entries[index]) for score, index in self._search(vector, group, k)]
+
+    def _search(self, vector: np.ndarray, group: str, k: int) -> List[Tuple[float, int]]:
+        count = len(self._entries)
+        group_id = self._group_ids.get(group)
+        if group_id is None or count == 0:
+            return []
+        scores = self._vectors[:count] @ vector
+        scores[self._groups[:count] != group_id] = -2.0
+        if count > k:
+            candidates = np.argpartition(scores, count - k)[count - k:]
+        else:
+            candidates = np.arange(count)
+        candidates = candidates[np.argsort(scores[candidates])[::-1]]
+        return [(float(scores[index]), int(index)) for index in candidates if scores[index] > -2.0]
+
+    def lookup(self, code: str, group: str, k: int = 5) -> Optional[Tuple[float, str]]:
+        """Cerca una funzione abbastanza simile e ne adatta la revisione al codice indicato.
+
+            Tra i `k` vicini sopra `threshold` viene usato il più simile di cui il codice è una copia
+            rinominata (vedi `adapt_findings`): una funzione simile ma con righe cambiate va rivista dal modello.
+
+            Returns:
+                Optional[tuple]: La similarità e la revisione adattata (il codice annotato con le segnalazioni
+                trasferite), o None se nessuna voce si può riusare.
+        """
+        vector = embed(code, self.dim)
+        with self._lock:
+            self.stats["lookups"] += 1
+            candidates = [(score, index, self._entries[index]) for score, index in self._search(vector, group, k)
+                          if score >= self.threshold]
+        for score, index, entry in candidates:
+            findings = adapt_findings(entry["code"], entry["findings"], code)
+            if findings is None:
+                continue
+            with self._lock:
+                self._tick += 1
+                if index < len(self._entries) and self._entries[index] is entry:
+                    self._used[index] = self._tick
+                self.stats["hits"] += 1
+            return score, apply_annotations(code, findings)
+        if candidates:
+            with self._lock:
+                self.stats["changed"] += 1
+        return None
+
+    def add(self, code: str, group: str, review: str) -> None:
+        """Salva la revisione di una funzione; la voce con lo stesso codice nello stesso gruppo viene sostituita."""
+        findings = [{key: finding[key] for key in ("line", "tag", "severity", "rule", "message")}
+                    for finding in parse_findings(review)["findings"]]
+        entry = {"code": code, "findings": findings,
+                 "bytes": self.dim * 4 + sys.getsizeof(code) + sum(sys.getsizeof(f["message"] or "") for f in findings)
+                          + _ENTRY_OVERHEAD * (1 + len(findings))}
+        vector = embed(code, self.dim)
+        with self._lock:
+            self.stats["inserts"] += 1
+            self._tick += 1
+            group_id = self._group_ids.setdefault(group, len(self._group_ids))
+            index = self._by_code.get((group_id, code))
+            if index is not None:
+                self._bytes -= self._entries[index]["bytes"]
+                self._entries[index] = entry
+            else:
+                index = len(self._entries)
+                if index == len(self._vectors):
+                    self._grow()
+                self._entries.append(entry)
+                self._by_code[(group_id, code)] = index
+            self._vectors[index] = vector
+            self._groups[index] = group_id
+            self._used[index] = self._tick
+            self._bytes += entry["bytes"]
+            if self._bytes > self.max_bytes:
+                self._evict(int(self.max_bytes * 0.9))
+
+    def _grow(self) -> None:
+        capacity = len(self._vectors) * 2
+        self._vectors = np.resize(self._vectors, (capacity, self.dim))
+        self._groups = np.resize(self._groups, capacity)
+        self._used = np.resize(self._used, capacity)
+
+    def _evict(self, target: int) -> None:
+        """Elimina le voci usate meno di recente finché la memoria stimata non scende a `target`."""
+        count = len(self._entries)
+        order = np.argsort(self._used[:count], kind="stable")
+        sizes = np.fromiter((self._entries[index]["bytes"] for index in order), dtype=np.int64, count=count)
+        freed = np.cumsum(sizes)
+        evict = int(np.searchsorted(freed, self._bytes - target)) + 1
+        keep = np.ones(count, dtype=bool)
+        keep[order[:evict]] = False
+        kept = np.flatnonzero(keep)
+        self._vectors[:len(kept)] = self._vectors[kept]
+        self._groups[:len(kept)] = self._groups[kept]
+        self._used[:len(kept)] = self._used[kept]
+        self._entries = [self._entries[index] for index in kept]
+        self._by_code = {(int(self._groups[index]), entry["code"]): index for index, entry in enumerate(self._entries)}
+        self._bytes -= int(freed[evict - 1])
+        self.stats["evicted"] += evict
+
+    def snapshot(self) -> Dict:
+        """Restituisce voci, memoria stimata e contatori."""
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._bytes, "max_bytes": self.max_bytes,
+                    "threshold": self.threshold, **self.stats}
+
+
+_semantic_cache: Optional[SemanticCache] = None
+_semantic_cache_lock = threading.Lock()
+
+
+def get_semantic_cache() -> Optional[SemanticCache]:
+    """Restituisce la cache semantica condivisa dal processo, o None se `Config.SEMANTIC_CACHE` è disattivato."""
+    global _semantic_cache
+    if not Config.SEMANTIC_CACHE:
+        return None
+    with _semantic_cache_lock:
+        if _semantic_cache is None:
+            _semantic_cache = SemanticCache(Config.SEMANTIC_CACHE_THRESHOLD, int(Config.SEMANTIC_CACHE_MAX_MB * 1024 * 1024))
+        return _semantic_cache
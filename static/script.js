@@ -20,7 +20,7 @@ document.addEventListener('DOMContentLoaded', function() {
 
     // Applica Highlight.js all'elemento <code> al caricamento iniziale
     // Questo è importante ora che la pagina si ricarica e Flask popola il contenuto
-    if (reviewedCodeOutputElement.textContent.trim().length > 0 && reviewedCodeOutputElement.textContent.trim() !== 'Il codice revisionato apparirà qui.') {
+    if (window.hljs && reviewedCodeOutputElement.textContent.trim().length > 0 && reviewedCodeOutputElement.textContent.trim() !== 'Il codice revisionato apparirà qui.') {
         hljs.highlightElement(reviewedCodeOutputElement);
     }
     
@@ -86,8 +86,57 @@ document.addEventListener('DOMContentLoaded', function() {
         }, 3000);
     }
 
-    // Rimossa completamente la gestione della sottomissione del form tramite AJAX.
-    // La sottomissione avverrà in modo tradizionale, causando un ricaricamento della pagina.
+    // Invio del form con risposta compatta: il server restituisce solo le modifiche rispetto al codice inviato
+    // (vedi `annotations.review_diff`) e la revisione viene ricostruita qui, senza ricaricare la pagina.
+    // In caso di problemi il form viene inviato in modo tradizionale, con il ricaricamento della pagina.
+    const reviewForm = document.getElementById('code_reviwer_form');
+
+    function applyReviewDiff(code, ops) {
+        const lines = code.split('\n');
+        for (let index = ops.length - 1; index >= 0; index--) {
+            const op = ops[index];
+            if (typeof op[1] === 'string') {
+                lines[op[0]] += op[1];
+            } else {
+                lines.splice(op[0], op[1], ...op[2]);
+            }
+        }
+        return lines.join('\n');
+    }
+
+    if (reviewForm && window.fetch) {
+        reviewForm.addEventListener('submit', async function(event) {
+            event.preventDefault();
+            const code = reviewForm.querySelector('.input_code').value;
+            const data = new FormData(reviewForm);
+            data.append('response', 'diff');
+            reviewedCodeOutputElement.textContent = 'Revisione in corso...';
+
+            let payload;
+            try {
+                const response = await fetch(reviewForm.action, { method: 'POST', body: data });
+                payload = await response.json();
+            } catch (err) {
+                reviewForm.submit();
+                return;
+            }
+            if (payload.error) {
+                reviewedCodeOutputElement.textContent = 'Il codice revisionato apparirà qui.';
+                showTemporaryMessage(payload.error, 'error');
+                return;
+            }
+            if (code.split('\n').length !== payload.base_lines) {
+                reviewForm.submit();
+                return;
+            }
+
+            reviewedCodeOutputElement.textContent = applyReviewDiff(code, payload.ops);
+            delete reviewedCodeOutputElement.dataset.highlighted;
+            if (window.hljs) {
+                hljs.highlightElement(reviewedCodeOutputElement);
+            }
+        });
+    }
 });
 
 // Funzione globale per il toggle del menu delle impostazioni (rimane invariata)
@@ -0,0 +1,145 @@
+import argparse
+import hashlib
+import mimetypes
+import os
+import threading
+import urllib.request
+from typing import Dict, Optional, Tuple
+
+from compression import brotli, choose_encoding, compress, is_compressible
+
+# Prefisso degli URL dei file statici con impronta, serviti con cache permanente.
+ASSETS_URL_PREFIX = "/assets/"
+
+# highlight.js copiato in static/vendor (vedi `vendor_highlight`); finché manca, la pagina usa la CDN.
+HIGHLIGHT_VERSION = "11.9.0"
+HIGHLIGHT_CDN = f"https://cdnjs.cloudflare.com/ajax/libs/highlight.js/{HIGHLIGHT_VERSION}/"
+HIGHLIGHT_FILES = ("highlight.min.js", "languages/python.min.js")
+
+
+class Asset:
+    """Un file statico letto in memoria, con la sua impronta e le versioni compresse.
+
+        Attributes:
+            name (str): Il percorso relativo alla cartella static (es. "style.css").
+            url_name (str): Il nome con l'impronta del contenuto (es. "style.3f2a9c1b04de.css").
+            mimetype (str): Il tipo di contenuto.
+            data (bytes): Il contenuto originale.
+            encoded (Dict[str, bytes]): Le versioni compresse ("gzip", "br"), solo se più piccole dell'originale.
+            etag (str): L'impronta del contenuto, usata anche come ETag.
+            mtime_ns (int): La data di modifica del file letto.
+    """
+
+    def __init__(self, name: str, data: bytes, mtime_ns: int) -> None:
+        self.name = name
+        self.data = data
+        self.mtime_ns = mtime_ns
+        self.etag = hashlib.sha256(data).hexdigest()[:12]
+        stem, extension = os.path.splitext(name)
+        self.url_name = f"{stem}.{self.etag}{extension}"
+        self.mimetype = mimetypes.guess_type(name)[0] or "application/octet-stream"
+        self.encoded: Dict[str, bytes] = {}
+        if is_compressible(self.mimetype, len(data)):
+            for encoding in ("gzip", "br") if brotli is not None else ("gzip",):
+                compressed = compress(data, encoding, static=True)
+                if len(compressed) < len(data):
+                    self.encoded[encoding] = compressed
+
+    def body(self, accept_encoding: Optional[str]) -> Tuple[bytes, Optional[str]]:
+        """Restituisce il contenuto da inviare al client e la sua codifica (None se non compresso)."""
+        encoding = choose_encoding(accept_encoding, [encoding for encoding in ("br", "gzip") if encoding in self.encoded])
+        return (self.encoded[encoding], encoding) if encoding else (self.data, None)
+
+
+class StaticAssets:
+    """Serve i file della cartella static con un'impronta del contenuto nel nome.
+
+        Il nome con impronta cambia a ogni modifica del file, quindi le risposte possono essere
+        memorizzate dal browser per sempre (`Cache-Control: immutable`) senza rischio di servire
+        versioni vecchie. I file vengono letti e compressi (gzip e, se installato, brotli al livello
+        massimo) una sola volta e riletti solo quando la loro data di modifica cambia.
+
+        Attributes:
+            folder (str): La cartella dei file statici.
+    """
+
+    def __init__(self, folder: str) -> None:
+        self.folder = folder
+        self._by_name: Dict[str, Asset] = {}
+        self._by_url: Dict[str, Asset] = {}
+        self._lock = threading.Lock()
+
+    def load(self, name: str) -> Optional[Asset]:
+        """Restituisce il file `name` della cartella static (None se non esiste), rileggendolo se è cambiato."""
+        path = os.path.join(self.folder, *name.split("/"))
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        with self._lock:
+            asset = self._by_name.get(name)
+            if asset is not None and asset.mtime_ns == stat.st_mtime_ns:
+                return asset
+        try:
+            with open(path, "rb") as f:
+                asset = Asset(name, f.read(), stat.st_mtime_ns)
+        except OSError:
+            return None
+        with self._lock:
+            previous = self._by_name.get(name)
+            if previous is not None:
+                self._by_url.pop(previous.url_name, None)
+            self._by_name[name] = asset
+            self._by_url[asset.url_name] = asset
+        return asset
+
+    def exists(self, name: str) -> bool:
+        """Indica se il file `name` è presente nella cartella static."""
+        return self.load(name) is not None
+
+    def url(self, name: str) -> str:
+        """Restituisce l'URL con impronta del file `name` (o l'URL /static/ se il file non esiste)."""
+        asset = self.load(name)
+        return ASSETS_URL_PREFIX + asset.url_name if asset else f"/static/{name}"
+
+    def get(self, url_name: str) -> Optional[Asset]:
+        """Restituisce il file con il nome con impronta indicato, se corrisponde ancora al contenuto attuale."""
+        with self._lock:
+            asset = self._by_url.get(url_name)
+        if asset is None:
+            return None
+        current = self.load(asset.name)
+        return current if current is not None and current.url_name == url_name else None
+
+
+def vendor_highlight(folder: str) -> None:
+    """Scarica highlight.js (`HIGHLIGHT_VERSION`) dalla CDN in `folder`/vendor/highlight, da aggiungere al repository."""
+    for name in HIGHLIGHT_FILES:
+        target = os.path.join(folder, "vendor", "highlight", *name.split("/"))
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with urllib.request.urlopen(HIGHLIGHT_CDN + name, timeout=30) as response:
+            data = response.read()
+        with open(target, "wb") as f:
+            f.write(data)
+        print(f"{target}: {len(data)} byte")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Gestione dei file statici dell'interfaccia web.")
+    parser.add_argument("--vendor", action="store_true", help=f"Scarica highlight.js {HIGHLIGHT_VERSION} in static/vendor.")
+    parser.add_argument("--folder", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "static"))
+    args = parser.parse_args()
+
+    if args.vendor:
+        vendor_highlight(args.folder)
+    assets = StaticAssets(args.folder)
+    for root, _, files in os.walk(args.folder):
+        for file_name in sorted(files):
+            name = os.path.relpath(os.path.join(root, file_name), args.folder).replace(os.sep, "/")
+            asset = assets.load(name)
+            sizes = ", ".join(f"{encoding} {len(data)}" for encoding, data in asset.encoded.items())
+            print(f"{ASSETS_URL_PREFIX}{asset.url_name}: {len(asset.data)} byte" + (f" ({sizes})" if sizes else ""))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+import ast
+import builtins
+from typing import Dict, List
+
+
+# Nomi built-in che, se riassegnati, nascondono la funzione originale (es. `list = [1, 2]`).
+_SHADOWED_BUILTINS = {name for name in dir(builtins) if not name.startswith("_")}
+
+
+def _finding(line: int, tag: str, severity: str, message: str, rule=None) -> Dict:
+    return {"line": line, "tag": tag, "severity": severity, "rule": rule, "message": message}
+
+
+def run_static_checks(code: str) -> List[Dict]:
+    """Esegue controlli statici veloci, senza LLM, sullo snippet di codice.
+
+        I controlli usano solo `ast` e coprono i casi più comuni del corpus di test:
+        errori di sintassi, argomenti di default mutabili, confronti con None/True/False,
+        `except` senza tipo, `is` usato con letterali, import con `*`, divisioni per
+        zero letterale e riassegnazione di nomi built-in.
+
+        Le segnalazioni hanno la stessa forma di quelle restituite da
+        `findings_parser.parse_findings`, così da poter essere confrontate direttamente.
+
+        Args:
+            code (str): Lo snippet di codice Python da analizzare.
+
+        Returns:
+            List[dict]: Le segnalazioni, ciascuna con "line", "tag", "severity", "rule" e "message".
+
+        Examples:
+            print(run_static_checks("def f(x=[]): pass")[0]["tag"])
+            POTENTIAL_BUG
+    """
+    try:
+        tree = ast.parse(code)
+    except SyntaxError as e:
+        return [_finding(e.lineno or 1, "SYNTAX_ERROR", "ALTA", e.msg)]
+
+    findings = []
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.Lambda)):
+            for default in node.args.defaults + [d for d in node.args.kw_defaults if d is not None]:
+                if isinstance(default, (ast.List, ast.Dict, ast.Set)):
+                    findings.append(_finding(node.lineno, "POTENTIAL_BUG", "ALTA",
+                                             "Argomento di default mutabile condiviso tra le chiamate."))
+
+        elif isinstance(node, ast.Compare):
+            for operator, comparator in zip(node.ops, node.comparators):
+                if isinstance(operator, (ast.Eq, ast.NotEq)) and isinstance(comparator, ast.Constant):
+                    if comparator.value is None:
+                        findings.append(_finding(node.lineno, "PEP8", "BASSA",
+                                                 "Confronto con None: usa 'is' o 'is not'.", rule="E711"))
+                    elif isinstance(comparator.value, bool):
+                        findings.append(_finding(node.lineno, "PEP8", "BASSA",
+                                                 "Confronto con True/False: usa direttamente la condizione.", rule="E712"))
+                if isinstance(operator, (ast.Is, ast.IsNot)) and isinstance(comparator, ast.Constant) \
+                        and comparator.value is not None and not isinstance(comparator.value, bool):
+                    findings.append(_finding(node.lineno, "BUG", "MEDIA",
+                                             "'is' confronta l'identità, non il valore: usa '=='."))
+
+        elif isinstance(node, ast.ExceptHandler) and node.type is None:
+            findings.append(_finding(node.lineno, "POTENTIAL_BUG", "MEDIA",
+                                     "'except' senza tipo cattura anche SystemExit e KeyboardInterrupt."))
+
+        elif isinstance(node, ast.ImportFrom) and any(alias.name == "*" for alias in node.names):
+            findings.append(_finding(node.lineno, "PEP8", "BASSA",
+                                     "Import con '*': importa esplicitamente i nomi usati.", rule="F403"))
+
+        elif isinstance(node, ast.BinOp) and isinstance(node.op, (ast.Div, ast.FloorDiv, ast.Mod)) \
+                and isinstance(node.right, ast.Constant) and node.right.value == 0:
+            findings.append(_finding(node.lineno, "BUG", "CRITICA", "Divisione per zero."))
+
+        elif isinstance(node, ast.Assign):
+            for target in node.targets:
+                if isinstance(target, ast.Name) and target.id in _SHADOWED_BUILTINS:
+                    findings.append(_finding(node.lineno, "POTENTIAL_BUG", "MEDIA",
+                                             f"La variabile '{target.id}' nasconde il built-in omonimo."))
+
+    findings.sort(key=lambda finding: finding["line"])
+    return findings
@@ -0,0 +1,322 @@
+import ast
+import builtins
+import json
+import os
+import re
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Set
+
+from config import Config
+from findings_parser import estimate_tokens
+from project_review import ProjectFile, discover_directory, module_name
+
+# Nome del file in cui l'indice di una cartella viene salvato, nella radice del progetto.
+INDEX_FILENAME = ".symbol_index.json"
+INDEX_FORMAT = 1
+
+_BUILTINS = frozenset(dir(builtins))
+_NAME_RE = re.compile(r"\b([A-Za-z_]\w*)(?:\.([A-Za-z_]\w*))?")
+
+
+def _first_line(node: ast.AST) -> str:
+    doc = ast.get_docstring(node)
+    return doc.strip().splitlines()[0].strip() if doc and doc.strip() else ""
+
+
+def _function_signature(node: ast.AST) -> str:
+    prefix = "async def" if isinstance(node, ast.AsyncFunctionDef) else "def"
+    returns = f" -> {ast.unparse(node.returns)}" if node.returns else ""
+    return f"{prefix} {node.name}({ast.unparse(node.args)}){returns}: ..."
+
+
+def _resolve_relative(module: str, is_package: bool, level: int, target: Optional[str]) -> str:
+    """Risolve un import relativo (`from ..utils import x`) rispetto al modulo che lo contiene."""
+    if not level:
+        return target or ""
+    parts = module.split(".") if module else []
+    if not is_package:
+        parts = parts[:-1]
+    parts = parts[:len(parts) - (level - 1)] if level > 1 else parts
+    return ".".join(part for part in [*parts, target or ""] if part)
+
+
+def parse_module(code: str, module: str = "", is_package: bool = False) -> Dict:
+    """Estrae con `ast` i simboli di primo livello e gli import di un modulo.
+
+        Args:
+            code (str): Il codice del modulo.
+            module (str, optional): Il nome del modulo, per risolvere gli import relativi.
+            is_package (bool, optional): True se il modulo è un `__init__.py`.
+
+        Returns:
+            Dict: "symbols" (nome -> tipo, firma, prima riga della docstring, riga e, per le classi,
+            le firme dei metodi pubblici e di `__init__`) e "imports" (alias -> nome qualificato).
+            Se il codice non è analizzabile, entrambi sono vuoti.
+    """
+    try:
+        tree = ast.parse(code)
+    except (SyntaxError, ValueError):
+        return {"symbols": {}, "imports": {}}
+
+    symbols = {}
+    imports = {}
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            symbols[node.name] = {"kind": "function", "signature": _function_signature(node),
+                                  "doc": _first_line(node), "line": node.lineno}
+        elif isinstance(node, ast.ClassDef):
+            bases = ", ".join(ast.unparse(base) for base in node.bases)
+            methods = [_function_signature(child) for child in node.body
+                       if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef))
+                       and (child.name == "__init__" or not child.name.startswith("_"))]
+            symbols[node.name] = {"kind": "class", "signature": f"class {node.name}({bases}):" if bases else f"class {node.name}:",
+                                  "doc": _first_line(node), "line": node.lineno, "methods": methods}
+        elif isinstance(node, ast.Import):
+            for alias in node.names:
+                if alias.asname:
+                    imports[alias.asname] = alias.name
+                else:
+                    imports[alias.name.split(".")[0]] = alias.name.split(".")[0]
+        elif isinstance(node, ast.ImportFrom):
+            source = _resolve_relative(module, is_package, node.level, node.module)
+            for alias in node.names:
+                if alias.name != "*":
+                    imports[alias.asname or alias.name] = f"{source}.{alias.name}" if source else alias.name
+    return {"symbols": symbols, "imports": imports}
+
+
+def _referenced_names(code: str):
+    """Restituisce i nomi usati dallo snippet (in ordine di apparizione), i suoi import e i nomi che definisce.
+
+        Se lo snippet non è analizzabile (es. revisioni di sintassi), i nomi vengono estratti con un'espressione regolare.
+    """
+    try:
+        tree = ast.parse(code)
+    except (SyntaxError, ValueError):
+        references = list(dict.fromkeys(match.group(0) for match in _NAME_RE.finditer(code)))
+        return references, {}, set()
+
+    imports = parse_module(code)["imports"]
+    defined: Set[str] = set()
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            defined.add(node.name)
+        elif isinstance(node, ast.arg):
+            defined.add(node.arg)
+        elif isinstance(node, ast.Name) and isinstance(node.ctx, ast.Store):
+            defined.add(node.id)
+
+    positioned = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Attribute) and isinstance(node.value, ast.Name) and isinstance(node.ctx, ast.Load):
+            positioned.append((node.lineno, node.col_offset, f"{node.value.id}.{node.attr}"))
+        elif isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load):
+            positioned.append((node.lineno, node.col_offset, node.id))
+    references = list(dict.fromkeys(reference for _, _, reference in sorted(positioned)))
+    return references, imports, defined
+
+
+class SymbolIndex:
+    """Indice dei simboli di un progetto: definizioni, firme, docstring e grafo degli import.
+
+        L'indice viene costruito con `ast` e aggiornato in modo incrementale: a ogni `update` vengono
+        analizzati di nuovo solo i file la cui versione (data di modifica e dimensione, o CRC nello zip)
+        è cambiata, e vengono rimossi quelli eliminati. Se `path` è indicato, l'indice viene letto e
+        salvato in JSON, così che non debba essere ricostruito a ogni avvio.
+
+        `context_for` restituisce le firme dei soli simboli definiti in altri moduli e usati dallo
+        snippet, entro un budget di token, da aggiungere al prompt di revisione.
+
+        Attributes:
+            path (Optional[str]): Il file JSON in cui l'indice viene salvato, o None.
+            files (Dict[str, Dict]): Per ogni file: versione, modulo, simboli e import.
+            last_update (Dict): File analizzati, riutilizzati e rimossi e secondi impiegati dall'ultimo `update`.
+    """
+
+    def __init__(self, path: Optional[str] = None) -> None:
+        self.path = path
+        self.files: Dict[str, Dict] = {}
+        self.last_update: Dict = {}
+        self._lock = threading.Lock()
+        self._by_qualified: Dict[str, Dict] = {}
+        self._by_name: Dict[str, List[str]] = {}
+        self._by_module: Dict[str, Dict] = {}
+        if path and os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                if data.get("format") == INDEX_FORMAT:
+                    self.files = data["files"]
+            except (OSError, ValueError, KeyError):
+                self.files = {}
+        self._rebuild_lookup()
+
+    def update(self, project_files: Iterable[ProjectFile], max_bytes: Optional[int] = None) -> Dict:
+        """Aggiorna l'indice con i file attuali del progetto, analizzando solo quelli modificati.
+
+            Args:
+                project_files (Iterable[ProjectFile]): I file del progetto (vedi `project_review.discover_directory`).
+                max_bytes (Optional[int]): I file più grandi vengono ignorati. Il valore predefinito è
+                    `Config.PROJECT_REVIEW_MAX_FILE_BYTES`.
+
+            Returns:
+                Dict: File analizzati ("parsed"), riutilizzati ("reused") e rimossi ("removed") e secondi impiegati.
+        """
+        max_bytes = max_bytes or Config.PROJECT_REVIEW_MAX_FILE_BYTES
+        start = time.perf_counter()
+        parsed = reused = 0
+        with self._lock:
+            current = {}
+            for project_file in project_files:
+                entry = self.files.get(project_file.path)
+                if entry and entry["version"] == project_file.version:
+                    current[project_file.path] = entry
+                    reused += 1
+                    continue
+                module = module_name(project_file.path)
+                code = project_file.read(max_bytes) if project_file.size <= max_bytes else None
+                info = parse_module(code or "", module, project_file.path.endswith("__init__.py"))
+                current[project_file.path] = {"version": project_file.version, "module": module, **info}
+                parsed += 1
+            removed = len(set(self.files) - set(current))
+            self.files = current
+            if parsed or removed:
+                self._rebuild_lookup()
+                self._save()
+        self.last_update = {"parsed": parsed, "reused": reused, "removed": removed,
+                            "elapsed": time.perf_counter() - start}
+        return self.last_update
+
+    def _rebuild_lookup(self) -> None:
+        self._by_qualified = {}
+        self._by_name = {}
+        self._by_module = {}
+        for path, entry in self.files.items():
+            self._by_module[entry["module"]] = {**entry, "path": path}
+            for name, symbol in entry["symbols"].items():
+                qualified = f"{entry['module']}.{name}" if entry["module"] else name
+                self._by_qualified[qualified] = {**symbol, "module": entry["module"], "name": name}
+                self._by_name.setdefault(name, []).append(qualified)
+
+    def _save(self) -> None:
+        if not self.path:
+            return
+        temporary = self.path + ".tmp"
+        with open(temporary, "w", encoding="utf-8") as f:
+            json.dump({"format": INDEX_FORMAT, "files": self.files}, f)
+        os.replace(temporary, self.path)
+
+    def imports_of(self, module: str) -> List[str]:
+        """Restituisce i moduli del progetto importati da `module` (archi uscenti del grafo degli import)."""
+        entry = self._by_module.get(module)
+        if entry is None:
+            return []
+        found = set()
+        for target in entry["imports"].values():
+            while target and target not in self._by_module:
+                target = target.rpartition(".")[0]
+            if target and target != module:
+                found.add(target)
+        return sorted(found)
+
+    def importers_of(self, module: str) -> List[str]:
+        """Restituisce i moduli del progetto che importano `module` (da rivedere se le sue firme cambiano)."""
+        return sorted(other for other in self._by_module if module in self.imports_of(other))
+
+    def resolve(self, code: str, module: Optional[str] = None) -> List[Dict]:
+        """Individua i simboli del progetto usati dallo snippet e definiti altrove.
+
+            I nomi importati dallo snippet (`from utils import f`, `import utils` e poi `utils.f`) vengono
+            risolti attraverso gli import; i nomi liberi non importati né definiti nello snippet vengono
+            cercati per nome e usati solo se definiti in un unico modulo.
+
+            Args:
+                code (str): Lo snippet di codice.
+                module (Optional[str]): Il modulo dello snippet, se fa parte del progetto: risolve gli
+                    import relativi ed esclude i simboli del modulo stesso.
+
+            Returns:
+                List[Dict]: I simboli, nell'ordine in cui vengono usati dallo snippet.
+        """
+        references, imports, defined = _referenced_names(code)
+        own = self._by_module.get(module) if module is not None else None
+        if own is not None:
+            # Import relativi risolti rispetto al modulo; quelli del file indicizzato valgono anche per i frammenti
+            imports = {**own["imports"], **parse_module(code, module, own["path"].endswith("__init__.py"))["imports"]}
+
+        found: Dict[str, Dict] = {}
+        for reference in references:
+            head, _, attr = reference.partition(".")
+            candidates = []
+            if head in imports:
+                target = imports[head]
+                candidates = [f"{target}.{attr}", target] if attr else [target]
+            elif head not in defined and head not in _BUILTINS and not attr:
+                matches = self._by_name.get(head, [])
+                candidates = matches if len(matches) == 1 else []
+            for qualified in candidates:
+                symbol = self._by_qualified.get(qualified)
+                if symbol and symbol["module"] != module:
+                    found.setdefault(qualified, symbol)
+                    break
+        return list(found.values())
+
+    def context_for(self, code: str, budget_tokens: Optional[int] = None, module: Optional[str] = None) -> str:
+        """Restituisce le firme dei simboli usati dallo snippet e definiti in altri moduli, entro `budget_tokens`.
+
+            Per ogni simbolo vengono riportate la firma e la prima riga della docstring; per le classi
+            anche le firme di `__init__` e dei metodi pubblici, omesse se non rientrano nel budget.
+
+            Args:
+                code (str): Lo snippet di codice.
+                budget_tokens (Optional[int]): I token stimati massimi del contesto. Il valore predefinito è
+                    `Config.SYMBOL_CONTEXT_TOKENS`.
+                module (Optional[str]): Il modulo dello snippet, se fa parte del progetto (vedi `resolve`).
+
+            Returns:
+                str: Le firme raggruppate per modulo, o una stringa vuota se non ci sono simboli da aggiungere.
+        """
+        budget = Config.SYMBOL_CONTEXT_TOKENS if budget_tokens is None else budget_tokens
+        by_module: Dict[str, List[str]] = {}
+        used = 0
+        for symbol in self.resolve(code, module):
+            doc = f"  # {symbol['doc']}" if symbol["doc"] else ""
+            variants = [symbol["signature"] + doc]
+            if symbol.get("methods"):
+                methods = "\n".join(f"    {method}" for method in symbol["methods"])
+                variants.insert(0, f"{symbol['signature']}{doc}\n{methods}")
+            for text in variants:
+                cost = estimate_tokens(text)
+                if used + cost <= budget:
+                    by_module.setdefault(symbol["module"], []).append(text)
+                    used += cost
+                    break
+        return "\n".join(f"# {source}\n" + "\n".join(entries) for source, entries in by_module.items())
+
+
+_index: Optional[SymbolIndex] = None
+_index_refreshed = 0.0
+_index_lock = threading.Lock()
+
+# Ogni quanti secondi l'indice condiviso controlla se i file del progetto sono cambiati.
+_REFRESH_SECONDS = 30.0
+
+
+def get_symbol_index() -> Optional[SymbolIndex]:
+    """Restituisce l'indice condiviso della cartella `Config.SYMBOL_INDEX_ROOT`, o None se non è impostata.
+
+        L'indice viene caricato da `.symbol_index.json` nella radice del progetto e aggiornato
+        in modo incrementale al più ogni 30 secondi, quando viene richiesto.
+    """
+    global _index, _index_refreshed
+    root = Config.SYMBOL_INDEX_ROOT
+    if not root or not os.path.isdir(root):
+        return None
+    with _index_lock:
+        if _index is None:
+            _index = SymbolIndex(os.path.join(root, INDEX_FILENAME))
+        if time.monotonic() - _index_refreshed > _REFRESH_SECONDS:
+            _index.update(discover_directory(root))
+            _index_refreshed = time.monotonic()
+        return _index
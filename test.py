@@ -2,6 +2,7 @@ import os
 import time
 
 from llm_service import LLMService
+from results_io import write_results
 
 
 def run_code_review_batch():
@@ -45,7 +46,8 @@ Examples:
         print(f"Errore: La cartella '{tests_dir}' non esiste. Creala e aggiungi i file di test.")
         return
 
-    llm_service = LLMService() 
+    # Le revisioni in batch non devono rallentare quelle interattive dell'interfaccia web
+    llm_service = LLMService(priority="batch", tenant="run_code_review_batch")
 
     results = {
         "bug_detection": [],
@@ -96,26 +98,7 @@ Examples:
     end_time = time.time()
     total_time = end_time - start_time
 
-    with open(output_filename, 'w', encoding='utf-8') as outfile:
-        outfile.write(f"--- Risultati della Code Review LLM ---\n")
-        outfile.write(f"Tempo totale impiegato: {total_time:.2f} secondi\n\n")
-
-        for category, items in results.items():
-            if items:
-                outfile.write(f"=== Categoria: {category.replace('_', ' ').title()} ===\n\n")
-                
-                if items[0]["prompt_used"]:
-                    outfile.write(f"--- Prompt utilizzato per '{category.replace('_', ' ').title()}' ---\n")
-                    outfile.write(items[0]["prompt_used"].splitlines()[1].strip() + '\n')
-                    outfile.write("...\n")
-                    outfile.write("---\n\n")
-
-                for item in items:
-                    outfile.write(f"--- Input {item['test_number']} ---\n")
-                    outfile.write(item['code_snippet'].strip() + "\n\n")
-                    outfile.write(f"--- Output {item['test_number']} (Revisione) ---\n")
-                    outfile.write(item['generated_review'].strip() + "\n\n")
-                outfile.write("\n")
+    write_results(output_filename, results, total_time)
 
     print(f"\nRevisione completata. I risultati sono stati salvati in '{output_filename}'.")
     print(f"Tempo totale impiegato: {total_time:.2f} secondi.")
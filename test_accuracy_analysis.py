@@ -0,0 +1,28 @@
+import os
+import subprocess
+import sys
+
+from accuracy_analysis import LlmModel, generate_report
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def test_importing_the_models_does_not_load_matplotlib():
+    code = "import sys, accuracy_analysis; print('matplotlib' in sys.modules)"
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == "False"
+
+
+def test_report_compares_every_model_headless(tmp_path):
+    import matplotlib.pyplot as plt
+
+    models = [LlmModel(f"modello{index}", "prompt <migliorato>", 10 * index, 20, 30, 40, time=index) for index in range(6)]
+    paths = generate_report(models, output_dir=str(tmp_path), formats=("svg",))
+
+    assert set(paths) == {"svg", "png", "html"}
+    assert all(os.path.getsize(path) > 0 for path in paths.values())
+    with open(paths["html"], encoding="utf-8") as f:
+        report = f.read()
+    assert report.count("<tr><td>modello") == 6
+    assert "prompt &lt;migliorato&gt;" in report and "data:image/png;base64," in report
+    assert plt.get_fignums() == []
@@ -0,0 +1,26 @@
+import json
+import os
+
+from accuracy_scoring import load_gold_labels, score_results
+from annotations import apply_annotations
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+# Input che iniziano con un commento o contengono commenti prima delle righe segnalate.
+COMMENTED_INPUTS = (1, 4, 7, 10, 15, 19, 20, 22, 86, 88)
+
+
+def test_gold_findings_on_commented_inputs_score_perfectly(tmp_path):
+    labels = load_gold_labels(os.path.join(ROOT, "tests", "labels"))
+    path = tmp_path / "gold_results.jsonl"
+    with open(path, "w", encoding="utf-8") as file:
+        for number in COMMENTED_INPUTS:
+            with open(os.path.join(ROOT, "tests", f"Input{number}.py"), encoding="utf-8") as source:
+                code = source.read()
+            findings = [{**finding, "message": "segnalazione attesa"} for finding in labels[number]["findings"]]
+            review = "```python\n" + apply_annotations(code, findings) + "\n```"
+            file.write(json.dumps({"input": number, "category": labels[number]["review_type"], "review": review}) + "\n")
+
+    scores = score_results([str(path)], {number: labels[number] for number in COMMENTED_INPUTS})
+    for values in scores["gold"]["categories"].values():
+        assert values["fp"] == 0 and values["fn"] == 0
+    assert scores["gold"]["overall"]["f1"] == 1.0
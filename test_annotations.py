@@ -0,0 +1,32 @@
+import ast
+
+from annotations import apply_annotations, parse_annotation_lines
+from findings_parser import parse_findings
+
+
+def test_findings_inside_multiline_strings_go_above_the_line():
+    code = 'def f():\n    testo = """prima\n    seconda"""\n    return testo\n'
+    annotated = apply_annotations(code, [{"line": 2, "tag": "STYLE", "message": "usare una costante"}])
+    assert annotated.splitlines()[1:4] == ["    # STYLE: usare una costante", '    testo = """prima', '    seconda"""']
+    ast.parse(annotated)
+
+
+def test_findings_on_continuation_lines_go_above_the_line():
+    code = "totale = 1 + \\\n    2\nprint(totale)"
+    findings = [{"line": 1, "tag": "BUG", "severity": "ALTA", "message": "somma errata"},
+                {"line": 3, "tag": "EXPLAIN", "message": "stampa il totale"}]
+    annotated = apply_annotations(code, findings)
+    assert annotated == "# BUG: ALTA - somma errata\ntotale = 1 + \\\n    2\nprint(totale) # EXPLAIN: stampa il totale"
+    ast.parse(annotated)
+
+
+def test_inline_and_extra_findings_round_trip():
+    code = "x = 1 / 0\ny = x"
+    findings = parse_annotation_lines(
+        '```json\n{"line": 1, "tag": "BUG", "severity": "ALTA", "message": "divisione per zero"}\n'
+        '{"line": 1, "tag": "PEP8", "rule": "E226", "message": "spazi"}\n'
+        '{"line": 9, "tag": "BUG", "message": "riga inesistente"}\n```', 2)
+    annotated = apply_annotations(code, findings)
+    assert annotated == "# PEP8: E226 - spazi\nx = 1 / 0 # BUG: ALTA - divisione per zero\ny = x"
+    assert sorted((finding["line"], finding["tag"]) for finding in parse_findings(annotated)["findings"]) == \
+        [(1, "BUG"), (1, "PEP8")]
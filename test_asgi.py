@@ -0,0 +1,53 @@
+import asyncio
+import json
+
+import asgi
+
+
+class StubService:
+    """Servizio asincrono che annota la prima riga con un bug e uno stile, o rifiuta i tipi sconosciuti."""
+
+    async def generate_code_review(self, code_snippet, review_type):
+        if review_type == "sconosciuto":
+            raise ValueError("Tipo di revisione non supportato: sconosciuto")
+        first, _, rest = code_snippet.partition("\n")
+        return f"# STYLE: nome poco chiaro\n{first}  # BUG: ALTA - divisione per zero\n{rest}"
+
+
+def _call(payload, path="/api/code_reviewer", method="POST"):
+    body = json.dumps(payload).encode("utf-8")
+    scope = {"type": "http", "method": method, "path": path, "query_string": b"",
+             "headers": [(b"content-type", b"application/json")], "client": ("127.0.0.1", 5000)}
+    messages = [{"type": "http.request", "body": body, "more_body": False}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0) if messages else {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(asgi.app(scope, receive, send))
+    return sent[0]["status"], json.loads(b"".join(message.get("body", b"") for message in sent[1:]))
+
+
+def test_review_api_returns_filtered_findings(monkeypatch):
+    monkeypatch.setattr(asgi, "_llm_service", lambda scope: StubService())
+
+    status, result = _call({"code": "x = 1 / 0\ny = x", "review_type": "bug_detection"})
+    assert status == 200
+    assert result["review_type"] == "bug_detection"
+    assert sorted(finding["tag"] for finding in result["findings"]) == ["BUG", "STYLE"]
+
+    status, result = _call({"input_code": "x = 1 / 0", "min_severity": "ALTA"})
+    assert status == 200
+    assert [finding["tag"] for finding in result["findings"]] == ["BUG"]
+
+
+def test_review_api_rejects_bad_requests(monkeypatch):
+    monkeypatch.setattr(asgi, "_llm_service", lambda scope: StubService())
+
+    assert _call({"review_type": "bug_detection"}) == (400, {"error": "Inserisci il codice da revisionare"})
+    assert _call({"code": "x = 1", "review_type": "sconosciuto"}) == \
+        (400, {"error": "Tipo di revisione non supportato: sconosciuto"})
+    assert _call({"code": "x = 1"}, path="/api/inesistente")[0] == 404
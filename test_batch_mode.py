@@ -0,0 +1,47 @@
+import os
+
+import pytest
+
+import batch_mode
+from config import Config
+from fake_batch_server import FakeBatchServer
+from results_io import iter_results
+
+TESTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tests")
+
+
+@pytest.fixture
+def batch_server(monkeypatch, request):
+    """Avvia il server batch simulato (con `fail_every` dal parametro del test) e vi indirizza Gemini."""
+    server = FakeBatchServer(queue_delay=0.1, per_request=0.01, fail_every=request.param).start()
+    for name, value in {"GEMINI_API_KEY": "chiave", "GEMINI_API_BASE_URL": server.url, "MODEL_NAME": None,
+                        "LOCAL_BASE_URL": None, "REVIEW_CACHE_PATH": "", "HISTORY_PATH": "",
+                        "REVIEW_PROTOCOL": "echo"}.items():
+        monkeypatch.setattr(Config, name, value)
+    yield server
+    server.stop()
+
+
+def _run_main(tmp_path):
+    output = tmp_path / "results.txt"
+    code = batch_mode.main(["--tests-dir", TESTS_DIR, "--first", "1", "--last", "6", "--output", str(output),
+                            "--max-requests", "10", "--poll-interval", "0.05", "--max-interval", "0.1"])
+    return code, list(iter_results(str(output)))
+
+
+@pytest.mark.parametrize("batch_server", [0], indirect=True)
+def test_main_reviews_the_corpus_in_one_job(batch_server, tmp_path):
+    code, results = _run_main(tmp_path)
+    assert code == 0
+    assert [item["input"] for item in results] == [1, 2, 3, 4, 5, 6]
+    assert not any(item["review"].startswith("Errore") for item in results)
+    assert batch_server.stats["jobs"] == 1 and batch_server.stats["batched_requests"] == 6
+    assert batch_server.stats["generate"] == 0
+
+
+@pytest.mark.parametrize("batch_server", [3], indirect=True)
+def test_main_fails_when_a_batch_request_fails(batch_server, tmp_path):
+    code, results = _run_main(tmp_path)
+    assert code == 1
+    errors = [item["input"] for item in results if item["review"].startswith("Errore dal job batch")]
+    assert errors == [3, 6]
@@ -0,0 +1,20 @@
+from cli import changed_units
+
+CODE = (
+    "@registra\n"
+    "class A(B):\n"
+    "    x = 1\n"
+    "\n"
+    "    def f(self):\n"
+    "        return 1\n"
+)
+
+
+def test_change_inside_a_method_reviews_only_the_method():
+    assert changed_units(CODE, [6]) == [(5, 6)]
+
+
+def test_change_in_class_header_reviews_the_class():
+    assert changed_units("class A(B):\n    x = 1\n", [1]) == [(1, 2)]
+    assert changed_units(CODE, [1]) == [(1, 6)]
+    assert changed_units(CODE, [4]) == [(1, 6)]
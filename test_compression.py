@@ -0,0 +1,44 @@
+import gzip
+
+import compression
+from annotations import apply_annotations, apply_review_diff, review_diff
+from compression import choose_encoding, compress
+
+
+def test_review_diff_round_trip():
+    code = "def f(x):\n    if x:\n        return 1 / 0\n    return x\n\nprint(f(1))"
+    reviewed = apply_annotations(code, [
+        {"line": 1, "tag": "EXPLAIN", "message": "funzione di prova"},
+        {"line": 3, "tag": "BUG", "severity": "ALTA", "message": "divisione per zero"},
+        {"line": 3, "tag": "STYLE", "message": "usare una costante"},
+    ])
+    ops = review_diff(code, reviewed)
+    assert ops[0] == [0, " # EXPLAIN: funzione di prova"]
+    assert apply_review_diff(code, ops) == reviewed
+
+    # Revisioni che riscrivono o eliminano righe (es. correzioni di sintassi)
+    rewritten = "def f(x):\n    if x:\n        return 1\n\nprint(f(1))\n# fine"
+    assert apply_review_diff(code, review_diff(code, rewritten)) == rewritten
+    assert review_diff(code, code) == []
+
+
+def test_choose_encoding_skips_q0(monkeypatch):
+    monkeypatch.setattr(compression, "brotli", None)
+    assert choose_encoding("gzip, deflate, br") == "gzip"
+    assert choose_encoding("gzip;q=0, deflate") is None
+    assert choose_encoding("gzip;q=0.0, *") is None
+    assert choose_encoding("*;q=0.5") == "gzip"
+    assert choose_encoding("GZIP;q=0.8") == "gzip"
+    assert choose_encoding(None) is None
+
+
+def test_choose_encoding_prefers_brotli_when_available(monkeypatch):
+    monkeypatch.setattr(compression, "brotli", object())
+    assert choose_encoding("gzip, br") == "br"
+    assert choose_encoding("gzip, br;q=0") == "gzip"
+    assert choose_encoding("br", available=("gzip",)) is None
+
+
+def test_gzip_compression_round_trips():
+    data = b"x = 1\n" * 200
+    assert gzip.decompress(compress(data, "gzip")) == data
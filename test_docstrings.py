@@ -0,0 +1,41 @@
+import ast
+import warnings
+
+from docstrings import find_units, insert_docstrings
+
+
+def _insert(code, docstrings):
+    return insert_docstrings(code, find_units(code)["units"], docstrings)
+
+
+def _docstring(code, *path):
+    node = ast.parse(code)
+    for name in path:
+        node = next(child for child in ast.iter_child_nodes(node) if getattr(child, "name", None) == name)
+    return ast.get_docstring(node, clean=False)
+
+
+def test_nested_method_gets_its_own_indentation():
+    code = "class Conto:\n    def deposita(self, importo):\n        self.saldo += importo\n"
+    result = _insert(code, {"Conto": "Un conto.", "Conto.deposita": "Deposita.\n\nArgs:\n    importo (int): L'importo."})
+    assert result.splitlines()[1] == '    """Un conto."""'
+    assert result.splitlines()[3] == '        """Deposita.'
+    assert _docstring(result, "Conto", "deposita") == "Deposita.\n\n        Args:\n            importo (int): L'importo.\n        "
+
+
+def test_existing_docstring_is_replaced():
+    code = 'def somma(a, b):\n    """Somma."""\n    return a + b\n'
+    result = _insert(code, {"somma": "Somma due numeri.\n\nArgs:\n    a (int): Primo.\n    b (int): Secondo.\n\nReturns:\n    int: La somma."})
+    assert result.count('"""') == 2
+    assert _docstring(result, "somma").startswith("Somma due numeri.")
+    assert result.endswith("    return a + b\n")
+
+
+def test_backslashes_and_triple_quotes_are_kept_literally():
+    code = "def percorso(nome):\n    return 'C:/' + nome\n"
+    text = 'Unisce C:\\new e \\d+ al nome, senza """ nel testo.'
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        result = _insert(code, {"percorso": text})
+        compile(result, "<test>", "exec")
+    assert _docstring(result, "percorso") == text
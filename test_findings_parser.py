@@ -0,0 +1,53 @@
+import os
+
+from annotations import apply_annotations
+from findings_parser import parse_findings
+
+TESTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tests")
+
+
+def _round_trip(code, findings):
+    parsed = parse_findings(apply_annotations(code, findings))
+    return sorted((finding["line"], finding["tag"]) for finding in parsed["findings"])
+
+
+def test_ordinary_comments_are_counted():
+    result = parse_findings("# helper\nx = 1  # BUG: ALTA - boom\n")
+    assert [finding["line"] for finding in result["findings"]] == [2]
+
+
+def test_round_trip_on_code_starting_with_a_comment():
+    with open(os.path.join(TESTS_DIR, "Input10.py"), encoding="utf-8") as file:
+        code = file.read()
+    findings = [
+        {"line": 3, "tag": "BUG", "severity": "ALTA", "message": "la condizione è sempre vera"},
+        {"line": 3, "tag": "STYLE", "message": "usare x in (1, 2)"},
+        {"line": 4, "tag": "EXPLAIN", "message": "stampa il messaggio"},
+    ]
+    assert _round_trip(code, findings) == [(3, "BUG"), (3, "STYLE"), (4, "EXPLAIN")]
+
+
+def test_round_trip_with_comments_and_docstrings():
+    code = (
+        "# modulo di esempio\n"
+        "def media(valori):\n"
+        '    """Calcola la media.\n'
+        "\n"
+        "    # BUG: esempio nella docstring, non una segnalazione\n"
+        '    """\n'
+        "    # somma dei valori\n"
+        "    totale = sum(valori)  # nota\n"
+        '    simbolo = "# PEP8: E501"\n'
+        "    return totale / len(valori)\n"
+    )
+    findings = [
+        {"line": 8, "tag": "STYLE", "message": "commento poco utile"},
+        {"line": 10, "tag": "BUG", "severity": "ALTA", "message": "divisione per zero con lista vuota"},
+        {"line": 10, "tag": "MISSING_HANDLING", "message": "valori vuoto"},
+    ]
+    assert _round_trip(code, findings) == [(8, "STYLE"), (10, "BUG"), (10, "MISSING_HANDLING")]
+
+
+def test_tag_after_unterminated_string():
+    result = parse_findings('print("Hello, world!) # SYNTAX_ERROR: stringa non chiusa\n')
+    assert [(finding["line"], finding["tag"]) for finding in result["findings"]] == [(1, "SYNTAX_ERROR")]
@@ -0,0 +1,43 @@
+from config import Config
+from findings_parser import strip_markdown_fences
+from generation import FenceStop, generation_settings
+
+RESPONSE = "Ecco il codice:\n```python\nx = 1 / 0  # BUG: ALTA - divisione per zero\ns = '```'\n```\n**Spiegazione:** ...\n"
+KEPT = RESPONSE.index("\n**Spiegazione")
+
+
+def _feed(chunks):
+    fence = FenceStop()
+    for chunk in chunks:
+        end = fence.feed(chunk)
+        if end is not None:
+            return fence.text[:end]
+    return None
+
+
+def test_fence_split_at_any_point_stops_at_the_same_place():
+    for split in range(1, len(RESPONSE)):
+        assert _feed([RESPONSE[:split], RESPONSE[split:]]) == RESPONSE[:KEPT], split
+    kept = _feed(list(RESPONSE))
+    assert kept == RESPONSE[:KEPT]
+    assert strip_markdown_fences(kept) == strip_markdown_fences(RESPONSE)
+
+
+def test_closing_fence_without_newline_stops_the_stream():
+    assert _feed(["```python\nx = 1\n``", "`"]) == "```python\nx = 1\n```"
+
+
+def test_unclosed_or_missing_fence_never_stops():
+    assert _feed(["```python\n", "x = 1\n", "``"]) is None
+    assert _feed(["x = 1\n", "y = 2\n"]) is None
+
+
+def test_generation_settings_are_opt_in(monkeypatch):
+    monkeypatch.setattr(Config, "GENERATION_LIMITS", False)
+    assert generation_settings("bug_detection", 100) is None
+    monkeypatch.setattr(Config, "GENERATION_LIMITS", True)
+    monkeypatch.setattr(Config, "EARLY_STOP", True)
+    settings = generation_settings("bug_detection", 100)
+    assert settings["early_stop"] and settings["review_type"] == "bug_detection"
+    assert generation_settings("bug_detection", 10_000)["max_tokens"] > settings["max_tokens"]
+    assert not generation_settings("bug_detection", 100, "annotations", early_stop=False)["early_stop"]
@@ -0,0 +1,57 @@
+import time
+
+import pytest
+
+from cascade import is_error_response
+from config import Config
+from fake_batch_server import FakeBatchServer
+from llm_service import LLMService
+
+
+@pytest.fixture
+def gemini(monkeypatch):
+    """Configura il servizio sul server Gemini simulato, senza cache, cronologia né micro-batch."""
+    server = FakeBatchServer(request_latency=0.05).start()
+    for name, value in {"GEMINI_API_KEY": "chiave", "GEMINI_API_BASE_URL": server.url, "MODEL_NAME": None,
+                        "LOCAL_BASE_URL": None, "REVIEW_CACHE_PATH": "", "HISTORY_PATH": "",
+                        "MICRO_BATCH_WINDOW_MS": 0, "REVIEW_PROTOCOL": "echo"}.items():
+        monkeypatch.setattr(Config, name, value)
+    yield server
+    server.stop()
+
+
+def test_deadline_starts_with_each_review(gemini):
+    service = LLMService(timeout=0.5)
+    first = service.generate_code_review("x = 1 / 0\n")
+    time.sleep(0.6)
+    second = service.generate_code_review("y = 2 / 0\n")
+    streamed = list(service.stream_code_review("z = 3 / 0\n"))
+    assert not is_error_response(first)
+    assert not is_error_response(second)
+    assert streamed and all(event == "chunk" for event, _ in streamed)
+
+
+def test_streamed_reviews_are_recorded_in_history(gemini, monkeypatch, tmp_path):
+    import asyncio
+
+    import history
+    from async_llm_service import AsyncLLMService
+
+    monkeypatch.setattr(Config, "HISTORY_PATH", str(tmp_path / "history.sqlite3"))
+    monkeypatch.setattr(history, "_history", None)
+
+    async def stream_async():
+        events = [event async for event in AsyncLLMService().stream_code_review("y = 2 / 0\n", "syntax_revision")]
+        await AsyncLLMService.aclose()
+        return events
+
+    assert list(LLMService().stream_code_review("x = 1 / 0\n"))
+    assert asyncio.run(stream_async())
+    monkeypatch.setattr(Config, "REVIEW_PROTOCOL", "annotations")
+    assert list(LLMService().stream_code_review("z = 3 / 0\n", "style_suggestions"))
+
+    recorded = history.get_review_history()
+    recorded.flush()
+    items = recorded.search()["items"]
+    assert sorted(item["review_type"] for item in items) == ["bug_detection", "style_suggestions", "syntax_revision"]
+    assert all(item["status"] == "ok" for item in items)
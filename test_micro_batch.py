@@ -0,0 +1,90 @@
+import threading
+import time
+
+from deadlines import DEADLINE_ERROR
+from micro_batch import MicroBatcher, _BATCH_ERROR
+
+
+def _build_prompt(code):
+    return "istruzioni\n" + code
+
+
+def _submit_all(batcher, requests):
+    """Invia le richieste (codice, send, group, deadline) da thread diversi e ne raccoglie i risultati."""
+    results = [None] * len(requests)
+
+    def run(index, code, send, group, deadline):
+        results[index] = batcher.submit("bug_detection", code, _build_prompt, send, group=group, deadline=deadline)
+
+    threads = [threading.Thread(target=run, args=(index, *request)) for index, request in enumerate(requests)]
+    for thread in threads:
+        thread.start()
+        time.sleep(0.005)
+    for thread in threads:
+        thread.join(timeout=5)
+    assert not any(thread.is_alive() for thread in threads)
+    return results
+
+
+def test_failed_send_unblocks_every_caller():
+    def send(prompt):
+        raise RuntimeError("backend non raggiungibile")
+
+    results = _submit_all(MicroBatcher(window_ms=50), [(f"x = {n}", send, (), None) for n in range(3)])
+    assert results == [(_BATCH_ERROR, None)] * 3
+
+
+def test_only_same_group_is_batched():
+    prompts = []
+
+    def send(prompt):
+        prompts.append(prompt)
+        return "```python\nok\n```", None
+
+    batcher = MicroBatcher(window_ms=50)
+    _submit_all(batcher, [("x = 1", send, ("gemini", "interactive"), None), ("x = 2", send, ("gemini", "batch"), None)])
+    assert batcher.stats["batches"] == 2 and len(prompts) == 2
+
+
+def test_requests_with_different_deadlines_share_a_batch():
+    def send(prompt):
+        return "### SNIPPET 1 ###\nuno\n### SNIPPET 2 ###\ndue", {"prompt_tokens": 100, "output_tokens": 10}
+
+    batcher = MicroBatcher(window_ms=50)
+    now = time.monotonic()
+    results = _submit_all(batcher, [("x = 1", send, (), now + 5), ("y = 2222222", send, (), now + 30)])
+    assert batcher.stats["batches"] == 1
+    assert [review for review, _ in results] == ["uno", "due"]
+    # I token del micro-batch sono ripartiti tra gli snippet
+    assert sum(usage["prompt_tokens"] for _, usage in results) == 100
+    assert results[0][1]["prompt_tokens"] < results[1][1]["prompt_tokens"]
+    assert sum(usage["output_tokens"] for _, usage in results) == 10
+
+
+def test_each_caller_waits_only_until_its_own_deadline():
+    release = threading.Event()
+
+    def slow_send(prompt):
+        release.wait(5)
+        return "### SNIPPET 1 ###\nuno\n### SNIPPET 2 ###\ndue", None
+
+    batcher = MicroBatcher(window_ms=50)
+    results = {}
+
+    def leader():
+        results["leader"] = batcher.submit("bug_detection", "x = 1", _build_prompt, slow_send, deadline=time.monotonic() + 0.3)
+
+    thread = threading.Thread(target=leader)
+    thread.start()
+    time.sleep(0.01)
+    follower_deadline = time.monotonic() + 5
+    follower = threading.Thread(target=lambda: results.setdefault(
+        "follower", batcher.submit("bug_detection", "x = 2", _build_prompt, slow_send, deadline=follower_deadline)))
+    follower.start()
+    thread.join(timeout=2)
+    # Il leader scade mentre il micro-batch, inviato con la scadenza del follower, è ancora in corso
+    assert results["leader"] == (DEADLINE_ERROR, None)
+    release.set()
+    follower.join(timeout=2)
+    assert results["follower"] == ("due", None)
+    assert batcher.stats["snippets"] == 2
@@ -0,0 +1,49 @@
+import gzip
+import json
+
+from results_io import convert_files, load_columns, output_names, read_jsonl_rows, write_results
+
+
+def _write_run(path, model_review):
+    results = {"bug_detection": [
+        {"test_number": number, "code_snippet": f"x = {number}\n", "prompt_used": "",
+         "generated_review": f"{model_review} {number}"}
+        for number in (1, 2, 3)
+    ]}
+    write_results(str(path), results, total_time=1.5)
+
+
+def test_same_named_results_in_different_folders_do_not_overwrite(tmp_path):
+    for run in ("run1", "run2"):
+        (tmp_path / run).mkdir()
+        _write_run(tmp_path / run / "gemini_results.txt", f"revisione {run}")
+
+    outputs = convert_files([str(tmp_path / "run1" / "gemini_results.txt"),
+                             str(tmp_path / "run2" / "gemini_results.txt")], str(tmp_path / "out"))
+
+    assert len({output["jsonl"] for output in outputs}) == 2
+    for run, output in zip(("run1", "run2"), outputs):
+        assert run in output["jsonl"]
+        columns = load_columns(output["columns"])
+        rows = list(read_jsonl_rows(output["jsonl"], columns["offset"]))
+        assert [row["review"] for row in rows] == [f"revisione {run} {number}" for number in (1, 2, 3)]
+
+
+def test_columns_file_holds_no_text(tmp_path):
+    _write_run(tmp_path / "gemini_results.txt", "revisione")
+
+    [output] = convert_files([str(tmp_path / "gemini_results.txt")], str(tmp_path / "out"))
+
+    with gzip.open(output["columns"], "rt", encoding="utf-8") as f:
+        data = json.load(f)
+    assert set(data["columns"]) == {"model", "category", "input", "n_findings", "offset"}
+    assert data["dictionaries"] == {"model": ["gemini"], "category": ["bug_detection"]}
+    columns = load_columns(output["columns"])
+    assert columns["model"] == ["gemini"] * 3 and columns["input"] == [1, 2, 3]
+    assert [row["code"] for row in read_jsonl_rows(output["jsonl"], columns["offset"][::-1])] == ["x = 3", "x = 2", "x = 1"]
+
+
+def test_output_names_only_grow_for_collisions():
+    assert output_names(["a/run1/gemini_results.txt", "b/run1/gemini_results.txt", "codegemma_results.txt"]) == \
+        ["a__run1__gemini_results", "b__run1__gemini_results", "codegemma_results"]
+    assert output_names(["gemini_results.txt", "gemini_results.jsonl"]) == ["gemini_results", "gemini_results-2"]
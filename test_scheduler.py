@@ -0,0 +1,23 @@
+from config import Config
+from scheduler import api_priority, tenant_from_headers
+
+
+def _headers(**values):
+    headers = {name.replace("_", "-"): value for name, value in values.items()}
+    return headers.get
+
+
+def test_unknown_token_falls_back_to_remote_address(monkeypatch):
+    monkeypatch.setattr(Config, "API_TOKENS", "abc=interactive,def")
+    assert tenant_from_headers(_headers(X_API_Token="abc"), "10.0.0.1") == "token:abc"
+    assert tenant_from_headers(_headers(Authorization="Bearer def"), "10.0.0.1") == "token:def"
+    assert tenant_from_headers(_headers(X_API_Token="inventato"), "10.0.0.1") == "ip:10.0.0.1"
+
+
+def test_api_priority_is_batch_unless_authorized(monkeypatch):
+    monkeypatch.setattr(Config, "API_TOKENS", "abc=interactive,def")
+    assert api_priority(_headers()) == "batch"
+    assert api_priority(_headers(X_Review_Priority="interactive")) == "batch"
+    assert api_priority(_headers(X_API_Token="def", X_Review_Priority="interactive")) == "batch"
+    assert api_priority(_headers(X_API_Token="abc")) == "interactive"
+    assert api_priority(_headers(X_API_Token="abc", X_Review_Priority="batch")) == "batch"
@@ -0,0 +1,24 @@
+from semantic_cache import SemanticCache
+
+CODE = "def media(valori):\n    totale = sum(valori)\n    return totale / len(valori)\n"
+REVIEW = "def media(valori):\n    totale = sum(valori)\n    return totale / len(valori)  # BUG: [ALTA] divisione per zero con lista vuota\n"
+
+
+def _cache():
+    cache = SemanticCache()
+    cache.add(CODE, "gruppo", REVIEW)
+    return cache
+
+
+def test_renamed_copy_reuses_the_review():
+    match = _cache().lookup(CODE.replace("totale", "somma"), "gruppo")
+    assert match is not None
+    assert "return somma / len(valori) # BUG: ALTA" in match[1]
+
+
+def test_changed_operator_or_literal_goes_to_the_model():
+    cache = _cache()
+    assert cache.lookup(CODE.replace(" / ", " // "), "gruppo") is None
+    assert cache.lookup(CODE.replace("sum(valori)", "sum(valori, 1)"), "gruppo") is None
+    assert cache.lookup(CODE.replace("len(valori)", "len(totale)"), "gruppo") is None
+    assert cache.snapshot()["changed"] >= 1
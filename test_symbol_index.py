@@ -0,0 +1,84 @@
+from findings_parser import estimate_tokens
+from project_review import discover_directory
+from symbol_index import SymbolIndex, _resolve_relative
+
+FILES = {
+    "app.py": "from pkg import utils\n",
+    "pkg/__init__.py": "from .utils import helper\n",
+    "pkg/utils.py": (
+        "def helper(x: int) -> int:\n"
+        '    """Raddoppia x."""\n'
+        "    return 2 * x\n"
+        "\n"
+        "\n"
+        "class Client:\n"
+        "    def __init__(self, url):\n"
+        "        self.url = url\n"
+        "\n"
+        "    def send(self, data):\n"
+        "        return data\n"
+        "\n"
+        "    def _retry(self):\n"
+        "        pass\n"
+    ),
+    "pkg/sub/__init__.py": "",
+    "pkg/sub/tools.py": "def tool():\n    return 1\n",
+    "pkg/sub/worker.py": "from ..utils import helper, Client\nfrom . import tools\n",
+}
+
+
+def _project(tmp_path):
+    for path, code in FILES.items():
+        target = tmp_path.joinpath(*path.split("/"))
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_text(code, encoding="utf-8")
+    index = SymbolIndex()
+    index.update(discover_directory(str(tmp_path)))
+    return index
+
+
+def test_update_reparses_only_changed_files(tmp_path):
+    index = _project(tmp_path)
+    assert index.last_update["parsed"] == len(FILES)
+
+    assert index.update(discover_directory(str(tmp_path)))["reused"] == len(FILES)
+    assert index.last_update["parsed"] == 0
+
+    (tmp_path / "pkg" / "utils.py").write_text(FILES["pkg/utils.py"] + "\n\ndef other():\n    pass\n", encoding="utf-8")
+    (tmp_path / "pkg" / "sub" / "tools.py").unlink()
+    update = index.update(discover_directory(str(tmp_path)))
+    assert (update["parsed"], update["reused"], update["removed"]) == (1, len(FILES) - 2, 1)
+    assert "other" in index.files["pkg/utils.py"]["symbols"]
+
+
+def test_relative_imports_resolve_against_the_module():
+    assert _resolve_relative("pkg.sub.worker", False, 2, "utils") == "pkg.utils"
+    assert _resolve_relative("pkg.sub.worker", False, 1, None) == "pkg.sub"
+    assert _resolve_relative("pkg.sub", True, 1, "tools") == "pkg.sub.tools"
+    assert _resolve_relative("pkg.sub", True, 2, None) == "pkg"
+    assert _resolve_relative("pkg.sub.worker", False, 0, "json") == "json"
+
+
+def test_importers_follow_the_import_graph(tmp_path):
+    index = _project(tmp_path)
+    assert index.imports_of("pkg.sub.worker") == ["pkg.sub.tools", "pkg.utils"]
+    assert index.importers_of("pkg.utils") == ["app", "pkg", "pkg.sub.worker"]
+    assert index.importers_of("pkg.sub.tools") == ["pkg.sub.worker"]
+    assert index.importers_of("app") == []
+
+
+def test_context_stays_within_the_token_budget(tmp_path):
+    index = _project(tmp_path)
+    code = "helper(1)\nClient('x')\n"
+    helper = "def helper(x: int) -> int: ...  # Raddoppia x."
+    client = "class Client:"
+
+    full = index.context_for(code, budget_tokens=1000)
+    assert "    def send(self, data): ..." in full and "_retry" not in full
+
+    # Senza spazio per i metodi, la classe viene riportata con la sola firma
+    short = index.context_for(code, budget_tokens=estimate_tokens(helper) + estimate_tokens(client))
+    assert short == f"# pkg.utils\n{helper}\n{client}"
+
+    assert index.context_for(code, budget_tokens=estimate_tokens(helper)) == f"# pkg.utils\n{helper}"
+    assert index.context_for(code, budget_tokens=0) == ""
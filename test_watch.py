@@ -0,0 +1,61 @@
+import asyncio
+
+from watch import Watcher, diff_lines
+
+
+class FakeService:
+    """Servizio asincrono che segnala le divisioni per zero, registrando gli snippet e le chiamate concorrenti."""
+
+    snippets = []
+    active = 0
+    max_active = 0
+
+    async def generate_code_review(self, code_snippet, review_type):
+        FakeService.snippets.append(code_snippet)
+        FakeService.active += 1
+        FakeService.max_active = max(FakeService.max_active, FakeService.active)
+        await asyncio.sleep(0.01)
+        FakeService.active -= 1
+        return "\n".join(line + "  # BUG: ALTA - divisione per zero" if "/ 0" in line else line
+                         for line in code_snippet.splitlines())
+
+
+def _watcher(tmp_path, workers=4):
+    FakeService.snippets, FakeService.active, FakeService.max_active = [], 0, 0
+    return Watcher(str(tmp_path), FakeService, workers=workers, output=None)
+
+
+def test_diff_lines_maps_unchanged_lines_and_reports_changes():
+    mapping, changed = diff_lines("a\nb\nc\nd\n", "nuova\na\nb\nC\nd\n")
+    assert mapping == {1: 2, 2: 3, 4: 5}
+    assert changed == [1, 4]
+    mapping, changed = diff_lines("a\nb\nc\n", "a\nc\n")
+    assert mapping == {1: 1, 3: 2}
+    assert changed == [2]
+
+
+def test_findings_of_unchanged_code_follow_moved_lines(tmp_path):
+    watcher = _watcher(tmp_path)
+    source = tmp_path / "modulo.py"
+    source.write_text("def a():\n    return 1 / 0\n\n\ndef b():\n    return 2\n", encoding="utf-8")
+    asyncio.run(watcher._review("modulo.py", "v1"))
+    assert [finding["line"] for finding in watcher.results["modulo.py"]["findings"]] == [2]
+
+    source.write_text("import os\n\n\ndef a():\n    return 1 / 0\n\n\ndef b():\n    return 2 / 0\n", encoding="utf-8")
+    asyncio.run(watcher._review("modulo.py", "v2"))
+
+    assert not any("return 1 / 0" in snippet for snippet in FakeService.snippets[1:])
+    assert [finding["line"] for finding in watcher.results["modulo.py"]["findings"]] == [5, 9]
+
+
+def test_concurrent_calls_are_limited_per_unit(tmp_path):
+    watcher = _watcher(tmp_path, workers=2)
+    functions = [f"def f{index}():\n    return {{}}\n\n\n" for index in range(6)]
+    (tmp_path / "modulo.py").write_text("".join(function.format("1 / 0") for function in functions), encoding="utf-8")
+    watcher._reviewed["modulo.py"] = "".join(function.format("0") for function in functions)
+
+    asyncio.run(watcher._review("modulo.py", "v1"))
+
+    assert len(FakeService.snippets) == 6
+    assert FakeService.max_active == 2
+    assert len(watcher.results["modulo.py"]["findings"]) == 6
@@ -0,0 +1,262 @@
+import argparse
+import asyncio
+import difflib
+import json
+import os
+import sys
+import textwrap
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from cascade import is_error_response
+from cli import changed_units
+from config import Config
+from deadlines import cancellation_stats
+from findings_parser import parse_findings
+from project_review import discover_directory, module_name
+
+
+def diff_lines(old: str, new: str) -> Tuple[Dict[int, int], List[int]]:
+    """Confronta due versioni di un file riga per riga.
+
+        Returns:
+            tuple: La corrispondenza tra le righe invariate (riga vecchia -> riga nuova) e le righe
+            nuove aggiunte o modificate (per le sole cancellazioni, la riga successiva al punto di cancellazione).
+    """
+    old_lines, new_lines = old.splitlines(), new.splitlines()
+    mapping: Dict[int, int] = {}
+    changed: List[int] = []
+    for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False).get_opcodes():
+        if tag == "equal":
+            mapping.update((i1 + k + 1, j1 + k + 1) for k in range(i2 - i1))
+        elif j2 > j1:
+            changed.extend(range(j1 + 1, j2 + 1))
+        else:
+            changed.append(min(j1 + 1, max(len(new_lines), 1)))
+    return mapping, changed
+
+
+class Watcher:
+    """Osserva una cartella e rivede i file Python poco dopo che sono stati salvati.
+
+        Il controllo usa solo la data di modifica e la dimensione dei file (`ProjectFile.version`),
+        senza leggerli né calcolarne l'hash. Una modifica viene rivista quando il file è rimasto
+        invariato per `debounce` secondi, così che una raffica di salvataggi produca una sola revisione.
+        Se arriva una versione più recente mentre la revisione di un file è in corso, questa viene
+        cancellata: con `AsyncLLMService` la cancellazione chiude la richiesta HTTP verso il backend.
+
+        Vengono riviste solo le funzioni (o le istruzioni) cambiate rispetto all'ultima versione
+        rivista (vedi `cli.changed_units`); le segnalazioni delle parti invariate vengono mantenute,
+        spostando i numeri di riga. I risultati vengono stampati e salvati in `output` (JSON).
+
+        Attributes:
+            root (str): La cartella osservata.
+            review_type (str): Il tipo di revisione eseguito.
+            results (Dict[str, Dict]): Per ogni file rivisto: versione, istante della revisione e segnalazioni.
+            stats (Dict[str, int]): Revisioni completate, porzioni riviste e revisioni cancellate.
+    """
+
+    def __init__(self, root: str, service_factory: Callable, review_type: str = "bug_detection",
+                 debounce: float = 0.5, interval: float = 0.5, workers: int = 4,
+                 output: Optional[str] = "watch_results.json", symbol_index=None) -> None:
+        self.root = root
+        self.review_type = review_type
+        self.debounce = debounce
+        self.interval = interval
+        self.output = output
+        self.results: Dict[str, Dict] = {}
+        self.stats = {"reviews": 0, "units": 0, "cancelled": 0}
+        self._service_factory = service_factory
+        self._symbol_index = symbol_index
+        self._semaphore = asyncio.Semaphore(max(1, workers))
+        self._versions: Dict[str, str] = {}
+        self._changed_at: Dict[str, float] = {}
+        self._reviewed: Dict[str, str] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    async def run(self, initial: bool = False, iterations: Optional[int] = None) -> None:
+        """Avvia il ciclo di osservazione.
+
+            Args:
+                initial (bool, optional): Se True, rivede subito tutti i file; altrimenti la versione
+                    attuale fa da riferimento e vengono riviste solo le modifiche successive.
+                iterations (Optional[int]): Il numero di controlli da eseguire (None: fino all'interruzione).
+        """
+        files = await asyncio.to_thread(discover_directory, self.root)
+        for project_file in files:
+            self._versions[project_file.path] = project_file.version
+            if initial:
+                self._changed_at[project_file.path] = 0.0
+            else:
+                self._reviewed[project_file.path] = self._read(project_file.path) or ""
+        if self._symbol_index is not None:
+            await asyncio.to_thread(self._symbol_index.update, files)
+        print(f"In osservazione {len(files)} file in {self.root} (Ctrl+C per terminare)")
+
+        count = 0
+        try:
+            while iterations is None or count < iterations:
+                await self._poll()
+                count += 1
+                await asyncio.sleep(self.interval)
+            await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+        finally:
+            for task in self._tasks.values():
+                task.cancel()
+
+    def _read(self, path: str) -> Optional[str]:
+        try:
+            with open(os.path.join(self.root, *path.split("/")), "r", encoding="utf-8", errors="replace") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    async def _poll(self) -> None:
+        files = {project_file.path: project_file for project_file in await asyncio.to_thread(discover_directory, self.root)}
+        now = time.monotonic()
+
+        for path, project_file in files.items():
+            if self._versions.get(path) != project_file.version:
+                self._versions[path] = project_file.version
+                self._changed_at[path] = now
+                task = self._tasks.pop(path, None)
+                if task is not None and not task.done():
+                    # Una versione più recente rende inutile la revisione in corso
+                    task.cancel()
+                    self.stats["cancelled"] += 1
+
+        removed = [path for path in self._versions if path not in files]
+        for path in removed:
+            for state in (self._versions, self._changed_at, self._reviewed, self.results):
+                state.pop(path, None)
+            task = self._tasks.pop(path, None)
+            if task is not None:
+                task.cancel()
+        if removed:
+            self._save()
+
+        if self._symbol_index is not None and any(path in self._changed_at for path in files):
+            await asyncio.to_thread(self._symbol_index.update, files.values())
+
+        for path, changed_at in list(self._changed_at.items()):
+            if now - changed_at >= self.debounce and path not in self._tasks:
+                del self._changed_at[path]
+                task = asyncio.create_task(self._review(path, self._versions[path]))
+                task.add_done_callback(lambda task, path=path: self._forget(path, task))
+                self._tasks[path] = task
+
+    def _forget(self, path: str, task: asyncio.Task) -> None:
+        if self._tasks.get(path) is task:
+            del self._tasks[path]
+
+    async def _review(self, path: str, version: str) -> None:
+        code = self._read(path)
+        if code is None:
+            return
+        previous = self._reviewed.get(path)
+        if previous is None:
+            mapping, units = {}, [(1, max(len(code.splitlines()), 1))]
+        else:
+            mapping, lines = diff_lines(previous, code)
+            units = changed_units(code, lines)
+
+        start = time.perf_counter()
+        try:
+            reviews = await asyncio.gather(*(self._review_unit(path, code, first, last) for first, last in units))
+        except asyncio.CancelledError:
+            cancellation_stats.record_cancelled(time.perf_counter() - start, 0.0)
+            raise
+
+        errors = [review for review in reviews if isinstance(review, str)]
+        findings = [finding for review in reviews if not isinstance(review, str) for finding in review]
+        if errors:
+            for error in errors:
+                print(f"{path}: {error}")
+            # La versione non viene presa come riferimento: al prossimo salvataggio si rivedono anche queste parti
+            return
+
+        # Segnalazioni precedenti delle righe invariate e fuori dalle porzioni appena riviste
+        for finding in self.results.get(path, {}).get("findings", []):
+            line = mapping.get(finding["line"])
+            if line is not None and not any(first <= line <= last for first, last in units):
+                findings.append({**finding, "line": line})
+        findings.sort(key=lambda finding: finding["line"])
+
+        self._reviewed[path] = code
+        self.results[path] = {"version": version, "reviewed_at": time.time(), "findings": findings}
+        self.stats["reviews"] += 1
+        self.stats["units"] += len(units)
+        self._report(path, units, findings, time.perf_counter() - start)
+        self._save()
+
+    async def _review_unit(self, path: str, code: str, first: int, last: int):
+        """Rivede le righe `first`-`last`; restituisce le segnalazioni (righe del file) o il messaggio di errore."""
+        snippet = textwrap.dedent("\n".join(code.splitlines()[first - 1:last]))
+        service = self._service_factory()
+        service.source_module = module_name(path)
+        service.source_path = path
+        # Il limite vale per porzione: una modifica estesa non invia tutte le sue porzioni insieme
+        async with self._semaphore:
+            review = await service.generate_code_review(code_snippet=snippet, review_type=self.review_type)
+        if is_error_response(review):
+            return review.strip()
+        return [{**finding, "line": finding["line"] + first - 1} for finding in parse_findings(review)["findings"]]
+
+    def _report(self, path: str, units: List[Tuple[int, int]], findings: List[Dict], elapsed: float) -> None:
+        ranges = ", ".join(f"{first}-{last}" if first != last else str(first) for first, last in units)
+        print(f"[{time.strftime('%H:%M:%S')}] {path}: righe {ranges} riviste in {elapsed:.1f}s, {len(findings)} segnalazioni")
+        for finding in findings:
+            rule = f" {finding['rule']}" if finding.get("rule") else ""
+            print(f"  {path}:{finding['line']}: {finding['severity']} {finding['tag']}{rule} {finding['message']}")
+
+    def _save(self) -> None:
+        if not self.output:
+            return
+        temporary = self.output + ".tmp"
+        with open(temporary, "w", encoding="utf-8") as f:
+            json.dump({"root": self.root, "review_type": self.review_type, "stats": self.stats, "files": self.results},
+                      f, ensure_ascii=False, indent=2)
+        os.replace(temporary, self.output)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Rivede i file Python di una cartella man mano che vengono salvati.")
+    parser.add_argument("root", nargs="?", default=".", help="La cartella da osservare.")
+    parser.add_argument("--review-type", default="bug_detection",
+                        choices=["bug_detection", "syntax_revision", "style_suggestions", "doc_strings_add"])
+    parser.add_argument("--debounce", type=float, default=0.5, help="Secondi di inattività prima di rivedere un file.")
+    parser.add_argument("--interval", type=float, default=0.5, help="Secondi tra un controllo e il successivo.")
+    parser.add_argument("--workers", type=int, default=Config.PROJECT_REVIEW_WORKERS, help="Porzioni di codice riviste in parallelo.")
+    parser.add_argument("--output", default="watch_results.json", help="Il file JSON con le segnalazioni correnti.")
+    parser.add_argument("--initial", action="store_true", help="Rivede subito tutti i file della cartella.")
+    parser.add_argument("--no-context", action="store_true", help="Non aggiunge ai prompt le firme dell'indice dei simboli.")
+    args = parser.parse_args()
+
+    from async_llm_service import AsyncLLMService
+    from symbol_index import SymbolIndex
+
+    try:
+        AsyncLLMService()
+    except ValueError as e:
+        print(f"Errore di configurazione del servizio LLM: {e}")
+        sys.exit(1)
+
+    symbol_index = None if args.no_context else SymbolIndex()
+    watcher = Watcher(args.root, lambda: AsyncLLMService(priority="interactive", tenant="watch", symbol_index=symbol_index),
+                      review_type=args.review_type, debounce=args.debounce, interval=args.interval,
+                      workers=args.workers, output=args.output, symbol_index=symbol_index)
+
+    async def run():
+        try:
+            await watcher.run(initial=args.initial)
+        finally:
+            await AsyncLLMService.aclose()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        print(f"Revisioni: {watcher.stats['reviews']}, cancellate: {watcher.stats['cancelled']}")
+
+
+if __name__ == "__main__":
+    main()